@@ -0,0 +1,374 @@
+"""
+In-process API load benchmark
+
+Boots the FastAPI app against a throwaway MongoDB database and drives it
+through an ASGI client (no uvicorn, no network hop), replaying the traffic
+shapes that matter on a training day and at month end:
+
+    login_burst        the whole class signing in at once
+    clock_in           a class clocking in at the same moment
+    test_wave          the class submitting the pre test, then the post test
+    month_end_finance  finance users opening the dashboard and P&L
+    payroll_run        bulk pay advice generation for the closed month
+
+With --dataset the scratch database is first filled with a synthetic
+history from benchmarks/dataset.py, so the scenarios run against
+production-sized collections.
+
+Each scenario reports p50/p95/p99 latency, throughput and MongoDB commands
+per request (read from the Server-Timing header set by the instrumentation
+middleware) as JSON, so runs can be diffed between commits.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/api_load.py
+    python benchmarks/api_load.py --scenario clock_in --scenario test_wave --rounds 10 --output bench.json
+    python benchmarks/api_load.py --dataset medium --scenario month_end_finance
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.dataset import PRESETS, BulkLoader, DatasetGenerator  # noqa: E402
+from benchmarks.timing import percentiles  # noqa: E402
+from utils.periods import document_period_fields, period_fields  # noqa: E402
+from utils.time_helpers import get_malaysia_time  # noqa: E402
+
+PASSWORD = "Bench-Pass-2026"
+DB_COMMANDS = re.compile(r'desc="(\d+) queries"')
+QUESTIONS_PER_TEST = 20
+
+
+class Recorder:
+    """Latencies, statuses and MongoDB command counts of one scenario, per request label"""
+
+    __slots__ = ("latencies", "db_commands", "statuses", "elapsed")
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.db_commands = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.elapsed = 0.0
+
+    async def request(self, client, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][response.status_code] += 1
+        match = DB_COMMANDS.search(response.headers.get("server-timing", ""))
+        if match:
+            self.db_commands[label].append(int(match.group(1)))
+        return response
+
+    def summary(self) -> dict:
+        labels = {label: self._summarise(self.latencies[label], self.db_commands[label], self.statuses[label])
+                  for label in self.latencies}
+        summary = self._summarise(
+            [s for samples in self.latencies.values() for s in samples],
+            [c for counts in self.db_commands.values() for c in counts],
+            sum(self.statuses.values(), Counter()),
+        )
+        summary["throughput_rps"] = round(summary["requests"] / self.elapsed, 1) if self.elapsed else None
+        summary["wall_seconds"] = round(self.elapsed, 3)
+        summary["by_request"] = labels
+        return summary
+
+    @staticmethod
+    def _summarise(latencies: list, db_commands: list, statuses: Counter) -> dict:
+        return {
+            "requests": len(latencies),
+            "errors": sum(count for status, count in statuses.items() if status >= 400),
+            "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+            "latency": percentiles(latencies),
+            "db_commands_per_request": {
+                "mean": round(sum(db_commands) / len(db_commands), 1) if db_commands else None,
+                "max": max(db_commands) if db_commands else None,
+            },
+        }
+
+
+# ==================== FIXTURES ====================
+
+def _user(role: str, n: int, password_hash: str, **extra) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "email": f"bench.{role}.{n}@example.com",
+        "full_name": f"BENCH {role.upper()} {n}",
+        "id_number": f"{role[:3].upper()}{n:06d}",
+        "role": role,
+        "password": password_hash,
+        "is_active": True,
+        "created_at": get_malaysia_time().isoformat(),
+        **extra,
+    }
+
+
+def _test(program_id: str, test_type: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "program_id": program_id,
+        "test_type": test_type,
+        "questions": [
+            {"question": f"{test_type} question {i + 1}", "options": ["A", "B", "C", "D"], "correct_answer": i % 4}
+            for i in range(QUESTIONS_PER_TEST)
+        ],
+        "created_at": get_malaysia_time().isoformat(),
+    }
+
+
+def _history(month_start, n: int, fixture: dict) -> dict:
+    """One completed session of a past month with its invoice, payment and payables"""
+    start = (month_start + timedelta(days=n % 27)).date().isoformat()
+    session_id, invoice_id = str(uuid.uuid4()), str(uuid.uuid4())
+    stamp = period_fields(start)
+    trainers = fixture["trainers"]
+    total = 4000.0 + 100 * (n % 10)
+    paid = n % 3 != 0
+    invoice = {
+        "id": invoice_id, "invoice_number": f"INV/BENCH/{start[:7]}/{n:04d}", "session_id": session_id,
+        "company_id": fixture["company_id"], "total_amount": total, "outstanding": 0.0 if paid else total,
+        "status": "paid" if paid else "approved", "invoice_date": start, "created_at": f"{start}T09:00:00+08:00",
+    }
+    invoice.update(document_period_fields("invoices", invoice))
+    rows = {
+        "sessions": [{
+            "id": session_id, "name": f"Bench history {start} #{n}", "program_id": fixture["program_id"],
+            "company_id": fixture["company_id"], "location": "Bench", "start_date": start, "end_date": start,
+            "participant_ids": [], "status": "active", "completion_status": "completed",
+            "invoice_id": invoice_id, "marketing_user_id": fixture["marketing_id"],
+            "created_at": f"{start}T08:00:00+08:00",
+        }],
+        "invoices": [invoice],
+        "payments": [],
+        "trainer_fees": [
+            {"id": str(uuid.uuid4()), "session_id": session_id, "trainer_id": trainers[(n + i) % len(trainers)],
+             "trainer_role": "chief" if i == 0 else "regular", "fee_amount": 600.0 if i == 0 else 400.0,
+             "status": "paid", **stamp}
+            for i in range(2)
+        ],
+        "coordinator_fees": [{"id": str(uuid.uuid4()), "session_id": session_id,
+                              "coordinator_id": fixture["coordinator_id"], "total_fee": 300.0, "status": "paid", **stamp}],
+        "marketing_commissions": [{"id": str(uuid.uuid4()), "session_id": session_id,
+                                   "marketing_user_id": fixture["marketing_id"], "calculated_amount": total * 0.05,
+                                   "status": "pending", **stamp}],
+        "session_expenses": [{"id": str(uuid.uuid4()), "session_id": session_id, "description": "Venue",
+                              "amount": 250.0, **stamp}],
+    }
+    if paid:
+        payment = {"id": str(uuid.uuid4()), "invoice_id": invoice_id, "amount": total, "payment_date": start,
+                   "payment_method": "bank_transfer", "created_at": f"{start}T12:00:00+08:00"}
+        payment.update(document_period_fields("payments", payment))
+        rows["payments"].append(payment)
+    return rows
+
+
+async def seed(db, password_hash: str, participants: int, months: int, sessions_per_month: int) -> dict:
+    """Users, one live session with its class and tests, and a few months of finance history"""
+    now = get_malaysia_time()
+    users = [_user("admin", 1, password_hash), _user("finance", 1, password_hash)]
+    trainers = [_user("trainer", n, password_hash) for n in range(4)]
+    coordinator = _user("coordinator", 1, password_hash)
+    marketing = _user("marketing", 1, password_hash)
+    company = {"id": str(uuid.uuid4()), "name": "BENCH LOGISTICS SDN BHD", "created_at": now.isoformat()}
+    program = {"id": str(uuid.uuid4()), "name": "BENCH DEFENSIVE DRIVING", "pass_percentage": 70.0,
+               "created_at": now.isoformat()}
+    learners = [_user("participant", n, password_hash, company_id=company["id"]) for n in range(participants)]
+    tests = {test_type: _test(program["id"], test_type) for test_type in ("pre", "post")}
+    session = {
+        "id": str(uuid.uuid4()), "name": "Bench live session", "program_id": program["id"],
+        "company_id": company["id"], "location": "Bench", "start_date": now.date().isoformat(),
+        "end_date": (now + timedelta(days=1)).date().isoformat(),
+        "participant_ids": [p["id"] for p in learners],
+        "trainer_assignments": [{"trainer_id": t["id"], "role": "regular"} for t in trainers],
+        "coordinator_id": coordinator["id"], "status": "active", "completion_status": "ongoing",
+        "created_at": now.isoformat(),
+    }
+    access = [{"id": str(uuid.uuid4()), "participant_id": p["id"], "session_id": session["id"],
+               "can_access_pre_test": True, "can_access_post_test": True} for p in learners]
+
+    await db.users.insert_many(users + trainers + [coordinator, marketing] + learners)
+    await db.companies.insert_one(company)
+    await db.programs.insert_one(program)
+    await db.tests.insert_many(list(tests.values()))
+    await db.sessions.insert_one(session)
+    await db.participant_access.insert_many(access)
+
+    fixture = {
+        "admin": users[0], "finance": users[1], "participants": learners, "session_id": session["id"],
+        "tests": {t: doc["id"] for t, doc in tests.items()}, "company_id": company["id"],
+        "program_id": program["id"], "trainers": [t["id"] for t in trainers],
+        "coordinator_id": coordinator["id"], "marketing_id": marketing["id"],
+    }
+    history = defaultdict(list)
+    month_start = now.replace(day=1, hour=9, minute=0, second=0, microsecond=0)
+    for _ in range(months):
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+        for n in range(sessions_per_month):
+            for collection, docs in _history(month_start, n, fixture).items():
+                history[collection].extend(docs)
+    for collection, docs in history.items():
+        if docs:
+            await db[collection].insert_many(docs, ordered=False)
+    last_month = (now.replace(day=1) - timedelta(days=1))
+    fixture["closed_month"] = (last_month.year, last_month.month)
+    return fixture
+
+
+# ==================== SCENARIOS ====================
+
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def login_burst(client, db, fixture, tokens, recorder):
+    await asyncio.gather(*(
+        recorder.request(client, "POST /auth/login", "POST", "/api/auth/login",
+                         json={"email": p["id_number"], "password": PASSWORD})
+        for p in fixture["participants"]
+    ))
+
+
+async def clock_in(client, db, fixture, tokens, recorder):
+    await db.attendance.delete_many({"session_id": fixture["session_id"]})
+    await asyncio.gather(*(
+        recorder.request(client, "POST /attendance/clock-in", "POST", "/api/attendance/clock-in",
+                         json={"session_id": fixture["session_id"]}, headers=_auth(tokens[p["id"]]))
+        for p in fixture["participants"]
+    ))
+
+
+async def test_wave(client, db, fixture, tokens, recorder):
+    await db.test_results.delete_many({"session_id": fixture["session_id"]})
+    for test_type in ("pre", "post"):
+        await asyncio.gather(*(
+            recorder.request(client, "POST /tests/submit", "POST", "/api/tests/submit", json={
+                "test_id": fixture["tests"][test_type],
+                "session_id": fixture["session_id"],
+                "answers": [(i + n) % 4 for i in range(QUESTIONS_PER_TEST)],
+            }, headers=_auth(tokens[p["id"]]))
+            for n, p in enumerate(fixture["participants"])
+        ))
+
+
+async def month_end_finance(client, db, fixture, tokens, recorder, viewers: int = 5):
+    year, month = fixture["closed_month"]
+    headers = _auth(tokens[fixture["finance"]["id"]])
+
+    async def viewer():
+        await recorder.request(client, "GET /finance/dashboard", "GET", "/api/finance/dashboard",
+                               params={"year": year}, headers=headers)
+        await recorder.request(client, "GET /finance/profit-loss", "GET", "/api/finance/profit-loss",
+                               params={"year": year, "month": month}, headers=headers)
+        await recorder.request(client, "GET /finance/profit-loss/by-programme", "GET",
+                               "/api/finance/profit-loss/by-programme", params={"year": year}, headers=headers)
+    await asyncio.gather(*(viewer() for _ in range(viewers)))
+
+
+async def payroll_run(client, db, fixture, tokens, recorder):
+    year, month = fixture["closed_month"]
+    await db.pay_advice.delete_many({"training_year": year, "training_month": month})
+    await recorder.request(client, "POST /hr/pay-advice/bulk-generate", "POST", "/api/hr/pay-advice/bulk-generate",
+                           params={"year": year, "month": month}, headers=_auth(tokens[fixture["admin"]["id"]]))
+
+
+SCENARIOS = {
+    "login_burst": login_burst,
+    "clock_in": clock_in,
+    "test_wave": test_wave,
+    "month_end_finance": month_end_finance,
+    "payroll_run": payroll_run,
+}
+
+
+async def run_scenario(scenario, client, db, fixture, tokens, rounds: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await scenario(client, db, fixture, tokens, Recorder())
+    recorder = Recorder()
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await scenario(client, db, fixture, tokens, recorder)
+        recorder.elapsed += time.perf_counter() - started
+    return recorder.summary()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API in-process against a scratch database")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default all)")
+    parser.add_argument("--participants", type=int, default=40, help="Class size of the live session")
+    parser.add_argument("--months", type=int, default=12, help="Months of finance history to seed")
+    parser.add_argument("--sessions-per-month", type=int, default=20)
+    parser.add_argument("--dataset", choices=sorted(PRESETS), help="Load a synthetic history of this size first")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="Unrecorded rounds before measuring")
+    parser.add_argument("--db-name", default=f"bench_api_{os.getpid()}")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    args = parser.parse_args()
+
+    # server.py connects at import time, so point it at the scratch database first
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db_name
+
+    import httpx
+    from motor.motor_asyncio import AsyncIOMotorClient
+    import server
+
+    admin_client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    await admin_client.drop_database(args.db_name)
+    report = {
+        "commit": _git_commit(),
+        "started_at": get_malaysia_time().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "keep")},
+        "scenarios": {},
+    }
+    try:
+        async with server.app.router.lifespan_context(server.app):
+            if args.dataset:
+                started = time.perf_counter()
+                counts = await DatasetGenerator(PRESETS[args.dataset]).generate(BulkLoader(server.db))
+                report["dataset"] = {"documents": sum(counts.values()),
+                                     "load_seconds": round(time.perf_counter() - started, 1)}
+            fixture = await seed(server.db, server.hash_password(PASSWORD), args.participants,
+                                 args.months, args.sessions_per_month)
+            everyone = fixture["participants"] + [fixture["admin"], fixture["finance"]]
+            tokens = {user["id"]: server.create_access_token({"sub": user["id"]}) for user in everyone}
+
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for name in args.scenario or list(SCENARIOS):
+                    report["scenarios"][name] = await run_scenario(
+                        SCENARIOS[name], client, server.db, fixture, tokens, args.rounds, args.warmup
+                    )
+    finally:
+        if not args.keep:
+            await admin_client.drop_database(args.db_name)
+        admin_client.close()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
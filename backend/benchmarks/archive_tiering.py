@@ -0,0 +1,189 @@
+"""
+Hot/archive tiering benchmark
+
+Seeds a scratch database with several years of completed synthetic sessions
+plus one live session, then measures hot-collection index sizes and the
+clock-in / clock-out query path before and after archiving the completed
+sessions. Needs a real MongoDB (collStats is not emulated by mongomock).
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/archive_tiering.py
+    python benchmarks/archive_tiering.py --years 5 --sessions-per-week 12 --participants 20 --keep
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.timing import percentiles  # noqa: E402
+from migrations.runner import apply_index_manifest  # noqa: E402
+from utils.archive import ARCHIVED_COLLECTIONS, archive_due_sessions  # noqa: E402
+from utils.time_helpers import get_malaysia_time  # noqa: E402
+
+INSERT_BATCH = 5000
+
+
+def session_records(session_id: str, participant_ids: list, start) -> dict:
+    """One completed two-day session's worth of operational rows"""
+    day_one, day_two = start.date().isoformat(), (start + timedelta(days=1)).date().isoformat()
+    rows = {name: [] for name in ARCHIVED_COLLECTIONS}
+    for pid in participant_ids:
+        key = {"session_id": session_id, "participant_id": pid}
+        for day in (day_one, day_two):
+            rows["attendance"].append({**key, "id": str(uuid.uuid4()), "date": day,
+                                       "clock_in": "08:0%d:00" % random.randint(0, 9), "clock_out": "17:00:00"})
+            rows["participant_attendance"].append({**key, "date": day, "present": True})
+        rows["attendance_records"].append({**key, "id": str(uuid.uuid4()), "days_present": 2})
+        for test_type in ("pre", "post"):
+            rows["test_results"].append({
+                **key, "id": str(uuid.uuid4()), "test_type": test_type, "score": random.randint(40, 100),
+                "passed": True, "answers": [random.randint(0, 3) for _ in range(30)],
+                "submitted_at": start.isoformat(),
+            })
+        rows["course_feedback"].append({**key, "id": str(uuid.uuid4()), "responses": {"q%d" % i: 5 for i in range(10)}})
+        rows["vehicle_checklists"].append({**key, "id": str(uuid.uuid4()), "verification_status": "verified",
+                                           "checklist_items": [{"item": "tyres", "status": "good"}] * 12})
+        rows["vehicle_details"].append({**key, "id": str(uuid.uuid4()), "vehicle_model": "Myvi", "registration_number": "WXX 1234"})
+        rows["participant_access"].append({**key, "id": str(uuid.uuid4()), "feedback_submitted": True,
+                                           "certificate_url": f"/api/static/certificates/{pid}.pdf"})
+    rows["chief_trainer_feedback"].append({"session_id": session_id, "id": str(uuid.uuid4()), "notes": "ok"})
+    rows["coordinator_feedback"].append({"session_id": session_id, "id": str(uuid.uuid4()), "notes": "ok"})
+    return rows
+
+
+async def seed(db, years: int, sessions_per_week: int, participants: int) -> int:
+    now = get_malaysia_time()
+    buffers = {name: [] for name in ARCHIVED_COLLECTIONS}
+    sessions = []
+    total = 0
+
+    async def flush(force=False):
+        nonlocal total
+        for name, docs in buffers.items():
+            if docs and (force or len(docs) >= INSERT_BATCH):
+                await db[name].insert_many(docs, ordered=False)
+                total += len(docs)
+                docs.clear()
+        if sessions and (force or len(sessions) >= INSERT_BATCH):
+            await db.sessions.insert_many(sessions, ordered=False)
+            sessions.clear()
+
+    for week in range(years * 52, 0, -1):
+        for _ in range(sessions_per_week):
+            start = now - timedelta(weeks=week, days=random.randint(0, 4))
+            session_id = str(uuid.uuid4())
+            participant_ids = [str(uuid.uuid4()) for _ in range(participants)]
+            sessions.append({
+                "id": session_id, "participant_ids": participant_ids,
+                "start_date": start.date().isoformat(), "end_date": (start + timedelta(days=1)).date().isoformat(),
+                "completion_status": "completed", "completed_date": (start + timedelta(days=3)).isoformat(),
+            })
+            for name, docs in session_records(session_id, participant_ids, start).items():
+                buffers[name].extend(docs)
+        await flush()
+    await flush(force=True)
+    return total
+
+
+async def index_sizes(db) -> dict:
+    sizes = {}
+    for name in ARCHIVED_COLLECTIONS + ["archive_" + n for n in ARCHIVED_COLLECTIONS]:
+        stats = await db.command("collStats", name)
+        sizes[name] = {"count": stats.get("count", 0), "total_index_bytes": stats.get("totalIndexSize", 0)}
+    return sizes
+
+
+async def clock_in_latency(db, participants: int, rounds: int) -> dict:
+    """Replays the /attendance/clock-in and /attendance/clock-out queries for a live session"""
+    session_id = str(uuid.uuid4())
+    today = get_malaysia_time().date().isoformat()
+    clock_in, clock_out = [], []
+    for _ in range(rounds):
+        for _ in range(participants):
+            pid = str(uuid.uuid4())
+            started = time.perf_counter()
+            await db.attendance.find_one({"participant_id": pid, "session_id": session_id}, {"_id": 0})
+            await db.attendance.find_one({"participant_id": pid, "session_id": session_id, "date": today}, {"_id": 0})
+            record_id = str(uuid.uuid4())
+            await db.attendance.insert_one({"id": record_id, "participant_id": pid, "session_id": session_id,
+                                            "date": today, "clock_in": "08:00:00"})
+            clock_in.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await db.attendance.find_one({"participant_id": pid, "session_id": session_id}, {"_id": 0})
+            await db.attendance.update_one({"id": record_id}, {"$set": {"clock_out": "17:00:00"}})
+            clock_out.append(time.perf_counter() - started)
+    await db.attendance.delete_many({"session_id": session_id})
+    return {"clock_in": percentiles(clock_in), "clock_out": percentiles(clock_out)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark hot/archive session tiering")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--sessions-per-week", type=int, default=12)
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10, help="Live clock-in rounds per measurement")
+    parser.add_argument("--db-name", default="bench_archive_tiering")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    args = parser.parse_args()
+
+    random.seed(42)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    await client.drop_database(args.db_name)
+    db = client[args.db_name]
+    try:
+        await apply_index_manifest(db)
+
+        started = time.perf_counter()
+        records = await seed(db, args.years, args.sessions_per_week, args.participants)
+        seed_seconds = time.perf_counter() - started
+
+        before = {"index_sizes": await index_sizes(db),
+                  "latency": await clock_in_latency(db, args.participants, args.rounds)}
+
+        started = time.perf_counter()
+        archived = {"sessions_archived": 0, "records_moved": 0}
+        while True:
+            batch = await archive_due_sessions(db, retention_days=0, limit=500)
+            if not batch["sessions_archived"]:
+                break
+            archived["sessions_archived"] += batch["sessions_archived"]
+            archived["records_moved"] += batch["records_moved"]
+        archive_seconds = time.perf_counter() - started
+        # Let WiredTiger reclaim the freed index pages before measuring
+        for name in ARCHIVED_COLLECTIONS:
+            try:
+                await db.command("compact", name)
+            except OperationFailure:
+                pass
+
+        after = {"index_sizes": await index_sizes(db),
+                 "latency": await clock_in_latency(db, args.participants, args.rounds)}
+
+        print(json.dumps({
+            "config": vars(args),
+            "seeded_records": records,
+            "seed_seconds": round(seed_seconds, 1),
+            "archive": {**archived, "seconds": round(archive_seconds, 1)},
+            "before": before,
+            "after": after,
+        }, indent=2))
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,490 @@
+"""
+Synthetic dataset generator for capacity testing
+
+Writes a consistent, linked history into a MongoDB database: companies,
+programs with their pre/post tests, staff, completed sessions with their
+participants, access rows, attendance, test results and feedback, and per
+session the invoice, payment, credit note, trainer and coordinator fees,
+marketing commission and expenses; then monthly payslips and pay advices,
+and a petty cash ledger whose running balance matches its settings document.
+
+The same --seed, --until and scale always produce the same documents, ids
+included, so benchmark runs can be repeated against identical data.
+Documents are written with bulk_write in batches, several batches in flight
+at once; the "large" preset is roughly a million documents.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/dataset.py --db-name capacity --preset large
+    python benchmarks/dataset.py --db-name capacity --years 2 --sessions-per-week 10 --participants 25 --drop
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from pymongo import InsertOne
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.periods import document_period_fields, month_period_fields, period_fields  # noqa: E402
+from utils.time_helpers import MALAYSIA_TZ, get_malaysia_time  # noqa: E402
+
+BATCH_SIZE = 2000
+CONCURRENCY = 8
+DEFAULT_PASSWORD = "Synthetic-Pass-2026"
+
+QUESTIONS_PER_TEST = 20
+PETTY_CASH_FLOAT = 2000.0
+PETTY_CASH_CATEGORIES = ["Transport", "Meals", "Stationery", "Postage", "Refreshments", "Miscellaneous"]
+EXPENSE_CATEGORIES = ["accommodation", "allowance", "petrol", "toll", "printing"]
+# Leading digit of synthetic IC numbers, so numbering per role never collides
+ROLE_CODES = {"participant": 1, "trainer": 2, "coordinator": 3, "marketing": 4, "admin": 5, "finance": 6}
+
+
+class Scale:
+    """How much history to generate"""
+
+    __slots__ = ("years", "sessions_per_week", "participants", "companies", "programs",
+                 "trainers", "coordinators", "marketing", "staff")
+
+    def __init__(self, years: int = 1, sessions_per_week: int = 4, participants: int = 15, companies: int = 40,
+                 programs: int = 8, trainers: int = 20, coordinators: int = 6, marketing: int = 4, staff: int = 12):
+        self.years = years
+        self.sessions_per_week = sessions_per_week
+        self.participants = participants
+        self.companies = companies
+        self.programs = programs
+        self.trainers = trainers
+        self.coordinators = coordinators
+        self.marketing = marketing
+        self.staff = staff
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+PRESETS = {
+    "small": Scale(years=1, sessions_per_week=4, participants=15),
+    "medium": Scale(years=3, sessions_per_week=10, participants=20, companies=150, trainers=40),
+    "large": Scale(years=5, sessions_per_week=30, participants=20, companies=400, programs=12,
+                   trainers=60, coordinators=12, marketing=8, staff=25),
+}
+
+
+class BulkLoader:
+    """Buffers documents per collection and inserts them with bulk_write, `concurrency` batches at a time"""
+
+    def __init__(self, db, batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY):
+        self.db = db
+        self.batch_size = batch_size
+        self.counts: Counter = Counter()
+        self._buffers = defaultdict(list)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+
+    async def add(self, collection: str, docs: list):
+        buffer = self._buffers[collection]
+        buffer.extend(docs)
+        while len(buffer) >= self.batch_size:
+            batch = buffer[:self.batch_size]
+            del buffer[:self.batch_size]
+            await self._submit(collection, batch)
+
+    async def _submit(self, collection: str, batch: list):
+        # Waiting for a free slot here keeps generation from running ahead of the database
+        await self._slots.acquire()
+        task = asyncio.create_task(self._write(collection, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, collection: str, batch: list):
+        try:
+            await self.db[collection].bulk_write([InsertOne(doc) for doc in batch], ordered=False)
+            self.counts[collection] += len(batch)
+        finally:
+            self._slots.release()
+
+    async def close(self) -> Counter:
+        """Write what is still buffered and wait for every batch"""
+        for collection, buffer in self._buffers.items():
+            if buffer:
+                await self._submit(collection, list(buffer))
+                buffer.clear()
+        await asyncio.gather(*list(self._tasks))
+        return self.counts
+
+
+class DatasetGenerator:
+    """Deterministic linked history for a Scale, ending the week before `until`"""
+
+    def __init__(self, scale: Scale, seed: int = 42, until: date = None, password_hash: str = ""):
+        self.scale = scale
+        self.seed = seed
+        self.until = until or get_malaysia_time().date()
+        self.password_hash = password_hash
+        self.rng = random.Random(seed)
+        # (year, month) -> worker id -> pay advice session lines
+        self._month_work = defaultdict(lambda: defaultdict(list))
+
+    def _id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    @staticmethod
+    def _at(day: date, hour: int, minute: int = 0) -> str:
+        return datetime(day.year, day.month, day.day, hour, minute, tzinfo=MALAYSIA_TZ).isoformat()
+
+    def _user(self, role: str, n: int, created: date, **extra) -> dict:
+        return {
+            "id": self._id(),
+            "email": f"{role}.{n}@synthetic.example.com",
+            "full_name": f"SYNTHETIC {role.upper()} {n}",
+            "id_number": f"{ROLE_CODES[role]}{n:011d}",
+            "role": role,
+            "password": self.password_hash,
+            "phone_number": f"01{self.rng.randint(10000000, 99999999)}",
+            "is_active": True,
+            "created_at": self._at(created, 9),
+            **extra,
+        }
+
+    async def generate(self, loader: BulkLoader) -> Counter:
+        start = self.until - timedelta(weeks=self.scale.years * 52)
+        await self._reference_data(loader, start)
+        for week in range(self.scale.years * 52):
+            monday = start + timedelta(weeks=week) - timedelta(days=start.weekday())
+            for _ in range(self.scale.sessions_per_week):
+                day = monday + timedelta(days=self.rng.randint(0, 4))
+                if day >= self.until:
+                    continue
+                for collection, docs in self._session(day).items():
+                    await loader.add(collection, docs)
+        months = sorted({(d.year, d.month) for d in (start + timedelta(days=n) for n in range((self.until - start).days))})
+        for year, month in months:
+            await loader.add("payslips", self._payslips(year, month))
+            await loader.add("pay_advice", self._pay_advice(year, month))
+        await self._petty_cash(loader, start)
+        return await loader.close()
+
+    async def _reference_data(self, loader: BulkLoader, start: date):
+        scale = self.scale
+        self.companies = [{
+            "id": self._id(), "name": f"SYNTHETIC COMPANY {n:04d} SDN BHD",
+            "registration_no": f"{self.rng.randint(100000, 999999)}-X", "city": "Shah Alam", "state": "Selangor",
+            "created_at": self._at(start, 9),
+        } for n in range(scale.companies)]
+        self.programs = [{
+            "id": self._id(), "name": f"SYNTHETIC PROGRAMME {n + 1}", "pass_percentage": 70.0,
+            "duration_days": 1 + n % 2, "price": 250.0 + 50 * (n % 5), "created_at": self._at(start, 9),
+        } for n in range(scale.programs)]
+        self.tests = {}
+        for program in self.programs:
+            for test_type in ("pre", "post"):
+                self.tests[(program["id"], test_type)] = {
+                    "id": self._id(), "program_id": program["id"], "test_type": test_type,
+                    "questions": [{"question": f"{test_type} question {i + 1}", "options": ["A", "B", "C", "D"],
+                                   "correct_answer": i % 4} for i in range(QUESTIONS_PER_TEST)],
+                    "created_at": self._at(start, 9),
+                }
+        self.trainers = [self._user("trainer", n, start, bank_name="Maybank",
+                                    bank_account=f"{self.rng.randint(10**11, 10**12 - 1)}")
+                         for n in range(scale.trainers)]
+        self.coordinators = [self._user("coordinator", n, start) for n in range(scale.coordinators)]
+        self.marketing = [self._user("marketing", n, start) for n in range(scale.marketing)]
+        office = [self._user("admin", 0, start), self._user("finance", 0, start)]
+        self.staff = [{
+            "id": self._id(), "employee_id": f"EMP{n + 1:04d}", "full_name": f"SYNTHETIC STAFF {n}",
+            "nric": f"{850101 + n:06d}14{n % 10000:04d}", "designation": "Executive", "department": "Operations",
+            "basic_salary": float(2500 + 250 * (n % 8)), "housing_allowance": 0.0, "transport_allowance": 150.0,
+            "meal_allowance": 0.0, "phone_allowance": 50.0, "other_allowance": 0.0,
+            "employee_epf_rate": 11.0, "employer_epf_rate": 13.0, "is_active": True,
+            "created_at": self._at(start, 9), "updated_at": self._at(start, 9),
+        } for n in range(scale.staff)]
+        self._participants = 0
+        self._sessions = 0
+
+        await loader.add("companies", self.companies)
+        await loader.add("programs", self.programs)
+        await loader.add("tests", list(self.tests.values()))
+        await loader.add("users", self.trainers + self.coordinators + self.marketing + office)
+        await loader.add("hr_staff", self.staff)
+
+    def _session(self, day: date) -> dict:
+        rng = self.rng
+        program, company = rng.choice(self.programs), rng.choice(self.companies)
+        days = [day + timedelta(days=n) for n in range(program["duration_days"])]
+        session_id, invoice_id = self._id(), self._id()
+        self._sessions += 1
+        stamp = period_fields(day.isoformat())
+        trainers = rng.sample(self.trainers, min(len(self.trainers), rng.randint(2, 4)))
+        coordinator, marketer = rng.choice(self.coordinators), rng.choice(self.marketing)
+
+        participants = []
+        for _ in range(self.scale.participants):
+            self._participants += 1
+            participants.append(self._user("participant", self._participants, day, company_id=company["id"]))
+        rows = defaultdict(list)
+        rows["users"] = participants
+
+        pax = len(participants)
+        total = round(program["price"] * pax, 2)
+        invoice_status = rng.choices(["paid", "issued", "approved"], weights=[7, 2, 1])[0]
+        invoice = {
+            "id": invoice_id, "invoice_number": f"INV/MDDRC/{day:%y/%m}/{self._sessions:06d}",
+            "session_id": session_id, "company_id": company["id"], "company_name": company["name"],
+            "programme_name": program["name"], "training_dates": day.isoformat(), "pax": pax,
+            "num_days": len(days), "pricing_type": "per_pax",
+            "line_items": [{"description": program["name"], "quantity": pax, "unit_price": program["price"],
+                            "amount": total}],
+            "subtotal": total, "total_amount": total, "outstanding": 0.0 if invoice_status == "paid" else total,
+            "status": invoice_status, "invoice_date": day.isoformat(), "version": 1,
+            "created_at": self._at(day, 17), "updated_at": self._at(day, 17),
+        }
+        invoice.update(document_period_fields("invoices", invoice))
+        rows["invoices"].append(invoice)
+        if invoice_status == "paid":
+            paid_on = day + timedelta(days=rng.randint(14, 60))
+            payment = {
+                "id": self._id(), "invoice_id": invoice_id, "amount": total, "payment_date": paid_on.isoformat(),
+                "payment_method": rng.choice(["bank_transfer", "cheque", "online"]),
+                "reference_number": f"REF{rng.randint(10**7, 10**8 - 1)}", "recorded_by": "synthetic",
+                "created_at": self._at(paid_on, 11),
+            }
+            payment.update(document_period_fields("payments", payment))
+            rows["payments"].append(payment)
+        if rng.random() < 0.1:
+            cn_date = day + timedelta(days=rng.randint(20, 45))
+            credit_note = {
+                "id": self._id(), "cn_number": f"CN/MDDRC/{cn_date:%y/%m}/{self._sessions:06d}",
+                "invoice_id": invoice_id, "invoice_number": invoice["invoice_number"], "session_id": session_id,
+                "company_id": company["id"], "company_name": company["name"], "reason": "HRDCorp Levy Deduction",
+                "base_amount": total, "percentage": 4.0, "amount": round(total * 0.04, 2), "status": "issued",
+                "cn_date": cn_date.isoformat(), "created_at": self._at(cn_date, 10),
+            }
+            credit_note.update(document_period_fields("credit_notes", credit_note))
+            rows["credit_notes"].append(credit_note)
+
+        work = self._month_work[(day.year, day.month)]
+        line = {"session_id": session_id, "session_name": f"{program['name']} - {company['name']}",
+                "company_name": company["name"], "session_date": day.isoformat(), "status": "paid"}
+        for n, trainer in enumerate(trainers):
+            role = "chief_trainer" if n == 0 else "trainer"
+            fee = (450.0 if n == 0 else 300.0) * len(days)
+            rows["trainer_fees"].append({
+                "id": self._id(), "session_id": session_id, "trainer_id": trainer["id"],
+                "trainer_name": trainer["full_name"], "role": role, "fee_amount": fee, "status": "paid",
+                "created_at": self._at(day, 8), **stamp,
+            })
+            work[trainer["id"]].append({**line, "role": role, "amount": fee})
+        coordinator_fee = 50.0 * len(days)
+        rows["coordinator_fees"].append({
+            "id": self._id(), "session_id": session_id, "coordinator_id": coordinator["id"],
+            "coordinator_name": coordinator["full_name"], "num_days": len(days), "daily_rate": 50.0,
+            "total_fee": coordinator_fee, "status": "paid", "created_at": self._at(day, 8), **stamp,
+        })
+        work[coordinator["id"]].append({**line, "role": "Coordinator", "amount": coordinator_fee})
+        expenses = []
+        for category in rng.sample(EXPENSE_CATEGORIES, 2):
+            amount = float(rng.randint(50, 600))
+            expenses.append({
+                "id": self._id(), "session_id": session_id, "category": category, "expense_type": "fixed",
+                "estimated_amount": amount, "actual_amount": amount, "quantity": 1, "unit_price": amount,
+                "status": "paid", "created_at": self._at(day, 8), "updated_at": self._at(day, 8), **stamp,
+            })
+        rows["session_expenses"] = expenses
+        profit = total - sum(f["fee_amount"] for f in rows["trainer_fees"]) - coordinator_fee \
+            - sum(e["actual_amount"] for e in expenses)
+        commission = round(max(profit, 0) * 0.1, 2)
+        rows["marketing_commissions"].append({
+            "id": self._id(), "session_id": session_id, "marketing_user_id": marketer["id"],
+            "marketing_user_name": marketer["full_name"], "commission_type": "percentage", "commission_rate": 10.0,
+            "calculated_amount": commission, "invoice_id": invoice_id, "status": "paid",
+            "created_at": self._at(day, 8), "updated_at": self._at(day, 8), **stamp,
+        })
+        work[marketer["id"]].append({**line, "role": "Marketing", "amount": commission})
+
+        pre_test, post_test = self.tests[(program["id"], "pre")], self.tests[(program["id"], "post")]
+        for participant in participants:
+            pid = participant["id"]
+            rows["participant_access"].append({
+                "id": self._id(), "participant_id": pid, "session_id": session_id,
+                "can_access_pre_test": True, "can_access_post_test": True, "can_access_checklist": True,
+                "can_access_feedback": True, "pre_test_completed": True, "post_test_completed": True,
+                "checklist_submitted": True, "checklist_completed": True,
+                "feedback_submitted": True, "feedback_completed": True,
+            })
+            for attended in days:
+                rows["attendance"].append({
+                    "id": self._id(), "participant_id": pid, "session_id": session_id,
+                    "date": attended.isoformat(), "clock_in": f"08:{rng.randint(0, 29):02d}:00",
+                    "clock_out": f"17:{rng.randint(0, 29):02d}:00", "created_at": self._at(attended, 8),
+                })
+            for test, floor, hour in ((pre_test, 6, 9), (post_test, 11, 16)):
+                correct = rng.randint(floor, QUESTIONS_PER_TEST)
+                score = round(correct / QUESTIONS_PER_TEST * 100, 1)
+                rows["test_results"].append({
+                    "id": self._id(), "test_id": test["id"], "participant_id": pid, "session_id": session_id,
+                    "test_type": test["test_type"],
+                    "answers": [(i % 4) if i < correct else (i + 1) % 4 for i in range(QUESTIONS_PER_TEST)],
+                    "score": score, "total_questions": QUESTIONS_PER_TEST, "correct_answers": correct,
+                    "passed": score >= program["pass_percentage"], "submitted_at": self._at(days[-1], hour),
+                })
+            rows["course_feedback"].append({
+                "id": self._id(), "participant_id": pid, "session_id": session_id, "program_id": program["id"],
+                "responses": [{"question": f"Question {i + 1}", "answer": rng.randint(3, 5)} for i in range(8)],
+                "submitted_at": self._at(days[-1], 17),
+            })
+
+        rows["sessions"].append({
+            "id": session_id, "name": f"{program['name']} - {company['name']}", "program_id": program["id"],
+            "company_id": company["id"], "location": rng.choice(["Shah Alam", "Klang", "Johor Bahru", "Penang"]),
+            "start_date": day.isoformat(), "end_date": days[-1].isoformat(), "supervisor_ids": [],
+            "participant_ids": [p["id"] for p in participants],
+            "trainer_assignments": [{"trainer_id": t["id"], "role": "chief" if n == 0 else "regular"}
+                                    for n, t in enumerate(trainers)],
+            "coordinator_id": coordinator["id"], "status": "active", "completion_status": "completed",
+            "completed_by_coordinator": True, "completed_date": self._at(days[-1], 18),
+            "marketing_user_id": marketer["id"], "commission_type": "percentage", "commission_rate": 10.0,
+            "invoice_id": invoice_id, "invoice_number": invoice["invoice_number"], "invoice_status": invoice_status,
+            "created_at": self._at(day - timedelta(days=14), 10),
+        })
+        return rows
+
+    def _payslips(self, year: int, month: int) -> list:
+        payslips = []
+        for staff in self.staff:
+            basic = staff["basic_salary"]
+            allowances = staff["transport_allowance"] + staff["phone_allowance"]
+            gross = basic + allowances
+            epf_employee, epf_employer = round(gross * 0.11), round(gross * 0.13)
+            socso_employee, socso_employer = round(gross * 0.005, 2), round(gross * 0.0175, 2)
+            eis_employee = eis_employer = round(gross * 0.002, 2)
+            deductions = epf_employee + socso_employee + eis_employee
+            payslips.append({
+                "id": self._id(), "staff_id": staff["id"], "year": year, "month": month,
+                "period_name": f"{year}-{month:02d}", "employee_id": staff["employee_id"],
+                "full_name": staff["full_name"], "nric": staff["nric"], "designation": staff["designation"],
+                "department": staff["department"], "basic_salary": basic,
+                "transport_allowance": staff["transport_allowance"], "phone_allowance": staff["phone_allowance"],
+                "total_allowances": allowances, "overtime": 0.0, "bonus": 0.0, "commission": 0.0,
+                "gross_salary": gross, "epf_employee": epf_employee, "epf_employer": epf_employer,
+                "socso_employee": socso_employee, "socso_employer": socso_employer,
+                "eis_employee": eis_employee, "eis_employer": eis_employer, "pcb": 0.0,
+                "total_deductions": deductions, "nett_pay": round(gross - deductions, 2), "is_locked": True,
+                "created_at": self._at(date(year, month, 25), 10), **month_period_fields(year, month),
+            })
+        return payslips
+
+    def _pay_advice(self, year: int, month: int) -> list:
+        """Pay advice for the month's session work, paid the following month"""
+        pay_year, pay_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        workers = {u["id"]: u for u in self.trainers + self.coordinators + self.marketing}
+        advices = []
+        for user_id, lines in sorted(self._month_work.pop((year, month), {}).items()):
+            user = workers[user_id]
+            gross = round(sum(line["amount"] for line in lines), 2)
+            advices.append({
+                "id": self._id(),
+                "advice_number": f"PA/MDDRC/{pay_year}/{pay_month:02d}/{self.rng.randint(0, 0xFFFF):04X}",
+                "user_id": user_id, "training_year": year, "training_month": month,
+                "year": pay_year, "month": pay_month,
+                "period_name": f"{datetime(pay_year, pay_month, 1):%B %Y}",
+                "training_period_name": f"{datetime(year, month, 1):%B %Y}",
+                "full_name": user["full_name"], "id_number": user["id_number"], "email": user["email"],
+                "phone": user.get("phone_number"), "bank_name": user.get("bank_name"),
+                "bank_account": user.get("bank_account"), "session_details": lines,
+                "total_sessions": len(lines), "gross_amount": gross, "deductions": 0, "nett_amount": gross,
+                "is_locked": True, "created_at": self._at(date(pay_year, pay_month, 5), 10),
+                **month_period_fields(pay_year, pay_month),
+            })
+        return advices
+
+    async def _petty_cash(self, loader: BulkLoader, start: date):
+        """A ledger of weekly expenses and top-ups whose last balance_after is the settings balance"""
+        balance, seq, transactions = PETTY_CASH_FLOAT, 0, []
+
+        def post(kind: str, amount: float, day: date, **extra):
+            nonlocal balance, seq
+            delta = amount if kind == "topup" else -amount
+            seq += 1
+            transactions.append({
+                "id": self._id(), "type": kind, "amount": amount, "date": day.isoformat(), "status": "approved",
+                "delta": delta, "ledger_seq": seq, "balance_before": round(balance, 2),
+                "balance_after": round(balance + delta, 2), "created_at": self._at(day, 12),
+                "approved_at": self._at(day, 15), **extra,
+            })
+            balance = round(balance + delta, 2)
+
+        day = start
+        while day < self.until:
+            for _ in range(self.rng.randint(1, 4)):
+                amount = float(self.rng.randint(5, 120))
+                if balance < amount:
+                    post("topup", round(PETTY_CASH_FLOAT - balance, 2), day, description="Float top-up")
+                category = self.rng.choice(PETTY_CASH_CATEGORIES)
+                post("expense", amount, day, description=f"{category} claim", category=category)
+            day += timedelta(days=7)
+
+        await loader.add("petty_cash_transactions", transactions)
+        await loader.add("petty_cash_settings", [{
+            "float_amount": PETTY_CASH_FLOAT, "current_balance": balance, "ledger_seq": seq,
+            "approval_threshold": 100.0, "last_reconciliation": None, "created_at": self._at(start, 9),
+        }])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MDDRC dataset")
+    parser.add_argument("--db-name", required=True)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--until", type=date.fromisoformat, help="History ends the day before (default today)")
+    for name in Scale.__slots__:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help="Override the preset")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Batches in flight at once")
+    parser.add_argument("--drop", action="store_true", help="Drop the database first")
+    parser.add_argument("--no-indexes", action="store_true", help="Skip applying the index manifest afterwards")
+    args = parser.parse_args()
+
+    scale = Scale(**{**PRESETS[args.preset].as_dict(),
+                     **{name: getattr(args, name) for name in Scale.__slots__ if getattr(args, name) is not None}})
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from passlib.context import CryptContext
+    from migrations.runner import apply_index_manifest
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    if args.drop:
+        await client.drop_database(args.db_name)
+    db = client[args.db_name]
+    try:
+        # Every synthetic user shares one hash: bcrypt per user would dominate the run
+        generator = DatasetGenerator(scale, seed=args.seed, until=args.until,
+                                     password_hash=CryptContext(schemes=["bcrypt"]).hash(DEFAULT_PASSWORD))
+        started = time.perf_counter()
+        counts = await generator.generate(BulkLoader(db, args.batch_size, args.concurrency))
+        load_seconds = time.perf_counter() - started
+        index_seconds = None
+        if not args.no_indexes:
+            started = time.perf_counter()
+            await apply_index_manifest(db)
+            index_seconds = round(time.perf_counter() - started, 1)
+        total = sum(counts.values())
+        print(json.dumps({
+            "scale": scale.as_dict(), "seed": args.seed, "until": generator.until.isoformat(),
+            "password": DEFAULT_PASSWORD, "documents": total, "by_collection": dict(sorted(counts.items())),
+            "load_seconds": round(load_seconds, 1), "documents_per_second": round(total / load_seconds),
+            "index_seconds": index_seconds,
+        }, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Response serialization micro-benchmark
+
+Renders a general-ledger response of --entries entries (10k by default)
+through the paths FastAPI can take:
+
+    default_dict       dict returned as-is: jsonable_encoder + stdlib json (FastAPI's default)
+    fast_dict          the same dict through FastJSONResponse (orjson)
+    response_model     List[LedgerEntry] via response_model: validate, dump, encode
+    validated_once     the same list through validated_response (one pydantic-core pass)
+
+No database or app is involved; only the serialization step is timed.
+
+Usage:
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --entries 50000 --rounds 20 --output serialization.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+
+from benchmarks.timing import percentiles  # noqa: E402
+from utils.fast_json import FastJSONResponse, validated_response  # noqa: E402
+
+ACCOUNTS = [("1001", "Bank"), ("1100", "Accounts Receivable"), ("4000", "Training Income"),
+            ("5001", "Trainer Fees"), ("2001", "Trainer Payable"), ("6100", "Petty Cash Expenses")]
+
+
+class LedgerEntry(BaseModel):
+    entry_id: int
+    date: str
+    reference: str
+    description: str
+    account_code: str
+    account_name: str
+    debit: float
+    credit: float
+    tags: dict = {}
+
+
+def ledger(entries: int, seed: int = 7) -> dict:
+    """General-ledger shaped payload with balanced debit/credit pairs"""
+    rng = random.Random(seed)
+    rows = []
+    for n in range(entries // 2):
+        amount = round(rng.uniform(50, 20000), 2)
+        date = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        (debit_code, debit_name), (credit_code, credit_name) = rng.sample(ACCOUNTS, 2)
+        common = {"entry_id": n + 1, "date": date, "reference": f"INV-{n:06d}",
+                  "description": f"Invoice issued - Customer {n % 300}",
+                  "tags": {"session_id": f"s-{n % 2000}", "programme": "Defensive Driving"}}
+        rows.append({**common, "account_code": debit_code, "account_name": debit_name, "debit": amount, "credit": 0})
+        rows.append({**common, "account_code": credit_code, "account_name": credit_name, "debit": 0, "credit": amount})
+    total = sum(row["debit"] for row in rows)
+    return {"year": 2025, "month": None, "entries": rows,
+            "totals": {"total_debit": total, "total_credit": total, "is_balanced": True}}
+
+
+def default_dict(payload: dict) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_dict(payload: dict) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+_entries_field = create_response_field(name="Response", type_=List[LedgerEntry])
+
+
+def response_model(payload: dict) -> bytes:
+    content = asyncio.run(serialize_response(field=_entries_field, response_content=payload["entries"]))
+    return JSONResponse(content).body
+
+
+def validated_once(payload: dict) -> bytes:
+    return validated_response(List[LedgerEntry], payload["entries"]).body
+
+
+CASES = {
+    "default_dict": default_dict,
+    "fast_dict": fast_dict,
+    "response_model": response_model,
+    "validated_once": validated_once,
+}
+
+
+def run_case(render, payload: dict, rounds: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        render(payload)
+    samples, size = [], 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        size = len(render(payload))
+        samples.append(time.perf_counter() - started)
+    return {"bytes": size, **percentiles(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time JSON rendering of a large ledger response")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    payload = ledger(args.entries)
+    # Every path must produce the same document
+    reference = json.loads(default_dict(payload))
+    assert json.loads(fast_dict(payload)) == reference
+    assert json.loads(validated_once(payload)) == json.loads(response_model(payload))
+
+    report = {"entries": len(payload["entries"]), "rounds": args.rounds, "cases": {}}
+    for name, render in CASES.items():
+        report["cases"][name] = run_case(render, payload, args.rounds, args.warmup)
+    for fast, slow in (("fast_dict", "default_dict"), ("validated_once", "response_model")):
+        report["cases"][fast]["speedup"] = round(
+            report["cases"][slow]["p50_ms"] / max(report["cases"][fast]["p50_ms"], 1e-6), 1
+        )
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Startup time benchmark
+
+Measures what a worker restart or a freshly scaled-out worker pays before it
+can serve traffic, each run in a new interpreter:
+
+    import_seconds        `import server` (module load, route definitions, Motor client)
+    startup_seconds       the startup hooks (lifespan start)
+    first_health_seconds  from the start of the import to the first /api/health response
+    process_seconds       the same as seen from outside, including interpreter start
+    heavy_modules         LLM/document/spreadsheet stacks loaded by the import (should be none)
+
+The median of --repeat runs is compared with the budget below; tests/test_startup.py
+enforces the same budget. The health check needs a reachable MongoDB (MONGO_URL).
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 5 --import-only --output startup.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get('STARTUP_IMPORT_BUDGET_SECONDS', '2.5'))
+FIRST_HEALTH_BUDGET_SECONDS = float(os.environ.get('STARTUP_FIRST_HEALTH_BUDGET_SECONDS', '4.0'))
+
+
+async def _child(check_health: bool) -> dict:
+    started = time.perf_counter()
+    import server
+    imported = time.perf_counter()
+
+    from utils.lazy_imports import HEAVY_MODULES
+    result = {
+        "import_seconds": imported - started,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+    if not check_health:
+        return result
+
+    import httpx
+    async with server.app.router.lifespan_context(server.app):
+        result["startup_seconds"] = time.perf_counter() - imported
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get("/api/health")
+        result["first_health_seconds"] = time.perf_counter() - started
+        result["health_status"] = response.status_code
+    return result
+
+
+def measure_once(check_health: bool = True, env: dict = None) -> dict:
+    """One cold start in a new interpreter"""
+    child_env = dict(os.environ, **(env or {}))
+    child_env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    child_env.setdefault("DB_NAME", f"bench_startup_{os.getpid()}")
+    child_env.setdefault("SECRET_KEY", secrets.token_hex(32))
+    # Migrations are a one-off per deploy, not part of every worker start
+    child_env.setdefault("RUN_MIGRATIONS_ON_STARTUP", "false")
+    command = [sys.executable, str(Path(__file__).resolve()), "--child"]
+    if not check_health:
+        command.append("--import-only")
+
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=child_env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = elapsed
+    return result
+
+
+def measure(repeat: int = 3, check_health: bool = True, env: dict = None) -> dict:
+    """Median timings over several cold starts, checked against the budget"""
+    runs = [measure_once(check_health, env) for _ in range(repeat)]
+    summary = {"runs": repeat}
+    for field in ("import_seconds", "startup_seconds", "first_health_seconds", "process_seconds"):
+        values = [run[field] for run in runs if field in run]
+        if values:
+            summary[field] = round(statistics.median(values), 3)
+    summary["heavy_modules"] = sorted({name for run in runs for name in run["heavy_modules"]})
+    if check_health:
+        summary["health_status"] = runs[-1].get("health_status")
+
+    over = []
+    if summary["import_seconds"] > IMPORT_BUDGET_SECONDS:
+        over.append(f"import {summary['import_seconds']}s > {IMPORT_BUDGET_SECONDS}s")
+    if summary.get("first_health_seconds", 0) > FIRST_HEALTH_BUDGET_SECONDS:
+        over.append(f"first /health {summary['first_health_seconds']}s > {FIRST_HEALTH_BUDGET_SECONDS}s")
+    if summary["heavy_modules"]:
+        over.append(f"loaded at import: {', '.join(summary['heavy_modules'])}")
+    summary["budget"] = {
+        "import_seconds": IMPORT_BUDGET_SECONDS,
+        "first_health_seconds": FIRST_HEALTH_BUDGET_SECONDS,
+        "over": over,
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API cold start time against the budget")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--import-only", action="store_true", help="Skip the lifespan and /health check")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(BACKEND_DIR))
+        print(json.dumps(asyncio.run(_child(not args.import_only))))
+        return
+
+    summary = measure(args.repeat, not args.import_only)
+    output = json.dumps(summary, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.exit(1 if summary["budget"]["over"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Database migration CLI
+
+Applies the index manifest and registered migrations outside app startup.
+
+Usage:
+    python migrate.py status       # list applied and pending migrations
+    python migrate.py up           # apply pending migrations
+    python migrate.py up --dry-run # show what would run
+    python migrate.py sync-admin   # reset admin credentials from ADMIN_EMAIL / ADMIN_PASSWORD
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from migrations import (  # noqa: E402
+    MIGRATIONS_COLLECTION,
+    admin_credentials_from_env,
+    pending_migrations,
+    run_migrations,
+    sync_admin_account,
+)
+
+
+async def show_status(db):
+    applied = await db[MIGRATIONS_COLLECTION].find({}, {"_id": 0}).sort("id", 1).to_list(None)
+    print("Applied / recorded migrations:")
+    for record in applied:
+        print(f"  [{record.get('status')}] {record['id']} ({record.get('duration_ms')}ms) {record.get('applied_at')}")
+        for error in (record.get('result') or {}).get('errors', []):
+            print(f"      ! {error}")
+    pending = await pending_migrations(db)
+    print("Pending migrations:")
+    for step in pending:
+        print(f"  {step['id']}: {step['description']}")
+    if not pending:
+        print("  (none)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run database migrations")
+    parser.add_argument("command", choices=["status", "up", "sync-admin"])
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.command == "status":
+            await show_status(db)
+        elif args.command == "up":
+            summary = await run_migrations(db, dry_run=args.dry_run)
+            print(f"Pending: {summary['pending']}")
+            print(f"Applied: {summary['applied']}")
+            if summary['failed']:
+                print(f"Failed: {summary['failed']} (see `python migrate.py status`)")
+            if summary['skipped']:
+                print("Another process holds the migration lock; nothing was applied")
+        elif args.command == "sync-admin":
+            admin_email, admin_password = admin_credentials_from_env()
+            result = await sync_admin_account(db, admin_email, admin_password)
+            print(f"Admin account {result['admin']}: {result['email']}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
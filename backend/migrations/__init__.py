@@ -0,0 +1,27 @@
+"""
+Schema migrations and the declarative index manifest
+"""
+from .index_manifest import INDEX_MANIFEST, manifest_checksum
+from .runner import (
+    MIGRATIONS_COLLECTION,
+    migration,
+    registered_migrations,
+    pending_migrations,
+    apply_index_manifest,
+    run_migrations,
+)
+from . import steps  # noqa: F401  (registers migrations)
+from .steps import sync_admin_account, admin_credentials_from_env
+
+__all__ = [
+    'INDEX_MANIFEST',
+    'manifest_checksum',
+    'MIGRATIONS_COLLECTION',
+    'migration',
+    'registered_migrations',
+    'pending_migrations',
+    'apply_index_manifest',
+    'run_migrations',
+    'sync_admin_account',
+    'admin_credentials_from_env',
+]
@@ -0,0 +1,268 @@
+"""
+Declarative index manifest for every hot collection
+
+Each entry is (keys, options). Names are left to MongoDB's defaults so that
+indexes created by earlier scripts with the same keys are recognised.
+"""
+import hashlib
+import json
+
+ASC = 1
+DESC = -1
+
+INDEX_MANIFEST = {
+    # ---- Core / training ----
+    "users": [
+        ([("id", ASC)], {"unique": True}),
+        ([("email", ASC)], {"unique": True}),
+        ([("role", ASC)], {}),
+        ([("company_id", ASC), ("role", ASC)], {}),
+        ([("id_number", ASC)], {}),
+        ([("full_name", ASC)], {}),
+    ],
+    "sessions": [
+        ([("id", ASC)], {"unique": True}),
+        ([("program_id", ASC)], {}),
+        ([("company_id", ASC)], {}),
+        ([("start_date", ASC), ("end_date", ASC)], {}),
+        ([("completion_status", ASC)], {}),
+        # Archival scan: completed sessions past the retention window
+        ([("completion_status", ASC), ("completed_date", ASC)], {}),
+        ([("participant_ids", ASC)], {}),
+        ([("trainer_assignments.trainer_id", ASC)], {}),
+        ([("coordinator_id", ASC)], {}),
+    ],
+    "programs": [
+        ([("id", ASC)], {"unique": True}),
+        ([("name", ASC)], {}),
+    ],
+    "companies": [
+        ([("id", ASC)], {"unique": True}),
+        ([("name", ASC)], {}),
+    ],
+    "tests": [
+        ([("id", ASC)], {"unique": True}),
+        ([("program_id", ASC), ("test_type", ASC)], {}),
+    ],
+    "test_permutations": [
+        ([("test_id", ASC), ("participant_id", ASC)], {"unique": True}),
+    ],
+    "test_results": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        # Admin data management pages: session filter, keyset on _id
+        ([("session_id", ASC), ("_id", ASC)], {}),
+        ([("participant_id", ASC), ("test_id", ASC)], {}),
+        ([("test_type", ASC)], {}),
+        ([("submitted_at", DESC)], {}),
+    ],
+    "attendance": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("session_id", ASC), ("_id", ASC)], {}),
+        ([("session_id", ASC), ("date", ASC)], {}),
+    ],
+    "participant_attendance": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "participant_access": [
+        ([("session_id", ASC), ("participant_id", ASC)], {"unique": True}),
+        ([("participant_id", ASC)], {}),
+    ],
+    "course_feedback": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("session_id", ASC), ("_id", ASC)], {}),
+    ],
+    "vehicle_checklists": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("session_id", ASC), ("_id", ASC)], {}),
+        ([("participant_id", ASC)], {}),
+        ([("verification_status", ASC)], {}),
+    ],
+    "vehicle_details": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "vehicle_issues": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "training_reports": [
+        ([("session_id", ASC), ("status", ASC)], {}),
+        ([("coordinator_id", ASC)], {}),
+    ],
+    "certificates": [
+        ([("id", ASC)], {"unique": True}),
+        ([("participant_id", ASC)], {}),
+        ([("session_id", ASC)], {}),
+    ],
+    "notifications": [
+        # Feed keyset: (created_at, id) newest first
+        ([("user_id", ASC), ("read", ASC), ("created_at", DESC), ("id", DESC)], {}),
+        ([("user_id", ASC), ("created_at", DESC), ("id", DESC)], {}),
+        ([("id", ASC)], {"unique": True}),
+    ],
+    "notification_counters": [
+        ([("user_id", ASC)], {"unique": True}),
+    ],
+
+    # ---- Archive tier (utils/archive.py) ----
+    "archive_test_results": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("participant_id", ASC)], {}),
+    ],
+    "archive_attendance": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("participant_id", ASC)], {}),
+    ],
+    "archive_attendance_records": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "archive_participant_attendance": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "archive_course_feedback": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "archive_vehicle_checklists": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("participant_id", ASC)], {}),
+    ],
+    "archive_vehicle_details": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "archive_participant_access": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+        ([("participant_id", ASC)], {}),
+    ],
+    "archive_chief_trainer_feedback": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+    "archive_coordinator_feedback": [
+        ([("session_id", ASC), ("participant_id", ASC)], {}),
+    ],
+
+    # ---- Finance ----
+    "invoices": [
+        ([("id", ASC)], {"unique": True}),
+        ([("session_id", ASC)], {}),
+        ([("invoice_number", ASC)], {}),
+        ([("status", ASC), ("created_at", DESC)], {}),
+        ([("created_at", DESC)], {}),
+        ([("company_id", ASC)], {}),
+        # Receivables aging: open invoices with a balance
+        ([("status", ASC), ("outstanding", ASC)], {}),
+        # Year/month filters on the typed period fields (utils/periods.py)
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "payments": [
+        ([("id", ASC)], {"unique": True}),
+        ([("invoice_id", ASC)], {}),
+        ([("payment_date", DESC)], {}),
+        ([("created_at", DESC)], {}),
+        ([("receipt_number", ASC)], {
+            "unique": True,
+            "partialFilterExpression": {"receipt_number": {"$type": "string"}}
+        }),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "receipt_counters": [
+        ([("period", ASC)], {"unique": True}),
+    ],
+    "credit_notes": [
+        ([("id", ASC)], {"unique": True}),
+        ([("invoice_id", ASC)], {}),
+        ([("cn_number", ASC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "trainer_fees": [
+        ([("id", ASC)], {"unique": True}),
+        ([("session_id", ASC)], {}),
+        ([("trainer_id", ASC), ("status", ASC)], {}),
+        ([("status", ASC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "coordinator_fees": [
+        ([("id", ASC)], {"unique": True}),
+        ([("session_id", ASC)], {}),
+        ([("coordinator_id", ASC), ("status", ASC)], {}),
+        ([("status", ASC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "marketing_commissions": [
+        ([("id", ASC)], {"unique": True}),
+        ([("session_id", ASC)], {}),
+        ([("marketing_user_id", ASC), ("status", ASC)], {}),
+        ([("status", ASC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "session_expenses": [
+        ([("session_id", ASC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "pay_advice": [
+        ([("id", ASC)], {"unique": True}),
+        ([("user_id", ASC), ("year", ASC), ("month", ASC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "payables_periods": [
+        ([("year", ASC), ("month", ASC)], {}),
+    ],
+    "manual_income": [
+        ([("date", DESC)], {}),
+    ],
+    "manual_expenses": [
+        ([("date", DESC)], {}),
+    ],
+    "petty_cash_transactions": [
+        ([("id", ASC)], {"unique": True}),
+        ([("date", DESC)], {}),
+        ([("status", ASC), ("date", DESC)], {}),
+        ([("category", ASC)], {}),
+        # Ledger replay from a reconciliation anchor, and the yearly expense $group
+        ([("ledger_seq", ASC)], {"sparse": True}),
+        ([("type", ASC), ("status", ASC), ("date", ASC)], {}),
+    ],
+    "petty_cash_reconciliations": [
+        ([("created_at", DESC)], {}),
+        ([("anchor_seq", DESC)], {"sparse": True}),
+    ],
+    # Audit collections: unique id lets a retried batch insert skip entries already written
+    "audit_trail": [
+        ([("id", ASC)], {"unique": True}),
+        ([("timestamp", DESC)], {}),
+        ([("entity_type", ASC), ("timestamp", DESC)], {}),
+        ([("entity_type", ASC), ("entity_id", ASC), ("timestamp", DESC)], {}),
+    ],
+    "finance_audit_log": [
+        ([("id", ASC)], {"unique": True}),
+        ([("timestamp", DESC)], {}),
+        ([("entity_type", ASC), ("entity_id", ASC), ("timestamp", DESC)], {}),
+    ],
+    "audit_logs": [
+        ([("id", ASC)], {"unique": True}),
+        ([("resource_type", ASC), ("resource_id", ASC), ("timestamp", DESC)], {}),
+    ],
+    "security_audit": [
+        ([("timestamp", DESC)], {}),
+    ],
+
+    # ---- HR / payroll ----
+    "hr_staff": [
+        ([("id", ASC)], {"unique": True}),
+    ],
+    "payslips": [
+        ([("id", ASC)], {"unique": True}),
+        ([("staff_id", ASC), ("year", DESC), ("month", DESC)], {}),
+        ([("year", DESC), ("month", DESC)], {}),
+        ([("period_year", ASC), ("period_month", ASC)], {}),
+    ],
+    "hr_payslips": [
+        ([("year", ASC), ("month", ASC)], {}),
+    ],
+    "payroll_periods": [
+        ([("year", ASC), ("month", ASC)], {}),
+    ],
+}
+
+
+def manifest_checksum(manifest=None) -> str:
+    """Stable hash of the manifest, used to re-apply it whenever it changes"""
+    payload = json.dumps(manifest or INDEX_MANIFEST, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:12]
@@ -0,0 +1,162 @@
+"""
+Versioned migration runner
+
+Migrations are registered with @migration("<id>") and applied in id order.
+Each applied migration is recorded in the schema_migrations collection so
+later boots only read that collection and skip straight past them.
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from utils.time_helpers import get_malaysia_time
+from .index_manifest import INDEX_MANIFEST, manifest_checksum
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+LOCK_COLLECTION = "schema_migration_locks"
+LOCK_TTL_SECONDS = 600
+
+# Index build errors that mean an equivalent index already exists
+INDEX_EXISTS_CODES = {85, 86}  # IndexOptionsConflict, IndexKeySpecsConflict
+
+logger = logging.getLogger(__name__)
+
+MigrationFunc = Callable[..., Awaitable[Optional[dict]]]
+_registry: Dict[str, dict] = {}
+
+
+def migration(migration_id: str, description: str = ""):
+    """Register a migration; ids sort lexically, so prefix them with a number"""
+    def decorator(func: MigrationFunc) -> MigrationFunc:
+        if migration_id in _registry:
+            raise ValueError(f"Duplicate migration id: {migration_id}")
+        _registry[migration_id] = {
+            "id": migration_id,
+            "description": description or (func.__doc__ or "").strip().split("\n")[0],
+            "func": func,
+        }
+        return func
+    return decorator
+
+
+def registered_migrations() -> List[dict]:
+    return [_registry[key] for key in sorted(_registry)]
+
+
+def index_manifest_migration_id() -> str:
+    """The manifest migration id changes whenever the manifest does"""
+    return f"index_manifest_{manifest_checksum()}"
+
+
+async def apply_index_manifest(db, manifest=None) -> dict:
+    """Create every index in the manifest, tolerating equivalent existing ones"""
+    manifest = manifest or INDEX_MANIFEST
+    created, existing, errors = 0, 0, []
+    for collection_name, indexes in manifest.items():
+        for keys, options in indexes:
+            try:
+                await db[collection_name].create_index(keys, **options)
+                created += 1
+            except OperationFailure as e:
+                if e.code in INDEX_EXISTS_CODES:
+                    existing += 1
+                else:
+                    errors.append(f"{collection_name} {keys}: {e}")
+                    logger.warning(f"Index creation failed on {collection_name} {keys}: {e}")
+    return {"created": created, "existing": existing, "errors": errors}
+
+
+async def _acquire_lock(db, owner: str) -> bool:
+    """Single-runner lock so concurrent workers do not run DDL twice"""
+    now = get_malaysia_time()
+    locks = db[LOCK_COLLECTION]
+    await locks.delete_one({"_id": "migrate", "expires_at": {"$lt": now.isoformat()}})
+    try:
+        await locks.insert_one({
+            "_id": "migrate",
+            "owner": owner,
+            "acquired_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=LOCK_TTL_SECONDS)).isoformat(),
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _release_lock(db, owner: str):
+    await db[LOCK_COLLECTION].delete_one({"_id": "migrate", "owner": owner})
+
+
+async def applied_migration_ids(db) -> set:
+    docs = await db[MIGRATIONS_COLLECTION].find(
+        {"status": "applied"}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    return {doc["id"] for doc in docs}
+
+
+async def pending_migrations(db) -> List[dict]:
+    applied = await applied_migration_ids(db)
+    pending = []
+    if index_manifest_migration_id() not in applied:
+        pending.append({
+            "id": index_manifest_migration_id(),
+            "description": "Apply declarative index manifest",
+            "func": lambda db, **_: apply_index_manifest(db),
+        })
+    pending.extend(m for m in registered_migrations() if m["id"] not in applied)
+    return pending
+
+
+async def run_migrations(db, dry_run: bool = False, **context) -> dict:
+    """
+    Apply all pending migrations.
+
+    Returns a summary of applied/failed ids. Extra keyword arguments are passed
+    through to every migration (e.g. admin credentials from the CLI).
+    """
+    pending = await pending_migrations(db)
+    summary = {"applied": [], "failed": [], "pending": [m["id"] for m in pending], "skipped": False}
+    if not pending or dry_run:
+        return summary
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not await _acquire_lock(db, owner):
+        logger.info("Migrations are being applied by another process, skipping")
+        summary["skipped"] = True
+        return summary
+
+    try:
+        for step in pending:
+            started = time.perf_counter()
+            record = {"id": step["id"], "description": step["description"]}
+            try:
+                result = await step["func"](db, **context) or {}
+                errors = result.get("errors") or []
+                record.update({
+                    "status": "failed" if errors else "applied",
+                    "result": result,
+                })
+            except Exception as e:
+                logger.error(f"Migration {step['id']} failed: {e}")
+                record.update({"status": "failed", "result": {"errors": [str(e)]}})
+
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            record["applied_at"] = get_malaysia_time().isoformat()
+            await db[MIGRATIONS_COLLECTION].update_one(
+                {"id": step["id"]}, {"$set": record}, upsert=True
+            )
+            summary["applied" if record["status"] == "applied" else "failed"].append(step["id"])
+            logger.info(f"Migration {step['id']}: {record['status']} in {record['duration_ms']}ms")
+            # Later migrations may depend on earlier ones; a partially applied
+            # index manifest is retried on the next run without blocking them
+            if record["status"] == "failed" and step["id"] != index_manifest_migration_id():
+                break
+    finally:
+        await _release_lock(db, owner)
+
+    return summary
@@ -0,0 +1,91 @@
+"""
+Registered data migrations, applied in id order
+"""
+import logging
+import os
+import uuid
+
+from utils.periods import backfill_periods
+from utils.receipts import ensure_receipt_number
+from utils.receivables import recompute_invoice_balances
+from utils.time_helpers import get_malaysia_time
+from .runner import migration
+
+logger = logging.getLogger(__name__)
+
+ADMIN_NAME = "System Administrator"
+ADMIN_ID_NUMBER = "ADMIN001"
+
+
+def admin_credentials_from_env():
+    return (
+        os.environ.get('ADMIN_EMAIL', 'admin@example.com'),
+        os.environ.get('ADMIN_PASSWORD', 'changeme123'),
+    )
+
+
+async def sync_admin_account(db, admin_email: str, admin_password: str) -> dict:
+    """Create the admin account, or reset its credentials if it exists"""
+    from passlib.context import CryptContext
+
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hashed_password = pwd_context.hash(admin_password)
+
+    existing_admin = await db.users.find_one({"role": "admin"}, {"_id": 0, "id": 1})
+    if existing_admin:
+        await db.users.update_one(
+            {"role": "admin"},
+            {"$set": {
+                "email": admin_email,
+                "password": hashed_password,
+                "full_name": ADMIN_NAME,
+                "id_number": ADMIN_ID_NUMBER
+            }}
+        )
+        return {"admin": "updated", "email": admin_email}
+
+    await db.users.insert_one({
+        "id": str(uuid.uuid4()),
+        "email": admin_email,
+        "password": hashed_password,
+        "full_name": ADMIN_NAME,
+        "id_number": ADMIN_ID_NUMBER,
+        "phone_number": "",
+        "role": "admin",
+        "company_id": None,
+        "created_at": get_malaysia_time().isoformat()
+    })
+    return {"admin": "created", "email": admin_email}
+
+
+@migration("0001_bootstrap_admin")
+async def bootstrap_admin(db, **context):
+    """Create the initial admin account from ADMIN_EMAIL / ADMIN_PASSWORD"""
+    existing_admin = await db.users.find_one({"role": "admin"}, {"_id": 0, "id": 1})
+    if existing_admin:
+        return {"admin": "exists"}
+    admin_email, admin_password = admin_credentials_from_env()
+    return await sync_admin_account(db, admin_email, admin_password)
+
+
+@migration("0002_backfill_invoice_balances")
+async def backfill_invoice_balances(db, **context):
+    """Populate paid_amount / credited_amount / outstanding on every invoice"""
+    return {"invoices": await recompute_invoice_balances(db)}
+
+
+@migration("0003_assign_receipt_numbers")
+async def assign_receipt_numbers(db, **context):
+    """Store receipt numbers on payments recorded before they were persisted"""
+    payments = await db.payments.find(
+        {"receipt_number": {"$exists": False}}, {"_id": 0}
+    ).sort("created_at", 1).to_list(None)
+    for payment in payments:
+        await ensure_receipt_number(db, payment)
+    return {"payments": len(payments)}
+
+
+@migration("0004_backfill_periods")
+async def backfill_record_periods(db, **context):
+    """Add period_date / period_year / period_month to finance and HR records"""
+    return await backfill_periods(db)
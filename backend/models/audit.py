@@ -12,9 +12,12 @@ class AuditLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     user_email: str
+    user_name: Optional[str] = None
     action: str  # "create", "update", "delete"
     resource_type: str  # "test_result", "feedback", "attendance", "checklist", etc.
     resource_id: str
+    changes: Optional[Dict[str, Any]] = None  # {field: {"from": old, "to": new}}
+    # Whole before/after documents, kept only by entries written before field diffs
     old_data: Optional[Dict[str, Any]] = None
     new_data: Optional[Dict[str, Any]] = None
     timestamp: datetime = Field(default_factory=lambda: datetime.now())
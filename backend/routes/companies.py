@@ -7,6 +7,7 @@ from typing import List, Optional
 from models import Company, CompanyCreate, CompanyUpdate
 from services.auth_service import get_current_user
 from utils import db
+from utils.reference_cache import reference_cache
 
 router = APIRouter(prefix="/companies", tags=["companies"])
 
@@ -47,6 +48,7 @@ async def create_company(
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.companies.insert_one(doc)
+    await reference_cache.invalidate(db, "companies")
     return company_obj
 
 
@@ -77,6 +79,7 @@ async def update_company(
         {"id": company_id},
         {"$set": {"name": company_data.name}}
     )
+    await reference_cache.invalidate(db, "companies")
     
     company_doc = await db.companies.find_one({"id": company_id}, {"_id": 0})
     from datetime import datetime
@@ -94,5 +97,6 @@ async def delete_company(company_id: str, current_user = Depends(get_current_use
     result = await db.companies.delete_one({"id": company_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Company not found")
+    await reference_cache.invalidate(db, "companies")
     
     return {"message": "Company deleted successfully"}
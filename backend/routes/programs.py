@@ -7,6 +7,7 @@ from typing import List, Optional
 from models import Program, ProgramCreate, ProgramUpdate
 from services.auth_service import get_current_user
 from utils import db
+from utils.reference_cache import reference_cache
 
 router = APIRouter(prefix="/programs", tags=["programs"])
 
@@ -47,6 +48,7 @@ async def create_program(
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.programs.insert_one(doc)
+    await reference_cache.invalidate(db, "programs")
     return program_obj
 
 
@@ -83,6 +85,7 @@ async def update_program(
     
     if update_data:
         await db.programs.update_one({"id": program_id}, {"$set": update_data})
+        await reference_cache.invalidate(db, "programs")
     
     program_doc = await db.programs.find_one({"id": program_id}, {"_id": 0})
     from datetime import datetime
@@ -100,5 +103,6 @@ async def delete_program(program_id: str, current_user = Depends(get_current_use
     result = await db.programs.delete_one({"id": program_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Program not found")
+    await reference_cache.invalidate(db, "programs")
     
     return {"message": "Program deleted successfully"}
@@ -1,10 +1,9 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
@@ -18,8 +17,6 @@ import jwt
 import random
 import shutil
 import subprocess
-from docx import Document
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 import json
 import asyncio
 import re
@@ -27,6 +24,50 @@ import html
 from collections import defaultdict
 import time
 import hashlib
+from utils.static_files import serve_static_file, resolve_static_path
+from utils.artifact_cache import artifact_store
+from utils.lazy_imports import docx, docx_shared, llm_chat, pandas as pd, read_excel
+from utils.fast_json import FastJSONResponse, validated_response
+from utils.sparse_fields import parse_fields, field_projection, trim_fields
+from utils.compression import CompressionMiddleware
+from utils.excel_templates import (
+    build_assessment_template, build_feedback_template, build_checklist_template,
+    build_test_questions_template, build_feedback_questions_template,
+    build_checklist_items_template, build_statutory_template
+)
+from utils.photo_ingest import ingest_photo, add_photo_variant_urls, photo_variant_path, stored_photo_path
+from utils.notifications import (
+    notify_users, list_notifications, get_unread_count, mark_read, wait_for_change
+)
+from migrations import run_migrations
+from utils.instrumentation import InstrumentationMiddleware, metrics
+from utils.database import client, db, db_name, reporting_database
+from utils.receivables import (
+    adjust_invoice_balance, apply_credit_note_change, collected_amount, refresh_invoice_balance,
+    receivables_aging
+)
+from utils.periods import (
+    with_period, period_fields, month_period_fields, period_filter, stamp_session_periods
+)
+from utils.receipts import (
+    next_receipt_number, ensure_receipt_number, receipt_number_prefix, receipt_filename,
+    get_receipt_pdf, build_receipts_zip
+)
+from utils.archive import (
+    TieredDatabase, archive_due_sessions, archive_session, cascade_delete,
+    records_archived, session_records_archived
+)
+from utils.test_cache import test_cache, participant_order, stored_order
+from utils.reference_cache import reference_cache
+from utils.calendar_cache import calendar_cache, calendar_window, session_months
+from utils.attendance_roster import apply_roster, roster as attendance_roster
+from utils.session_creation import resolve_people, write_session
+from utils.session_events import (
+    session_events, stream_session_events, run_change_stream_feed, change_streams_enabled
+)
+from utils.audit_writer import audit_writer, field_diff, split_diff
+from utils import petty_cash as petty_cash_ledger
+from utils.petty_cash import InsufficientBalance, LedgerNotSetUp
 
 # ==================== SECURITY CONFIGURATION ====================
 # Rate limiting storage (in-memory, consider Redis for production)
@@ -145,7 +186,10 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         response.headers["X-XSS-Protection"] = "1; mode=block"
         response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
         response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
+        # API responses are never cached; static file routes set their own
+        # ETag-based Cache-Control and keep it
+        if "cache-control" not in response.headers:
+            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate"
         
         return response
 
@@ -168,15 +212,14 @@ def get_malaysia_time_str():
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db_name = os.environ.get('DB_NAME')
-if not db_name:
-    raise ValueError("DB_NAME environment variable is required")
-db = client[db_name]
+# MongoDB connection: client and db come from utils.database, which owns
+# the one tuned client per process (pool size, timeouts, compression)
+# Report/certificate reads of session records span the hot and archive tiers
+tiered_db = TieredDatabase(db)
+# Finance reports and aggregations read with the report read preference
+# (a secondary on a replica set, the primary otherwise)
+report_db = reporting_database(db)
 print(f"🔥🔥🔥 CONNECTED TO DATABASE: {db_name} 🔥🔥🔥")
-logging.info(f"🔥🔥🔥 CONNECTED TO DATABASE: {db_name} 🔥🔥🔥")
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -273,6 +316,10 @@ app = FastAPI(
 
 # Add security middleware FIRST (before CORS)
 app.add_middleware(SecurityMiddleware)
+# Outside SecurityMiddleware so rate-limited requests are timed too
+app.add_middleware(InstrumentationMiddleware)
+# Outermost of the three: compresses what the others produced, Server-Timing included
+app.add_middleware(CompressionMiddleware)
 
 api_router = APIRouter(prefix="/api")
 
@@ -295,6 +342,8 @@ TEMPLATE_DIR = STATIC_DIR / "templates"
 TEMPLATE_DIR.mkdir(exist_ok=True)
 CHECKLIST_PHOTOS_DIR = STATIC_DIR / "checklist_photos"
 CHECKLIST_PHOTOS_DIR.mkdir(exist_ok=True)
+RECEIPT_DIR = STATIC_DIR / "receipts"
+RECEIPT_DIR.mkdir(exist_ok=True)
 
 # ============ MODELS ============
 
@@ -650,6 +699,15 @@ class AttendanceClockIn(BaseModel):
 class AttendanceClockOut(BaseModel):
     session_id: str
 
+class RosterEntry(BaseModel):
+    participant_id: str
+    status: Optional[str] = None  # "present" or "absent"; None keeps the current mark
+    clock_in: Optional[str] = None  # ISO datetime; None keeps the current time
+    clock_out: Optional[str] = None
+
+class RosterUpdate(BaseModel):
+    entries: List[RosterEntry]
+
 # Super Admin models for data submission
 class SuperAdminClockIn(BaseModel):
     session_id: str
@@ -1183,8 +1241,10 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+async def get_user_from_token(token: str) -> User:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
@@ -1203,8 +1263,17 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def reject_archived_session_writes(session_id: Optional[str], session: Optional[dict] = None):
+    """
+    409 once a session's records have moved to the archive tier, where a
+    write to the hot collections would match nothing or shadow the archived row
+    """
+    archived = records_archived(session) if session is not None else await session_records_archived(db, session_id)
+    if archived:
+        raise HTTPException(status_code=409, detail="This session's records are archived and can no longer be changed")
+
 async def get_or_create_participant_access(participant_id: str, session_id: str):
-    access_doc = await db.participant_access.find_one(
+    access_doc = await tiered_db.participant_access.find_one(
         {"participant_id": participant_id, "session_id": session_id},
         {"_id": 0}
     )
@@ -1214,108 +1283,27 @@ async def get_or_create_participant_access(participant_id: str, session_id: str)
             participant_id=participant_id,
             session_id=session_id
         )
+        if await session_records_archived(db, session_id):
+            # Not stored: a hot row would shadow the archive tier
+            return access_obj
         doc = access_obj.model_dump()
         await db.participant_access.insert_one(doc)
         return access_obj
     
     return ParticipantAccess(**access_doc)
 
-async def find_or_create_user(user_data: dict, role: str, company_id: str) -> dict:
-    """
-    Find existing user by fullname OR email OR id_number (any match)
-    If found: update the user with new data
-    If not found: create new user
-    Returns: user dict with 'is_existing' flag and user data
-    """
-    full_name = user_data.get("full_name")
-    email = user_data.get("email")
-    id_number = user_data.get("id_number")
-    phone_number = user_data.get("phone_number")
-    
-    # Search for existing user by fullname OR email OR id_number
-    query = {"$or": []}
-    
-    if full_name:
-        query["$or"].append({"full_name": full_name})
-    if email:
-        query["$or"].append({"email": email})
-    if id_number:
-        query["$or"].append({"id_number": id_number})
-    
-    # If no fields provided, skip search
-    if not query["$or"]:
-        query = None
-    
-    existing_user = None
-    if query:
-        existing_user = await db.users.find_one(query, {"_id": 0})
-    
-    if existing_user:
-        # User found - update with new data
-        update_data = {
-            "id_number": user_data.get("id_number"),
-            "phone_number": phone_number,
-            "company_id": company_id,
-        }
-        
-        # Only update email if a valid non-empty email is provided
-        # Don't overwrite existing email with empty string (violates unique constraint)
-        if email and email.strip():
-            update_data["email"] = email
-        
-        # Remove None values
-        update_data = {k: v for k, v in update_data.items() if v is not None}
-        
-        await db.users.update_one(
-            {"id": existing_user["id"]},
-            {"$set": update_data}
-        )
-        
-        # Return updated user data
-        updated_user = await db.users.find_one({"id": existing_user["id"]}, {"_id": 0})
-        if isinstance(updated_user.get('created_at'), str):
-            updated_user['created_at'] = datetime.fromisoformat(updated_user['created_at'])
-        
-        return {
-            "is_existing": True,
-            "user": User(**updated_user)
-        }
-    else:
-        # User not found - create new
-        # For participants: use default password 'mddrc1' if no password provided
-        password = user_data.get("password")
-        if role == "participant" and not password:
-            password = "mddrc1"  # Default password for participants
-        
-        hashed_password = pwd_context.hash(password)
-        
-        # Auto-generate email if not provided (for unique constraint)
-        if not email or email.strip() == "":
-            # Generate unique email using ID number or timestamp
-            if id_number:
-                email = f"{id_number.replace('-', '').replace(' ', '')}@temp.mddrc.local"
-            else:
-                email = f"user_{uuid.uuid4().hex[:8]}@temp.mddrc.local"
-        
-        new_user = User(
-            email=email,
-            full_name=full_name,
-            id_number=user_data.get("id_number"),
-            role=role,
-            company_id=company_id,
-            phone_number=phone_number
-        )
-        
-        user_doc = new_user.model_dump()
-        user_doc["created_at"] = user_doc["created_at"].isoformat()
-        user_doc["password"] = hashed_password
-        
-        await db.users.insert_one(user_doc)
-        
-        return {
-            "is_existing": False,
-            "user": new_user
-        }
+def new_session_user_doc(person: dict, role: str, company_id: str, email: str) -> dict:
+    """User document for a person first seen in a session's participant or supervisor list"""
+    user_doc = User(
+        email=email,
+        full_name=person.get("full_name"),
+        id_number=person.get("id_number"),
+        role=role,
+        company_id=company_id,
+        phone_number=person.get("phone_number")
+    ).model_dump()
+    user_doc["created_at"] = user_doc["created_at"].isoformat()
+    return user_doc
 
 # Training Report Models
 class TrainingReport(BaseModel):
@@ -1569,6 +1557,7 @@ async def create_company(company_data: CompanyCreate, current_user: User = Depen
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.companies.insert_one(doc)
+    await reference_cache.invalidate(db, "companies")
     return company_obj
 
 @api_router.get("/companies", response_model=List[Company])
@@ -1602,6 +1591,7 @@ async def update_company(company_id: str, company_data: CompanyUpdate, current_u
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Company not found")
+    await reference_cache.invalidate(db, "companies")
     
     company_doc = await db.companies.find_one({"id": company_id}, {"_id": 0})
     return company_doc
@@ -1630,6 +1620,7 @@ async def create_billing_party(data: dict, current_user: User = Depends(get_curr
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.billing_parties.insert_one(doc)
+    await reference_cache.invalidate(db, "billing_parties")
     doc.pop('_id', None)  # Remove ObjectId before returning
     return {"message": "Billing party created", "billing_party": doc}
 
@@ -1639,7 +1630,7 @@ async def get_billing_parties(current_user: User = Depends(get_current_user)):
     if current_user.role not in ["admin", "super_admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    parties = await db.billing_parties.find({"is_active": True}, {"_id": 0}).to_list(100)
+    parties = [p for p in await reference_cache.all(db, "billing_parties") if p.get("is_active")]
     return parties
 
 @api_router.put("/finance/billing-parties/{party_id}")
@@ -1657,6 +1648,7 @@ async def update_billing_party(party_id: str, data: dict, current_user: User = D
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Billing party not found")
+    await reference_cache.invalidate(db, "billing_parties")
     
     return {"message": "Updated successfully"}
 
@@ -1670,6 +1662,7 @@ async def delete_billing_party(party_id: str, current_user: User = Depends(get_c
         {"id": party_id},
         {"$set": {"is_active": False}}
     )
+    await reference_cache.invalidate(db, "billing_parties")
     
     return {"message": "Deleted successfully"}
 
@@ -1682,6 +1675,7 @@ async def delete_company(company_id: str, current_user: User = Depends(get_curre
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Company not found")
+    await reference_cache.invalidate(db, "companies")
     
     return {"message": "Company deleted successfully"}
 
@@ -1696,6 +1690,7 @@ async def create_program(program_data: ProgramCreate, current_user: User = Depen
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.programs.insert_one(doc)
+    await reference_cache.invalidate(db, "programs")
     return program_obj
 
 @api_router.get("/programs", response_model=List[Program])
@@ -1727,6 +1722,9 @@ async def update_program(program_id: str, program_data: ProgramUpdate, current_u
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Program not found")
+    # Compiled tests carry the program's pass percentage
+    await test_cache.invalidate(db)
+    await reference_cache.invalidate(db, "programs")
     
     program_doc = await db.programs.find_one({"id": program_id}, {"_id": 0})
     if isinstance(program_doc.get('created_at'), str):
@@ -1742,6 +1740,8 @@ async def delete_program(program_id: str, current_user: User = Depends(get_curre
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Program not found")
+    await test_cache.invalidate(db)
+    await reference_cache.invalidate(db, "programs")
     
     return {"message": "Program deleted successfully"}
 
@@ -1760,17 +1760,19 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Clean up: Remove user from all sessions
+    # Clean up: Remove user from all sessions (their calendar participant counts change)
+    enrolled = await db.sessions.find(
+        {"participant_ids": user_id}, {"_id": 0, "start_date": 1, "end_date": 1}
+    ).to_list(None)
     await db.sessions.update_many(
         {"participant_ids": user_id},
         {"$pull": {"participant_ids": user_id}}
     )
+    if enrolled:
+        await calendar_cache.invalidate(db, session_months(*enrolled))
     
-    # Clean up: Delete participant_access records
-    await db.participant_access.delete_many({"participant_id": user_id})
-    
-    # Clean up: Delete attendance records
-    await db.attendance.delete_many({"participant_id": user_id})
+    # Clean up: Delete participant_access and attendance records (archive tiers included)
+    await cascade_delete(db, ["participant_access", "attendance"], {"participant_id": user_id})
     
     return {"message": "User and all related data deleted successfully"}
 
@@ -2044,39 +2046,25 @@ async def create_session(session_data: SessionCreate, current_user: User = Depen
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can create sessions")
     
-    # Process new participants (find or create)
-    processed_participant_ids = list(session_data.participant_ids)  # Start with existing IDs
-    participant_results = []
-    
-    for participant_data in session_data.participants:
-        result = await find_or_create_user(
-            participant_data.model_dump(),
-            role="participant",
-            company_id=session_data.company_id
-        )
-        processed_participant_ids.append(result["user"].id)
-        participant_results.append({
-            "name": result["user"].full_name,
-            "email": result["user"].email,
-            "is_existing": result["is_existing"]
-        })
-    
-    # Process new supervisors (find or create)
-    processed_supervisor_ids = list(session_data.supervisor_ids)  # Start with existing IDs
-    supervisor_results = []
-    
-    for supervisor_data in session_data.supervisors:
-        result = await find_or_create_user(
-            supervisor_data.model_dump(),
-            role="pic_supervisor",
-            company_id=session_data.company_id
-        )
-        processed_supervisor_ids.append(result["user"].id)
-        supervisor_results.append({
-            "name": result["user"].full_name,
-            "email": result["user"].email,
-            "is_existing": result["is_existing"]
-        })
+    # Find or create every participant and supervisor in one batch
+    people = [("participant", p.model_dump()) for p in session_data.participants] + \
+             [("pic_supervisor", s.model_dump()) for s in session_data.supervisors]
+    user_operations, resolved = await resolve_people(
+        db, people, session_data.company_id, new_session_user_doc, hash_password
+    )
+    resolved_participants = resolved[:len(session_data.participants)]
+    resolved_supervisors = resolved[len(session_data.participants):]
+    
+    processed_participant_ids = list(session_data.participant_ids) + [u["id"] for u, _ in resolved_participants]
+    processed_supervisor_ids = list(session_data.supervisor_ids) + [u["id"] for u, _ in resolved_supervisors]
+    participant_results = [
+        {"name": u["full_name"], "email": u.get("email"), "is_existing": existing}
+        for u, existing in resolved_participants
+    ]
+    supervisor_results = [
+        {"name": u["full_name"], "email": u.get("email"), "is_existing": existing}
+        for u, existing in resolved_supervisors
+    ]
     
     # Create session with processed IDs
     session_obj = Session(
@@ -2102,27 +2090,14 @@ async def create_session(session_data: SessionCreate, current_user: User = Depen
     # completion_status is already set to "ongoing" by default in the model
     # completed_by_coordinator is already set to False by default in the model
     
-    await db.sessions.insert_one(doc)
-    
-    # Auto-create draft invoice for this session
-    try:
-        invoice = await create_auto_invoice_for_session(doc, current_user.id)
-        # Update session with invoice reference
-        await db.sessions.update_one(
-            {"id": session_obj.id},
-            {"$set": {
-                "invoice_id": invoice["id"],
-                "invoice_number": invoice["invoice_number"],
-                "invoice_status": invoice["status"]
-            }}
-        )
-        session_obj.invoice_id = invoice["id"]
-        session_obj.invoice_number = invoice["invoice_number"]
-        session_obj.invoice_status = invoice["status"]
-    except Exception as e:
-        logging.error(f"Failed to create auto-invoice for session {session_obj.id}: {str(e)}")
+    # Draft invoice, created together with the session
+    invoice = await build_auto_invoice(doc)
+    session_obj.invoice_id = doc["invoice_id"] = invoice["id"]
+    session_obj.invoice_number = doc["invoice_number"] = invoice["invoice_number"]
+    session_obj.invoice_status = doc["invoice_status"] = invoice["status"]
     
-    # Create marketing commission record if marketing person assigned
+    # Marketing commission record if marketing person assigned
+    commission_record = None
     if session_data.marketing_user_id:
         commission_record = {
             "id": str(uuid.uuid4()),
@@ -2134,13 +2109,30 @@ async def create_session(session_data: SessionCreate, current_user: User = Depen
             "calculated_amount": 0.0,  # Will be calculated when invoice is issued
             "status": "pending",
             "created_at": get_malaysia_time().isoformat(),
-            "updated_at": get_malaysia_time().isoformat()
+            "updated_at": get_malaysia_time().isoformat(),
+            **period_fields(session_obj.start_date)
         }
-        await db.marketing_commissions.insert_one(commission_record)
     
-    # Create participant access records
-    for participant_id in processed_participant_ids:
-        await get_or_create_participant_access(participant_id, session_obj.id)
+    access_docs = [
+        ParticipantAccess(participant_id=participant_id, session_id=session_obj.id).model_dump()
+        for participant_id in dict.fromkeys(processed_participant_ids)
+    ]
+    
+    # Users, session, invoice, commission and access rows: all written or none
+    await write_session(
+        db, user_operations, [u for u, existing in resolved if not existing], doc,
+        invoice=invoice, commission=commission_record, access_docs=access_docs
+    )
+    await calendar_cache.invalidate(db, session_months(doc))
+    
+    await log_finance_action(
+        entity_type="invoice",
+        entity_id=invoice["id"],
+        action="created",
+        changed_by=current_user.id,
+        after_value=invoice,
+        changed_by_name=current_user.full_name
+    )
     
     return {
         "session": session_obj,
@@ -2148,6 +2140,16 @@ async def create_session(session_data: SessionCreate, current_user: User = Depen
         "supervisor_results": supervisor_results
     }
 
+# ?fields= on the session lists: names come from the reference cache, the count from participant_ids
+SESSION_DERIVED_FIELDS = {
+    "company_name": ("company_id",),
+    "program_name": ("program_id",),
+    "participant_count": ("participant_ids",),
+}
+SESSION_LIST_FIELDS = set(Session.model_fields) | set(SESSION_DERIVED_FIELDS)
+# Read by the text search after enrichment
+SESSION_SEARCH_FIELDS = ("name", "location", "company_id", "program_id")
+
 @api_router.get("/sessions", response_model=List[Session])
 async def get_sessions(
     search: Optional[str] = None,
@@ -2155,8 +2157,14 @@ async def get_sessions(
     program_id: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
+    selected = parse_fields(fields, SESSION_LIST_FIELDS)
+    projection = {"_id": 0} if selected is None else field_projection(
+        selected, needs=SESSION_SEARCH_FIELDS if search else (), derived=SESSION_DERIVED_FIELDS
+    )
+    
     # Get sessions based on role-specific rules
     current_date = get_malaysia_time().date()
     
@@ -2236,32 +2244,29 @@ async def get_sessions(
     
     if current_user.role == "participant":
         query["$and"].append({"participant_ids": current_user.id})
-        sessions = await db.sessions.find(query, {"_id": 0}).to_list(1000)
+        sessions = await db.sessions.find(query, projection).to_list(1000)
         
         # Auto-create participant_access records for each session
         for session in sessions:
             await get_or_create_participant_access(current_user.id, session['id'])
     elif current_user.role == "supervisor":
         query["$and"].append({"supervisor_ids": current_user.id})
-        sessions = await db.sessions.find(query, {"_id": 0}).to_list(1000)
+        sessions = await db.sessions.find(query, projection).to_list(1000)
     else:
-        sessions = await db.sessions.find(query, {"_id": 0}).to_list(1000)
+        sessions = await db.sessions.find(query, projection).to_list(1000)
     
     # Enrich sessions with company and program data
     for session in sessions:
-        if isinstance(session.get('created_at'), str):
-            session['created_at'] = datetime.fromisoformat(session['created_at'])
-        
         # Get company info
         if session.get("company_id"):
-            company = await db.companies.find_one({"id": session["company_id"]}, {"_id": 0})
+            company = await reference_cache.lookup(db, "companies", session["company_id"])
             session["company_name"] = company.get("name", "Unknown") if company else "Unknown"
         else:
             session["company_name"] = "Unknown"
         
         # Get program info
         if session.get("program_id"):
-            program = await db.programs.find_one({"id": session["program_id"]}, {"_id": 0})
+            program = await reference_cache.lookup(db, "programs", session["program_id"])
             session["program_name"] = program.get("name", "Unknown") if program else "Unknown"
         else:
             session["program_name"] = "Unknown"
@@ -2277,7 +2282,10 @@ async def get_sessions(
             or search_lower in s.get("location", "").lower()
         ]
     
-    return sessions
+    if selected is not None:
+        return FastJSONResponse(trim_fields(sessions, selected))
+    # created_at strings are parsed by the single validation pass
+    return validated_response(List[Session], sessions)
 
 @api_router.put("/sessions/{session_id}/toggle-status")
 async def toggle_session_status(session_id: str, current_user: User = Depends(get_current_user)):
@@ -2295,6 +2303,7 @@ async def toggle_session_status(session_id: str, current_user: User = Depends(ge
         {"id": session_id},
         {"$set": {"status": new_status}}
     )
+    await calendar_cache.invalidate(db, session_months(session))
     
     return {"message": f"Session marked as {new_status}", "status": new_status}
 
@@ -2344,14 +2353,14 @@ async def get_past_training_sessions(
     for session in sessions:
         # Get company info
         if session.get("company_id"):
-            company = await db.companies.find_one({"id": session["company_id"]}, {"_id": 0})
+            company = await reference_cache.lookup(db, "companies", session["company_id"])
             session["company_name"] = company.get("name", "Unknown") if company else "Unknown"
         else:
             session["company_name"] = "Unknown"
         
         # Get program info
         if session.get("program_id"):
-            program = await db.programs.find_one({"id": session["program_id"]}, {"_id": 0})
+            program = await reference_cache.lookup(db, "programs", session["program_id"])
             session["program_name"] = program.get("name", "Unknown") if program else "Unknown"
         else:
             session["program_name"] = "Unknown"
@@ -2359,7 +2368,7 @@ async def get_past_training_sessions(
     return sessions
 
 @api_router.get("/sessions/calendar")
-async def get_calendar_sessions(current_user: User = Depends(get_current_user)):
+async def get_calendar_sessions(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
     """Get sessions for calendar view (shows all sessions from past year to next year)"""
     if current_user.role not in ["admin", "coordinator", "assistant_admin", "trainer"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
@@ -2376,20 +2385,22 @@ async def get_calendar_sessions(current_user: User = Depends(get_current_user)):
         }
     }
     
-    sessions = await db.sessions.find(query, {"_id": 0}).to_list(1000)
+    selected = parse_fields(fields, SESSION_LIST_FIELDS)
+    projection = {"_id": 0} if selected is None else field_projection(selected, derived=SESSION_DERIVED_FIELDS)
+    sessions = await db.sessions.find(query, projection).to_list(1000)
     
     # Enrich with company and program data for calendar display
     for session in sessions:
         # Get company info
         if session.get("company_id"):
-            company = await db.companies.find_one({"id": session["company_id"]}, {"_id": 0})
+            company = await reference_cache.lookup(db, "companies", session["company_id"])
             session["company_name"] = company.get("name", "Unknown") if company else "Unknown"
         else:
             session["company_name"] = "Unknown"
         
         # Get program info
         if session.get("program_id"):
-            program = await db.programs.find_one({"id": session["program_id"]}, {"_id": 0})
+            program = await reference_cache.lookup(db, "programs", session["program_id"])
             session["program_name"] = program.get("name", "Unknown") if program else "Unknown"
         else:
             session["program_name"] = "Unknown"
@@ -2397,7 +2408,30 @@ async def get_calendar_sessions(current_user: User = Depends(get_current_user)):
         # Add participant count
         session["participant_count"] = len(session.get("participant_ids", []))
     
-    return sessions
+    return FastJSONResponse(sessions if selected is None else trim_fields(sessions, selected))
+
+# Declared before /sessions/{session_id}/events so "calendar" is not taken for a session id
+@api_router.get("/sessions/calendar/events")
+async def get_calendar_events(
+    month: Optional[str] = None,
+    week: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Compact calendar events for one month (month=2025-03) or ISO week
+    (week=2025-W10), defaulting to the current month. Served from per-month
+    cache buckets that session writes invalidate.
+    """
+    if current_user.role not in ["admin", "coordinator", "assistant_admin", "trainer"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    start, end = calendar_window(month, week, today=get_malaysia_date())
+    events = await calendar_cache.events(db, start, end)
+    return FastJSONResponse({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "events": events
+    })
 
 @api_router.get("/sessions/{session_id}", response_model=Session)
 async def get_session(session_id: str, current_user: User = Depends(get_current_user)):
@@ -2482,6 +2516,7 @@ async def add_participants_to_session(
         {"id": session_id},
         {"$set": {"participant_ids": current_participants}}
     )
+    await calendar_cache.invalidate(db, session_months(session))
     
     # Create participant_access records for newly added participants
     # This ensures checklists and tests show up for trainers immediately
@@ -2520,19 +2555,8 @@ async def bulk_upload_participants(
     
     try:
         # Read Excel file
-        import pandas as pd
-        import io
-        
         contents = await file.read()
-        
-        # Try reading as xlsx first, then xls
-        try:
-            df = pd.read_excel(io.BytesIO(contents), engine='openpyxl')
-        except:
-            try:
-                df = pd.read_excel(io.BytesIO(contents), engine='xlrd')
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
+        df = read_excel(contents)
         
         # Normalize column names (remove extra spaces, convert to lowercase for matching)
         df.columns = df.columns.str.strip()
@@ -2604,6 +2628,7 @@ async def bulk_upload_participants(
                     "created_at": datetime.now(timezone.utc).isoformat()
                 }
                 await db.companies.insert_one({**company, "_id": company_id})
+                await reference_cache.invalidate(db, "companies")
                 created_companies.append(company_name)
             
             company_id = company["id"]
@@ -2658,6 +2683,7 @@ async def bulk_upload_participants(
             {"id": session_id},
             {"$set": {"participant_ids": current_participants}}
         )
+        await calendar_cache.invalidate(db, session_months(session))
         
         # Create participant_access records
         for user_id in new_participant_ids:
@@ -2699,8 +2725,14 @@ async def update_session(session_id: str, session_data: dict, current_user: User
         {"$set": session_data}
     )
     
+    # Payables are booked in the month the session starts
+    if "start_date" in session_data and session_data["start_date"] != session.get("start_date"):
+        await stamp_session_periods(db, session_id, session_data["start_date"])
+    
     # Return the updated session
     updated_session = await db.sessions.find_one({"id": session_id}, {"_id": 0})
+    # Both the old and the new dates' months
+    await calendar_cache.invalidate(db, session_months(session, updated_session))
     return updated_session
 
 @api_router.delete("/sessions/{session_id}")
@@ -2719,6 +2751,7 @@ async def delete_session(session_id: str, current_user: User = Depends(get_curre
     # Delete the session itself first (uses "id" field)
     result = await db.sessions.delete_one({"id": session_id})
     total_deleted += result.deleted_count
+    await calendar_cache.invalidate(db, session_months(session))
     
     # Delete from related collections (use "session_id" field)
     related_collections = [
@@ -2743,9 +2776,7 @@ async def delete_session(session_id: str, current_user: User = Depends(get_curre
         "marketing_commissions",
     ]
     
-    for collection_name in related_collections:
-        result = await db[collection_name].delete_many({"session_id": session_id})
-        total_deleted += result.deleted_count
+    total_deleted += await cascade_delete(db, related_collections, {"session_id": session_id})
     
     return {
         "message": "Session and all related data deleted successfully",
@@ -2761,7 +2792,7 @@ async def delete_all_sessions(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Only admins can delete all sessions")
     
     # Get all session IDs first
-    all_sessions = await db.sessions.find({}, {"_id": 0, "id": 1}).to_list(1000)
+    all_sessions = await db.sessions.find({}, {"_id": 0, "id": 1, "start_date": 1, "end_date": 1}).to_list(None)
     session_ids = [s["id"] for s in all_sessions]
     
     if not session_ids:
@@ -2790,10 +2821,9 @@ async def delete_all_sessions(current_user: User = Depends(get_current_user)):
         "coordinator_feedback",
     ]
     
-    # Delete from all collections
-    for collection_name in collections_to_clean:
-        result = await db[collection_name].delete_many({})
-        total_deleted += result.deleted_count
+    # Delete from all collections (archive tiers included)
+    total_deleted += await cascade_delete(db, collections_to_clean, {})
+    await calendar_cache.invalidate(db, session_months(*all_sessions))
     
     return {
         "message": f"All sessions and related data deleted successfully",
@@ -2816,6 +2846,8 @@ async def update_participant_access(access_data: UpdateParticipantAccess, curren
     elif current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins and coordinators can update access")
     
+    await reject_archived_session_writes(access_data.session_id)
+    
     await get_or_create_participant_access(access_data.participant_id, access_data.session_id)
     
     update_fields = {}
@@ -2833,6 +2865,7 @@ async def update_participant_access(access_data: UpdateParticipantAccess, curren
         {"$set": update_fields}
     )
     
+    session_events.publish(access_data.session_id, "access.updated", participant_id=access_data.participant_id, **update_fields)
     return {"message": "Access updated successfully"}
 
 @api_router.get("/participant-access/{session_id}")
@@ -2892,6 +2925,8 @@ async def toggle_session_access(session_id: str, access_data: dict, current_user
     if not can_access:
         raise HTTPException(status_code=403, detail="You don't have permission to control access for this session")
     
+    await reject_archived_session_writes(session_id, session)
+    
     access_type = access_data.get("access_type")
     enabled = access_data.get("enabled", False)
     
@@ -2921,6 +2956,8 @@ async def toggle_session_access(session_id: str, access_data: dict, current_user
             {"$set": {field_name: enabled}}
         )
     
+    session_events.publish(session_id, "access.updated", participant_ids=participant_ids, **{field_name: enabled})
+    
     status_text = "enabled" if enabled else "disabled"
     return {"message": f"{access_type} access {status_text} for {len(participant_ids)} participants"}
 
@@ -2935,12 +2972,16 @@ async def release_pre_test(session_id: str, current_user: User = Depends(get_cur
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    await reject_archived_session_writes(session_id, session)
+    
     # Update all participant access records for this session
     result = await db.participant_access.update_many(
         {"session_id": session_id},
         {"$set": {"can_access_pre_test": True}}
     )
     
+    session_events.publish(session_id, "access.updated", can_access_pre_test=True)
+    
     return {"message": f"Pre-test released to {result.modified_count} participants"}
 
 @api_router.post("/sessions/{session_id}/release-post-test")
@@ -2952,11 +2993,15 @@ async def release_post_test(session_id: str, current_user: User = Depends(get_cu
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    await reject_archived_session_writes(session_id, session)
+    
     result = await db.participant_access.update_many(
         {"session_id": session_id},
         {"$set": {"can_access_post_test": True}}
     )
     
+    session_events.publish(session_id, "access.updated", can_access_post_test=True)
+    
     return {"message": f"Post-test released to {result.modified_count} participants"}
 
 @api_router.post("/sessions/{session_id}/release-feedback")
@@ -2968,11 +3013,15 @@ async def release_feedback(session_id: str, current_user: User = Depends(get_cur
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    await reject_archived_session_writes(session_id, session)
+    
     result = await db.participant_access.update_many(
         {"session_id": session_id},
         {"$set": {"can_access_feedback": True}}
     )
     
+    session_events.publish(session_id, "access.updated", can_access_feedback=True)
+    
     return {"message": f"Feedback form released to {result.modified_count} participants"}
 
 @api_router.get("/sessions/{session_id}/status")
@@ -3015,6 +3064,46 @@ async def get_session_status(session_id: str, current_user: User = Depends(get_c
         }
     }
 
+@api_router.get("/sessions/{session_id}/events")
+async def stream_session_progress(session_id: str, request: Request, token: Optional[str] = None):
+    """
+    Server-Sent Events stream of a session's progress (clock-ins, test
+    submissions, feedback, checklists, access changes). Browsers' EventSource
+    cannot set headers, so the bearer token may also be passed as ?token=.
+    Reconnects send Last-Event-ID and get the missed events, or a `resync`
+    event when they are no longer held.
+    """
+    auth_header = request.headers.get("authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current_user = await get_user_from_token(token)
+    
+    session = await db.sessions.find_one(
+        {"id": session_id}, {"_id": 0, "trainer_assignments": 1, "assistant_coordinator_ids": 1}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Same rule as the participant access view: staff, or trainers assigned to the session
+    can_access = current_user.role in ["coordinator", "admin", "assistant_admin"]
+    if current_user.role == "trainer":
+        trainer_ids = [t.get("trainer_id") for t in session.get("trainer_assignments", [])]
+        can_access = current_user.id in trainer_ids or current_user.id in session.get("assistant_coordinator_ids", [])
+    if not can_access:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    last_event_id = request.headers.get("last-event-id")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    
+    from fastapi.responses import StreamingResponse
+    return StreamingResponse(
+        stream_session_events(session_events, session_id, last_event_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/sessions/{session_id}/participants/{participant_id}/attendance")
 async def mark_participant_attendance(
     session_id: str,
@@ -3034,6 +3123,8 @@ async def mark_participant_attendance(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    await reject_archived_session_writes(session_id, session)
+    
     # Check if participant is in this session
     if participant_id not in session.get("participant_ids", []):
         raise HTTPException(status_code=400, detail="Participant not enrolled in this session")
@@ -3079,6 +3170,61 @@ async def get_session_attendance_status(
     
     return attendance_dict
 
+@api_router.get("/sessions/{session_id}/attendance/roster")
+async def get_attendance_roster(session_id: str, current_user: User = Depends(get_current_user)):
+    """Every enrolled participant with their present/absent mark and clock times, from one aggregation"""
+    if current_user.role not in ["coordinator", "admin", "trainer", "pic_supervisor"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    result = await attendance_roster(db, session_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    session = result["session"]
+    if current_user.role == "pic_supervisor" and current_user.id not in (session.get("supervisor_ids") or []):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    return FastJSONResponse({
+        "session": {k: session.get(k) for k in ("id", "name", "start_date", "end_date")},
+        "participants": result["participants"]
+    })
+
+@api_router.put("/sessions/{session_id}/attendance/roster")
+async def update_attendance_roster(
+    session_id: str,
+    roster_data: RosterUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Mark a whole session's attendance in one request. Only fields that differ
+    from the stored roster are written, so a retried request is a no-op.
+    """
+    if current_user.role not in ["coordinator", "admin"]:
+        raise HTTPException(status_code=403, detail="Only coordinators and admins can mark attendance")
+    
+    current = await attendance_roster(db, session_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    await reject_archived_session_writes(session_id, current["session"])
+    
+    entries = [entry.model_dump() for entry in roster_data.entries]
+    changes = await apply_roster(db, session_id, current, entries, current_user.id)
+    
+    for change in changes:
+        participant_id = change["participant_id"]
+        if "status" in change:
+            session_events.publish(session_id, "attendance.marked", participant_id=participant_id, status=change["status"])
+        if "clock_in" in change:
+            session_events.publish(session_id, "attendance.clock_in", participant_id=participant_id, time=change["clock_in"])
+        if "clock_out" in change:
+            session_events.publish(session_id, "attendance.clock_out", participant_id=participant_id, time=change["clock_out"])
+    
+    result = await attendance_roster(db, session_id) if changes else current
+    return FastJSONResponse({
+        "updated": len(changes),
+        "unchanged": len(entries) - len(changes),
+        "participants": result["participants"]
+    })
+
 @api_router.get("/sessions/{session_id}/completion-checklist")
 async def get_completion_checklist(session_id: str, current_user: User = Depends(get_current_user)):
     """Get checklist status for session completion (training report upload status)"""
@@ -3138,6 +3284,7 @@ async def mark_session_completed(session_id: str, current_user: User = Depends(g
             }
         }
     )
+    await calendar_cache.invalidate(db, session_months(session))
     
     # Update training report to mark as available to supervisors
     await db.training_reports.update_one(
@@ -3156,6 +3303,28 @@ async def mark_session_completed(session_id: str, current_user: User = Depends(g
         "report_pushed_to_supervisors": True
     }
 
+@api_router.post("/admin/archive/run")
+async def run_session_archival(retention_days: Optional[int] = None, current_user: User = Depends(get_current_user)):
+    """Move records of sessions completed longer ago than the retention window into the archive tier"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can run archival")
+    if retention_days is not None and retention_days < 0:
+        raise HTTPException(status_code=400, detail="retention_days must be zero or more")
+    return await archive_due_sessions(db, retention_days)
+
+@api_router.post("/sessions/{session_id}/archive")
+async def archive_completed_session(session_id: str, current_user: User = Depends(get_current_user)):
+    """Archive one completed session's records now, regardless of the retention window"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can archive sessions")
+    session = await db.sessions.find_one({"id": session_id}, {"_id": 0, "completion_status": 1})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.get("completion_status") not in ["completed", "archived"]:
+        raise HTTPException(status_code=400, detail="Only completed sessions can be archived")
+    moved = await archive_session(db, session_id)
+    return {"session_id": session_id, "records_moved": moved}
+
 @api_router.get("/sessions/{session_id}/results-summary")
 async def get_results_summary(session_id: str, current_user: User = Depends(get_current_user)):
     # Check if user has permission (admin, coordinator, or chief trainer)
@@ -3176,13 +3345,13 @@ async def get_results_summary(session_id: str, current_user: User = Depends(get_
     ).to_list(1000)
     
     # Get test results for all participants
-    test_results = await db.test_results.find(
+    test_results = await tiered_db.test_results.find(
         {"session_id": session_id},
         {"_id": 0}
     ).to_list(1000)
     
     # Get feedback for all participants
-    feedbacks = await db.course_feedback.find(
+    feedbacks = await tiered_db.course_feedback.find(
         {"session_id": session_id},
         {"_id": 0}
     ).to_list(1000)
@@ -3234,6 +3403,7 @@ async def get_users(
     role: Optional[str] = None,
     search: Optional[str] = None,
     company_id: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role not in ["admin", "supervisor", "coordinator", "trainer"]:
@@ -3258,6 +3428,12 @@ async def get_users(
             {"id_number": search_pattern}
         ]
     
+    # An inclusion projection never returns password: it is not a User field
+    selected = parse_fields(fields, User.model_fields)
+    if selected is not None:
+        users = await db.users.find(query, field_projection(selected)).to_list(1000)
+        return FastJSONResponse(users)
+    
     users = await db.users.find(query, {"_id": 0, "password": 0}).to_list(1000)
     for user in users:
         if isinstance(user.get('created_at'), str):
@@ -3290,6 +3466,7 @@ async def create_test(test_data: TestCreate, current_user: User = Depends(get_cu
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.tests.insert_one(doc)
+    await test_cache.invalidate(db)
     return test_obj
 
 @api_router.get("/tests/program/{program_id}", response_model=List[Test])
@@ -3309,6 +3486,8 @@ async def delete_test(test_id: str, current_user: User = Depends(get_current_use
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Test not found")
+    await test_cache.invalidate(db)
+    await db.test_permutations.delete_many({"test_id": test_id})
     
     return {"message": "Test deleted successfully"}
 
@@ -3335,19 +3514,8 @@ async def bulk_upload_test_questions(
         raise HTTPException(status_code=400, detail="Only .xlsx and .xls files are supported")
     
     try:
-        import pandas as pd
-        import io
-        
         contents = await file.read()
-        
-        # Try reading as xlsx first, then xls
-        try:
-            df = pd.read_excel(io.BytesIO(contents), engine='openpyxl')
-        except:
-            try:
-                df = pd.read_excel(io.BytesIO(contents), engine='xlrd')
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
+        df = read_excel(contents)
         
         # Normalize column names
         df.columns = df.columns.str.strip()
@@ -3357,7 +3525,7 @@ async def bulk_upload_test_questions(
         
         if use_simplified_format:
             # Verify program exists
-            program = await db.programs.find_one({"id": program_id}, {"_id": 0})
+            program = await reference_cache.lookup(db, "programs", program_id)
             if not program:
                 raise HTTPException(status_code=404, detail="Program not found")
             
@@ -3473,6 +3641,7 @@ async def bulk_upload_test_questions(
                 "questions": questions_list,
                 "created_at": now
             })
+            await test_cache.invalidate(db)
             
             return {
                 "message": "Questions uploaded successfully",
@@ -3552,6 +3721,9 @@ async def bulk_upload_test_questions(
                     "action": "created_new_test"
                 })
         
+        if added_questions:
+            await test_cache.invalidate(db)
+        
         response = {
             "message": "Bulk upload successful",
             "total_uploaded": len(added_questions),
@@ -3584,18 +3756,8 @@ async def bulk_upload_checklist_items(
         raise HTTPException(status_code=400, detail="Only .xlsx and .xls files are supported")
     
     try:
-        import pandas as pd
-        import io
-        
         contents = await file.read()
-        
-        try:
-            df = pd.read_excel(io.BytesIO(contents), engine='openpyxl')
-        except:
-            try:
-                df = pd.read_excel(io.BytesIO(contents), engine='xlrd')
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
+        df = read_excel(contents)
         
         df.columns = df.columns.str.strip()
         
@@ -3713,18 +3875,8 @@ async def bulk_upload_feedback_questions(
         raise HTTPException(status_code=400, detail="Only .xlsx and .xls files are supported")
     
     try:
-        import pandas as pd
-        import io
-        
         contents = await file.read()
-        
-        try:
-            df = pd.read_excel(io.BytesIO(contents), engine='openpyxl')
-        except:
-            try:
-                df = pd.read_excel(io.BytesIO(contents), engine='xlrd')
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
+        df = read_excel(contents)
         
         df.columns = df.columns.str.strip()
         
@@ -3860,14 +4012,11 @@ async def get_available_tests(session_id: str, current_user: User = Depends(get_
     access = await get_or_create_participant_access(current_user.id, session_id)
     
     # Get tests for the session's program
-    tests = await db.tests.find({"program_id": session['program_id']}, {"_id": 0}).to_list(10)
+    tests = await test_cache.for_program(db, session['program_id'])
     
     available_tests = []
     for test in tests:
-        if isinstance(test.get('created_at'), str):
-            test['created_at'] = datetime.fromisoformat(test['created_at'])
-        
-        test_type = test['test_type']
+        test_type = test.test_type
         can_access = False
         is_completed = False
         
@@ -3880,100 +4029,55 @@ async def get_available_tests(session_id: str, current_user: User = Depends(get_
             is_completed = access.post_test_completed
         
         if can_access and not is_completed:
-            # Don't send correct answers to participant
-            test_copy = test.copy()
-            questions = test['questions'].copy()
-            
-            # Shuffle post-test questions
-            if test_type == "post":
-                random.shuffle(questions)
-            
-            test_copy['questions'] = [
-                {
-                    'question': q['question'],
-                    'options': q['options']
-                }
-                for q in questions
-            ]
-            available_tests.append(test_copy)
+            # Participant payload has no correct answers; post-tests use the participant's stored order
+            order = await participant_order(db, test, current_user.id)
+            available_tests.append(test.document(test.participant_payload(order)))
     
     return available_tests
 
 @api_router.get("/tests/{test_id}")
 async def get_test(test_id: str, current_user: User = Depends(get_current_user)):
-    test_doc = await db.tests.find_one({"id": test_id}, {"_id": 0})
-    if not test_doc:
+    test = await test_cache.get(db, test_id)
+    if not test:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    if isinstance(test_doc.get('created_at'), str):
-        test_doc['created_at'] = datetime.fromisoformat(test_doc['created_at'])
-    
-    # Make a copy of questions for shuffling
-    questions = test_doc['questions'].copy()
-    
-    # Shuffle post-test questions for participants
-    if current_user.role == "participant" and test_doc['test_type'] == "post":
-        random.shuffle(questions)
-    
-    # Don't send correct answers to participants before submission
+    # Don't send correct answers to participants before submission;
+    # post-tests come in the participant's stored shuffle order
     if current_user.role == "participant":
-        test_doc['questions'] = [
-            {
-                'question': q['question'],
-                'options': q['options'],
-                'original_index': test_doc['questions'].index(q)  # Track original position
-            }
-            for q in questions
-        ]
-    else:
-        test_doc['questions'] = questions
+        order = await participant_order(db, test, current_user.id)
+        return test.document(test.participant_payload(order))
     
-    return test_doc
+    return test.document(test.questions)
 
 @api_router.post("/tests/submit", response_model=TestResult)
 async def submit_test(submission: TestSubmit, current_user: User = Depends(get_current_user)):
     if current_user.role != "participant":
         raise HTTPException(status_code=403, detail="Only participants can submit tests")
     
-    test_doc = await db.tests.find_one({"id": submission.test_id}, {"_id": 0})
-    if not test_doc:
+    test = await test_cache.get(db, submission.test_id)
+    if not test:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    program_doc = await db.programs.find_one({"id": test_doc['program_id']}, {"_id": 0})
-    pass_percentage = program_doc.get('pass_percentage', 70.0) if program_doc else 70.0
+    await reject_archived_session_writes(submission.session_id)
     
-    questions = test_doc['questions']
+    # Shuffled tests are graded against the order we served, not the one the client reports
+    order = None
+    if test.shuffled:
+        order = await stored_order(db, test.test_id, current_user.id)
+        if order is not None and len(order) != len(test.answer_key):
+            order = None
+    order = order or submission.question_indices
     
-    # Ensure both are integers for comparison
-    correct = 0
-    for i, ans in enumerate(submission.answers):
-        if i < len(questions):
-            # If question_indices provided (shuffled test), use original index
-            if submission.question_indices and i < len(submission.question_indices):
-                original_idx = submission.question_indices[i]
-            else:
-                original_idx = i
-            
-            if original_idx < len(questions):
-                submitted_answer = int(ans)
-                correct_answer = int(questions[original_idx]['correct_answer'])
-                if submitted_answer == correct_answer:
-                    correct += 1
-    
-    score = (correct / len(questions)) * 100 if questions else 0
-    passed = score >= pass_percentage
+    grading = test.grade(submission.answers, order)
     
     result_obj = TestResult(
         test_id=submission.test_id,
         participant_id=current_user.id,
         session_id=submission.session_id,
-        test_type=test_doc['test_type'],
+        test_type=test.test_type,
         answers=submission.answers,
-        score=score,
-        total_questions=len(questions),
-        correct_answers=correct,
-        passed=passed,
-        question_indices=submission.question_indices  # Store the shuffled order
+        question_indices=order,  # Store the shuffled order
+        **grading
     )
     
     doc = result_obj.model_dump()
@@ -3982,7 +4086,7 @@ async def submit_test(submission: TestSubmit, current_user: User = Depends(get_c
     await db.test_results.insert_one(doc)
     
     # Handle both "pre"/"post" and "pre_test"/"post_test" formats
-    test_type = test_doc['test_type']
+    test_type = test.test_type
     if test_type in ['pre', 'pre_test']:
         update_field = 'pre_test_completed'
     else:
@@ -3992,6 +4096,9 @@ async def submit_test(submission: TestSubmit, current_user: User = Depends(get_c
         {"$set": {update_field: True}}
     )
     
+    session_events.publish(submission.session_id, "test.submitted", participant_id=current_user.id,
+                           test_type=test.test_type, score=result_obj.score, passed=result_obj.passed)
+    
     return result_obj
 
 @api_router.get("/tests/results/participant/{participant_id}", response_model=List[TestResult])
@@ -3999,10 +4106,8 @@ async def get_participant_results(participant_id: str, current_user: User = Depe
     if current_user.role == "participant" and current_user.id != participant_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    results = await db.test_results.find({"participant_id": participant_id}, {"_id": 0}).to_list(100)
+    results = await tiered_db.test_results.find({"participant_id": participant_id}, {"_id": 0}).to_list(100)
     for result in results:
-        if isinstance(result.get('submitted_at'), str):
-            result['submitted_at'] = datetime.fromisoformat(result['submitted_at'])
         # Set default test_type if missing (for old records)
         if 'test_type' not in result:
             result['test_type'] = 'pre'
@@ -4011,7 +4116,7 @@ async def get_participant_results(participant_id: str, current_user: User = Depe
             result['total_questions'] = len(result.get('answers', []))
         if 'correct_answers' not in result:
             result['correct_answers'] = int((result.get('score', 0) / 100) * result['total_questions'])
-    return results
+    return validated_response(List[TestResult], results)
 
 @api_router.put("/tests/results/{result_id}")
 async def update_test_result(result_id: str, score: float, passed: bool, current_user: User = Depends(get_current_user)):
@@ -4019,11 +4124,12 @@ async def update_test_result(result_id: str, score: float, passed: bool, current
     if current_user.email != "arjuna@mddrc.com.my":
         raise HTTPException(status_code=403, detail="Only super admin can update test results")
     
-    result = await db.test_results.find_one({"id": result_id}, {"_id": 0})
+    # Archived sessions' results are edited where they now live
+    collection, result = await tiered_db.test_results.locate({"id": result_id}, {"_id": 0})
     if not result:
         raise HTTPException(status_code=404, detail="Test result not found")
     
-    await db.test_results.update_one(
+    await collection.update_one(
         {"id": result_id},
         {"$set": {"score": score, "passed": passed}}
     )
@@ -4036,37 +4142,22 @@ async def super_admin_submit_test(data: SuperAdminTestSubmit, current_user: User
     if current_user.email != "arjuna@mddrc.com.my":
         raise HTTPException(status_code=403, detail="Only super admin can submit tests for participants")
     
-    test_doc = await db.tests.find_one({"id": data.test_id}, {"_id": 0})
-    if not test_doc:
+    test = await test_cache.get(db, data.test_id)
+    if not test:
         raise HTTPException(status_code=404, detail="Test not found")
     
-    program_doc = await db.programs.find_one({"id": test_doc['program_id']}, {"_id": 0})
-    pass_percentage = program_doc.get('pass_percentage', 70.0) if program_doc else 70.0
-    
-    questions = test_doc['questions']
+    await reject_archived_session_writes(data.session_id)
     
-    # Calculate correct answers from provided answers
-    correct = 0
-    for i, ans in enumerate(data.answers):
-        if i < len(questions):
-            submitted_answer = int(ans)
-            correct_answer = int(questions[i]['correct_answer'])
-            if submitted_answer == correct_answer:
-                correct += 1
-    
-    score = (correct / len(questions)) * 100 if questions else 0
-    passed = score >= pass_percentage
+    # Answers are entered in the original question order
+    grading = test.grade(data.answers)
     
     result_obj = TestResult(
         test_id=data.test_id,
         participant_id=data.participant_id,
         session_id=data.session_id,
-        test_type=test_doc['test_type'],
+        test_type=test.test_type,
         answers=data.answers,
-        score=score,
-        total_questions=len(questions),
-        correct_answers=correct,
-        passed=passed
+        **grading
     )
     
     doc = result_obj.model_dump()
@@ -4076,7 +4167,7 @@ async def super_admin_submit_test(data: SuperAdminTestSubmit, current_user: User
     existing = await db.test_results.find_one({
         "participant_id": data.participant_id,
         "session_id": data.session_id,
-        "test_type": test_doc['test_type']
+        "test_type": test.test_type
     })
     
     if existing:
@@ -4085,15 +4176,12 @@ async def super_admin_submit_test(data: SuperAdminTestSubmit, current_user: User
             {
                 "participant_id": data.participant_id,
                 "session_id": data.session_id,
-                "test_type": test_doc['test_type']
+                "test_type": test.test_type
             },
             {"$set": {
                 "test_id": data.test_id,
                 "answers": data.answers,
-                "score": score,
-                "total_questions": len(questions),
-                "correct_answers": correct,
-                "passed": passed,
+                **grading,
                 "submitted_at": doc['submitted_at']
             }}
         )
@@ -4101,13 +4189,16 @@ async def super_admin_submit_test(data: SuperAdminTestSubmit, current_user: User
         # Insert new test result
         await db.test_results.insert_one(doc)
     
-    update_field = 'pre_test_completed' if test_doc['test_type'] == 'pre' else 'post_test_completed'
+    update_field = 'pre_test_completed' if test.test_type == 'pre' else 'post_test_completed'
     await db.participant_access.update_one(
         {"participant_id": data.participant_id, "session_id": data.session_id},
         {"$set": {update_field: True}},
         upsert=True
     )
     
+    session_events.publish(data.session_id, "test.submitted", participant_id=data.participant_id,
+                           test_type=test.test_type, score=result_obj.score, passed=result_obj.passed)
+    
     return result_obj
 
 class SuperAdminClockIn(BaseModel):
@@ -4126,6 +4217,8 @@ async def super_admin_clock_in(data: SuperAdminClockIn, current_user: User = Dep
     if current_user.email != "arjuna@mddrc.com.my":
         raise HTTPException(status_code=403, detail="Only super admin can manage attendance")
     
+    await reject_archived_session_writes(data.session_id)
+    
     # Parse the datetime and convert to Malaysian timezone for consistency
     clock_in_dt = datetime.fromisoformat(data.clock_in.replace('Z', '+00:00'))
     # Convert to Malaysia timezone
@@ -4160,6 +4253,7 @@ async def super_admin_clock_in(data: SuperAdminClockIn, current_user: User = Dep
         doc['created_at'] = doc['created_at'].isoformat()
         await db.attendance.insert_one(doc)
     
+    session_events.publish(data.session_id, "attendance.clock_in", participant_id=data.participant_id, time=time_str)
     return {"message": "Attendance updated successfully"}
 
 @api_router.post("/super-admin/attendance/clock-out")
@@ -4168,6 +4262,8 @@ async def super_admin_clock_out(data: SuperAdminClockOut, current_user: User = D
     if current_user.email != "arjuna@mddrc.com.my":
         raise HTTPException(status_code=403, detail="Only super admin can manage attendance")
     
+    await reject_archived_session_writes(data.session_id)
+    
     # Parse the datetime and convert to Malaysian timezone for consistency
     clock_out_dt = datetime.fromisoformat(data.clock_out.replace('Z', '+00:00'))
     # Convert to Malaysia timezone
@@ -4187,6 +4283,7 @@ async def super_admin_clock_out(data: SuperAdminClockOut, current_user: User = D
             {"id": existing['id']},
             {"$set": {"clock_out": time_str}}
         )
+        session_events.publish(data.session_id, "attendance.clock_out", participant_id=data.participant_id, time=time_str)
         return {"message": "Attendance updated successfully"}
     else:
         raise HTTPException(status_code=404, detail="No clock-in record found. Please clock in first.")
@@ -4202,6 +4299,8 @@ async def super_admin_checklist_submit(data: SuperAdminChecklistSubmit, current_
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    await reject_archived_session_writes(data.session_id, session)
+    
     # For Super Admin, use standardized interval to match trainer submissions
     checklist_obj = VehicleChecklist(
         participant_id=data.participant_id,
@@ -4237,6 +4336,8 @@ async def super_admin_checklist_submit(data: SuperAdminChecklistSubmit, current_
         upsert=True
     )
     
+    session_events.publish(data.session_id, "checklist.submitted", participant_id=data.participant_id,
+                           verification_status="completed")
     return {"message": "Checklist submitted successfully"}
 
 @api_router.post("/super-admin/feedback/submit")
@@ -4250,6 +4351,8 @@ async def super_admin_feedback_submit(data: SuperAdminFeedbackSubmit, current_us
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    await reject_archived_session_writes(data.session_id, session)
+    
     program_id = session.get('program_id')
     if not program_id:
         raise HTTPException(status_code=400, detail="Session has no program_id")
@@ -4291,6 +4394,7 @@ async def super_admin_feedback_submit(data: SuperAdminFeedbackSubmit, current_us
         upsert=True
     )
     
+    session_events.publish(data.session_id, "feedback.submitted", participant_id=data.participant_id)
     return {"message": "Feedback submitted successfully"}
 
 @api_router.post("/super-admin/vehicle-details")
@@ -4299,6 +4403,8 @@ async def super_admin_vehicle_details(data: SuperAdminVehicleDetails, current_us
     if current_user.email != "arjuna@mddrc.com.my":
         raise HTTPException(status_code=403, detail="Only super admin can submit vehicle details")
     
+    await reject_archived_session_writes(data.session_id)
+    
     # Check if vehicle details already exist
     existing = await db.vehicle_details.find_one({
         "participant_id": data.participant_id,
@@ -4338,7 +4444,7 @@ async def get_session_test_results(session_id: str, current_user: User = Depends
     if current_user.role not in ["coordinator", "admin", "trainer"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    results = await db.test_results.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
+    results = await tiered_db.test_results.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
     
     for result in results:
         if isinstance(result.get('submitted_at'), str):
@@ -4348,7 +4454,7 @@ async def get_session_test_results(session_id: str, current_user: User = Depends
 
 @api_router.get("/tests/results/{result_id}")
 async def get_test_result_detail(result_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.test_results.find_one({"id": result_id}, {"_id": 0})
+    result = await tiered_db.test_results.find_one({"id": result_id}, {"_id": 0})
     if not result:
         raise HTTPException(status_code=404, detail="Test result not found")
     
@@ -4517,6 +4623,8 @@ async def submit_vehicle_details(vehicle_data: VehicleDetailsSubmit, current_use
     if current_user.role != "participant":
         raise HTTPException(status_code=403, detail="Only participants can submit vehicle details")
     
+    await reject_archived_session_writes(vehicle_data.session_id)
+    
     # Check if already exists
     existing = await db.vehicle_details.find_one({
         "participant_id": current_user.id,
@@ -4554,7 +4662,7 @@ async def submit_vehicle_details(vehicle_data: VehicleDetailsSubmit, current_use
 
 @api_router.get("/vehicle-details/{session_id}/{participant_id}")
 async def get_vehicle_details(session_id: str, participant_id: str, current_user: User = Depends(get_current_user)):
-    vehicle = await db.vehicle_details.find_one({
+    vehicle = await tiered_db.vehicle_details.find_one({
         "participant_id": participant_id,
         "session_id": session_id
     }, {"_id": 0})
@@ -4572,6 +4680,8 @@ async def clock_in(attendance_data: AttendanceClockIn, current_user: User = Depe
     if current_user.role != "participant":
         raise HTTPException(status_code=403, detail="Only participants can clock in")
     
+    await reject_archived_session_writes(attendance_data.session_id)
+    
     # Use Malaysian time
     today = get_malaysia_date().isoformat()
     now = get_malaysia_time_str()
@@ -4599,6 +4709,7 @@ async def clock_in(attendance_data: AttendanceClockIn, current_user: User = Depe
             {"id": existing_today['id']},
             {"$set": {"clock_in": now}}
         )
+        session_events.publish(attendance_data.session_id, "attendance.clock_in", participant_id=current_user.id, time=now)
         return {"message": "Clocked in successfully", "time": now}
     
     if existing_any:
@@ -4607,6 +4718,7 @@ async def clock_in(attendance_data: AttendanceClockIn, current_user: User = Depe
             {"id": existing_any['id']},
             {"$set": {"clock_in": now, "date": today}}
         )
+        session_events.publish(attendance_data.session_id, "attendance.clock_in", participant_id=current_user.id, time=now)
         return {"message": "Clocked in successfully", "time": now}
     
     # Create new record
@@ -4620,6 +4732,7 @@ async def clock_in(attendance_data: AttendanceClockIn, current_user: User = Depe
     doc = attendance_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.attendance.insert_one(doc)
+    session_events.publish(attendance_data.session_id, "attendance.clock_in", participant_id=current_user.id, time=now)
     
     return {"message": "Clocked in successfully", "time": now}
 
@@ -4628,6 +4741,8 @@ async def clock_out(attendance_data: AttendanceClockOut, current_user: User = De
     if current_user.role != "participant":
         raise HTTPException(status_code=403, detail="Only participants can clock out")
     
+    await reject_archived_session_writes(attendance_data.session_id)
+    
     # Use Malaysian time
     now = get_malaysia_time_str()
     
@@ -4649,6 +4764,7 @@ async def clock_out(attendance_data: AttendanceClockOut, current_user: User = De
         {"$set": {"clock_out": now}}
     )
     
+    session_events.publish(attendance_data.session_id, "attendance.clock_out", participant_id=current_user.id, time=now)
     return {"message": "Clocked out successfully", "time": now}
 
 @api_router.get("/attendance/session/{session_id}")
@@ -4665,7 +4781,7 @@ async def get_session_attendance(session_id: str, current_user: User = Depends(g
     # Get all attendance records for the session
     print(f"Querying attendance for session_id: {session_id}")
     logging.info(f"Querying attendance for session_id: {session_id}")
-    attendance_records = await db.attendance.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
+    attendance_records = await tiered_db.attendance.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
     print(f"Found {len(attendance_records)} attendance records")
     logging.info(f"Found {len(attendance_records)} attendance records")
     
@@ -4698,7 +4814,7 @@ async def get_session_attendance(session_id: str, current_user: User = Depends(g
 
 @api_router.get("/attendance/{session_id}/{participant_id}")
 async def get_attendance(session_id: str, participant_id: str, current_user: User = Depends(get_current_user)):
-    attendance_records = await db.attendance.find({
+    attendance_records = await tiered_db.attendance.find({
         "participant_id": participant_id,
         "session_id": session_id
     }, {"_id": 0}).to_list(100)
@@ -4723,7 +4839,7 @@ async def get_attendance(session_id: str, participant_id: str, current_user: Use
     # Get all attendance records for the session
     print(f"Querying attendance for session_id: {session_id}")
     logging.info(f"Querying attendance for session_id: {session_id}")
-    attendance_records = await db.attendance.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
+    attendance_records = await tiered_db.attendance.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
     print(f"Found {len(attendance_records)} attendance records")
     logging.info(f"Found {len(attendance_records)} attendance records")
     
@@ -4867,8 +4983,8 @@ async def get_all_training_reports(
         coordinator = await db.users.find_one({"id": report.get('coordinator_id')}, {"_id": 0})
         
         # Get company and program details
-        company = await db.companies.find_one({"id": session.get('company_id')}, {"_id": 0})
-        program = await db.programs.find_one({"id": session.get('program_id')}, {"_id": 0})
+        company = await reference_cache.lookup(db, "companies", session.get('company_id'))
+        program = await reference_cache.lookup(db, "programs", session.get('program_id'))
         
         # Get participant count
         participant_count = len(session.get('participant_ids', []))
@@ -4931,7 +5047,6 @@ async def generate_ai_report(session_id: str, current_user: User = Depends(get_c
     if current_user.role != "coordinator" and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only coordinators can generate reports")
     
-    from emergentintegrations.llm.chat import LlmChat, UserMessage, FileContentWithMimeType
     from dotenv import load_dotenv
     load_dotenv()
     
@@ -4941,20 +5056,20 @@ async def generate_ai_report(session_id: str, current_user: User = Depends(get_c
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Get program details
-    program = await db.programs.find_one({"id": session['program_id']}, {"_id": 0})
+    program = await reference_cache.lookup(db, "programs", session['program_id'])
     
     # Get company details
-    company = await db.companies.find_one({"id": session['company_id']}, {"_id": 0})
+    company = await reference_cache.lookup(db, "companies", session['company_id'])
     
     # Get participants count
     participant_count = len(session.get('participant_ids', []))
     
     # Get attendance records
-    attendance_records = await db.attendance.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
+    attendance_records = await tiered_db.attendance.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
     total_attendance = len(set([r['participant_id'] for r in attendance_records]))
     
     # Get test results
-    test_results = await db.test_results.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
+    test_results = await tiered_db.test_results.find({"session_id": session_id}, {"_id": 0}).to_list(1000)
     passed_tests = len([r for r in test_results if r.get('passed', False)])
     
     # Get training report with photos
@@ -5037,13 +5152,13 @@ Please generate this report professionally with proper formatting, specific deta
         if not api_key:
             raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
         
-        chat = LlmChat(
+        chat = llm_chat.LlmChat(
             api_key=api_key,
             session_id=f"report_{session_id}",
             system_message="You are a professional training report writer specializing in defensive driving and road safety training programs."
         ).with_model("openai", "gpt-4o")
         
-        user_message = UserMessage(text=context)
+        user_message = llm_chat.UserMessage(text=context)
         
         # Generate report
         ai_response = await chat.send_message(user_message)
@@ -5077,8 +5192,8 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        program = await db.programs.find_one({"id": session.get('program_id')}, {"_id": 0}) if session.get('program_id') else None
-        company = await db.companies.find_one({"id": session.get('company_id')}, {"_id": 0}) if session.get('company_id') else None
+        program = await reference_cache.lookup(db, "programs", session.get('program_id')) if session.get('program_id') else None
+        company = await reference_cache.lookup(db, "companies", session.get('company_id')) if session.get('company_id') else None
         
         # Validate required data
         if not program:
@@ -5093,13 +5208,13 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
             user = await db.users.find_one({"id": pid}, {"_id": 0})
             if user:
                 # Get pre and post test results
-                pre_test = await db.test_results.find_one({
+                pre_test = await tiered_db.test_results.find_one({
                     "participant_id": pid,
                     "session_id": session_id,
                     "test_type": "pre"
                 }, {"_id": 0})
                 
-                post_test = await db.test_results.find_one({
+                post_test = await tiered_db.test_results.find_one({
                     "participant_id": pid,
                     "session_id": session_id,
                     "test_type": "post"
@@ -5116,7 +5231,7 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
                 })
         
         # Get vehicle checklists with issues
-        checklists = await db.vehicle_checklists.find({"session_id": session_id}, {"_id": 0}).to_list(100)
+        checklists = await tiered_db.vehicle_checklists.find({"session_id": session_id}, {"_id": 0}).to_list(100)
         vehicle_issues = []
         for checklist in checklists:
             participant = await db.users.find_one({"id": checklist['participant_id']}, {"_id": 0})
@@ -5147,7 +5262,7 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
         }
         
         # Get participant feedback
-        all_feedback = await db.course_feedback.find({"session_id": session_id}, {"_id": 0}).to_list(100)
+        all_feedback = await tiered_db.course_feedback.find({"session_id": session_id}, {"_id": 0}).to_list(100)
         feedback_data = []
         for feedback in all_feedback:
             participant = await db.users.find_one({"id": feedback['participant_id']}, {"_id": 0})
@@ -5162,7 +5277,7 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
         is_truck = 'truck' in program_name_lower or 'lorry' in program_name_lower or 'heavy' in program_name_lower
         
         # Create DOCX document with enhanced formatting
-        doc = Document()
+        doc = docx.Document()
         
         # COVER PAGE
         title = doc.add_heading('DEFENSIVE DRIVING/RIDING TRAINING', 0)
@@ -5486,7 +5601,7 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
         doc.add_page_break()
         
         # Get chief trainer feedback before displaying
-        chief_trainer_feedback = await db.chief_trainer_feedback.find_one({"session_id": session_id}, {"_id": 0})
+        chief_trainer_feedback = await tiered_db.chief_trainer_feedback.find_one({"session_id": session_id}, {"_id": 0})
         
         # TRAINER FEEDBACK (Enhanced narrative)
         if chief_trainer_feedback:
@@ -5717,7 +5832,7 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
         
         # COORDINATOR FEEDBACK (Enhanced)
         doc.add_heading('11. COORDINATOR FEEDBACK', 1)
-        coordinator_feedback = await db.coordinator_feedback.find_one({"session_id": session_id}, {"_id": 0})
+        coordinator_feedback = await tiered_db.coordinator_feedback.find_one({"session_id": session_id}, {"_id": 0})
         if coordinator_feedback:
             doc.add_paragraph(
                 "The training coordinator provided comprehensive observations on logistics, participant engagement, "
@@ -5877,7 +5992,17 @@ async def generate_docx_report(session_id: str, current_user: User = Depends(get
                 for issue in vehicle_issue['issues']:
                     if issue['photo_url']:
                         doc.add_paragraph(f"• {issue['item']}")
-                        doc.add_paragraph(f"  [Photo URL: {issue['photo_url']}]")
+                        # Embed the downscaled display variant rather than the original upload
+                        photo_path = photo_variant_path(issue['photo_url'], 'display', CHECKLIST_PHOTOS_DIR)
+                        embedded = False
+                        if photo_path:
+                            try:
+                                doc.add_picture(str(photo_path), width=docx_shared.Inches(3))
+                                embedded = True
+                            except Exception as e:
+                                logging.warning(f"Could not embed checklist photo {photo_path}: {str(e)}")
+                        if not embedded:
+                            doc.add_paragraph(f"  [Photo URL: {issue['photo_url']}]")
                 doc.add_paragraph()
             doc.add_page_break()
         
@@ -6075,9 +6200,9 @@ async def upload_final_pdf_report(
         company = None
         if session:
             if session.get('program_id'):
-                program = await db.programs.find_one({"id": session['program_id']}, {"_id": 0})
+                program = await reference_cache.lookup(db, "programs", session['program_id'])
             if session.get('company_id'):
-                company = await db.companies.find_one({"id": session['company_id']}, {"_id": 0})
+                company = await reference_cache.lookup(db, "companies", session['company_id'])
         
         # Update database with submitted status
         await db.training_reports.update_one(
@@ -6203,33 +6328,26 @@ async def submit_final_report(session_id: str, current_user: User = Depends(get_
         )
         
         # Get session and create notifications for supervisor and admin
-        session = await db.sessions.find_one({"id": session_id}, {"_id": 0})
-        
-        # Notify supervisor
-        if session.get('supervisor_ids'):
-            for supervisor_id in session['supervisor_ids']:
-                await db.notifications.insert_one({
-                    "id": str(uuid.uuid4()),
-                    "user_id": supervisor_id,
-                    "type": "training_report_submitted",
-                    "message": f"Training report for {session.get('name')} has been submitted",
-                    "session_id": session_id,
-                    "read": False,
-                    "created_at": get_malaysia_time().isoformat()
-                })
+        session = await db.sessions.find_one({"id": session_id}, {"_id": 0, "name": 1, "supervisor_ids": 1}) or {}
+        
+        # Notify supervisors
+        await notify_users(
+            db,
+            session.get('supervisor_ids') or [],
+            "training_report_submitted",
+            f"Training report for {session.get('name')} has been submitted",
+            session_id=session_id
+        )
         
         # Notify all admins
-        admins = await db.users.find({"role": "admin"}, {"_id": 0}).to_list(100)
-        for admin in admins:
-            await db.notifications.insert_one({
-                "id": str(uuid.uuid4()),
-                "user_id": admin['id'],
-                "type": "training_report_submitted",
-                "message": f"Training report for {session.get('name')} has been submitted by {current_user.full_name}",
-                "session_id": session_id,
-                "read": False,
-                "created_at": get_malaysia_time().isoformat()
-            })
+        admins = await db.users.find({"role": "admin"}, {"_id": 0, "id": 1}).to_list(100)
+        await notify_users(
+            db,
+            [admin['id'] for admin in admins],
+            "training_report_submitted",
+            f"Training report for {session.get('name')} has been submitted by {current_user.full_name}",
+            session_id=session_id
+        )
         
         return {
             "message": "Report submitted successfully and PDF generated",
@@ -6274,6 +6392,8 @@ async def submit_trainer_checklist(checklist_data: TrainerChecklistSubmit, curre
     if current_user.role != "trainer":
         raise HTTPException(status_code=403, detail="Only trainers can submit checklists")
     
+    await reject_archived_session_writes(checklist_data.session_id)
+    
     # Create checklist
     checklist_obj = VehicleChecklist(
         participant_id=checklist_data.participant_id,
@@ -6328,6 +6448,8 @@ async def submit_trainer_checklist(checklist_data: TrainerChecklistSubmit, curre
                     }}
                 )
     
+    session_events.publish(checklist_data.session_id, "checklist.submitted", participant_id=checklist_data.participant_id,
+                           verification_status=checklist_obj.verification_status)
     return {"message": "Checklist submitted successfully", "checklist_id": checklist_obj.id}
 
 @api_router.get("/trainer-checklist/{session_id}/assigned-participants")
@@ -6455,7 +6577,7 @@ async def get_assigned_participants(session_id: str, current_user: User = Depend
             "session_id": session_id,
             "verified_by": current_user.id
         }, {"_id": 0})
-        participant['checklist'] = checklist
+        participant['checklist'] = add_photo_variant_urls(checklist) if checklist else None
         
         # Add attendance status for reference
         participant['clocked_in'] = participant['id'] in clocked_in_ids
@@ -6469,6 +6591,8 @@ async def submit_checklist(checklist_data: ChecklistSubmit, current_user: User =
     if current_user.role != "participant":
         raise HTTPException(status_code=403, detail="Only participants can submit checklists")
     
+    await reject_archived_session_writes(checklist_data.session_id)
+    
     checklist_obj = VehicleChecklist(
         participant_id=current_user.id,
         session_id=checklist_data.session_id,
@@ -6488,6 +6612,8 @@ async def submit_checklist(checklist_data: ChecklistSubmit, current_user: User =
         {"$set": {"checklist_submitted": True}}
     )
     
+    session_events.publish(checklist_data.session_id, "checklist.submitted", participant_id=current_user.id,
+                           verification_status=checklist_obj.verification_status)
     return checklist_obj
 
 @api_router.get("/checklists/participant/{participant_id}")
@@ -6497,7 +6623,7 @@ async def get_participant_checklists(participant_id: str, current_user: User = D
     if current_user.role not in ["trainer", "coordinator", "admin"] and current_user.id != participant_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    checklists = await db.vehicle_checklists.find({
+    checklists = await tiered_db.vehicle_checklists.find({
         "participant_id": participant_id
     }, {"_id": 0}).to_list(1000)
     
@@ -6515,7 +6641,7 @@ async def get_checklist(session_id: str, participant_id: str, current_user: User
     if current_user.role not in ["trainer", "coordinator", "admin"] and current_user.id != participant_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    checklist = await db.vehicle_checklists.find_one({
+    checklist = await tiered_db.vehicle_checklists.find_one({
         "participant_id": participant_id,
         "session_id": session_id
     }, {"_id": 0})
@@ -6528,7 +6654,7 @@ async def get_checklist(session_id: str, participant_id: str, current_user: User
     if checklist.get('verified_at') and isinstance(checklist['verified_at'], str):
         checklist['verified_at'] = datetime.fromisoformat(checklist['verified_at'])
     
-    return checklist
+    return add_photo_variant_urls(checklist)
 
 @api_router.get("/checklists/session/{session_id}")
 async def get_checklists_by_session(session_id: str, current_user: User = Depends(get_current_user)):
@@ -6537,7 +6663,7 @@ async def get_checklists_by_session(session_id: str, current_user: User = Depend
     if current_user.role not in ["trainer", "coordinator", "admin"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    checklists = await db.vehicle_checklists.find({
+    checklists = await tiered_db.vehicle_checklists.find({
         "session_id": session_id
     }, {"_id": 0}).to_list(1000)
     
@@ -6547,6 +6673,7 @@ async def get_checklists_by_session(session_id: str, current_user: User = Depend
             checklist['submitted_at'] = datetime.fromisoformat(checklist['submitted_at'])
         if checklist.get('verified_at') and isinstance(checklist['verified_at'], str):
             checklist['verified_at'] = datetime.fromisoformat(checklist['verified_at'])
+        add_photo_variant_urls(checklist)
     
     return checklists
 
@@ -6556,7 +6683,7 @@ async def get_participant_checklists(participant_id: str, current_user: User = D
     if current_user.role == "participant" and current_user.id != participant_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    checklists = await db.vehicle_checklists.find({"participant_id": participant_id}, {"_id": 0}).to_list(100)
+    checklists = await tiered_db.vehicle_checklists.find({"participant_id": participant_id}, {"_id": 0}).to_list(100)
     for checklist in checklists:
         if isinstance(checklist.get('submitted_at'), str):
             checklist['submitted_at'] = datetime.fromisoformat(checklist['submitted_at'])
@@ -6580,7 +6707,7 @@ async def verify_checklist(verification: ChecklistVerify, current_user: User = D
     if current_user.role != "supervisor" and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only supervisors can verify checklists")
     
-    result = await db.vehicle_checklists.update_one(
+    checklist = await db.vehicle_checklists.find_one_and_update(
         {"id": verification.checklist_id},
         {
             "$set": {
@@ -6588,11 +6715,16 @@ async def verify_checklist(verification: ChecklistVerify, current_user: User = D
                 "verified_by": current_user.id,
                 "verified_at": get_malaysia_time().isoformat()
             }
-        }
+        },
+        projection={"_id": 0, "session_id": 1, "participant_id": 1}
     )
     
-    if result.modified_count == 0:
+    if checklist is None:
+        if await db.archive_vehicle_checklists.find_one({"id": verification.checklist_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="This session's records are archived and can no longer be changed")
         raise HTTPException(status_code=404, detail="Checklist not found")
+    session_events.publish(checklist.get("session_id"), "checklist.verified",
+                           participant_id=checklist.get("participant_id"), verification_status=verification.status)
     
     return {"message": "Checklist verified successfully"}
 
@@ -6679,6 +6811,8 @@ async def submit_feedback(feedback_data: FeedbackSubmit, current_user: User = De
     if current_user.role != "participant":
         raise HTTPException(status_code=403, detail="Only participants can submit feedback")
     
+    await reject_archived_session_writes(feedback_data.session_id)
+    
     # Check if feedback already exists for this participant and session
     existing_feedback = await db.course_feedback.find_one({
         "participant_id": current_user.id,
@@ -6708,6 +6842,7 @@ async def submit_feedback(feedback_data: FeedbackSubmit, current_user: User = De
         upsert=True
     )
     
+    session_events.publish(feedback_data.session_id, "feedback.submitted", participant_id=current_user.id)
     return feedback_obj
 
 @api_router.get("/feedback/session/{session_id}", response_model=List[CourseFeedback])
@@ -6715,7 +6850,7 @@ async def get_session_feedback(session_id: str, current_user: User = Depends(get
     if current_user.role not in ["admin", "supervisor", "coordinator", "trainer"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    feedback = await db.course_feedback.find({"session_id": session_id}, {"_id": 0}).to_list(100)
+    feedback = await tiered_db.course_feedback.find({"session_id": session_id}, {"_id": 0}).to_list(100)
     for fb in feedback:
         if isinstance(fb.get('submitted_at'), str):
             fb['submitted_at'] = datetime.fromisoformat(fb['submitted_at'])
@@ -6729,7 +6864,7 @@ async def get_company_feedback(company_id: str, current_user: User = Depends(get
     sessions = await db.sessions.find({"company_id": company_id}, {"_id": 0}).to_list(1000)
     session_ids = [s['id'] for s in sessions]
     
-    feedback = await db.course_feedback.find({"session_id": {"$in": session_ids}}, {"_id": 0}).to_list(1000)
+    feedback = await tiered_db.course_feedback.find({"session_id": {"$in": session_ids}}, {"_id": 0}).to_list(1000)
     for fb in feedback:
         if isinstance(fb.get('submitted_at'), str):
             fb['submitted_at'] = datetime.fromisoformat(fb['submitted_at'])
@@ -6823,6 +6958,8 @@ async def submit_coordinator_feedback(
     if current_user.role not in ["coordinator", "admin"]:
         raise HTTPException(status_code=403, detail="Only coordinators and admins can submit coordinator feedback")
     
+    await reject_archived_session_writes(session_id)
+    
     # Check if feedback already exists
     existing = await db.coordinator_feedback.find_one({"session_id": session_id}, {"_id": 0})
     
@@ -6851,7 +6988,7 @@ async def submit_coordinator_feedback(
 @api_router.get("/coordinator-feedback/{session_id}")
 async def get_coordinator_feedback(session_id: str, current_user: User = Depends(get_current_user)):
     """Get coordinator feedback for a session"""
-    feedback = await db.coordinator_feedback.find_one({"session_id": session_id}, {"_id": 0})
+    feedback = await tiered_db.coordinator_feedback.find_one({"session_id": session_id}, {"_id": 0})
     if not feedback:
         return None
     return feedback
@@ -6867,6 +7004,8 @@ async def submit_chief_trainer_feedback(
     if current_user.role not in ["chief_trainer", "trainer", "admin"]:
         raise HTTPException(status_code=403, detail="Only trainers and admins can submit chief trainer feedback")
     
+    await reject_archived_session_writes(session_id)
+    
     # Check if feedback already exists
     existing = await db.chief_trainer_feedback.find_one({"session_id": session_id}, {"_id": 0})
     
@@ -6895,7 +7034,7 @@ async def submit_chief_trainer_feedback(
 @api_router.get("/chief-trainer-feedback/{session_id}")
 async def get_chief_trainer_feedback(session_id: str, current_user: User = Depends(get_current_user)):
     """Get chief trainer feedback for a session"""
-    feedback = await db.chief_trainer_feedback.find_one({"session_id": session_id}, {"_id": 0})
+    feedback = await tiered_db.chief_trainer_feedback.find_one({"session_id": session_id}, {"_id": 0})
     if not feedback:
         return None
     return feedback
@@ -7025,6 +7164,8 @@ async def upload_participant_certificate(
     elif current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only coordinators and admins can upload certificates")
     
+    await reject_archived_session_writes(session_id)
+    
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted")
@@ -7084,7 +7225,7 @@ async def get_session_certificates(session_id: str, current_user: User = Depends
         raise HTTPException(status_code=403, detail="Only admins and coordinators can access certificates")
     
     # Get all participant access records for this session that have certificates
-    access_records = await db.participant_access.find(
+    access_records = await tiered_db.participant_access.find(
         {
             "session_id": session_id,
             "certificate_url": {"$exists": True, "$ne": None}
@@ -7129,7 +7270,7 @@ async def download_participant_certificate(
         raise HTTPException(status_code=403, detail="Certificate access is not available. Session is not active.")
     
     # Get participant access
-    access = await db.participant_access.find_one(
+    access = await tiered_db.participant_access.find_one(
         {"participant_id": participant_id, "session_id": session_id},
         {"_id": 0}
     )
@@ -7153,7 +7294,7 @@ async def download_participant_certificate(
             )
         
         # Check if clocked out
-        attendance = await db.attendance.find_one(
+        attendance = await tiered_db.attendance.find_one(
             {
                 "participant_id": participant_id,
                 "session_id": session_id,
@@ -7204,7 +7345,7 @@ async def check_certificate_eligibility(
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Get participant access
-    access = await db.participant_access.find_one(
+    access = await tiered_db.participant_access.find_one(
         {"participant_id": participant_id, "session_id": session_id},
         {"_id": 0}
     )
@@ -7214,7 +7355,7 @@ async def check_certificate_eligibility(
     feedback_submitted = bool(access and access.get('feedback_submitted', False))
     
     # Check clock out
-    attendance = await db.attendance.find_one(
+    attendance = await tiered_db.attendance.find_one(
         {
             "participant_id": participant_id,
             "session_id": session_id,
@@ -7248,7 +7389,7 @@ async def get_certificates_repository(current_user: User = Depends(get_current_u
         raise HTTPException(status_code=403, detail="Only admins can access certificate repository")
     
     # Get all participant access records that have certificates
-    certificates = await db.participant_access.find(
+    certificates = await tiered_db.participant_access.find(
         {"certificate_url": {"$exists": True, "$ne": None}},
         {"_id": 0}
     ).to_list(length=None)
@@ -7269,12 +7410,12 @@ async def get_certificates_repository(current_user: User = Depends(get_current_u
         # Get program details if session has program_id
         program = None
         if session and session.get('program_id'):
-            program = await db.programs.find_one({"id": session['program_id']}, {"_id": 0})
+            program = await reference_cache.lookup(db, "programs", session['program_id'])
         
         # Get company details if session has company_id
         company = None
         if session and session.get('company_id'):
-            company = await db.companies.find_one({"id": session['company_id']}, {"_id": 0})
+            company = await reference_cache.lookup(db, "companies", session['company_id'])
         
         enriched_certificates.append({
             "certificate_url": cert.get('certificate_url'),
@@ -7307,7 +7448,7 @@ async def generate_certificate(session_id: str, participant_id: str, current_use
         raise HTTPException(status_code=403, detail="Unauthorized")
     
     # Check if feedback is submitted (required for certificate)
-    access = await db.participant_access.find_one(
+    access = await tiered_db.participant_access.find_one(
         {"participant_id": participant_id, "session_id": session_id},
         {"_id": 0}
     )
@@ -7330,11 +7471,11 @@ async def generate_certificate(session_id: str, participant_id: str, current_use
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Get program details
-    program = await db.programs.find_one({"id": session['program_id']}, {"_id": 0})
+    program = await reference_cache.lookup(db, "programs", session['program_id'])
     program_name = program['name'] if program else "Training Program"
     
     # Get company details
-    company = await db.companies.find_one({"id": session['company_id']}, {"_id": 0})
+    company = await reference_cache.lookup(db, "companies", session['company_id'])
     company_name = company['name'] if company else ""
     
     # Get settings for company name (already in template, no replacement needed)
@@ -7345,7 +7486,7 @@ async def generate_certificate(session_id: str, participant_id: str, current_use
         raise HTTPException(status_code=404, detail="Certificate template not found. Please upload a template first.")
     
     # Create document from template
-    doc = Document(template_path)
+    doc = docx.Document(template_path)
     
     # Replace placeholders in paragraphs
     replacements = {
@@ -7489,11 +7630,9 @@ async def preview_certificate(certificate_id: str, current_user: User = Depends(
 
 # Static files
 @api_router.get("/static/logos/{filename}")
-async def get_logo(filename: str):
-    file_path = LOGO_DIR / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Logo not found")
-    return FileResponse(file_path)
+async def get_logo(filename: str, request: Request):
+    file_path = resolve_static_path(LOGO_DIR, filename)
+    return await serve_static_file(request, file_path, not_found_detail="Logo not found")
 
 @api_router.get("/static/certificates/{filename}")
 async def get_certificate(filename: str):
@@ -7503,13 +7642,13 @@ async def get_certificate(filename: str):
     return FileResponse(file_path)
 
 @api_router.get("/static/certificates_pdf/{filename}")
-async def get_certificate_pdf(filename: str):
-    file_path = CERTIFICATE_PDF_DIR / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Certificate PDF not found")
-    return FileResponse(
-        file_path, 
+async def get_certificate_pdf(filename: str, request: Request):
+    file_path = resolve_static_path(CERTIFICATE_PDF_DIR, filename)
+    return await serve_static_file(
+        request,
+        file_path,
         media_type='application/pdf',
+        not_found_detail="Certificate PDF not found",
         headers={
             "Content-Disposition": f"attachment; filename={filename}",
             "Access-Control-Allow-Origin": "*",
@@ -7530,27 +7669,21 @@ async def upload_checklist_photo(file: UploadFile = File(...), current_user: Use
     if current_user.role != "trainer":
         raise HTTPException(status_code=403, detail="Only trainers can upload checklist photos")
     
-    if not file.content_type.startswith('image/'):
+    if not file.content_type or not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="Only image files are allowed")
     
-    # Generate unique filename
-    file_extension = file.filename.split('.')[-1]
-    filename = f"{str(uuid.uuid4())}.{file_extension}"
-    file_path = CHECKLIST_PHOTOS_DIR / filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    photo_url = f"/api/static/checklist-photos/{filename}"
-    return {"photo_url": photo_url}
+    # Stored under its content hash; re-uploads of the same photo are deduplicated
+    photo = await ingest_photo(file, CHECKLIST_PHOTOS_DIR)
+    return {
+        "photo_url": photo["photo_url"],
+        "display_url": photo["display_url"],
+        "thumb_url": photo["thumb_url"]
+    }
 
 @api_router.get("/static/checklist-photos/{filename}")
-async def get_checklist_photo(filename: str):
-    file_path = CHECKLIST_PHOTOS_DIR / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Photo not found")
-    return FileResponse(file_path)
+async def get_checklist_photo(filename: str, request: Request):
+    file_path = stored_photo_path(resolve_static_path(CHECKLIST_PHOTOS_DIR, filename))
+    return await serve_static_file(request, file_path, not_found_detail="Photo not found")
 
 # ============ AI REPORT GENERATION ============
 
@@ -7559,8 +7692,8 @@ async def generate_training_report_content(session_id: str, program_id: str, com
     
     # Gather all data
     session = await db.sessions.find_one({"id": session_id}, {"_id": 0})
-    program = await db.programs.find_one({"id": program_id}, {"_id": 0})
-    company = await db.companies.find_one({"id": company_id}, {"_id": 0})
+    program = await reference_cache.lookup(db, "programs", program_id)
+    company = await reference_cache.lookup(db, "companies", company_id)
     
     # Get all participants
     participant_ids = session.get('participant_ids', [])
@@ -7571,29 +7704,29 @@ async def generate_training_report_content(session_id: str, program_id: str, com
             participants.append(user)
     
     # Get pre-test results
-    pre_tests = await db.test_results.find({
+    pre_tests = await tiered_db.test_results.find({
         "session_id": session_id,
         "test_type": "pre"
     }, {"_id": 0}).to_list(100)
     
     # Get post-test results
-    post_tests = await db.test_results.find({
+    post_tests = await tiered_db.test_results.find({
         "session_id": session_id,
         "test_type": "post"
     }, {"_id": 0}).to_list(100)
     
     # Get checklists
-    checklists = await db.vehicle_checklists.find({
+    checklists = await tiered_db.vehicle_checklists.find({
         "session_id": session_id
     }, {"_id": 0}).to_list(100)
     
     # Get feedback
-    feedbacks = await db.course_feedback.find({
+    feedbacks = await tiered_db.course_feedback.find({
         "session_id": session_id
     }, {"_id": 0}).to_list(100)
     
     # Get attendance
-    attendance = await db.attendance_records.find({
+    attendance = await tiered_db.attendance_records.find({
         "session_id": session_id
     }, {"_id": 0}).to_list(100)
     
@@ -7733,13 +7866,13 @@ ABSOLUTE CRITICAL RULES FOR VEHICLE INSPECTION SECTION:
         if not api_key:
             raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
         
-        chat = LlmChat(
+        chat = llm_chat.LlmChat(
             api_key=api_key,
             session_id=f"report_gen_{uuid.uuid4().hex[:8]}",
             system_message="You are a professional training report writer specializing in defensive driving and road safety training programs."
         ).with_model("openai", "gpt-4o")
         
-        user_message = UserMessage(text=prompt)
+        user_message = llm_chat.UserMessage(text=prompt)
         response = await chat.send_message(user_message)
         
         return response
@@ -7871,13 +8004,18 @@ async def get_supervisor_session_attendance(session_id: str, current_user: User
         raise HTTPException(status_code=403, detail="Unauthorized")
     
     # Get attendance records
-    attendance = await db.attendance.find({
+    attendance = await tiered_db.attendance.find({
         "session_id": session_id
     }, {"_id": 0}).to_list(100)
     
-    # Get participant details
+    # Get participant details in one query
+    participant_ids = list({record['participant_id'] for record in attendance})
+    participants = await db.users.find(
+        {"id": {"$in": participant_ids}}, {"_id": 0, "id": 1, "full_name": 1, "email": 1}
+    ).to_list(None) if participant_ids else []
+    participant_map = {p['id']: p for p in participants}
     for record in attendance:
-        participant = await db.users.find_one({"id": record['participant_id']}, {"_id": 0, "password": 0})
+        participant = participant_map.get(record['participant_id'])
         if participant:
             record['participant_name'] = participant.get('full_name', 'Unknown')
             record['participant_email'] = participant.get('email', '')
@@ -7948,26 +8086,28 @@ async def generate_credit_note_number():
 # Audit logging for finance
 async def log_finance_action(entity_type: str, entity_id: str, action: str, 
                              changed_by: str, before_value: dict = None, 
-                             after_value: dict = None, reason: str = None):
+                             after_value: dict = None, reason: str = None,
+                             changed_by_name: str = None):
     log_entry = {
         "id": str(uuid.uuid4()),
         "entity_type": entity_type,
         "entity_id": entity_id,
         "action": action,
-        "before_value": before_value,
-        "after_value": after_value,
+        "changes": field_diff(before_value, after_value),
         "changed_by": changed_by,
+        "changed_by_name": changed_by_name,
         "reason": reason,
         "timestamp": get_malaysia_time().isoformat()
     }
-    await db.finance_audit_log.insert_one(log_entry)
+    await audit_writer.write(db, "finance_audit_log", log_entry)
 
 # Auto-create invoice when session is created
-async def create_auto_invoice_for_session(session_data: dict, created_by: str):
+async def build_auto_invoice(session_data: dict) -> dict:
+    """Draft invoice document for a new session (not yet inserted)"""
     invoice_number = await generate_invoice_number()
     
-    company = await db.companies.find_one({"id": session_data.get("company_id")}, {"_id": 0})
-    programme = await db.programs.find_one({"id": session_data.get("program_id")}, {"_id": 0})
+    company = await reference_cache.lookup(db, "companies", session_data.get("company_id"))
+    programme = await reference_cache.lookup(db, "programs", session_data.get("program_id"))
     
     invoice = {
         "id": str(uuid.uuid4()),
@@ -7989,18 +8129,7 @@ async def create_auto_invoice_for_session(session_data: dict, created_by: str):
         "updated_at": get_malaysia_time().isoformat(),
         "version": 1
     }
-    
-    await db.invoices.insert_one(invoice)
-    
-    await log_finance_action(
-        entity_type="invoice",
-        entity_id=invoice["id"],
-        action="created",
-        changed_by=created_by,
-        after_value=invoice
-    )
-    
-    return invoice
+    return with_period("invoices", invoice)
 
 # ============ FINANCE API ENDPOINTS ============
 
@@ -8009,43 +8138,22 @@ async def get_invoices(
     status: Optional[str] = None,
     company_id: Optional[str] = None,
     year: Optional[int] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get all invoices with optional year filter"""
     if current_user.role not in ["admin", "super_admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    query = {}
+    query = period_filter(year)
     if status:
         query["status"] = status
     if company_id:
         query["company_id"] = company_id
     
-    # Get all invoices first, then filter by year in Python for consistent date handling
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Filter by year if specified - handle both string and datetime formats
-    if year:
-        def get_invoice_year(inv):
-            # First try invoice_date, then created_at
-            date_val = inv.get("invoice_date") or inv.get("created_at")
-            if not date_val:
-                return None
-            if isinstance(date_val, str):
-                try:
-                    return datetime.fromisoformat(date_val.replace('Z', '+00:00')).year
-                except:
-                    # Try parsing just the year from YYYY-MM-DD format
-                    try:
-                        return int(date_val[:4])
-                    except:
-                        return None
-            elif hasattr(date_val, 'year'):
-                return date_val.year
-            return None
-        
-        invoices = [inv for inv in invoices if get_invoice_year(inv) == year]
-    
+    selected = parse_fields(fields)
+    projection = {"_id": 0} if selected is None else field_projection(selected)
+    invoices = await db.invoices.find(query, projection).sort("created_at", -1).to_list(1000)
     return invoices
 
 # MUST be before /finance/invoices/{invoice_id} to avoid route conflict
@@ -8062,14 +8170,14 @@ async def export_invoices(
     if status:
         query["status"] = status
     
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("created_at", 1).to_list(10000)
+    invoices = await report_db.invoices.find(query, {"_id": 0}).sort("created_at", 1).to_list(10000)
     
     # Get all payments for payment status
-    payments = await db.payments.find({}, {"_id": 0}).to_list(10000)
+    payments = await report_db.payments.find({}, {"_id": 0}).to_list(10000)
     payment_by_invoice = {p.get("invoice_id"): p for p in payments}
     
     # Get all credit notes
-    credit_notes = await db.credit_notes.find({}, {"_id": 0}).to_list(10000)
+    credit_notes = await report_db.credit_notes.find({}, {"_id": 0}).to_list(10000)
     cn_by_invoice = {}
     for cn in credit_notes:
         inv_id = cn.get("invoice_id")
@@ -8148,13 +8256,16 @@ async def update_invoice(
     
     await db.invoices.update_one({"id": invoice_id}, {"$set": update_dict})
     
+    if "total_amount" in update_dict or "status" in update_dict:
+        await refresh_invoice_balance(db, invoice_id)
+    
     if "status" in update_dict:
         await db.sessions.update_one(
             {"invoice_id": invoice_id},
             {"$set": {"invoice_status": update_dict["status"]}}
         )
     
-    await log_finance_action("invoice", invoice_id, "updated", current_user.id, before_value, update_dict)
+    await log_finance_action("invoice", invoice_id, "updated", current_user.id, before_value, update_dict, changed_by_name=current_user.full_name)
     
     return await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
 
@@ -8183,7 +8294,7 @@ async def approve_invoice(invoice_id: str, current_user: User = Depends(get_curr
     
     await db.sessions.update_one({"invoice_id": invoice_id}, {"$set": {"invoice_status": "approved"}})
     await log_finance_action("invoice", invoice_id, "status_changed", current_user.id, 
-                            {"status": invoice.get("status")}, {"status": "approved"})
+                            {"status": invoice.get("status")}, {"status": "approved"}, changed_by_name=current_user.full_name)
     
     return {"message": "Invoice approved successfully"}
 
@@ -8212,6 +8323,9 @@ async def issue_invoice(invoice_id: str, current_user: User = Depends(get_curren
     
     await db.sessions.update_one({"invoice_id": invoice_id}, {"$set": {"invoice_status": "issued"}})
     
+    # Start the maintained receivable balance
+    await refresh_invoice_balance(db, invoice_id)
+    
     # Calculate marketing commission when invoice is issued
     session = await db.sessions.find_one({"invoice_id": invoice_id}, {"_id": 0})
     if session and session.get("marketing_user_id"):
@@ -8227,13 +8341,14 @@ async def issue_invoice(invoice_id: str, current_user: User = Depends(get_curren
                 "calculated_amount": commission_amount,
                 "invoice_id": invoice_id,
                 "status": "approved",
-                "updated_at": get_malaysia_time().isoformat()
+                "updated_at": get_malaysia_time().isoformat(),
+                **period_fields(session.get("start_date"))
             }},
             upsert=True
         )
     
     await log_finance_action("invoice", invoice_id, "status_changed", current_user.id,
-                            {"status": invoice.get("status")}, {"status": "issued"})
+                            {"status": invoice.get("status")}, {"status": "issued"}, changed_by_name=current_user.full_name)
     
     return {"message": "Invoice issued successfully"}
 
@@ -8254,13 +8369,14 @@ async def cancel_invoice(invoice_id: str, reason: str = "", current_user: User =
             "cancelled_by": current_user.id,
             "cancelled_at": get_malaysia_time().isoformat(),
             "cancellation_reason": reason,
+            "outstanding": 0.0,
             "updated_at": get_malaysia_time().isoformat()
         }}
     )
     
     await db.sessions.update_one({"invoice_id": invoice_id}, {"$set": {"invoice_status": "cancelled"}})
     await log_finance_action("invoice", invoice_id, "status_changed", current_user.id,
-                            {"status": invoice.get("status")}, {"status": "cancelled", "reason": reason}, reason)
+                            {"status": invoice.get("status")}, {"status": "cancelled", "reason": reason}, reason, changed_by_name=current_user.full_name)
     
     return {"message": "Invoice cancelled successfully"}
 
@@ -8305,8 +8421,8 @@ async def create_credit_note(cn_data: dict, current_user: User = Depends(get_cur
         "updated_at": now.isoformat()
     }
     
-    await db.credit_notes.insert_one(credit_note)
-    await log_finance_action("credit_note", credit_note["id"], "created", current_user.id, after_value=credit_note)
+    await db.credit_notes.insert_one(with_period("credit_notes", credit_note))
+    await log_finance_action("credit_note", credit_note["id"], "created", current_user.id, after_value=credit_note, changed_by_name=current_user.full_name)
     
     return {"message": "Credit note created", "cn_number": cn_number, "id": credit_note["id"]}
 
@@ -8340,7 +8456,8 @@ async def update_credit_note(cn_id: str, update_data: dict, current_user: User =
     update_dict["updated_at"] = get_malaysia_time().isoformat()
     
     await db.credit_notes.update_one({"id": cn_id}, {"$set": update_dict})
-    await log_finance_action("credit_note", cn_id, "updated", current_user.id, credit_note, update_dict)
+    await apply_credit_note_change(db, credit_note, {**credit_note, **update_dict})
+    await log_finance_action("credit_note", cn_id, "updated", current_user.id, credit_note, update_dict, changed_by_name=current_user.full_name)
     
     return await db.credit_notes.find_one({"id": cn_id}, {"_id": 0})
 
@@ -8366,7 +8483,8 @@ async def approve_credit_note(cn_id: str, current_user: User = Depends(get_curre
     }
     
     await db.credit_notes.update_one({"id": cn_id}, {"$set": update_dict})
-    await log_finance_action("credit_note", cn_id, "approved", current_user.id, credit_note, update_dict)
+    await apply_credit_note_change(db, credit_note, {**credit_note, **update_dict})
+    await log_finance_action("credit_note", cn_id, "approved", current_user.id, credit_note, update_dict, changed_by_name=current_user.full_name)
     
     return {"message": "Credit note approved", "cn_number": credit_note.get("cn_number")}
 
@@ -8392,7 +8510,8 @@ async def issue_credit_note(cn_id: str, current_user: User = Depends(get_current
     }
     
     await db.credit_notes.update_one({"id": cn_id}, {"$set": update_dict})
-    await log_finance_action("credit_note", cn_id, "issued", current_user.id, credit_note, update_dict)
+    await apply_credit_note_change(db, credit_note, {**credit_note, **update_dict})
+    await log_finance_action("credit_note", cn_id, "issued", current_user.id, credit_note, update_dict, changed_by_name=current_user.full_name)
     
     return {"message": "Credit note issued", "cn_number": credit_note.get("cn_number")}
 
@@ -8467,6 +8586,7 @@ async def backdate_credit_note(
         {"$set": {
             "created_at": new_datetime.isoformat(),
             "cn_date": request.new_date,
+            **period_fields(new_datetime),
             "updated_at": get_malaysia_time().isoformat()
         }}
     )
@@ -8536,6 +8656,7 @@ async def edit_credit_note_admin(
     
     # Update the credit note
     await db.credit_notes.update_one({"id": cn_id}, {"$set": update_dict})
+    await apply_credit_note_change(db, credit_note, {**credit_note, **update_dict})
     
     return {"message": "Credit note updated successfully", "changes": len(changes)}
 
@@ -8586,6 +8707,7 @@ async def void_credit_note(
             "updated_at": get_malaysia_time().isoformat()
         }}
     )
+    await apply_credit_note_change(db, credit_note, {**credit_note, "status": "voided"})
     
     return {"message": "Credit note voided successfully"}
 
@@ -8658,7 +8780,7 @@ async def create_session_credit_note(session_id: str, cn_data: dict, current_use
     invoice = await db.invoices.find_one({"session_id": session_id}, {"_id": 0})
     
     # Get company info
-    company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+    company = await reference_cache.lookup(db, "companies", session.get("company_id"))
     
     # Calculate CN amount
     percentage = float(cn_data.get("percentage", 4))  # Default 4% for HRDCorp
@@ -8688,8 +8810,8 @@ async def create_session_credit_note(session_id: str, cn_data: dict, current_use
         "updated_at": now.isoformat()
     }
     
-    await db.credit_notes.insert_one(credit_note)
-    await log_finance_action("credit_note", credit_note["id"], "created", current_user.id, after_value=credit_note)
+    await db.credit_notes.insert_one(with_period("credit_notes", credit_note))
+    await log_finance_action("credit_note", credit_note["id"], "created", current_user.id, after_value=credit_note, changed_by_name=current_user.full_name)
     
     return {"message": "Credit note created", "cn_number": cn_number, "id": credit_note["id"], "amount": cn_amount}
 
@@ -8701,13 +8823,18 @@ async def get_payments(current_user: User = Depends(get_current_user)):
     
     payments = await db.payments.find({}, {"_id": 0}).sort("payment_date", -1).to_list(100)
     
-    # Enrich with invoice info
+    # Enrich with invoice info in one query
+    invoice_ids = list({p["invoice_id"] for p in payments if p.get("invoice_id")})
+    invoices = await db.invoices.find(
+        {"id": {"$in": invoice_ids}},
+        {"_id": 0, "id": 1, "invoice_number": 1, "company_name": 1}
+    ).to_list(None) if invoice_ids else []
+    invoice_map = {inv["id"]: inv for inv in invoices}
     for payment in payments:
-        if payment.get("invoice_id"):
-            invoice = await db.invoices.find_one({"id": payment["invoice_id"]}, {"_id": 0, "invoice_number": 1, "company_name": 1})
-            if invoice:
-                payment["invoice_number"] = invoice.get("invoice_number")
-                payment["company_name"] = invoice.get("company_name")
+        invoice = invoice_map.get(payment.get("invoice_id"))
+        if invoice:
+            payment["invoice_number"] = invoice.get("invoice_number")
+            payment["company_name"] = invoice.get("company_name")
     
     return payments
 
@@ -8732,27 +8859,31 @@ async def record_payment(payment_data: PaymentCreate, current_user: User = Depen
         "payment_method": payment_data.payment_method,
         "reference_number": payment_data.reference_number,
         "notes": payment_data.notes,
+        "receipt_number": await next_receipt_number(db),
         "recorded_by": current_user.id,
         "created_at": get_malaysia_time().isoformat()
     }
     
-    await db.payments.insert_one(payment)
+    await db.payments.insert_one(with_period("payments", payment))
     
     # Remove MongoDB _id if present (not JSON serializable)
     payment.pop("_id", None)
     
-    # Check if fully paid
-    all_payments = await db.payments.find({"invoice_id": payment_data.invoice_id}, {"_id": 0}).to_list(100)
-    total_paid = sum(p.get("amount", 0) for p in all_payments)
-    
-    if total_paid >= invoice.get("total_amount", 0):
-        await db.invoices.update_one({"id": payment_data.invoice_id}, {"$set": {"status": "paid", "updated_at": get_malaysia_time().isoformat()}})
-        await db.sessions.update_one({"invoice_id": payment_data.invoice_id}, {"$set": {"invoice_status": "paid"}})
+    # Flips the invoice to paid once nothing is outstanding
+    await adjust_invoice_balance(db, payment_data.invoice_id, paid_delta=payment_data.amount)
     
-    await log_finance_action("payment", payment["id"], "created", current_user.id, after_value=payment)
+    await log_finance_action("payment", payment["id"], "created", current_user.id, after_value=payment, changed_by_name=current_user.full_name)
     
     return payment
 
+@api_router.get("/finance/receivables/aging")
+async def get_receivables_aging(company_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Outstanding receivables per billing party and company in 0-30/31-60/61-90/90+ day buckets"""
+    if current_user.role not in ["admin", "super_admin", "finance"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return await receivables_aging(db, company_id=company_id)
+
 # Company Settings APIs
 @api_router.get("/finance/company-settings")
 async def get_company_settings(current_user: User = Depends(get_current_user)):
@@ -8760,11 +8891,13 @@ async def get_company_settings(current_user: User = Depends(get_current_user)):
     if current_user.role not in ["admin", "super_admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    settings = await db.company_settings.find_one({"id": "company_settings"}, {"_id": 0})
+    settings = await reference_cache.company_settings(db)
     if not settings:
         # Return default settings
         settings = CompanySettings().model_dump()
         await db.company_settings.insert_one(settings)
+        settings.pop("_id", None)
+        await reference_cache.invalidate(db, "company_settings")
     
     return settings
 
@@ -8777,12 +8910,16 @@ async def update_company_settings(settings_data: dict, current_user: User = Depe
     settings_data["updated_at"] = get_malaysia_time().isoformat()
     settings_data["updated_by"] = current_user.id
     settings_data["id"] = "company_settings"
+    settings_data.pop("_id", None)
+    settings_data.pop("version", None)
     
+    # The version invalidates receipt PDFs rendered with the old settings
     await db.company_settings.update_one(
         {"id": "company_settings"},
-        {"$set": settings_data},
+        {"$set": settings_data, "$inc": {"version": 1}},
         upsert=True
     )
+    await reference_cache.invalidate(db, "company_settings")
     
     return {"message": "Settings updated successfully"}
 
@@ -8825,9 +8962,10 @@ async def upload_company_logo(file: UploadFile = File(...), current_user: User =
             "logo_filename": file.filename,
             "updated_at": get_malaysia_time().isoformat(),
             "updated_by": current_user.id
-        }},
+        }, "$inc": {"version": 1}},
         upsert=True
     )
+    await reference_cache.invalidate(db, "company_settings")
     
     return {
         "message": "Logo uploaded successfully",
@@ -8837,11 +8975,9 @@ async def upload_company_logo(file: UploadFile = File(...), current_user: User =
 
 # Serve uploaded company files (logo, etc.)
 @api_router.get("/uploads/company/{filename}")
-async def get_company_file(filename: str):
+async def get_company_file(filename: str, request: Request):
     """Serve uploaded company files"""
-    file_path = f"uploads/company/{filename}"
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
+    file_path = resolve_static_path("uploads/company", filename)
     
     # Determine content type based on extension
     ext = os.path.splitext(filename)[1].lower()
@@ -8854,7 +8990,12 @@ async def get_company_file(filename: str):
     }
     content_type = content_types.get(ext, 'application/octet-stream')
     
-    return FileResponse(file_path, media_type=content_type, filename=filename)
+    return await serve_static_file(
+        request,
+        file_path,
+        media_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # Upload custom indemnity form PDF
 @api_router.post("/finance/company-settings/upload-indemnity-form")
@@ -8896,6 +9037,7 @@ async def upload_indemnity_form(file: UploadFile = File(...), current_user: User
         }},
         upsert=True
     )
+    await reference_cache.invalidate(db, "company_settings")
     
     return {
         "message": "Indemnity form uploaded successfully",
@@ -8937,15 +9079,12 @@ async def get_receipt_data(payment_id: str, current_user: User = Depends(get_cur
         raise HTTPException(status_code=404, detail="Invoice not found")
     
     # Get company settings
-    settings = await db.company_settings.find_one({"id": "company_settings"}, {"_id": 0})
+    settings = await reference_cache.company_settings(db)
     if not settings:
         settings = CompanySettings().model_dump()
     
-    # Generate receipt number
-    receipt_count = await db.payments.count_documents({})
-    year = get_malaysia_time().year
-    month = get_malaysia_time().month
-    receipt_number = f"RCP/{year}/{month:02d}/{receipt_count:04d}"
+    # Assigned when the payment was recorded; older payments get one on first view
+    receipt_number = await ensure_receipt_number(db, payment)
     
     return {
         "receipt_number": receipt_number,
@@ -8954,6 +9093,72 @@ async def get_receipt_data(payment_id: str, current_user: User = Depends(get_cur
         "company_settings": settings
     }
 
+def company_logo_path(settings: dict) -> Optional[Path]:
+    """Local file behind the company logo URL, if it is one we serve"""
+    logo_url = settings.get("logo_url") or ""
+    try:
+        if logo_url.startswith("/api/uploads/company/"):
+            return resolve_static_path("uploads/company", logo_url.rsplit("/", 1)[-1])
+        if logo_url.startswith("/api/static/logos/"):
+            return resolve_static_path(LOGO_DIR, logo_url.rsplit("/", 1)[-1])
+    except HTTPException:
+        pass
+    return None
+
+@api_router.get("/finance/payments/{payment_id}/receipt/pdf")
+async def download_receipt_pdf(payment_id: str, current_user: User = Depends(get_current_user)):
+    """Download the official receipt PDF (rendered once, then served from disk)"""
+    if current_user.role not in ["admin", "super_admin", "finance"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    payment = await db.payments.find_one({"id": payment_id}, {"_id": 0})
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    
+    invoice = await db.invoices.find_one({"id": payment.get("invoice_id")}, {"_id": 0})
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    settings = await reference_cache.company_settings(db)
+    if not settings:
+        settings = CompanySettings().model_dump()
+    
+    await ensure_receipt_number(db, payment)
+    pdf_path = await get_receipt_pdf(payment, invoice, settings, RECEIPT_DIR, company_logo_path(settings))
+    return FileResponse(pdf_path, media_type="application/pdf", filename=receipt_filename(payment))
+
+@api_router.get("/finance/receipts/bulk")
+async def download_month_receipts(year: int, month: int, current_user: User = Depends(get_current_user)):
+    """Download a ZIP of every receipt numbered in the given month"""
+    if current_user.role not in ["admin", "super_admin", "finance"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+    
+    prefix = receipt_number_prefix(year, month)
+    payments = await db.payments.find(
+        {"receipt_number": {"$regex": f"^{re.escape(prefix)}"}}, {"_id": 0}
+    ).sort("receipt_number", 1).to_list(None)
+    if not payments:
+        raise HTTPException(status_code=404, detail="No receipts for this month")
+    
+    invoice_ids = list({p["invoice_id"] for p in payments if p.get("invoice_id")})
+    invoices = await db.invoices.find({"id": {"$in": invoice_ids}}, {"_id": 0}).to_list(None)
+    
+    settings = await reference_cache.company_settings(db)
+    if not settings:
+        settings = CompanySettings().model_dump()
+    
+    content = await build_receipts_zip(
+        payments, {inv["id"]: inv for inv in invoices}, settings, RECEIPT_DIR, company_logo_path(settings)
+    )
+    return Response(
+        content=content,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="receipts_{year}_{month:02d}.zip"'}
+    )
+
 # Session Payables Report (Course Registration Form style)
 @api_router.get("/finance/session/{session_id}/payables-report")
 async def get_session_payables_report(session_id: str, current_user: User = Depends(get_current_user)):
@@ -8967,10 +9172,10 @@ async def get_session_payables_report(session_id: str, current_user: User = Depe
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Get company
-    company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0})
+    company = await reference_cache.lookup(db, "companies", session.get("company_id"))
     
     # Get program
-    program = await db.programs.find_one({"id": session.get("program_id")}, {"_id": 0})
+    program = await reference_cache.lookup(db, "programs", session.get("program_id"))
     
     # Get participants count
     participant_count = len(session.get("participant_ids", []))
@@ -9100,7 +9305,7 @@ async def get_trainer_income(trainer_id: str, current_user: User = Depends(get_c
             record["start_date"] = session.get("start_date")  # For filtering
             # Get company name
             if session.get("company_id"):
-                company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+                company = await reference_cache.lookup(db, "companies", session.get("company_id"))
                 record["company_name"] = company.get("name") if company else None
             record["amount"] = record.get("fee_amount", 0)  # Map fee_amount to amount for consistency
             valid_records.append(record)
@@ -9135,7 +9340,7 @@ async def get_coordinator_income(coordinator_id: str, current_user: User = Depen
             record["training_dates"] = f"{session.get('start_date')} to {session.get('end_date')}"
             record["start_date"] = session.get("start_date")  # For filtering
             # Get company name
-            company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+            company = await reference_cache.lookup(db, "companies", session.get("company_id"))
             record["company_name"] = company.get("name") if company else None
             record["amount"] = record.get("total_fee", 0)  # Map total_fee to amount for consistency
             valid_records.append(record)
@@ -9170,7 +9375,7 @@ async def get_marketing_income(marketing_id: str, current_user: User = Depends(g
             record["session_name"] = session.get("name")
             record["training_dates"] = f"{session.get('start_date')} to {session.get('end_date')}"
             record["start_date"] = session.get("start_date")  # For filtering
-            company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+            company = await reference_cache.lookup(db, "companies", session.get("company_id"))
             record["company_name"] = company.get("name") if company else None
             valid_records.append(record)
         else:
@@ -9202,30 +9407,10 @@ async def get_finance_dashboard(year: Optional[int] = None, current_user: User =
     if current_user.role not in ["admin", "super_admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Helper function to extract year from date value
-    def get_date_year(date_val):
-        if not date_val:
-            return None
-        if isinstance(date_val, str):
-            try:
-                return datetime.fromisoformat(date_val.replace('Z', '+00:00')).year
-            except:
-                try:
-                    return int(date_val[:4])
-                except:
-                    return None
-        elif hasattr(date_val, 'year'):
-            return date_val.year
-        return None
-    
-    # Get all invoices and filter in Python for consistent date handling
-    all_invoices_raw = await db.invoices.find({}, {"_id": 0}).to_list(5000)
-    
-    # Filter by year if specified
-    if year:
-        invoices_for_year = [inv for inv in all_invoices_raw if get_date_year(inv.get("invoice_date") or inv.get("created_at")) == year]
-    else:
-        invoices_for_year = all_invoices_raw
+    year_query = period_filter(year)
+    invoices_for_year = await report_db.invoices.find(
+        year_query, {"_id": 0, "status": 1, "total_amount": 1, "paid_amount": 1, "outstanding": 1}
+    ).to_list(5000)
     
     # Invoice counts
     total_invoices = len(invoices_for_year)
@@ -9237,34 +9422,26 @@ async def get_finance_dashboard(year: Optional[int] = None, current_user: User =
     # Financial totals
     financial_invoices = [inv for inv in invoices_for_year if inv.get("status") in ["issued", "paid"]]
     total_issued_amount = sum(inv.get("total_amount", 0) for inv in financial_invoices)
-    total_collected = sum(inv.get("total_amount", 0) for inv in financial_invoices if inv.get("status") == "paid")
-    
-    # Payables with year filter (based on created_at)
-    pending_trainer_all = await db.trainer_fees.find({"status": {"$ne": "paid"}}, {"_id": 0, "fee_amount": 1, "created_at": 1, "session_start_date": 1}).to_list(1000)
-    pending_coord_all = await db.coordinator_fees.find({"status": {"$ne": "paid"}}, {"_id": 0, "total_fee": 1, "created_at": 1, "session_start_date": 1}).to_list(1000)
-    pending_comm_all = await db.marketing_commissions.find({"status": {"$in": ["pending", "approved"]}}, {"_id": 0, "calculated_amount": 1, "created_at": 1, "session_start_date": 1}).to_list(1000)
+    # Payments received, not the total of invoices a credit note may have settled
+    total_collected = round(sum(collected_amount(inv) for inv in financial_invoices), 2)
+    # Partially paid and credited invoices count only their maintained outstanding balance
+    outstanding_receivables = sum(
+        inv.get("outstanding", inv.get("total_amount", 0)) for inv in financial_invoices if inv.get("status") == "issued"
+    )
     
-    if year:
-        pending_trainer = [r for r in pending_trainer_all if get_date_year(r.get("session_start_date") or r.get("created_at")) == year]
-        pending_coord = [r for r in pending_coord_all if get_date_year(r.get("session_start_date") or r.get("created_at")) == year]
-        pending_comm = [r for r in pending_comm_all if get_date_year(r.get("session_start_date") or r.get("created_at")) == year]
-    else:
-        pending_trainer = pending_trainer_all
-        pending_coord = pending_coord_all
-        pending_comm = pending_comm_all
+    # Payables with year filter (booked in the session's start month)
+    pending_trainer = await report_db.trainer_fees.find({**year_query, "status": {"$ne": "paid"}}, {"_id": 0, "fee_amount": 1}).to_list(1000)
+    pending_coord = await report_db.coordinator_fees.find({**year_query, "status": {"$ne": "paid"}}, {"_id": 0, "total_fee": 1}).to_list(1000)
+    pending_comm = await report_db.marketing_commissions.find({**year_query, "status": {"$in": ["pending", "approved"]}}, {"_id": 0, "calculated_amount": 1}).to_list(1000)
     
     total_pending = sum(r.get("fee_amount", 0) for r in pending_trainer) + sum(r.get("total_fee", 0) for r in pending_coord) + sum(r.get("calculated_amount", 0) for r in pending_comm)
     
     # Get available years for the dropdown
-    available_years = set()
-    for inv in all_invoices_raw:
-        inv_year = get_date_year(inv.get("invoice_date") or inv.get("created_at"))
-        if inv_year:
-            available_years.add(inv_year)
+    available_years = {y for y in await report_db.invoices.distinct("period_year") if y}
     
     return {
         "invoices": {"total": total_invoices, "draft": draft_invoices, "approved": approved_invoices, "issued": issued_invoices, "paid": paid_invoices},
-        "financials": {"total_issued": total_issued_amount, "total_collected": total_collected, "outstanding_receivables": total_issued_amount - total_collected},
+        "financials": {"total_issued": total_issued_amount, "total_collected": total_collected, "outstanding_receivables": round(outstanding_receivables, 2)},
         "payables": {"pending_total": total_pending},
         "available_years": sorted(list(available_years), reverse=True),
         "selected_year": year
@@ -9282,22 +9459,32 @@ async def get_audit_log(entity_type: Optional[str] = None, entity_id: Optional[s
     if entity_id:
         query["entity_id"] = entity_id
     
+    await audit_writer.flush()
     logs = await db.finance_audit_log.find(query, {"_id": 0}).sort("timestamp", -1).to_list(limit)
     
-    # Enrich with user names and ensure serializable
+    # Entries carry the actor's name; older ones are resolved in one query
+    missing_names = {log.get("changed_by") for log in logs if not log.get("changed_by_name")}
+    user_names = {}
+    if missing_names:
+        users = await db.users.find({"id": {"$in": list(missing_names)}}, {"_id": 0, "id": 1, "full_name": 1}).to_list(None)
+        user_names = {u["id"]: u.get("full_name") for u in users}
+    
     result = []
     for log in logs:
-        user = await db.users.find_one({"id": log.get("changed_by")}, {"_id": 0, "full_name": 1})
+        if "changes" in log:
+            before_value, after_value = split_diff(log["changes"])
+        else:
+            before_value, after_value = log.get("before_value"), log.get("after_value")
         log_dict = {
             "id": log.get("id"),
             "entity_type": log.get("entity_type"),
             "entity_id": log.get("entity_id"),
             "action": log.get("action"),
             "changed_by": log.get("changed_by"),
-            "changed_by_name": user.get("full_name") if user else "Unknown",
+            "changed_by_name": log.get("changed_by_name") or user_names.get(log.get("changed_by")) or "Unknown",
             "timestamp": log.get("timestamp"),
-            "before_value": str(log.get("before_value", "")) if log.get("before_value") else None,
-            "after_value": str(log.get("after_value", "")) if log.get("after_value") else None,
+            "before_value": str(before_value) if before_value else None,
+            "after_value": str(after_value) if after_value else None,
             "remark": log.get("remark")
         }
         result.append(log_dict)
@@ -9315,7 +9502,7 @@ async def mark_trainer_paid(record_id: str, current_user: User = Depends(get_cur
         raise HTTPException(status_code=404, detail="Record not found")
     
     await db.trainer_income.update_one({"id": record_id}, {"$set": {"status": "paid", "paid_date": get_malaysia_time().strftime("%Y-%m-%d"), "paid_by": current_user.id}})
-    await log_finance_action("trainer_income", record_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"})
+    await log_finance_action("trainer_income", record_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"}, changed_by_name=current_user.full_name)
     
     return {"message": "Marked as paid"}
 
@@ -9330,7 +9517,7 @@ async def mark_coordinator_paid(record_id: str, current_user: User = Depends(get
         raise HTTPException(status_code=404, detail="Record not found")
     
     await db.coordinator_fees.update_one({"id": record_id}, {"$set": {"status": "paid", "paid_date": get_malaysia_time().strftime("%Y-%m-%d"), "paid_by": current_user.id}})
-    await log_finance_action("coordinator_fee", record_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"})
+    await log_finance_action("coordinator_fee", record_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"}, changed_by_name=current_user.full_name)
     
     return {"message": "Marked as paid"}
 
@@ -9345,7 +9532,7 @@ async def mark_commission_paid(record_id: str, current_user: User = Depends(get_
         raise HTTPException(status_code=404, detail="Record not found")
     
     await db.marketing_commissions.update_one({"id": record_id}, {"$set": {"status": "paid", "paid_date": get_malaysia_time().strftime("%Y-%m-%d"), "paid_by": current_user.id, "updated_at": get_malaysia_time().isoformat()}})
-    await log_finance_action("marketing_commission", record_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"})
+    await log_finance_action("marketing_commission", record_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"}, changed_by_name=current_user.full_name)
     
     return {"message": "Marked as paid"}
 
@@ -9360,7 +9547,7 @@ async def mark_trainer_fee_paid(fee_id: str, current_user: User = Depends(get_cu
         raise HTTPException(status_code=404, detail="Fee record not found")
     
     await db.trainer_fees.update_one({"id": fee_id}, {"$set": {"status": "paid", "paid_date": get_malaysia_time().strftime("%Y-%m-%d"), "paid_by": current_user.id, "updated_at": get_malaysia_time().isoformat()}})
-    await log_finance_action("trainer_fee", fee_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"})
+    await log_finance_action("trainer_fee", fee_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"}, changed_by_name=current_user.full_name)
     
     return {"message": "Trainer fee marked as paid"}
 
@@ -9375,7 +9562,7 @@ async def mark_coordinator_fee_paid(fee_id: str, current_user: User = Depends(ge
         raise HTTPException(status_code=404, detail="Fee record not found")
     
     await db.coordinator_fees.update_one({"id": fee_id}, {"$set": {"status": "paid", "paid_date": get_malaysia_time().strftime("%Y-%m-%d"), "paid_by": current_user.id, "updated_at": get_malaysia_time().isoformat()}})
-    await log_finance_action("coordinator_fee", fee_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"})
+    await log_finance_action("coordinator_fee", fee_id, "status_changed", current_user.id, {"status": record.get("status")}, {"status": "paid"}, changed_by_name=current_user.full_name)
     
     return {"message": "Coordinator fee marked as paid"}
 
@@ -9503,150 +9690,83 @@ async def export_payables_excel(year: int, month: int, current_user: User = Depe
     if current_user.role not in ["admin", "super_admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Define date range for the month
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = datetime(year, month + 1, 1) - timedelta(days=1)
-    end_date = end_date.replace(hour=23, minute=59, second=59)
+    # Fees and commissions carry the period of their session's start date
+    month_query = period_filter(year, month)
+    trainer_fees = await db.trainer_fees.find(month_query, {"_id": 0}).to_list(1000)
+    coord_fees = await db.coordinator_fees.find(month_query, {"_id": 0}).to_list(1000)
+    mkt_comm = await db.marketing_commissions.find(month_query, {"_id": 0}).to_list(1000)
+    
+    session_ids = list({r.get("session_id") for r in trainer_fees + coord_fees + mkt_comm if r.get("session_id")})
+    sessions = await db.sessions.find(
+        {"id": {"$in": session_ids}}, {"_id": 0, "id": 1, "name": 1, "start_date": 1, "company_id": 1}
+    ).to_list(None)
+    session_map = {s["id"]: s for s in sessions}
+    company_ids = list({s.get("company_id") for s in sessions if s.get("company_id")})
+    companies = await db.companies.find({"id": {"$in": company_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    company_map = {c["id"]: c.get("name") for c in companies}
+    invoices = await db.invoices.find(
+        {"session_id": {"$in": session_ids}}, {"_id": 0, "session_id": 1, "invoice_number": 1}
+    ).to_list(None)
+    invoice_map = {inv["session_id"]: inv.get("invoice_number") for inv in invoices}
     
     # Collect all payables from all sources
     payables_data = []
     
-    # 1. Trainer fees - get from same endpoint trainers see
-    trainer_fees = await db.trainer_fees.find({}, {"_id": 0}).to_list(1000)
+    def payable_row(record, name, position, amount, payable_type):
+        session = session_map[record["session_id"]]
+        return {
+            "name": name,
+            "invoice_number": invoice_map.get(record["session_id"]) or "-",
+            "training_date": session.get("start_date"),
+            "position": position,
+            "company": company_map.get(session.get("company_id")) or "-",
+            "details": session.get("name", "-"),
+            "amount": amount,
+            "status": record.get("status", "pending"),
+            "type": payable_type
+        }
+    
+    # 1. Trainer fees
     for fee in trainer_fees:
-        # Get session info
-        session = await db.sessions.find_one({"id": fee.get("session_id")}, {"_id": 0, "name": 1, "start_date": 1, "company_id": 1})
-        if not session:
-            continue
-        
-        # Check if session is in the target month
-        session_date = session.get("start_date")
-        if session_date:
-            try:
-                if isinstance(session_date, str):
-                    session_dt = datetime.fromisoformat(session_date.replace('Z', '+00:00'))
-                else:
-                    session_dt = session_date
-                if session_dt.year != year or session_dt.month != month:
-                    continue
-            except:
-                continue
-        else:
+        if fee.get("session_id") not in session_map:
             continue
-        
-        # Get company info
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
-        company_name = company.get("name") if company else "-"
-        
-        # Get invoice info
-        invoice = await db.invoices.find_one({"session_id": fee.get("session_id")}, {"_id": 0, "invoice_number": 1})
-        invoice_number = invoice.get("invoice_number") if invoice else "-"
-        
-        payables_data.append({
-            "name": fee.get("trainer_name", "Unknown").upper(),
-            "invoice_number": invoice_number,
-            "training_date": session_date,
-            "position": fee.get("trainer_role", "Trainer").title(),
-            "company": company_name,
-            "details": session.get("name", "-"),
-            "amount": fee.get("fee_amount", 0),
-            "status": fee.get("status", "pending"),
-            "type": "trainer"
-        })
+        payables_data.append(payable_row(
+            fee, fee.get("trainer_name", "Unknown").upper(), fee.get("trainer_role", "Trainer").title(),
+            fee.get("fee_amount", 0), "trainer"
+        ))
     
     # 2. Coordinator fees
-    coord_fees = await db.coordinator_fees.find({}, {"_id": 0}).to_list(1000)
     for fee in coord_fees:
-        session = await db.sessions.find_one({"id": fee.get("session_id")}, {"_id": 0, "name": 1, "start_date": 1, "company_id": 1})
-        if not session:
-            continue
-        
-        session_date = session.get("start_date")
-        if session_date:
-            try:
-                if isinstance(session_date, str):
-                    session_dt = datetime.fromisoformat(session_date.replace('Z', '+00:00'))
-                else:
-                    session_dt = session_date
-                if session_dt.year != year or session_dt.month != month:
-                    continue
-            except:
-                continue
-        else:
+        if fee.get("session_id") not in session_map:
             continue
-        
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
-        company_name = company.get("name") if company else "-"
-        
-        invoice = await db.invoices.find_one({"session_id": fee.get("session_id")}, {"_id": 0, "invoice_number": 1})
-        invoice_number = invoice.get("invoice_number") if invoice else "-"
-        
-        payables_data.append({
-            "name": fee.get("coordinator_name", "Unknown").upper(),
-            "invoice_number": invoice_number,
-            "training_date": session_date,
-            "position": "Coordinator",
-            "company": company_name,
-            "details": session.get("name", "-"),
-            "amount": fee.get("total_fee", 0),
-            "status": fee.get("status", "pending"),
-            "type": "coordinator"
-        })
+        payables_data.append(payable_row(
+            fee, fee.get("coordinator_name", "Unknown").upper(), "Coordinator", fee.get("total_fee", 0), "coordinator"
+        ))
     
     # 3. Marketing commissions
-    mkt_comm = await db.marketing_commissions.find({}, {"_id": 0}).to_list(1000)
+    missing_names = [
+        c.get("marketing_user_id") or c.get("user_id") for c in mkt_comm
+        if not (c.get("marketer_name") or c.get("user_name")) or (c.get("marketer_name") or c.get("user_name")) == "Unknown"
+    ]
+    marketers = await db.users.find(
+        {"id": {"$in": [uid for uid in missing_names if uid]}}, {"_id": 0, "id": 1, "full_name": 1}
+    ).to_list(None) if missing_names else []
+    marketer_map = {u["id"]: u.get("full_name", "Unknown") for u in marketers}
     for comm in mkt_comm:
-        session = await db.sessions.find_one({"id": comm.get("session_id")}, {"_id": 0, "name": 1, "start_date": 1, "company_id": 1})
-        if not session:
-            continue
-        
-        session_date = session.get("start_date")
-        if session_date:
-            try:
-                if isinstance(session_date, str):
-                    session_dt = datetime.fromisoformat(session_date.replace('Z', '+00:00'))
-                else:
-                    session_dt = session_date
-                if session_dt.year != year or session_dt.month != month:
-                    continue
-            except:
-                continue
-        else:
+        if comm.get("session_id") not in session_map:
             continue
         
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
-        company_name = company.get("name") if company else "-"
-        
-        invoice = await db.invoices.find_one({"session_id": comm.get("session_id")}, {"_id": 0, "invoice_number": 1})
-        invoice_number = invoice.get("invoice_number") if invoice else "-"
-        
         # Get marketer name - try multiple fields
         marketer_name = comm.get("marketer_name") or comm.get("user_name")
         if not marketer_name or marketer_name == "Unknown":
-            # Look up from marketing_user_id
-            mkt_user_id = comm.get("marketing_user_id") or comm.get("user_id")
-            if mkt_user_id:
-                mkt_user = await db.users.find_one({"id": mkt_user_id}, {"_id": 0, "full_name": 1})
-                if mkt_user:
-                    marketer_name = mkt_user.get("full_name", "Unknown")
-        
-        payables_data.append({
-            "name": (marketer_name or "Unknown").upper(),
-            "invoice_number": invoice_number,
-            "training_date": session_date,
-            "position": "Marketing",
-            "company": company_name,
-            "details": session.get("name", "-"),
-            "amount": comm.get("calculated_amount", 0),
-            "status": comm.get("status", "pending"),
-            "type": "marketing"
-        })
+            marketer_name = marketer_map.get(comm.get("marketing_user_id") or comm.get("user_id"), marketer_name)
+        
+        payables_data.append(payable_row(
+            comm, (marketer_name or "Unknown").upper(), "Marketing", comm.get("calculated_amount", 0), "marketing"
+        ))
     
     # Sort by name, then by date
-    payables_data.sort(key=lambda x: (x["name"], x.get("training_date", "")))
+    payables_data.sort(key=lambda x: (x["name"], x.get("training_date") or ""))
     
     # Group by name and calculate totals
     grouped_data = {}
@@ -9869,7 +9989,7 @@ async def get_session_costing(session_id: str, current_user: User = Depends(get_
     profit_percentage = (final_profit / gross_revenue * 100) if gross_revenue > 0 else 0
     
     # Get company name
-    company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+    company = await reference_cache.lookup(db, "companies", session.get("company_id"))
     
     # Calculate headcount for F&B (participants + trainers + coordinator)
     trainer_count = len(session.get("trainer_assignments", []))
@@ -9935,11 +10055,12 @@ async def save_session_invoice(session_id: str, invoice_data: dict, current_user
             "updated_at": now.isoformat()
         }
         await db.invoices.update_one({"id": existing["id"]}, {"$set": update_dict})
+        await refresh_invoice_balance(db, existing["id"])
         return {"message": "Invoice updated", "invoice_id": existing["id"]}
     else:
         # Create new invoice
         invoice_number = await generate_invoice_number()
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+        company = await reference_cache.lookup(db, "companies", session.get("company_id"))
         
         invoice = {
             "id": str(uuid.uuid4()),
@@ -9959,7 +10080,7 @@ async def save_session_invoice(session_id: str, invoice_data: dict, current_user
             "updated_at": now.isoformat(),
             "created_by": current_user.id
         }
-        await db.invoices.insert_one(invoice)
+        await db.invoices.insert_one(with_period("invoices", invoice))
         return {"message": "Invoice created", "invoice_id": invoice["id"], "invoice_number": invoice_number}
 
 @api_router.post("/finance/session/{session_id}/trainer-fees")
@@ -9987,6 +10108,7 @@ async def save_trainer_fees(session_id: str, fees: List[dict], current_user: Use
         }
         await db.trainer_fees.insert_one(fee_record)
     
+    await stamp_session_periods(db, session_id)
     return {"message": f"Saved {len(fees)} trainer fees"}
 
 @api_router.post("/finance/session/{session_id}/coordinator-fee")
@@ -10025,7 +10147,8 @@ async def save_coordinator_fee(session_id: str, fee_data: dict, current_user: Us
             "daily_rate": daily_rate,
             "total_fee": total_fee,
             "status": "pending",
-            "created_at": get_malaysia_time().isoformat()
+            "created_at": get_malaysia_time().isoformat(),
+            **period_fields(session.get("start_date"))
         }},
         upsert=True
     )
@@ -10079,6 +10202,7 @@ async def save_session_expenses(session_id: str, expenses: List[dict], current_u
             }
             await db.session_expenses.insert_one(expense_record)
     
+    await stamp_session_periods(db, session_id)
     return {"message": f"Saved {len(expenses)} expenses"}
 
 @api_router.delete("/finance/session/{session_id}/expense/{expense_id}")
@@ -10179,7 +10303,8 @@ async def save_marketing_commission(session_id: str, marketing_data: dict, curre
             "session_start_date": session.get("start_date") if session else None,
             "invoice_id": session.get("invoice_id") if session else None,
             "status": "pending",
-            "updated_at": get_malaysia_time().isoformat()
+            "updated_at": get_malaysia_time().isoformat(),
+            **period_fields(session.get("start_date") if session else None)
         }},
         upsert=True
     )
@@ -10287,7 +10412,7 @@ async def create_audit_trail_entry(
         "reason": reason,
         "timestamp": get_malaysia_time().isoformat()
     }
-    await db.audit_trail.insert_one(entry)
+    await audit_writer.write(db, "audit_trail", entry)
     return entry
 
 # Edit Invoice Number
@@ -10412,6 +10537,7 @@ async def void_invoice(
             "voided_by": current_user.id,
             "voided_at": get_malaysia_time().isoformat(),
             "void_reason": request.reason,
+            "outstanding": 0.0,
             "updated_at": get_malaysia_time().isoformat()
         }}
     )
@@ -10481,6 +10607,8 @@ async def edit_paid_invoice(
     
     # Update the invoice
     await db.invoices.update_one({"id": invoice_id}, {"$set": update_data})
+    if "total_amount" in update_data:
+        await refresh_invoice_balance(db, invoice_id)
     
     return {"message": "Paid invoice updated successfully", "changes": changes}
 
@@ -10527,16 +10655,12 @@ async def delete_payment(
     
     # Delete the payment
     await db.payments.delete_one({"id": payment_id})
+    for cached_receipt in RECEIPT_DIR.glob(f"{payment_id}.*.pdf"):
+        cached_receipt.unlink(missing_ok=True)
     
-    # Update invoice status if it was paid
-    if invoice and invoice.get("status") == "paid":
-        # Check if there are other payments for this invoice
-        remaining_payments = await db.payments.count_documents({"invoice_id": invoice["id"]})
-        if remaining_payments == 0:
-            await db.invoices.update_one(
-                {"id": invoice["id"]},
-                {"$set": {"status": "issued", "updated_at": get_malaysia_time().isoformat()}}
-            )
+    # Restore the outstanding balance; reopens a paid invoice that is now short
+    if invoice:
+        await adjust_invoice_balance(db, invoice["id"], paid_delta=-(payment.get("amount") or 0))
     
     return {"message": "Payment deleted successfully"}
 
@@ -10602,6 +10726,7 @@ async def backdate_invoice(
         {"$set": {
             "created_at": new_datetime.isoformat(),
             "invoice_date": request.new_date,
+            **period_fields(new_datetime),
             "updated_at": get_malaysia_time().isoformat()
         }}
     )
@@ -10700,6 +10825,7 @@ async def get_admin_audit_trail(
         else:
             query["timestamp"] = {"$lte": end_date + "T23:59:59"}
     
+    await audit_writer.flush()
     logs = await db.audit_trail.find(query, {"_id": 0}).sort("timestamp", -1).to_list(limit)
     
     return logs
@@ -10728,6 +10854,7 @@ async def export_audit_trail(
         else:
             query["timestamp"] = {"$lte": end_date + "T23:59:59"}
     
+    await audit_writer.flush()
     logs = await db.audit_trail.find(query, {"_id": 0}).sort("timestamp", -1).to_list(5000)
     
     # Create Excel workbook
@@ -10797,664 +10924,71 @@ async def export_audit_trail(
 # ============ EXCEL TEMPLATES FOR BULK UPLOAD ============
 
 @api_router.get("/templates/pre-post-assessment")
-async def download_assessment_template(current_user: User = Depends(get_current_user)):
+async def download_assessment_template(request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for Pre/Post Assessment bulk upload"""
     if current_user.role not in ["admin", "trainer", "assistant_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Pre-Post Assessment"
-    
-    # Headers
-    headers = [
-        "participant_ic",          # Required - IC number to identify participant
-        "participant_name",        # Optional - for reference
-        "test_type",              # Required - "pre" or "post"
-        "correct_answers",        # Required - number of correct answers
-        "total_questions",        # Required - total number of questions
-        "score_percentage",       # Auto-calculated - for reference only
-        "passed",                 # Auto-calculated - for reference only
-        "session_name",           # Optional - for reference
-        "notes"                   # Optional - any additional notes
-    ]
-    ws.append(headers)
-    
-    # Style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.fill = openpyxl.styles.PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-    
-    # Sample data rows
-    sample_data = [
-        ["871128385485", "Ahmad Bin Ali", "pre", 36, 40, "=D2/E2*100", "=IF(F2>=70,\"PASS\",\"FAIL\")", "KONE Training Session", "Morning batch"],
-        ["880215143265", "Siti Binti Hassan", "pre", 28, 40, "=D3/E3*100", "=IF(F3>=70,\"PASS\",\"FAIL\")", "KONE Training Session", ""],
-        ["871128385485", "Ahmad Bin Ali", "post", 38, 40, "=D4/E4*100", "=IF(F4>=70,\"PASS\",\"FAIL\")", "KONE Training Session", "Improved from pre-test"],
-        ["880215143265", "Siti Binti Hassan", "post", 35, 40, "=D5/E5*100", "=IF(F5>=70,\"PASS\",\"FAIL\")", "KONE Training Session", ""],
-    ]
-    
-    for row in sample_data:
-        ws.append(row)
-    
-    # Instructions sheet
-    ws_inst = wb.create_sheet("Instructions")
-    instructions = [
-        ["PRE/POST ASSESSMENT BULK UPLOAD TEMPLATE"],
-        [""],
-        ["REQUIRED COLUMNS:"],
-        ["participant_ic", "IC Number of participant (must exist in system)"],
-        ["test_type", "Either 'pre' or 'post'"],
-        ["correct_answers", "Number of correct answers (e.g., 36)"],
-        ["total_questions", "Total questions in test (e.g., 40)"],
-        [""],
-        ["OPTIONAL COLUMNS:"],
-        ["participant_name", "Name for reference only"],
-        ["score_percentage", "Auto-calculated: (correct/total)*100"],
-        ["passed", "Auto-calculated: PASS if >=70%, FAIL otherwise"],
-        ["session_name", "Session reference"],
-        ["notes", "Any additional notes"],
-        [""],
-        ["NOTES:"],
-        ["- Same participant can have both PRE and POST test entries"],
-        ["- System will calculate percentage and pass/fail automatically"],
-        ["- Passing mark is 70%"],
-        ["- Delete sample rows before uploading your data"],
-    ]
-    for row in instructions:
-        ws_inst.append(row)
-    
-    # Auto-width columns
-    for ws_sheet in [ws, ws_inst]:
-        for column in ws_sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws_sheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=PrePost_Assessment_Template.xlsx"}
+    return await artifact_store.respond(
+        request, "pre-post-assessment-template", build_assessment_template,
+        filename="PrePost_Assessment_Template.xlsx"
     )
 
 @api_router.get("/templates/feedback")
-async def download_feedback_template(current_user: User = Depends(get_current_user)):
+async def download_feedback_template(request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for Feedback bulk upload"""
     if current_user.role not in ["admin", "trainer", "assistant_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Feedback"
-    
-    # Headers - Generic feedback questions
-    headers = [
-        "participant_ic",           # Required
-        "participant_name",         # Optional - for reference
-        "session_name",            # Optional - for reference
-        "q1_course_content",       # Rating 1-5: Course content quality
-        "q2_trainer_knowledge",    # Rating 1-5: Trainer's knowledge
-        "q3_trainer_delivery",     # Rating 1-5: Trainer's delivery style
-        "q4_training_materials",   # Rating 1-5: Training materials quality
-        "q5_practical_sessions",   # Rating 1-5: Practical session effectiveness
-        "q6_facilities",           # Rating 1-5: Training facilities
-        "q7_time_management",      # Rating 1-5: Time management
-        "q8_overall_satisfaction", # Rating 1-5: Overall satisfaction
-        "q9_recommend_others",     # Yes/No: Would recommend to others
-        "q10_comments",            # Text: Additional comments/suggestions
-    ]
-    ws.append(headers)
-    
-    # Style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.fill = openpyxl.styles.PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-    
-    # Sample data
-    sample_data = [
-        ["871128385485", "Ahmad Bin Ali", "KONE Training", 5, 5, 4, 5, 5, 4, 5, 5, "Yes", "Excellent training program!"],
-        ["880215143265", "Siti Binti Hassan", "KONE Training", 4, 5, 5, 4, 4, 4, 4, 4, "Yes", "More practical sessions would be better."],
-    ]
-    
-    for row in sample_data:
-        ws.append(row)
-    
-    # Instructions sheet
-    ws_inst = wb.create_sheet("Instructions")
-    instructions = [
-        ["FEEDBACK BULK UPLOAD TEMPLATE"],
-        [""],
-        ["REQUIRED COLUMNS:"],
-        ["participant_ic", "IC Number of participant (must exist in system)"],
-        [""],
-        ["RATING COLUMNS (1-5 scale):"],
-        ["q1_course_content", "Rate course content quality (1=Poor, 5=Excellent)"],
-        ["q2_trainer_knowledge", "Rate trainer's subject knowledge"],
-        ["q3_trainer_delivery", "Rate trainer's delivery and presentation"],
-        ["q4_training_materials", "Rate quality of training materials"],
-        ["q5_practical_sessions", "Rate practical/hands-on sessions"],
-        ["q6_facilities", "Rate training facilities"],
-        ["q7_time_management", "Rate time management during training"],
-        ["q8_overall_satisfaction", "Rate overall satisfaction"],
-        [""],
-        ["OTHER COLUMNS:"],
-        ["q9_recommend_others", "Would recommend to others? (Yes/No)"],
-        ["q10_comments", "Additional comments or suggestions (text)"],
-        [""],
-        ["RATING SCALE:"],
-        ["1 = Poor"],
-        ["2 = Fair"],
-        ["3 = Good"],
-        ["4 = Very Good"],
-        ["5 = Excellent"],
-        [""],
-        ["NOTES:"],
-        ["- Delete sample rows before uploading your data"],
-        ["- All rating columns should be numbers 1-5"],
-    ]
-    for row in instructions:
-        ws_inst.append(row)
-    
-    # Auto-width
-    for ws_sheet in [ws, ws_inst]:
-        for column in ws_sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws_sheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=Feedback_Template.xlsx"}
+    return await artifact_store.respond(
+        request, "feedback-template", build_feedback_template,
+        filename="Feedback_Template.xlsx"
     )
 
 @api_router.get("/templates/checklist")
-async def download_checklist_template(current_user: User = Depends(get_current_user)):
+async def download_checklist_template(request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for Vehicle Checklist bulk upload"""
     if current_user.role not in ["admin", "trainer", "assistant_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Vehicle Checklist"
-    
-    # Headers - Standard vehicle checklist items
-    headers = [
-        "participant_ic",          # Required
-        "participant_name",        # Optional
-        "session_name",           # Optional
-        "vehicle_model",          # Vehicle details
-        "registration_number",
-        "roadtax_expiry",         # YYYY-MM-DD format
-        # Checklist items with status (good/satisfactory/needs_repair)
-        "tyres_condition",
-        "tyres_comments",
-        "brakes_condition",
-        "brakes_comments",
-        "lights_condition",
-        "lights_comments",
-        "horn_condition",
-        "horn_comments",
-        "mirrors_condition",
-        "mirrors_comments",
-        "steering_condition",
-        "steering_comments",
-        "windscreen_condition",
-        "windscreen_comments",
-        "wipers_condition",
-        "wipers_comments",
-        "seatbelt_condition",
-        "seatbelt_comments",
-        "engine_condition",
-        "engine_comments",
-        "overall_remarks",
-    ]
-    ws.append(headers)
-    
-    # Style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.fill = openpyxl.styles.PatternFill(start_color="ED7D31", end_color="ED7D31", fill_type="solid")
-        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-    
-    # Sample data
-    sample_data = [
-        ["871128385485", "Ahmad Bin Ali", "KONE Training", "Honda City", "WMY1234", "2026-06-30",
-         "good", "", "good", "", "good", "", "good", "", "good", "", 
-         "good", "", "satisfactory", "Minor scratch", "good", "", "good", "", "good", "", "Vehicle in good condition"],
-        ["880215143265", "Siti Binti Hassan", "KONE Training", "Toyota Vios", "BKA5678", "2026-08-15",
-         "good", "", "needs_repair", "Brake pads worn", "good", "", "good", "", "good", "",
-         "good", "", "good", "", "good", "", "good", "", "satisfactory", "Minor noise", "Needs brake service"],
-    ]
-    
-    for row in sample_data:
-        ws.append(row)
-    
-    # Instructions sheet
-    ws_inst = wb.create_sheet("Instructions")
-    instructions = [
-        ["VEHICLE CHECKLIST BULK UPLOAD TEMPLATE"],
-        [""],
-        ["REQUIRED COLUMNS:"],
-        ["participant_ic", "IC Number of participant (must exist in system)"],
-        [""],
-        ["VEHICLE DETAILS:"],
-        ["vehicle_model", "Vehicle make and model (e.g., Honda City)"],
-        ["registration_number", "Vehicle registration number"],
-        ["roadtax_expiry", "Road tax expiry date (YYYY-MM-DD format)"],
-        [""],
-        ["CHECKLIST ITEM STATUS VALUES:"],
-        ["good", "Item is in good working condition"],
-        ["satisfactory", "Item is acceptable but may need attention"],
-        ["needs_repair", "Item requires repair/replacement"],
-        [""],
-        ["CHECKLIST ITEMS:"],
-        ["tyres_condition/comments", "Tyre condition and any comments"],
-        ["brakes_condition/comments", "Brake system condition"],
-        ["lights_condition/comments", "All lights (head, tail, signal)"],
-        ["horn_condition/comments", "Horn functionality"],
-        ["mirrors_condition/comments", "Side and rear mirrors"],
-        ["steering_condition/comments", "Steering system"],
-        ["windscreen_condition/comments", "Windscreen condition"],
-        ["wipers_condition/comments", "Windscreen wipers"],
-        ["seatbelt_condition/comments", "Seatbelt functionality"],
-        ["engine_condition/comments", "Engine performance"],
-        [""],
-        ["NOTES:"],
-        ["- Delete sample rows before uploading your data"],
-        ["- Comments are required for 'needs_repair' status"],
-        ["- Date format must be YYYY-MM-DD"],
-    ]
-    for row in instructions:
-        ws_inst.append(row)
-    
-    # Auto-width
-    for ws_sheet in [ws, ws_inst]:
-        for column in ws_sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws_sheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=Vehicle_Checklist_Template.xlsx"}
+    return await artifact_store.respond(
+        request, "checklist-template", build_checklist_template,
+        filename="Vehicle_Checklist_Template.xlsx"
     )
 
 # ============ PROGRAM CONFIGURATION TEMPLATES (Master Files) ============
 
 @api_router.get("/templates/program-test-questions")
-async def download_test_questions_template(current_user: User = Depends(get_current_user)):
+async def download_test_questions_template(request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for Pre/Post Test Questions (Program Configuration)"""
     if current_user.role not in ["admin", "trainer", "assistant_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Test Questions"
-    
-    # Headers for test questions
-    headers = [
-        "program_name",           # For reference
-        "test_type",              # "pre" or "post" (same questions usually)
-        "question_number",        # 1, 2, 3...
-        "question_text",          # The actual question
-        "option_1",               # First answer option
-        "option_2",               # Second answer option
-        "option_3",               # Third answer option
-        "option_4",               # Fourth answer option
-        "correct_answer",         # 1, 2, 3, or 4 (which option is correct)
-    ]
-    ws.append(headers)
-    
-    # Style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.fill = openpyxl.styles.PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-    
-    # Sample data - Defensive Driving questions
-    sample_data = [
-        ["Defensive Driving", "pre", 1, "What is the safest following distance in normal conditions?", "1 second", "2 seconds", "3 seconds", "4 seconds", 3],
-        ["Defensive Driving", "pre", 2, "When should you use your hazard lights?", "When parking illegally", "When your vehicle breaks down", "When driving slowly", "When it's raining", 2],
-        ["Defensive Driving", "pre", 3, "What does a yellow traffic light mean?", "Speed up", "Stop if safe to do so", "Continue at same speed", "Honk your horn", 2],
-        ["Defensive Driving", "pre", 4, "What is the first thing to check before changing lanes?", "Speedometer", "Mirrors and blind spots", "Radio", "Air conditioning", 2],
-        ["Defensive Driving", "pre", 5, "In wet conditions, you should:", "Drive faster to clear water", "Maintain normal speed", "Reduce speed and increase following distance", "Use high beam lights", 3],
-    ]
-    
-    for row in sample_data:
-        ws.append(row)
-    
-    # Instructions sheet
-    ws_inst = wb.create_sheet("Instructions")
-    instructions = [
-        ["PRE/POST TEST QUESTIONS TEMPLATE (PROGRAM CONFIGURATION)"],
-        [""],
-        ["PURPOSE:"],
-        ["This template is for creating/restoring TEST QUESTIONS for a program."],
-        ["Use this to quickly re-upload your test questions after redeployment."],
-        [""],
-        ["COLUMNS:"],
-        ["program_name", "Name of the program (for your reference)"],
-        ["test_type", "'pre' or 'post' - typically same questions for both"],
-        ["question_number", "Question sequence number (1, 2, 3...)"],
-        ["question_text", "The full question text"],
-        ["option_1 to option_4", "Four answer options"],
-        ["correct_answer", "Number 1-4 indicating which option is correct"],
-        [""],
-        ["HOW TO USE:"],
-        ["1. Fill in your questions following the sample format"],
-        ["2. Save this file locally as your master copy"],
-        ["3. After redeployment, go to Programs tab → Edit Program → Tests"],
-        ["4. Add questions manually using this file as reference"],
-        ["   (or use bulk upload if available)"],
-        [""],
-        ["TIPS:"],
-        ["- Keep questions clear and concise"],
-        ["- Ensure only ONE correct answer per question"],
-        ["- Use consistent formatting for all options"],
-        ["- Recommended: 20-40 questions per program"],
-        ["- Delete sample rows and add your own questions"],
-    ]
-    for row in instructions:
-        ws_inst.append(row)
-    
-    # Auto-width
-    for ws_sheet in [ws, ws_inst]:
-        for column in ws_sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws_sheet.column_dimensions[column_letter].width = min(max_length + 2, 60)
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=Program_Test_Questions_Template.xlsx"}
+    return await artifact_store.respond(
+        request, "program-test-questions-template", build_test_questions_template,
+        filename="Program_Test_Questions_Template.xlsx"
     )
 
 @api_router.get("/templates/program-feedback-questions")
-async def download_feedback_questions_template(current_user: User = Depends(get_current_user)):
+async def download_feedback_questions_template(request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for Feedback Questions (Program Configuration)"""
     if current_user.role not in ["admin", "trainer", "assistant_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Feedback Questions"
-    
-    # Headers
-    headers = [
-        "program_name",           # For reference
-        "question_number",        # 1, 2, 3...
-        "question_text",          # The feedback question
-        "question_type",          # "rating" (1-5 scale) or "text" (free text)
-        "required",               # "yes" or "no"
-    ]
-    ws.append(headers)
-    
-    # Style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.fill = openpyxl.styles.PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-    
-    # Sample data - Standard feedback questions
-    sample_data = [
-        ["Defensive Driving", 1, "How would you rate the overall quality of the training program?", "rating", "yes"],
-        ["Defensive Driving", 2, "How knowledgeable was the trainer on the subject matter?", "rating", "yes"],
-        ["Defensive Driving", 3, "How effective was the trainer's delivery and presentation style?", "rating", "yes"],
-        ["Defensive Driving", 4, "How useful were the training materials provided?", "rating", "yes"],
-        ["Defensive Driving", 5, "How effective were the practical/hands-on sessions?", "rating", "yes"],
-        ["Defensive Driving", 6, "How would you rate the training facilities and environment?", "rating", "yes"],
-        ["Defensive Driving", 7, "How well was the training time managed?", "rating", "yes"],
-        ["Defensive Driving", 8, "How likely are you to recommend this training to others?", "rating", "yes"],
-        ["Defensive Driving", 9, "What did you find most valuable about this training?", "text", "no"],
-        ["Defensive Driving", 10, "What suggestions do you have for improving this training?", "text", "no"],
-    ]
-    
-    for row in sample_data:
-        ws.append(row)
-    
-    # Instructions sheet
-    ws_inst = wb.create_sheet("Instructions")
-    instructions = [
-        ["FEEDBACK QUESTIONS TEMPLATE (PROGRAM CONFIGURATION)"],
-        [""],
-        ["PURPOSE:"],
-        ["This template is for creating/restoring FEEDBACK QUESTIONS for a program."],
-        ["Use this to quickly re-create your feedback form after redeployment."],
-        [""],
-        ["COLUMNS:"],
-        ["program_name", "Name of the program (for your reference)"],
-        ["question_number", "Question sequence (1, 2, 3...)"],
-        ["question_text", "The feedback question text"],
-        ["question_type", "'rating' = 1-5 scale, 'text' = free text answer"],
-        ["required", "'yes' = must answer, 'no' = optional"],
-        [""],
-        ["QUESTION TYPES:"],
-        ["rating", "Participant selects 1-5 (1=Poor, 5=Excellent)"],
-        ["text", "Participant types free-form answer"],
-        [""],
-        ["HOW TO USE:"],
-        ["1. Customize questions for your program"],
-        ["2. Save this file locally as your master copy"],
-        ["3. After redeployment, go to Feedback tab → Create Template"],
-        ["4. Add questions using this file as reference"],
-        [""],
-        ["RECOMMENDED STRUCTURE:"],
-        ["- 6-8 rating questions covering key aspects"],
-        ["- 1-2 text questions for open feedback"],
-        ["- Keep questions clear and specific"],
-        ["- Delete sample rows and add your own questions"],
-    ]
-    for row in instructions:
-        ws_inst.append(row)
-    
-    # Auto-width
-    for ws_sheet in [ws, ws_inst]:
-        for column in ws_sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws_sheet.column_dimensions[column_letter].width = min(max_length + 2, 60)
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=Program_Feedback_Questions_Template.xlsx"}
+    return await artifact_store.respond(
+        request, "program-feedback-questions-template", build_feedback_questions_template,
+        filename="Program_Feedback_Questions_Template.xlsx"
     )
 
 @api_router.get("/templates/program-checklist-items")
-async def download_checklist_items_template(current_user: User = Depends(get_current_user)):
+async def download_checklist_items_template(request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for Checklist Items (Program Configuration)"""
     if current_user.role not in ["admin", "trainer", "assistant_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Checklist Items"
-    
-    # Headers
-    headers = [
-        "program_name",           # For reference
-        "item_number",            # 1, 2, 3...
-        "checklist_item",         # The item to check
-        "category",               # Optional: group items by category
-    ]
-    ws.append(headers)
-    
-    # Style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = openpyxl.styles.Font(bold=True)
-        cell.fill = openpyxl.styles.PatternFill(start_color="ED7D31", end_color="ED7D31", fill_type="solid")
-        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
-    
-    # Sample data - Vehicle checklist items
-    sample_data = [
-        ["Defensive Driving", 1, "Tyres - Check tread depth and pressure", "Exterior"],
-        ["Defensive Driving", 2, "Tyres - Check for damage or bulges", "Exterior"],
-        ["Defensive Driving", 3, "Brakes - Test brake pedal feel", "Safety"],
-        ["Defensive Driving", 4, "Brakes - Check handbrake operation", "Safety"],
-        ["Defensive Driving", 5, "Lights - Headlights (low and high beam)", "Lights"],
-        ["Defensive Driving", 6, "Lights - Tail lights and brake lights", "Lights"],
-        ["Defensive Driving", 7, "Lights - Turn signals (front and rear)", "Lights"],
-        ["Defensive Driving", 8, "Lights - Hazard lights", "Lights"],
-        ["Defensive Driving", 9, "Horn - Test horn functionality", "Safety"],
-        ["Defensive Driving", 10, "Mirrors - Side mirrors condition and adjustment", "Visibility"],
-        ["Defensive Driving", 11, "Mirrors - Rear view mirror condition", "Visibility"],
-        ["Defensive Driving", 12, "Windscreen - Check for cracks or chips", "Visibility"],
-        ["Defensive Driving", 13, "Wipers - Front wiper operation", "Visibility"],
-        ["Defensive Driving", 14, "Wipers - Rear wiper operation (if equipped)", "Visibility"],
-        ["Defensive Driving", 15, "Seatbelts - Driver seatbelt condition", "Safety"],
-        ["Defensive Driving", 16, "Seatbelts - Passenger seatbelts", "Safety"],
-        ["Defensive Driving", 17, "Steering - Check for play or stiffness", "Controls"],
-        ["Defensive Driving", 18, "Engine - Check for unusual sounds", "Engine"],
-        ["Defensive Driving", 19, "Engine - Oil level", "Engine"],
-        ["Defensive Driving", 20, "Coolant - Check coolant level", "Engine"],
-    ]
-    
-    for row in sample_data:
-        ws.append(row)
-    
-    # Instructions sheet
-    ws_inst = wb.create_sheet("Instructions")
-    instructions = [
-        ["CHECKLIST ITEMS TEMPLATE (PROGRAM CONFIGURATION)"],
-        [""],
-        ["PURPOSE:"],
-        ["This template is for creating/restoring CHECKLIST ITEMS for a program."],
-        ["Use this to quickly re-create your vehicle inspection checklist after redeployment."],
-        [""],
-        ["COLUMNS:"],
-        ["program_name", "Name of the program (for your reference)"],
-        ["item_number", "Item sequence (1, 2, 3...)"],
-        ["checklist_item", "The item to be inspected"],
-        ["category", "Optional grouping (Exterior, Safety, Lights, etc.)"],
-        [""],
-        ["HOW TO USE:"],
-        ["1. List all inspection items for your program"],
-        ["2. Save this file locally as your master copy"],
-        ["3. After redeployment, go to Checklist Templates tab → Create"],
-        ["4. Add items using this file as reference"],
-        [""],
-        ["RECOMMENDED CATEGORIES:"],
-        ["Exterior", "Body, tyres, paint"],
-        ["Safety", "Brakes, seatbelts, horn"],
-        ["Lights", "All vehicle lights"],
-        ["Visibility", "Mirrors, windscreen, wipers"],
-        ["Controls", "Steering, pedals, gear"],
-        ["Engine", "Oil, coolant, sounds"],
-        [""],
-        ["TIPS:"],
-        ["- Be specific about what to check"],
-        ["- Group related items together"],
-        ["- 15-25 items is typical for vehicle inspection"],
-        ["- Delete sample rows and add your own items"],
-    ]
-    for row in instructions:
-        ws_inst.append(row)
-    
-    # Auto-width
-    for ws_sheet in [ws, ws_inst]:
-        for column in ws_sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws_sheet.column_dimensions[column_letter].width = min(max_length + 2, 60)
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=Program_Checklist_Items_Template.xlsx"}
+    return await artifact_store.respond(
+        request, "program-checklist-items-template", build_checklist_items_template,
+        filename="Program_Checklist_Items_Template.xlsx"
     )
 
 # Override Validation - Edit invoice without amount checks
@@ -11510,6 +11044,7 @@ async def override_invoice_validation(
             "updated_at": get_malaysia_time().isoformat()
         }}
     )
+    await refresh_invoice_balance(db, invoice_id)
     
     return {
         "message": "Invoice amount overridden successfully",
@@ -11994,59 +11529,15 @@ async def get_statutory_rates(rate_type: Optional[str] = None, current_user: Use
     return rates
 
 @api_router.get("/hr/statutory-rates/templates/{rate_type}")
-async def download_statutory_template(rate_type: str, current_user: User = Depends(get_current_user)):
+async def download_statutory_template(rate_type: str, request: Request, current_user: User = Depends(get_current_user)):
     """Download Excel template for statutory rates"""
     if rate_type not in ["epf", "socso", "eis"]:
         raise HTTPException(status_code=400, detail="Invalid rate type")
     
-    import openpyxl
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"{rate_type.upper()} Rates"
-    
-    # Headers
-    headers = ["Min Wages (RM)", "Max Wages (RM)", "Employee Amount (RM)", "Employer Amount (RM)", "Total (RM)"]
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
-    
-    # Sample data based on type
-    if rate_type == "epf":
-        sample_data = [
-            [0, 20, 0, 0, 0],
-            [20, 40, 4, 5, 9],
-            [40, 60, 6, 8, 14],
-        ]
-    elif rate_type == "socso":
-        sample_data = [
-            [0, 30, 0.10, 0.40, 0.50],
-            [30, 50, 0.20, 0.70, 0.90],
-            [50, 70, 0.30, 1.00, 1.30],
-        ]
-    else:  # eis
-        sample_data = [
-            [0, 30, 0.05, 0.05, 0.10],
-            [30, 50, 0.10, 0.10, 0.20],
-        ]
-    
-    for row_idx, row_data in enumerate(sample_data, 2):
-        for col_idx, value in enumerate(row_data, 1):
-            ws.cell(row=row_idx, column=col_idx, value=value)
-    
-    # Set column widths
-    for col in ws.columns:
-        ws.column_dimensions[col[0].column_letter].width = 20
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={rate_type}_rates_template.xlsx"}
+    return await artifact_store.respond(
+        request, "statutory-rates-template", build_statutory_template,
+        inputs={"rate_type": rate_type},
+        filename=f"{rate_type}_rates_template.xlsx"
     )
 
 # =====================================================
@@ -12256,6 +11747,8 @@ async def generate_payslip(data: dict, current_user: User = Depends(get_current_
         "created_by": current_user.email
     }
     
+    if payslip.get("year") and payslip.get("month"):
+        payslip.update(month_period_fields(payslip["year"], payslip["month"]))
     await db.payslips.insert_one(payslip)
     return {"id": payslip["id"], "message": "Payslip generated successfully", "nett_pay": nett_pay}
 
@@ -12373,7 +11866,7 @@ async def generate_pay_advice(data: dict, current_user: User = Depends(get_curre
         else:
             continue
         
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+        company = await reference_cache.lookup(db, "companies", session.get("company_id"))
         
         session_details.append({
             "session_id": fee.get("session_id"),
@@ -12408,7 +11901,7 @@ async def generate_pay_advice(data: dict, current_user: User = Depends(get_curre
         else:
             continue
         
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+        company = await reference_cache.lookup(db, "companies", session.get("company_id"))
         
         session_details.append({
             "session_id": fee.get("session_id"),
@@ -12443,7 +11936,7 @@ async def generate_pay_advice(data: dict, current_user: User = Depends(get_curre
         else:
             continue
         
-        company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1})
+        company = await reference_cache.lookup(db, "companies", session.get("company_id"))
         
         session_details.append({
             "session_id": comm.get("session_id"),
@@ -12507,7 +12000,7 @@ async def generate_pay_advice(data: dict, current_user: User = Depends(get_curre
         "created_by_name": current_user.full_name or current_user.email
     }
     
-    await db.pay_advice.insert_one({**pay_advice, "_id": pay_advice["id"]})
+    await db.pay_advice.insert_one({**pay_advice, **month_period_fields(payment_year, payment_month), "_id": pay_advice["id"]})
     return {"id": pay_advice["id"], "message": "Pay advice generated successfully", "total_sessions": len(session_details), "total_amount": total_amount}
 
 @api_router.get("/hr/pay-advice/{advice_id}")
@@ -12611,28 +12104,12 @@ async def bulk_generate_pay_advice(year: int, month: int, current_user: User = D
     if current_user.role not in ["admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Date range for the month
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = datetime(year, month + 1, 1) - timedelta(days=1)
-    
-    # Get all sessions in this month
-    sessions = await db.sessions.find({}, {"_id": 0, "id": 1, "start_date": 1}).to_list(1000)
-    session_ids = []
-    for s in sessions:
-        sd = s.get("start_date")
-        if sd:
-            try:
-                if isinstance(sd, str):
-                    sdt = datetime.fromisoformat(sd.replace('Z', '+00:00'))
-                else:
-                    sdt = sd
-                if sdt.year == year and sdt.month == month:
-                    session_ids.append(s["id"])
-            except:
-                pass
+    # Sessions starting this month that have payables (rows carry the session's period)
+    month_query = period_filter(year, month)
+    session_ids = set()
+    for collection in (db.trainer_fees, db.coordinator_fees, db.marketing_commissions):
+        session_ids.update(sid for sid in await collection.distinct("session_id", month_query) if sid)
+    session_ids = list(session_ids)
     
     if not session_ids:
         return {"message": "No sessions found for this period", "generated": 0}
@@ -12683,7 +12160,7 @@ async def bulk_generate_pay_advice(year: int, month: int, current_user: User = D
             # Trainer fees
             for fee in await db.trainer_fees.find({"trainer_id": user_id, "session_id": {"$in": session_ids}}, {"_id": 0}).to_list(100):
                 session = await db.sessions.find_one({"id": fee.get("session_id")}, {"_id": 0, "name": 1, "start_date": 1, "company_id": 1})
-                company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1}) if session else None
+                company = await reference_cache.lookup(db, "companies", session.get("company_id")) if session else None
                 session_details.append({
                     "session_id": fee.get("session_id"),
                     "session_name": session.get("name") if session else "Unknown",
@@ -12698,7 +12175,7 @@ async def bulk_generate_pay_advice(year: int, month: int, current_user: User = D
             # Coordinator fees
             for fee in await db.coordinator_fees.find({"coordinator_id": user_id, "session_id": {"$in": session_ids}}, {"_id": 0}).to_list(100):
                 session = await db.sessions.find_one({"id": fee.get("session_id")}, {"_id": 0, "name": 1, "start_date": 1, "company_id": 1})
-                company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1}) if session else None
+                company = await reference_cache.lookup(db, "companies", session.get("company_id")) if session else None
                 session_details.append({
                     "session_id": fee.get("session_id"),
                     "session_name": session.get("name") if session else "Unknown",
@@ -12713,7 +12190,7 @@ async def bulk_generate_pay_advice(year: int, month: int, current_user: User = D
             # Marketing commission
             for comm in await db.marketing_commissions.find({"marketing_user_id": user_id, "session_id": {"$in": session_ids}}, {"_id": 0}).to_list(100):
                 session = await db.sessions.find_one({"id": comm.get("session_id")}, {"_id": 0, "name": 1, "start_date": 1, "company_id": 1})
-                company = await db.companies.find_one({"id": session.get("company_id")}, {"_id": 0, "name": 1}) if session else None
+                company = await reference_cache.lookup(db, "companies", session.get("company_id")) if session else None
                 session_details.append({
                     "session_id": comm.get("session_id"),
                     "session_name": session.get("name") if session else "Unknown",
@@ -12763,7 +12240,7 @@ async def bulk_generate_pay_advice(year: int, month: int, current_user: User = D
                 "created_by": current_user.id
             }
             
-            await db.pay_advice.insert_one({**pay_advice, "_id": pay_advice["id"]})
+            await db.pay_advice.insert_one({**pay_advice, **month_period_fields(payment_year, payment_month), "_id": pay_advice["id"]})
             generated += 1
         except Exception as e:
             errors.append(f"{user_id}: {str(e)}")
@@ -13021,7 +12498,7 @@ async def get_profit_loss_report(
     
     # Get all invoices for the year (INCOME) - filter by session start date
     # First get sessions for the year to map invoice amounts to correct months
-    sessions = await db.sessions.find({
+    sessions = await report_db.sessions.find({
         "start_date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0, "id": 1, "start_date": 1, "invoice_id": 1}).to_list(10000)
     
@@ -13033,46 +12510,46 @@ async def get_profit_loss_report(
             invoice_session_map[s.get("invoice_id")] = s.get("id")
     
     # Get all invoices
-    invoices = await db.invoices.find({}, {"_id": 0}).to_list(10000)
+    invoices = await report_db.invoices.find({}, {"_id": 0}).to_list(10000)
     
     # Get manual income entries
-    manual_income = await db.manual_income.find({
+    manual_income = await report_db.manual_income.find({
         "date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(1000)
     
     # Get payslips (EXPENSE - Payroll)
-    payslips = await db.hr_payslips.find({
+    payslips = await report_db.hr_payslips.find({
         "year": year
     }, {"_id": 0}).to_list(1000)
     
     # Get pay advice (EXPENSE - Session Workers)
-    pay_advice = await db.hr_pay_advices.find({
+    pay_advice = await report_db.hr_pay_advices.find({
         "year": year
     }, {"_id": 0}).to_list(1000)
     
     # Get ALL trainer fees - we'll filter by session date using session_date_map
-    all_trainer_fees = await db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
+    all_trainer_fees = await report_db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
     
     # Get ALL coordinator fees - we'll filter by session date using session_date_map
-    all_coordinator_fees = await db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
+    all_coordinator_fees = await report_db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
     
     # Get ALL session expenses - we'll filter by session date using session_date_map
-    all_session_expenses = await db.session_expenses.find({}, {"_id": 0}).to_list(10000)
+    all_session_expenses = await report_db.session_expenses.find({}, {"_id": 0}).to_list(10000)
     
     # Get ALL marketing commissions with approved/paid status - we'll filter by session date
-    all_marketing_commissions = await db.marketing_commissions.find({
+    all_marketing_commissions = await report_db.marketing_commissions.find({
         "status": {"$in": ["approved", "paid"]}
     }, {"_id": 0}).to_list(10000)
     
     # Get petty cash expenses - only approved transactions
-    petty_cash = await db.petty_cash_transactions.find({
+    petty_cash = await report_db.petty_cash_transactions.find({
         "date": {"$gte": start_date, "$lte": end_date},
         "type": "expense",
         "status": "approved"  # Only count approved petty cash
     }, {"_id": 0}).to_list(1000)
     
     # Get manual expense entries
-    manual_expenses = await db.manual_expenses.find({
+    manual_expenses = await report_db.manual_expenses.find({
         "date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(1000)
     
@@ -13275,11 +12752,11 @@ async def get_profit_loss_by_programme(
     end_date = f"{year}-12-31"
     
     # Get all programmes
-    programmes = await db.programs.find({}, {"_id": 0, "id": 1, "name": 1, "category": 1}).to_list(100)
+    programmes = await reference_cache.all(db, "programs")
     programme_map = {p["id"]: p for p in programmes}
     
     # Get sessions for the year with their programme info
-    sessions = await db.sessions.find({
+    sessions = await report_db.sessions.find({
         "start_date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(10000)
     
@@ -13340,7 +12817,7 @@ async def get_profit_loss_by_programme(
             programme_data[prog_id]["session_count"] += 1
     
     # Process invoices (INCOME) - attribute to programme via session
-    invoices = await db.invoices.find({
+    invoices = await report_db.invoices.find({
         "status": {"$in": ["approved", "issued", "paid"]}
     }, {"_id": 0}).to_list(10000)
     
@@ -13368,7 +12845,7 @@ async def get_profit_loss_by_programme(
             pass
     
     # Process trainer fees - attribute to programme via session
-    trainer_fees = await db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
+    trainer_fees = await report_db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
     for tf in trainer_fees:
         try:
             session_id = tf.get("session_id")
@@ -13381,7 +12858,7 @@ async def get_profit_loss_by_programme(
             pass
     
     # Process coordinator fees
-    coordinator_fees = await db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
+    coordinator_fees = await report_db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
     for cf in coordinator_fees:
         try:
             session_id = cf.get("session_id")
@@ -13394,7 +12871,7 @@ async def get_profit_loss_by_programme(
             pass
     
     # Process marketing commissions
-    marketing_comms = await db.marketing_commissions.find({
+    marketing_comms = await report_db.marketing_commissions.find({
         "status": {"$in": ["approved", "paid"]}
     }, {"_id": 0}).to_list(10000)
     for mc in marketing_comms:
@@ -13409,7 +12886,7 @@ async def get_profit_loss_by_programme(
             pass
     
     # Process session expenses (F&B, venue, etc.)
-    session_expenses = await db.session_expenses.find({}, {"_id": 0}).to_list(10000)
+    session_expenses = await report_db.session_expenses.find({}, {"_id": 0}).to_list(10000)
     for exp in session_expenses:
         try:
             session_id = exp.get("session_id")
@@ -13443,27 +12920,27 @@ async def get_profit_loss_by_programme(
         total_direct_expenses += data["expenses"]["total"]
     
     # Get overhead costs (not tied to programmes)
-    payslips = await db.hr_payslips.find({"year": year}, {"_id": 0}).to_list(1000)
+    payslips = await report_db.hr_payslips.find({"year": year}, {"_id": 0}).to_list(1000)
     overhead_payroll = sum(
         float(ps.get("gross_salary", 0)) + float(ps.get("epf_employer", 0)) + 
         float(ps.get("socso_employer", 0)) + float(ps.get("eis_employer", 0))
         for ps in payslips
     )
     
-    petty_cash = await db.petty_cash_transactions.find({
+    petty_cash = await report_db.petty_cash_transactions.find({
         "date": {"$gte": start_date, "$lte": end_date},
         "type": "expense",
         "status": "approved"
     }, {"_id": 0}).to_list(1000)
     overhead_petty_cash = sum(float(pc.get("amount", 0)) for pc in petty_cash)
     
-    manual_expenses = await db.manual_expenses.find({
+    manual_expenses = await report_db.manual_expenses.find({
         "date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(1000)
     overhead_manual = sum(float(exp.get("amount", 0)) for exp in manual_expenses)
     
     # Manual income (other income streams)
-    manual_income = await db.manual_income.find({
+    manual_income = await report_db.manual_income.find({
         "date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(1000)
     other_income = sum(float(inc.get("amount", 0)) for inc in manual_income)
@@ -13514,22 +12991,22 @@ async def get_trainer_subledger(
     end_date = f"{year}-12-31"
     
     # Get sessions for the year
-    sessions = await db.sessions.find({
+    sessions = await report_db.sessions.find({
         "start_date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0, "id": 1, "start_date": 1, "program_id": 1}).to_list(10000)
     session_ids = {s["id"] for s in sessions}
     session_map = {s["id"]: s for s in sessions}
     
     # Get programmes
-    programmes = await db.programs.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)
+    programmes = await reference_cache.all(db, "programs")
     programme_map = {p["id"]: p.get("name", "Unknown") for p in programmes}
     
     # Get all users for name lookup
-    users = await db.users.find({}, {"_id": 0, "id": 1, "full_name": 1}).to_list(1000)
+    users = await report_db.users.find({}, {"_id": 0, "id": 1, "full_name": 1}).to_list(1000)
     user_map = {u["id"]: u.get("full_name", "Unknown") for u in users}
     
     # Get trainer fees for sessions in this year
-    trainer_fees = await db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
+    trainer_fees = await report_db.trainer_fees.find(period_filter(year), {"_id": 0}).to_list(10000)
     
     # Aggregate by trainer
     trainer_data = {}
@@ -13570,7 +13047,7 @@ async def get_trainer_subledger(
         })
     
     # Get coordinator fees
-    coordinator_fees = await db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
+    coordinator_fees = await report_db.coordinator_fees.find(period_filter(year), {"_id": 0}).to_list(10000)
     
     coordinator_data = {}
     for cf in coordinator_fees:
@@ -13621,7 +13098,7 @@ async def get_trainer_subledger(
     trainers = sorted(trainer_data.values(), key=lambda x: x["total_earned"], reverse=True)
     coordinators = sorted(coordinator_data.values(), key=lambda x: x["total_earned"], reverse=True)
     
-    return {
+    return FastJSONResponse({
         "year": year,
         "trainers": trainers,
         "coordinators": coordinators,
@@ -13633,7 +13110,7 @@ async def get_trainer_subledger(
             "coordinator_paid": sum(c["total_paid"] for c in coordinators),
             "coordinator_balance": sum(c["balance"] for c in coordinators)
         }
-    }
+    })
 
 
 @api_router.get("/finance/subledger/marketing")
@@ -13651,22 +13128,22 @@ async def get_marketing_subledger(
     end_date = f"{year}-12-31"
     
     # Get sessions for the year
-    sessions = await db.sessions.find({
+    sessions = await report_db.sessions.find({
         "start_date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0, "id": 1, "start_date": 1, "program_id": 1, "company_name": 1}).to_list(10000)
     session_ids = {s["id"] for s in sessions}
     session_map = {s["id"]: s for s in sessions}
     
     # Get programmes
-    programmes = await db.programs.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)
+    programmes = await reference_cache.all(db, "programs")
     programme_map = {p["id"]: p.get("name", "Unknown") for p in programmes}
     
     # Get users
-    users = await db.users.find({}, {"_id": 0, "id": 1, "full_name": 1}).to_list(1000)
+    users = await report_db.users.find({}, {"_id": 0, "id": 1, "full_name": 1}).to_list(1000)
     user_map = {u["id"]: u.get("full_name", "Unknown") for u in users}
     
     # Get marketing commissions
-    commissions = await db.marketing_commissions.find({}, {"_id": 0}).to_list(10000)
+    commissions = await report_db.marketing_commissions.find(period_filter(year), {"_id": 0}).to_list(10000)
     
     marketer_data = {}
     for mc in commissions:
@@ -13713,7 +13190,7 @@ async def get_marketing_subledger(
     
     marketers = sorted(marketer_data.values(), key=lambda x: x["total_commission"], reverse=True)
     
-    return {
+    return FastJSONResponse({
         "year": year,
         "marketers": marketers,
         "totals": {
@@ -13721,7 +13198,7 @@ async def get_marketing_subledger(
             "total_paid": sum(m["total_paid"] for m in marketers),
             "total_balance": sum(m["balance"] for m in marketers)
         }
-    }
+    })
 
 
 @api_router.get("/finance/subledger/payroll")
@@ -13737,10 +13214,10 @@ async def get_payroll_subledger(
     year = year or now.year
     
     # Get payslips for the year
-    payslips = await db.hr_payslips.find({"year": year}, {"_id": 0}).to_list(1000)
+    payslips = await report_db.hr_payslips.find({"year": year}, {"_id": 0}).to_list(1000)
     
     # Get staff info
-    staff = await db.hr_staff.find({}, {"_id": 0}).to_list(1000)
+    staff = await report_db.hr_staff.find({}, {"_id": 0}).to_list(1000)
     staff_map = {s["id"]: s for s in staff}
     
     employee_data = {}
@@ -13787,7 +13264,7 @@ async def get_payroll_subledger(
     
     employees = sorted(employee_data.values(), key=lambda x: x["name"])
     
-    return {
+    return FastJSONResponse({
         "year": year,
         "employees": employees,
         "totals": {
@@ -13797,7 +13274,7 @@ async def get_payroll_subledger(
             "total_eis": sum(e["total_eis"] for e in employees),
             "total_net": sum(e["total_net"] for e in employees)
         }
-    }
+    })
 
 
 # Chart of Accounts - Static configuration based on user's Excel template
@@ -13888,17 +13365,17 @@ async def get_general_ledger(
     entry_id = 1
     
     # Get programmes for mapping
-    programmes = await db.programs.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)
+    programmes = await reference_cache.all(db, "programs")
     programme_map = {p["id"]: p.get("name", "Unknown") for p in programmes}
     
     # Get sessions for the year
-    sessions = await db.sessions.find({
+    sessions = await report_db.sessions.find({
         "start_date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(10000)
     session_map = {s.get("id"): s for s in sessions}
     
     # 1. INVOICES - DR Accounts Receivable, CR Training Income
-    invoices = await db.invoices.find({
+    invoices = await report_db.invoices.find({
         "status": {"$in": ["approved", "issued", "paid"]}
     }, {"_id": 0}).to_list(10000)
     
@@ -13969,7 +13446,7 @@ async def get_general_ledger(
             pass
     
     # 2. PAYMENTS RECEIVED - DR Bank, CR Accounts Receivable
-    payments = await db.payments.find({}, {"_id": 0}).to_list(10000)
+    payments = await report_db.payments.find(period_filter(year, month), {"_id": 0}).to_list(10000)
     for pmt in payments:
         try:
             pmt_date = pmt.get("payment_date", pmt.get("created_at", ""))[:10]
@@ -14010,7 +13487,7 @@ async def get_general_ledger(
     
     # 3. TRAINER FEES - DR Trainer Fees Expense, CR Trainer Payable
     session_ids = set(session_map.keys())
-    trainer_fees = await db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
+    trainer_fees = await report_db.trainer_fees.find({}, {"_id": 0}).to_list(10000)
     for tf in trainer_fees:
         try:
             session_id = tf.get("session_id")
@@ -14052,7 +13529,7 @@ async def get_general_ledger(
             pass
     
     # 4. COORDINATOR FEES - DR Coordinator Fees Expense, CR Coordinator Payable
-    coordinator_fees = await db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
+    coordinator_fees = await report_db.coordinator_fees.find({}, {"_id": 0}).to_list(10000)
     for cf in coordinator_fees:
         try:
             session_id = cf.get("session_id")
@@ -14094,7 +13571,7 @@ async def get_general_ledger(
             pass
     
     # 5. MARKETING COMMISSIONS - DR Marketing Expense, CR Marketing Payable
-    marketing_comms = await db.marketing_commissions.find({
+    marketing_comms = await report_db.marketing_commissions.find({
         "status": {"$in": ["approved", "paid"]}
     }, {"_id": 0}).to_list(10000)
     for mc in marketing_comms:
@@ -14138,7 +13615,7 @@ async def get_general_ledger(
             pass
     
     # 6. PAYROLL - DR Salaries & Employer Contributions, CR Payables
-    payslips = await db.hr_payslips.find({"year": year}, {"_id": 0}).to_list(1000)
+    payslips = await report_db.hr_payslips.find({"year": year}, {"_id": 0}).to_list(1000)
     if month:
         payslips = [p for p in payslips if p.get("month") == month]
     
@@ -14278,7 +13755,7 @@ async def get_general_ledger(
             pass
     
     # 7. SESSION EXPENSES (F&B, Venue, etc.)
-    session_expenses = await db.session_expenses.find({}, {"_id": 0}).to_list(10000)
+    session_expenses = await report_db.session_expenses.find({}, {"_id": 0}).to_list(10000)
     for exp in session_expenses:
         try:
             session_id = exp.get("session_id")
@@ -14331,7 +13808,7 @@ async def get_general_ledger(
             pass
     
     # 8. PETTY CASH EXPENSES
-    petty_cash = await db.petty_cash_transactions.find({
+    petty_cash = await report_db.petty_cash_transactions.find({
         "date": {"$gte": start_date, "$lte": end_date},
         "type": "expense",
         "status": "approved"
@@ -14372,7 +13849,7 @@ async def get_general_ledger(
             pass
     
     # 9. MANUAL INCOME
-    manual_income = await db.manual_income.find({
+    manual_income = await report_db.manual_income.find({
         "date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(1000)
     
@@ -14411,7 +13888,7 @@ async def get_general_ledger(
             pass
     
     # 10. MANUAL EXPENSES
-    manual_expenses = await db.manual_expenses.find({
+    manual_expenses = await report_db.manual_expenses.find({
         "date": {"$gte": start_date, "$lte": end_date}
     }, {"_id": 0}).to_list(1000)
     
@@ -14477,7 +13954,7 @@ async def get_general_ledger(
     
     trial_balance_list = sorted(trial_balance.values(), key=lambda x: x["account_code"])
     
-    return {
+    return FastJSONResponse({
         "year": year,
         "month": month,
         "entries": gl_entries,
@@ -14487,7 +13964,7 @@ async def get_general_ledger(
             "total_credit": total_credit,
             "is_balanced": abs(total_debit - total_credit) < 0.01
         }
-    }
+    })
 
 
 @api_router.post("/finance/manual-income")
@@ -14622,11 +14099,8 @@ async def setup_petty_cash(setup: PettyCashSetup, current_user: User = Depends(g
     if current_user.role not in ["admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    existing = await db.petty_cash_settings.find_one({})
-    
     settings = {
         "float_amount": setup.float_amount,
-        "current_balance": setup.float_amount if not existing else existing.get("current_balance", setup.float_amount),
         "custodian_id": setup.custodian_id,
         "custodian_name": setup.custodian_name,
         "approval_threshold": setup.approval_threshold,
@@ -14634,14 +14108,9 @@ async def setup_petty_cash(setup: PettyCashSetup, current_user: User = Depends(g
         "updated_by": current_user.id
     }
     
-    if existing:
-        await db.petty_cash_settings.update_one({}, {"$set": settings})
-    else:
-        settings["created_at"] = get_malaysia_time().isoformat()
-        settings["last_reconciliation"] = None
-        await db.petty_cash_settings.insert_one(settings)
+    settings = await petty_cash_ledger.configure(db, settings, setup.float_amount)
     
-    return {"message": "Petty cash settings updated", "settings": {k: v for k, v in settings.items() if k != "_id"}}
+    return {"message": "Petty cash settings updated", "settings": settings}
 
 @api_router.post("/finance/petty-cash/transaction")
 async def add_petty_cash_transaction(txn: PettyCashTransaction, current_user: User = Depends(get_current_user)):
@@ -14653,16 +14122,11 @@ async def add_petty_cash_transaction(txn: PettyCashTransaction, current_user: Us
     if not settings:
         raise HTTPException(status_code=400, detail="Petty cash not set up")
     
-    current_balance = settings.get("current_balance", 0)
-    
-    if txn.type == "expense":
-        if txn.amount > current_balance:
-            raise HTTPException(status_code=400, detail=f"Insufficient balance. Current: RM {current_balance:.2f}")
-        new_balance = current_balance - txn.amount
-    elif txn.type == "topup":
-        new_balance = current_balance + txn.amount
-    else:
+    if txn.type not in petty_cash_ledger.SIGNS:
         raise HTTPException(status_code=400, detail="Invalid type")
+    current_balance = settings.get("current_balance", 0)
+    if txn.type == "expense" and txn.amount > current_balance:
+        raise HTTPException(status_code=400, detail=f"Insufficient balance. Current: RM {current_balance:.2f}")
     
     requires_approval = txn.type == "expense" and txn.amount > settings.get("approval_threshold", 100)
     
@@ -14675,8 +14139,6 @@ async def add_petty_cash_transaction(txn: PettyCashTransaction, current_user: Us
         "receipt_url": txn.receipt_url,
         "date": txn.date,
         "notes": txn.notes,
-        "balance_before": current_balance,
-        "balance_after": new_balance,
         "status": "pending" if requires_approval else "approved",
         "created_by": current_user.id,
         "created_by_name": current_user.full_name,
@@ -14685,15 +14147,24 @@ async def add_petty_cash_transaction(txn: PettyCashTransaction, current_user: Us
         "approved_at": None if requires_approval else get_malaysia_time().isoformat()
     }
     
-    await db.petty_cash_transactions.insert_one(transaction)
-    
-    if not requires_approval:
-        await db.petty_cash_settings.update_one({}, {"$set": {"current_balance": new_balance}})
+    if requires_approval:
+        # Posted to the ledger (with its balance_after) when approved
+        await db.petty_cash_transactions.insert_one(transaction)
+        new_balance = current_balance
+    else:
+        # The balance check is repeated inside the $inc so concurrent expenses cannot overdraw
+        try:
+            transaction = await petty_cash_ledger.record_posted(
+                db, transaction, require_balance=txn.amount if txn.type == "expense" else None
+            )
+        except InsufficientBalance as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        new_balance = transaction["balance_after"]
     
     return {
         "message": "Transaction added" + (" (pending approval)" if requires_approval else ""),
         "transaction_id": transaction["id"],
-        "new_balance": new_balance if not requires_approval else current_balance,
+        "new_balance": new_balance,
         "requires_approval": requires_approval
     }
 
@@ -14728,26 +14199,15 @@ async def approve_petty_cash_transaction(transaction_id: str, current_user: User
     if current_user.role not in ["admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    txn = await db.petty_cash_transactions.find_one({"id": transaction_id}, {"_id": 0})
+    txn = await db.petty_cash_transactions.find_one({"id": transaction_id}, {"_id": 0, "status": 1})
     if not txn:
         raise HTTPException(status_code=404, detail="Not found")
-    if txn.get("status") != "pending":
-        raise HTTPException(status_code=400, detail="Not pending")
-    
-    await db.petty_cash_transactions.update_one(
-        {"id": transaction_id},
-        {"$set": {"status": "approved", "approved_by": current_user.id, "approved_at": get_malaysia_time().isoformat()}}
-    )
-    
-    settings = await db.petty_cash_settings.find_one({})
-    new_balance = settings.get("current_balance", 0)
-    if txn.get("type") == "expense":
-        new_balance -= txn.get("amount", 0)
-    elif txn.get("type") == "topup":
-        new_balance += txn.get("amount", 0)
     
-    await db.petty_cash_settings.update_one({}, {"$set": {"current_balance": new_balance}})
-    return {"message": "Approved", "new_balance": new_balance}
+    # Claiming the pending transaction and moving the balance are both atomic
+    posted = await petty_cash_ledger.approve(db, transaction_id, current_user.id)
+    if not posted:
+        raise HTTPException(status_code=400, detail="Not pending")
+    return {"message": "Approved", "new_balance": posted["balance_after"]}
 
 @api_router.post("/finance/petty-cash/reject/{transaction_id}")
 async def reject_petty_cash_transaction(transaction_id: str, current_user: User = Depends(get_current_user)):
@@ -14777,69 +14237,52 @@ async def delete_petty_cash_transaction(transaction_id: str, current_user: User
     if not txn:
         raise HTTPException(status_code=404, detail="Not found")
     
-    if txn.get("status") == "approved":
-        settings = await db.petty_cash_settings.find_one({})
-        current_balance = settings.get("current_balance", 0)
-        if txn.get("type") == "expense":
-            new_balance = current_balance + txn.get("amount", 0)
-        elif txn.get("type") == "topup":
-            new_balance = current_balance - txn.get("amount", 0)
-        else:
-            new_balance = current_balance
-        await db.petty_cash_settings.update_one({}, {"$set": {"current_balance": new_balance}})
+    if txn.get("status") in ("approved", "reversed"):
+        # Posted entries stay in the ledger; a reversal entry restores the balance
+        reversal = await petty_cash_ledger.reverse(db, transaction_id, current_user)
+        if not reversal:
+            raise HTTPException(status_code=400, detail="Transaction already reversed")
+        return {"message": "Reversed", "reversal_id": reversal["id"], "new_balance": reversal["balance_after"]}
     
-    await db.petty_cash_transactions.delete_one({"id": transaction_id})
+    # Pending and rejected transactions never touched the balance
+    await db.petty_cash_transactions.delete_one({"id": transaction_id, "status": {"$in": ["pending", "rejected"]}})
     return {"message": "Deleted"}
 
 @api_router.post("/finance/petty-cash/reconcile")
 async def reconcile_petty_cash(recon: PettyCashReconciliation, current_user: User = Depends(get_current_user)):
-    """Reconcile petty cash"""
+    """Reconcile petty cash; the result anchors the ledger balance"""
     if current_user.role not in ["admin", "finance"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    settings = await db.petty_cash_settings.find_one({})
-    if not settings:
+    try:
+        reconciliation = await petty_cash_ledger.reconcile(db, recon.physical_count, recon.notes, current_user)
+    except LedgerNotSetUp:
         raise HTTPException(status_code=400, detail="Not set up")
     
-    system_balance = settings.get("current_balance", 0)
-    variance = recon.physical_count - system_balance
-    
-    reconciliation = {
-        "id": str(uuid.uuid4()),
-        "date": get_malaysia_time().isoformat()[:10],
-        "system_balance": system_balance,
+    return {
+        "message": "Complete",
+        "system_balance": reconciliation["system_balance"],
         "physical_count": recon.physical_count,
-        "variance": variance,
-        "notes": recon.notes,
-        "reconciled_by": current_user.id,
-        "reconciled_by_name": current_user.full_name,
-        "created_at": get_malaysia_time().isoformat()
+        "variance": reconciliation["variance"],
+        "new_balance": reconciliation["anchor_balance"]
     }
+
+@api_router.get("/finance/petty-cash/ledger-check")
+async def check_petty_cash_ledger(current_user: User = Depends(get_current_user)):
+    """Compare the running balance with the one re-derived from the last reconciliation anchor"""
+    if current_user.role not in ["admin", "finance"]:
+        raise HTTPException(status_code=403, detail="Access denied")
     
-    await db.petty_cash_reconciliations.insert_one(reconciliation)
-    await db.petty_cash_settings.update_one({}, {"$set": {"current_balance": recon.physical_count, "last_reconciliation": reconciliation["date"]}})
-    
-    if abs(variance) > 0.01:
-        adjustment = {
-            "id": str(uuid.uuid4()),
-            "type": "adjustment",
-            "amount": abs(variance),
-            "description": f"Reconciliation adjustment",
-            "category": "Adjustment",
-            "date": get_malaysia_time().isoformat()[:10],
-            "notes": recon.notes,
-            "balance_before": system_balance,
-            "balance_after": recon.physical_count,
-            "status": "approved",
-            "created_by": current_user.id,
-            "created_by_name": current_user.full_name,
-            "created_at": get_malaysia_time().isoformat(),
-            "approved_by": current_user.id,
-            "approved_at": get_malaysia_time().isoformat()
-        }
-        await db.petty_cash_transactions.insert_one(adjustment)
-    
-    return {"message": "Complete", "system_balance": system_balance, "physical_count": recon.physical_count, "variance": variance, "new_balance": recon.physical_count}
+    settings = await db.petty_cash_settings.find_one({}, {"_id": 0, "current_balance": 1})
+    if not settings:
+        raise HTTPException(status_code=400, detail="Not set up")
+    derived = await petty_cash_ledger.ledger_balance(db)
+    current_balance = round(settings.get("current_balance", 0), 2)
+    return {
+        "current_balance": current_balance,
+        "ledger": derived,
+        "in_balance": derived is None or abs(derived["balance"] - current_balance) <= petty_cash_ledger.RECONCILIATION_TOLERANCE
+    }
 
 @api_router.get("/finance/petty-cash/reconciliations")
 async def get_reconciliation_history(current_user: User = Depends(get_current_user)):
@@ -14858,39 +14301,62 @@ async def get_petty_cash_summary(year: int = None, current_user: User = Depends(
     now = get_malaysia_time()
     year = year or now.year
     
-    query = {"date": {"$gte": f"{year}-01-01", "$lte": f"{year}-12-31"}, "type": "expense", "status": "approved"}
-    transactions = await db.petty_cash_transactions.find(query, {"_id": 0}).to_list(10000)
-    
-    by_category = {}
-    for txn in transactions:
-        cat = txn.get("category", "Miscellaneous")
-        if cat not in by_category:
-            by_category[cat] = {"count": 0, "total": 0}
-        by_category[cat]["count"] += 1
-        by_category[cat]["total"] += txn.get("amount", 0)
-    
-    by_month = {}
-    for txn in transactions:
-        try:
-            m = int(txn.get("date", "")[5:7])
-            if m not in by_month:
-                by_month[m] = 0
-            by_month[m] += txn.get("amount", 0)
-        except:
-            pass
-    
-    settings = await db.petty_cash_settings.find_one({}, {"_id": 0})
+    summary, settings = await asyncio.gather(
+        petty_cash_ledger.expense_summary(report_db, year),
+        db.petty_cash_settings.find_one({}, {"_id": 0})
+    )
     
     return {
         "year": year,
         "current_balance": settings.get("current_balance", 0) if settings else 0,
         "float_amount": settings.get("float_amount", 0) if settings else 0,
-        "by_category": by_category,
-        "by_month": by_month,
-        "total_expenses": sum(c["total"] for c in by_category.values())
+        "by_category": summary["by_category"],
+        "by_month": summary["by_month"],
+        "total_expenses": sum(c["total"] for c in summary["by_category"].values())
     }
 
 
+# ==================== NOTIFICATIONS ====================
+
+class NotificationMarkRead(BaseModel):
+    notification_ids: Optional[List[str]] = None  # None marks everything read
+
+@api_router.get("/notifications")
+async def get_notifications(
+    limit: int = 20,
+    before: Optional[str] = None,
+    unread_only: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Paginated notification feed for the current user (newest first)"""
+    return await list_notifications(db, current_user.id, limit=limit, before=before, unread_only=unread_only)
+
+@api_router.get("/notifications/unread-count")
+async def get_notifications_unread_count(current_user: User = Depends(get_current_user)):
+    """Unread notification count from the maintained per-user counter"""
+    return {"unread_count": await get_unread_count(db, current_user.id)}
+
+@api_router.get("/notifications/poll")
+async def poll_notifications(
+    since: Optional[int] = None,
+    timeout: float = 25,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Long-poll for notification changes.
+    Pass the last unread_count seen as `since`; the request returns when it changes or on timeout.
+    """
+    return await wait_for_change(db, current_user.id, since, timeout)
+
+@api_router.post("/notifications/mark-read")
+async def mark_notifications_read(data: NotificationMarkRead, current_user: User = Depends(get_current_user)):
+    """Mark the given notifications (or all of them) as read"""
+    updated = await mark_read(db, current_user.id, data.notification_ids)
+    return {
+        "updated": updated,
+        "unread_count": await get_unread_count(db, current_user.id)
+    }
+
 # ==================== HEALTH & SECURITY ADMIN ENDPOINTS ====================
 
 @api_router.get("/health")
@@ -14910,6 +14376,20 @@ async def health_check():
             content={"status": "unhealthy", "error": str(e)}
         )
 
+@api_router.get("/metrics")
+async def prometheus_metrics(request: Request):
+    """
+    Prometheus text exposition: per-route latency histograms, MongoDB commands per
+    request, N+1 and slow-request counters. Set METRICS_TOKEN to require a bearer token.
+    """
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    if metrics_token and request.headers.get("authorization") != f"Bearer {metrics_token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(
+        content=metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @api_router.get("/security/status")
 async def security_status(current_user: User = Depends(get_current_user)):
     """Get security status (admin only)"""
@@ -14987,94 +14467,63 @@ logger = logging.getLogger(__name__)
 
 
 @app.on_event("startup")
-async def setup_admin_account():
-    """Create or update admin account on startup"""
+async def run_startup_migrations():
+    """
+    Apply pending schema migrations (index manifest, admin bootstrap).
+    Once applied they are recorded in schema_migrations, so a normal boot is a
+    single read. Set RUN_MIGRATIONS_ON_STARTUP=false and use `python migrate.py up`
+    to keep DDL out of app start entirely.
+    """
+    if os.environ.get('RUN_MIGRATIONS_ON_STARTUP', 'true').lower() != 'true':
+        return
     try:
-        # PERFORMANCE OPTIMIZATION: Create database indexes
-        # Indexes dramatically speed up queries on large datasets
-        logging.info("📊 Creating database indexes for performance optimization...")
-        
+        summary = await run_migrations(db)
+        if summary['applied'] or summary['failed']:
+            logging.info(f"📊 Migrations applied: {summary['applied']} failed: {summary['failed']}")
+    except Exception as e:
+        logging.error(f"❌ Failed to run startup migrations: {str(e)}")
+
+
+async def archive_sessions_periodically(interval_hours: float):
+    while True:
         try:
-            # Users collection indexes
-            await db.users.create_index("id", unique=True)
-            await db.users.create_index("email", unique=True)
-            await db.users.create_index("role")
-            await db.users.create_index([("company_id", 1), ("role", 1)])
-            
-            # Sessions collection indexes
-            await db.sessions.create_index("id", unique=True)
-            await db.sessions.create_index("program_id")
-            await db.sessions.create_index("company_id")
-            await db.sessions.create_index([("start_date", 1), ("end_date", 1)])
-            
-            # Test results collection indexes
-            await db.test_results.create_index([("session_id", 1), ("participant_id", 1)])
-            await db.test_results.create_index("test_type")
-            
-            # Attendance collection indexes
-            await db.attendance.create_index([("session_id", 1), ("participant_id", 1)])
-            await db.attendance.create_index([("session_id", 1), ("date", 1)])
-            
-            # Participant access collection indexes
-            await db.participant_access.create_index([("session_id", 1), ("participant_id", 1)], unique=True)
-            
-            # Feedback collection indexes
-            await db.course_feedback.create_index([("session_id", 1), ("participant_id", 1)])
-            
-            # Vehicle issues collection indexes
-            await db.vehicle_issues.create_index([("session_id", 1), ("participant_id", 1)])
-            
-            logging.info("✅ Database indexes created successfully")
-        except Exception as idx_error:
-            logging.warning(f"⚠️  Index creation warning (may already exist): {str(idx_error)}")
-        
-        # Admin credentials from environment variables
-        admin_email = os.environ.get('ADMIN_EMAIL', 'admin@example.com')
-        admin_password = os.environ.get('ADMIN_PASSWORD', 'changeme123')
-        admin_name = "System Administrator"
-        admin_id_number = "ADMIN001"
-        
-        # Check if admin exists
-        existing_admin = await db.users.find_one({"role": "admin"})
-        
-        # Hash password
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        hashed_password = pwd_context.hash(admin_password)
-        
-        if existing_admin:
-            # Update existing admin
-            await db.users.update_one(
-                {"role": "admin"},
-                {"$set": {
-                    "email": admin_email,
-                    "password": hashed_password,
-                    "full_name": admin_name,
-                    "id_number": admin_id_number
-                }}
-            )
-            logging.info(f"✅ Admin account updated: {admin_email}")
-        else:
-            # Create new admin
-            admin_doc = {
-                "id": str(uuid.uuid4()),
-                "email": admin_email,
-                "password": hashed_password,
-                "full_name": admin_name,
-                "id_number": admin_id_number,
-                "phone_number": "",
-                "role": "admin",
-                "company_id": None,
-                "created_at": get_malaysia_time().isoformat()
-            }
-            await db.users.insert_one(admin_doc)
-            logging.info(f"✅ Admin account created: {admin_email}")
-        
-        logging.info(f"🔐 Admin credentials: {admin_email} / {admin_password}")
-        
+            summary = await archive_due_sessions(db)
+            if summary['sessions_archived']:
+                logging.info(f"🗄️ Archived {summary['sessions_archived']} sessions ({summary['records_moved']} records)")
+        except Exception as e:
+            logging.error(f"❌ Session archival failed: {str(e)}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+@app.on_event("startup")
+async def start_session_event_feed():
+    """Feed live session events from MongoDB change streams when SESSION_EVENTS_CHANGE_STREAMS=true"""
+    if change_streams_enabled():
+        app.state.session_events_task = asyncio.create_task(run_change_stream_feed(db, session_events))
+
+
+@app.on_event("startup")
+async def start_session_archival():
+    """
+    Archive completed sessions in the background every ARCHIVE_INTERVAL_HOURS
+    (unset or 0 disables it; POST /api/admin/archive/run does the same on demand).
+    Archival is idempotent, so several workers running it is harmless.
+    """
+    interval_hours = float(os.environ.get('ARCHIVE_INTERVAL_HOURS', '0') or 0)
+    if interval_hours > 0:
+        app.state.archive_task = asyncio.create_task(archive_sessions_periodically(interval_hours))
+
+
+@app.on_event("startup")
+async def start_audit_writer():
+    """Buffer audit entries and write them in batches (replaying any spooled at the last shutdown)"""
+    try:
+        await audit_writer.start(db)
     except Exception as e:
-        logging.error(f"❌ Failed to setup admin account: {str(e)}")
+        logging.error(f"❌ Failed to start audit writer, audit entries will be written inline: {str(e)}")
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await audit_writer.stop()
     client.close()
@@ -2,19 +2,39 @@
 Utility modules for the application
 """
 from .time_helpers import get_malaysia_time, get_malaysia_date, get_malaysia_time_str, MALAYSIA_TZ
-from .database import db, get_database
-from .security import (
-    pwd_context, 
-    security, 
-    SECRET_KEY, 
-    ALGORITHM, 
-    verify_password, 
-    get_password_hash
-)
+
+# Database and security helpers are resolved on first access so that importing
+# a standalone helper module (e.g. utils.static_files) does not open a MongoDB
+# client or require SECRET_KEY
+_LAZY_EXPORTS = {
+    'db': 'database',
+    'get_database': 'database',
+    'pwd_context': 'security',
+    'security': 'security',
+    'SECRET_KEY': 'security',
+    'ALGORITHM': 'security',
+    'verify_password': 'security',
+    'get_password_hash': 'security',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    module = importlib.import_module(f".{module_name}", __name__)
+    # Bind every export of the module, which also replaces the "security"
+    # submodule attribute with the HTTPBearer instance of the same name
+    for export, source in _LAZY_EXPORTS.items():
+        if source == module_name:
+            globals()[export] = getattr(module, export)
+    return globals()[name]
+
 
 __all__ = [
     'get_malaysia_time',
-    'get_malaysia_date', 
+    'get_malaysia_date',
     'get_malaysia_time_str',
     'MALAYSIA_TZ',
     'db',
@@ -0,0 +1,321 @@
+"""
+Hot/archive tiering for session-scoped operational records
+
+Once a session has been marked completed and the retention window has passed,
+its rows in the participant-facing collections are moved into archive_<name>
+collections. The hot collections (and their indexes) then only hold live
+sessions, which is what clock-in, test and checklist polling hit.
+
+Reports and certificates read through TieredDatabase, which merges both tiers,
+so archived sessions look exactly as they did before they were moved. Writes
+for an archived session would land in (or miss) the hot tier, so the API
+refuses them once records_tier is set; admin edits of an individual record
+write to the tier that holds it (TieredCollection.locate).
+"""
+import asyncio
+import os
+from datetime import timedelta
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from pymongo import ReplaceOne
+
+from .time_helpers import get_malaysia_time
+
+ARCHIVE_PREFIX = "archive_"
+
+# Session-scoped collections that are moved once a session is archived
+ARCHIVED_COLLECTIONS = [
+    "test_results",
+    "attendance",
+    "attendance_records",
+    "participant_attendance",
+    "course_feedback",
+    "vehicle_checklists",
+    "vehicle_details",
+    "participant_access",
+    "chief_trainer_feedback",
+    "coordinator_feedback",
+]
+
+ARCHIVABLE_STATUSES = ["completed", "archived"]
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '180'))
+ARCHIVE_CONCURRENCY = int(os.environ.get('ARCHIVE_CONCURRENCY', '4'))
+ARCHIVE_BATCH_SIZE = 500
+
+# sessions.records_tier
+TIER_ARCHIVING = "archiving"
+TIER_ARCHIVE = "archive"
+ARCHIVED_TIERS = (TIER_ARCHIVING, TIER_ARCHIVE)
+
+
+def archive_name(collection: str) -> str:
+    return f"{ARCHIVE_PREFIX}{collection}"
+
+
+def records_archived(session: Optional[dict]) -> bool:
+    """True once a session's records have started moving to the archive tier"""
+    return bool(session) and session.get("records_tier") in ARCHIVED_TIERS
+
+
+async def session_records_archived(db, session_id: Optional[str]) -> bool:
+    if not session_id:
+        return False
+    session = await db.sessions.find_one({"id": session_id}, {"_id": 0, "records_tier": 1})
+    return records_archived(session)
+
+
+async def gather_bounded(tasks: Iterable[Callable[[], Awaitable]], concurrency: int = ARCHIVE_CONCURRENCY) -> list:
+    """Run the task factories with at most `concurrency` in flight, results in order"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(task):
+        async with semaphore:
+            return await task()
+
+    return await asyncio.gather(*(run(task) for task in tasks))
+
+
+# ==================== ARCHIVAL ====================
+
+async def _move_session_records(db, collection: str, session_id: str, batch_size: int) -> int:
+    """
+    Copy a session's rows into the archive tier, then delete them from the hot tier.
+
+    Copies are upserts by _id, so a run interrupted between the two steps is
+    finished cleanly by the next one.
+    """
+    hot, archive = db[collection], db[archive_name(collection)]
+    moved = 0
+    while True:
+        docs = await hot.find({"session_id": session_id}).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return moved
+        await archive.bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs],
+            ordered=False
+        )
+        await hot.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        moved += len(docs)
+
+
+async def archive_session(
+    db,
+    session_id: str,
+    concurrency: int = ARCHIVE_CONCURRENCY,
+    batch_size: int = ARCHIVE_BATCH_SIZE
+) -> dict:
+    """Move one session's operational records into the archive collections"""
+    await db.sessions.update_one({"id": session_id}, {"$set": {"records_tier": TIER_ARCHIVING}})
+    counts = await gather_bounded(
+        [
+            (lambda name=name: _move_session_records(db, name, session_id, batch_size))
+            for name in ARCHIVED_COLLECTIONS
+        ],
+        concurrency
+    )
+    await db.sessions.update_one(
+        {"id": session_id},
+        {"$set": {"records_tier": TIER_ARCHIVE, "records_archived_at": get_malaysia_time().isoformat()}}
+    )
+    return dict(zip(ARCHIVED_COLLECTIONS, counts))
+
+
+def due_sessions_filter(retention_days: int = ARCHIVE_RETENTION_DAYS, now=None) -> dict:
+    cutoff = (now or get_malaysia_time()) - timedelta(days=retention_days)
+    return {
+        "completion_status": {"$in": ARCHIVABLE_STATUSES},
+        "completed_date": {"$lt": cutoff.isoformat()},
+        "records_tier": {"$ne": TIER_ARCHIVE},
+    }
+
+
+async def archive_due_sessions(
+    db,
+    retention_days: Optional[int] = None,
+    now=None,
+    limit: int = 200,
+    concurrency: int = ARCHIVE_CONCURRENCY
+) -> dict:
+    """Archive sessions completed more than `retention_days` ago"""
+    retention_days = ARCHIVE_RETENTION_DAYS if retention_days is None else retention_days
+    sessions = await db.sessions.find(
+        due_sessions_filter(retention_days, now), {"_id": 0, "id": 1}
+    ).sort("completed_date", 1).limit(limit).to_list(limit)
+
+    records = 0
+    for session in sessions:
+        counts = await archive_session(db, session["id"], concurrency)
+        records += sum(counts.values())
+    return {
+        "sessions_archived": len(sessions),
+        "records_moved": records,
+        "retention_days": retention_days,
+    }
+
+
+async def cascade_delete(
+    db,
+    collections: List[str],
+    query: dict,
+    concurrency: int = ARCHIVE_CONCURRENCY
+) -> int:
+    """delete_many across collections (and their archive tiers) with bounded parallelism"""
+    targets = list(collections)
+    targets += [archive_name(name) for name in collections if name in ARCHIVED_COLLECTIONS]
+    results = await gather_bounded(
+        [(lambda name=name: db[name].delete_many(query)) for name in targets],
+        concurrency
+    )
+    return sum(result.deleted_count for result in results)
+
+
+# ==================== TIERED READS ====================
+
+def _field_value(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _sort_documents(docs: list, sort_spec: list) -> list:
+    # Stable sorts applied from the last key to the first; missing values sort lowest, as in MongoDB
+    for field, direction in reversed(sort_spec):
+        docs.sort(
+            key=lambda doc: (_field_value(doc, field) is not None, _field_value(doc, field)),
+            reverse=direction < 0
+        )
+    return docs
+
+
+class TieredCursor:
+    """The subset of the Motor cursor API the report readers use, over both tiers"""
+
+    def __init__(self, collections, filter: Optional[dict], projection: Optional[dict]):
+        self._collections = collections
+        self._filter = filter or {}
+        self._projection = dict(projection) if projection else None
+        self._sort: list = []
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: int = 1) -> "TieredCursor":
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def limit(self, limit: int) -> "TieredCursor":
+        self._limit = limit
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        # _id is needed to drop rows caught in both tiers mid-archive
+        projection, strip_id = self._projection, False
+        if projection and projection.get("_id") == 0:
+            projection = {k: v for k, v in projection.items() if k != "_id"} or None
+            strip_id = True
+
+        limit = min(filter(None, [self._limit, length]), default=0)
+
+        async def read(collection):
+            cursor = collection.find(self._filter, projection)
+            if self._sort:
+                cursor = cursor.sort(self._sort)
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(limit or None)
+
+        tiers = await asyncio.gather(*(read(collection) for collection in self._collections))
+
+        seen, merged = set(), []
+        for docs in tiers:
+            for doc in docs:
+                if doc["_id"] in seen:
+                    continue
+                seen.add(doc["_id"])
+                merged.append(doc)
+        # Each tier comes back sorted; only a merge with archived rows needs re-sorting
+        if self._sort and tiers[1]:
+            _sort_documents(merged, self._sort)
+        if limit:
+            merged = merged[:limit]
+        if strip_id:
+            for doc in merged:
+                doc.pop("_id", None)
+        return merged
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list(None):
+            yield doc
+
+
+class TieredCollection:
+    """
+    Read view of a hot collection and its archive tier; locate() also names
+    the tier holding a record so a single-record edit can write there
+    """
+
+    def __init__(self, db, name: str):
+        self.name = name
+        self.hot = db[name]
+        self.archive = db[archive_name(name)]
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None) -> TieredCursor:
+        return TieredCursor((self.hot, self.archive), filter, projection)
+
+    async def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        # Hot first: live sessions never touch the archive
+        doc = await self.hot.find_one(filter, projection, **kwargs)
+        if doc is None:
+            doc = await self.archive.find_one(filter, projection, **kwargs)
+        return doc
+
+    async def locate(self, filter: dict, projection: Optional[dict] = None):
+        """(collection, document) for the tier holding a matching record, or (None, None)"""
+        for collection in (self.hot, self.archive):
+            doc = await collection.find_one(filter, projection)
+            if doc is not None:
+                return collection, doc
+        return None, None
+
+    async def count_documents(self, filter: dict, **kwargs) -> int:
+        counts = await asyncio.gather(
+            self.hot.count_documents(filter, **kwargs),
+            self.archive.count_documents(filter, **kwargs)
+        )
+        return sum(counts)
+
+    async def distinct(self, key: str, filter: Optional[dict] = None) -> list:
+        tiers = await asyncio.gather(self.hot.distinct(key, filter), self.archive.distinct(key, filter))
+        values = list(tiers[0])
+        values += [value for value in tiers[1] if value not in values]
+        return values
+
+
+class TieredDatabase:
+    """
+    Database wrapper for readers of historical sessions.
+
+    Archived collections resolve to TieredCollection; everything else is the
+    underlying Motor collection, so `tiered_db.X.find(...)` is a drop-in for
+    `db.X.find(...)` in report and certificate code.
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name: str):
+        if name in ARCHIVED_COLLECTIONS:
+            return TieredCollection(self._db, name)
+        return self._db[name]
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
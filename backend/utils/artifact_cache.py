@@ -0,0 +1,199 @@
+"""
+Content-addressed store for generated downloads
+
+Generated files (Excel templates, exports, reports) are keyed by
+(generator name, hash of the declared inputs, code version) and kept on disk
+under a size-bounded LRU. The key doubles as a strong ETag, so a browser
+that already has the file gets a 304 without the generator or the disk being
+touched, and any other repeat request is served from the stored bytes.
+
+The code version is a hash of the source file that defines the generator:
+changing the generator, or anything else in its module, produces new keys
+and the old entries age out. A generator opts in by being a plain function
+that returns bytes and takes its inputs as keyword arguments:
+
+    return await artifact_store.respond(
+        request, "statutory-rates-template", build_statutory_template,
+        inputs={"rate_type": rate_type}, media_type=XLSX_MEDIA_TYPE,
+        filename=f"{rate_type}_rates_template.xlsx"
+    )
+
+Several workers can share the directory: files are written atomically and
+each worker evicts from its own view of the directory, tolerating files
+another worker already removed.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .static_files import etag_matches
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_DIR = os.environ.get(
+    'ARTIFACT_CACHE_DIR', str(Path(__file__).resolve().parent.parent / "artifact_cache")
+)
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get('ARTIFACT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Downloads sit behind authentication: browsers may keep them but must revalidate
+ARTIFACT_CACHE_CONTROL = "private, no-cache"
+
+_code_versions: Dict[str, str] = {}
+
+
+def code_version(generator: Callable) -> str:
+    """Hash of the source file defining the generator (its code object when there is none)"""
+    module = sys.modules.get(generator.__module__)
+    path = getattr(module, "__file__", None)
+    if path is None:
+        return hashlib.sha256(generator.__code__.co_code).hexdigest()[:16]
+    if path not in _code_versions:
+        with open(path, "rb") as f:
+            _code_versions[path] = hashlib.sha256(f.read()).hexdigest()[:16]
+    return _code_versions[path]
+
+
+def artifact_key(name: str, inputs: dict, version: str) -> str:
+    payload = json.dumps([name, inputs, version], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ArtifactStore:
+    """Generated bytes on disk, one file per key, least recently used evicted first"""
+
+    def __init__(self, root: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None  # key -> size, oldest first
+        self._total = 0
+        self._index_lock = threading.Lock()
+        self._build_locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.bin"
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.root.glob("*.bin"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, path.stem, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._index.values())
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Stored bytes for key, or None (runs in a worker thread)"""
+        with self._index_lock:
+            self._load_index()
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._index_lock:
+                if key in self._index:
+                    self._total -= self._index.pop(key)
+            return None
+        with self._index_lock:
+            if key not in self._index:
+                # Written by another worker
+                self._index[key] = len(data)
+                self._total += len(data)
+            self._index.move_to_end(key)
+        try:
+            # Recency survives restarts through the file's mtime
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def write(self, key: str, data: bytes):
+        """Store bytes atomically and evict down to max_bytes (runs in a worker thread)"""
+        with self._index_lock:
+            self._load_index()
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._index_lock:
+            self._total += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict(keep=key)
+
+    def _evict(self, keep: str):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = next(iter(self._index.items()))
+            if key == keep:
+                break
+            self._index.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def key_for(self, name: str, generator: Callable, inputs: Optional[dict] = None, version: str = "") -> str:
+        return artifact_key(name, inputs or {}, f"{code_version(generator)}:{version}")
+
+    async def get_or_build(self, name: str, generator: Callable, inputs: Optional[dict] = None,
+                           version: str = "") -> Tuple[str, bytes]:
+        """(key, bytes), building once per key even under concurrent requests"""
+        inputs = inputs or {}
+        key = self.key_for(name, generator, inputs, version)
+        data = await asyncio.to_thread(self.read, key)
+        if data is not None:
+            self.hits += 1
+            return key, data
+
+        lock = self._build_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            data = await asyncio.to_thread(self.read, key)
+            if data is not None:
+                self.hits += 1
+                return key, data
+            self.misses += 1
+            data = await asyncio.to_thread(generator, **inputs)
+            try:
+                await asyncio.to_thread(self.write, key, data)
+            except OSError as e:
+                # A full or read-only disk only costs the caching
+                logger.warning(f"Could not store artifact {name}: {e}")
+        self._build_locks.pop(key, None)
+        return key, data
+
+    async def respond(self, request: Request, name: str, generator: Callable, *,
+                      inputs: Optional[dict] = None, media_type: str = XLSX_MEDIA_TYPE,
+                      filename: Optional[str] = None, version: str = "") -> Response:
+        """Serve a generated artifact with a strong ETag, answering 304 when the client has it"""
+        key = self.key_for(name, generator, inputs, version)
+        etag = f'"{key[:32]}"'
+        headers = {"ETag": etag, "Cache-Control": ARTIFACT_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        _, data = await self.get_or_build(name, generator, inputs, version)
+        if filename:
+            headers["Content-Disposition"] = f"attachment; filename={filename}"
+        return Response(content=data, media_type=media_type, headers=headers)
+
+
+artifact_store = ArtifactStore()
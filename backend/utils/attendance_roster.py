@@ -0,0 +1,195 @@
+"""
+Whole-session attendance roster
+
+A coordinator marks attendance for a whole session at once. Each
+participant can be marked present or absent (stored in
+participant_attendance) and can have clock times (stored in attendance, one
+record per participant per session).
+
+roster() reads everything with one aggregation on the session. It joins the
+enrolled users, both attendance collections and their archive tiers by id.
+Each join is an equality match on an indexed field.
+
+apply_roster() compares the submitted entries with that roster. Only real
+changes are sent, as one unordered bulk_write per collection, and each
+write updates or upserts the participant's single record. A retried request
+(patchy venue Wi-Fi) finds nothing left to change and writes nothing.
+"""
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from .time_helpers import MALAYSIA_TZ, get_malaysia_time
+
+ROSTER_STATUSES = ("present", "absent")
+
+PARTICIPANT_FIELDS = ("id", "full_name", "email", "id_number", "company_id")
+MARK_FIELDS = ("participant_id", "status", "marked_by", "marked_at")
+CLOCK_FIELDS = ("id", "participant_id", "date", "clock_in", "clock_out")
+SESSION_FIELDS = ("id", "name", "start_date", "end_date", "supervisor_ids", "coordinator_id", "records_tier")
+
+
+def _slim(array: str, fields) -> dict:
+    return {"$map": {"input": array, "as": "row", "in": {name: f"$$row.{name}" for name in fields}}}
+
+
+def _join(collection: str, local_field: str, foreign_field: str, alias: str) -> dict:
+    return {"$lookup": {"from": collection, "localField": local_field, "foreignField": foreign_field, "as": alias}}
+
+
+def roster_pipeline(session_id: str) -> list:
+    return [
+        {"$match": {"id": session_id}},
+        _join("users", "participant_ids", "id", "participants"),
+        _join("attendance", "id", "session_id", "clock"),
+        _join("archive_attendance", "id", "session_id", "clock_archived"),
+        _join("participant_attendance", "id", "session_id", "marks"),
+        _join("archive_participant_attendance", "id", "session_id", "marks_archived"),
+        # Only what the roster shows leaves the server (no password hashes)
+        {"$project": {
+            "_id": 0,
+            **{name: 1 for name in SESSION_FIELDS},
+            "participant_ids": 1,
+            "participants": _slim("$participants", PARTICIPANT_FIELDS),
+            "clock": _slim({"$concatArrays": ["$clock", "$clock_archived"]}, CLOCK_FIELDS),
+            "marks": _slim({"$concatArrays": ["$marks", "$marks_archived"]}, MARK_FIELDS),
+        }},
+    ]
+
+
+def _latest_by_participant(records: List[dict], key) -> Dict[str, dict]:
+    latest = {}
+    for record in sorted(records, key=key):
+        latest[record.get("participant_id")] = record
+    return latest
+
+
+def build_roster(doc: dict) -> dict:
+    """Session summary and one row per enrolled participant, by name"""
+    users = {user.get("id"): user for user in doc.get("participants", [])}
+    # Legacy data may hold several records per participant; the newest wins
+    clocks = _latest_by_participant(doc.get("clock", []), key=lambda r: (r.get("date") or "", r.get("clock_in") or ""))
+    marks = _latest_by_participant(doc.get("marks", []), key=lambda r: r.get("marked_at") or "")
+
+    rows = []
+    for participant_id in dict.fromkeys(doc.get("participant_ids") or []):
+        user = users.get(participant_id, {})
+        clock = clocks.get(participant_id, {})
+        mark = marks.get(participant_id, {})
+        rows.append({
+            "participant_id": participant_id,
+            "full_name": user.get("full_name") or f"Participant {participant_id}",
+            "email": user.get("email", ""),
+            "id_number": user.get("id_number"),
+            "company_id": user.get("company_id"),
+            "status": mark.get("status"),
+            "marked_by": mark.get("marked_by"),
+            "marked_at": mark.get("marked_at"),
+            "attendance_id": clock.get("id"),
+            "date": clock.get("date"),
+            "clock_in": clock.get("clock_in"),
+            "clock_out": clock.get("clock_out"),
+        })
+    rows.sort(key=lambda row: (row["full_name"] or "").lower())
+    return {
+        "session": {name: doc.get(name) for name in SESSION_FIELDS},
+        "participants": rows,
+    }
+
+
+async def roster(db, session_id: str) -> Optional[dict]:
+    """The session's roster, or None when the session does not exist"""
+    docs = await db.sessions.aggregate(roster_pipeline(session_id)).to_list(1)
+    return build_roster(docs[0]) if docs else None
+
+
+def local_clock(value: str) -> Tuple[str, str]:
+    """(date, HH:MM:SS) in Malaysian time for an ISO datetime, as the clock-in routes store it"""
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid clock time: {value}")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=MALAYSIA_TZ)
+    moment = moment.astimezone(MALAYSIA_TZ)
+    return moment.date().isoformat(), moment.strftime("%H:%M:%S")
+
+
+def plan_roster(session_id: str, current: dict, entries: List[dict], marked_by: str,
+                now: Optional[datetime] = None) -> Tuple[List[UpdateOne], List[UpdateOne], List[dict]]:
+    """
+    Writes needed to bring the roster to the submitted entries.
+
+    Returns participant_attendance writes, attendance writes and the changed
+    fields per participant. Entries may leave out status or clock times to
+    keep them as they are.
+    """
+    now_iso = (now or get_malaysia_time()).isoformat()
+    rows = {row["participant_id"]: row for row in current["participants"]}
+
+    seen, unknown = set(), []
+    for entry in entries:
+        participant_id = entry["participant_id"]
+        if participant_id in seen:
+            raise HTTPException(status_code=400, detail=f"Participant listed twice: {participant_id}")
+        seen.add(participant_id)
+        if participant_id not in rows:
+            unknown.append(participant_id)
+        if entry.get("status") is not None and entry["status"] not in ROSTER_STATUSES:
+            raise HTTPException(status_code=400, detail="Status must be 'present' or 'absent'")
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Participants not enrolled in this session: {', '.join(unknown)}")
+
+    mark_writes, clock_writes, changes = [], [], []
+    for entry in entries:
+        participant_id = entry["participant_id"]
+        row = rows[participant_id]
+        changed = {}
+
+        status = entry.get("status")
+        if status is not None and status != row["status"]:
+            changed["status"] = status
+            mark_writes.append(UpdateOne(
+                {"session_id": session_id, "participant_id": participant_id},
+                {"$set": {"status": status, "marked_by": marked_by, "marked_at": now_iso}},
+                upsert=True
+            ))
+
+        clock = {}
+        if entry.get("clock_in"):
+            date_str, time_str = local_clock(entry["clock_in"])
+            if (date_str, time_str) != (row["date"], row["clock_in"]):
+                clock.update(date=date_str, clock_in=time_str)
+        if entry.get("clock_out"):
+            if not (entry.get("clock_in") or row["clock_in"]):
+                raise HTTPException(status_code=400, detail=f"Clock in {participant_id} before clocking out")
+            _, time_str = local_clock(entry["clock_out"])
+            if time_str != row["clock_out"]:
+                clock["clock_out"] = time_str
+        if clock:
+            changed.update(clock)
+            if row["attendance_id"]:
+                clock_writes.append(UpdateOne({"id": row["attendance_id"]}, {"$set": clock}))
+            else:
+                clock_writes.append(UpdateOne(
+                    {"session_id": session_id, "participant_id": participant_id},
+                    {"$set": clock, "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now_iso}},
+                    upsert=True
+                ))
+
+        if changed:
+            changes.append({"participant_id": participant_id, **changed})
+    return mark_writes, clock_writes, changes
+
+
+async def apply_roster(db, session_id: str, current: dict, entries: List[dict], marked_by: str) -> List[dict]:
+    """Write the changes between the current roster and the entries; returns what changed"""
+    mark_writes, clock_writes, changes = plan_roster(session_id, current, entries, marked_by)
+    if mark_writes:
+        await db.participant_attendance.bulk_write(mark_writes, ordered=False)
+    if clock_writes:
+        await db.attendance.bulk_write(clock_writes, ordered=False)
+    return changes
@@ -3,7 +3,8 @@ Audit logging helper functions
 """
 from typing import Optional, Dict, Any
 from datetime import datetime
-from utils import db, get_malaysia_time
+from utils import db
+from utils.audit_writer import audit_writer, field_diff
 
 
 async def log_audit(
@@ -14,7 +15,8 @@ async def log_audit(
     resource_id: str,
     old_data: Optional[Dict[str, Any]] = None,
     new_data: Optional[Dict[str, Any]] = None,
-    ip_address: Optional[str] = None
+    ip_address: Optional[str] = None,
+    user_name: Optional[str] = None
 ):
     """
     Log an admin action to the audit trail
@@ -28,24 +30,27 @@ async def log_audit(
         old_data: Previous state of the resource (for updates/deletes)
         new_data: New state of the resource (for creates/updates)
         ip_address: IP address of the request
+        user_name: Name of the user, stored so log views need no user lookup
+    
+    Only the changed fields are stored (see utils.audit_writer.field_diff).
     """
     from models.audit import AuditLog
     
     audit_log = AuditLog(
         user_id=user_id,
         user_email=user_email,
+        user_name=user_name,
         action=action,
         resource_type=resource_type,
         resource_id=resource_id,
-        old_data=old_data,
-        new_data=new_data,
+        changes=field_diff(old_data, new_data),
         ip_address=ip_address
     )
     
-    doc = audit_log.model_dump()
+    doc = audit_log.model_dump(exclude_none=True)
     doc['timestamp'] = doc['timestamp'].isoformat()
     
-    await db.audit_logs.insert_one(doc)
+    await audit_writer.write(db, "audit_logs", doc)
     
     return audit_log.id
 
@@ -54,6 +59,7 @@ async def get_audit_logs_for_resource(resource_type: str, resource_id: str):
     """
     Get all audit logs for a specific resource
     """
+    await audit_writer.flush()
     logs = await db.audit_logs.find(
         {
             "resource_type": resource_type,
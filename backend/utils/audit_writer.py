@@ -0,0 +1,214 @@
+"""
+Buffered audit log writer
+
+Audit entries (finance_audit_log, audit_trail, audit_logs) are queued in
+process and written with one insert_many per collection, either when
+AUDIT_BATCH_SIZE entries are waiting or every AUDIT_FLUSH_INTERVAL_SECONDS,
+so a mutation no longer waits on its own audit insert.
+
+Entries that cannot be written when the app shuts down are appended to
+AUDIT_SPOOL_PATH (JSON lines) and replayed on the next start. Audit readers
+call flush() first, so a request always sees the entries made before it.
+
+Before/after documents are reduced to field-level diffs with field_diff().
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '200'))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', '1'))
+# Past this many waiting entries, writers wait for a flush instead of growing the buffer
+MAX_BUFFERED = int(os.environ.get('AUDIT_MAX_BUFFERED', '10000'))
+SPOOL_PATH = Path(os.environ.get('AUDIT_SPOOL_PATH', Path(__file__).parent.parent / 'audit_spool.jsonl'))
+
+DUPLICATE_KEY = 11000
+
+# Bookkeeping fields that change on every write and say nothing in an audit diff
+IGNORED_DIFF_FIELDS = {"_id", "updated_at", "version"}
+
+
+def field_diff(before: Optional[dict], after: Optional[dict], prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    """
+    {field: {"from": old, "to": new}} for every field that differs.
+
+    `after` is read like a $set: only the fields it carries are compared, so a
+    partial update dict can be passed against the full previous document.
+    Without `after` (a delete) every field of `before` is recorded. Nested
+    documents are compared under dotted paths; lists and scalars whole.
+    """
+    keys = list(after) if after is not None else list(before or {})
+    before, after = before or {}, after or {}
+    changes = {}
+    for key in keys:
+        if not prefix and key in IGNORED_DIFF_FIELDS:
+            continue
+        old, new = before.get(key), after.get(key)
+        if old == new:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(old, dict) and isinstance(new, dict):
+            changes.update(field_diff(old, new, f"{path}."))
+        else:
+            changes[path] = {"from": old, "to": new}
+    return changes
+
+
+def split_diff(changes: Optional[dict]):
+    """(before, after) dicts of just the changed fields, for screens that show both sides"""
+    if not changes:
+        return None, None
+    return ({field: change["from"] for field, change in changes.items()},
+            {field: change["to"] for field, change in changes.items()})
+
+
+class AuditWriter:
+
+    def __init__(self, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 max_buffered: int = MAX_BUFFERED, spool_path: Path = SPOOL_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.spool_path = Path(spool_path)
+        self._db = None
+        self._buffer: Dict[str, List[dict]] = defaultdict(list)
+        self._buffered = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    async def write(self, db, collection: str, entry: dict):
+        """Queue an entry (written immediately when the background flusher is not running)"""
+        if not self.running:
+            await db[collection].insert_one(entry)
+            return
+        self._db = db
+        self._buffer[collection].append(entry)
+        self._buffered += 1
+        if self._buffered >= self.max_buffered:
+            await self.flush()
+        elif self._buffered >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Write everything queued so far; entries that fail stay queued. Returns entries written."""
+        # Taking the lock even when empty makes a reader wait for a flush already in flight
+        async with self._lock():
+            if not self._buffered:
+                return 0
+            pending, self._buffer = self._buffer, defaultdict(list)
+            self._buffered = 0
+            written = 0
+            for collection, entries in pending.items():
+                if not entries:
+                    continue
+                try:
+                    await self._db[collection].insert_many(entries, ordered=False)
+                    written += len(entries)
+                except BulkWriteError as e:
+                    # Entries already written by an earlier, partly failed flush come back as duplicates
+                    failed = {
+                        err["index"] for err in e.details.get("writeErrors", [])
+                        if err.get("code") != DUPLICATE_KEY
+                    }
+                    written += len(entries) - len(failed)
+                    self._requeue(collection, [entries[i] for i in sorted(failed)])
+                except Exception as e:
+                    logger.warning(f"Audit flush to {collection} failed, will retry: {e}")
+                    self._requeue(collection, entries)
+            return written
+
+    def _requeue(self, collection: str, entries: List[dict]):
+        if entries:
+            self._buffer[collection][:0] = entries
+            self._buffered += len(entries)
+
+    def _lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Audit flush failed: {e}")
+
+    async def start(self, db):
+        """Replay any spooled entries and start the background flusher"""
+        self._db = db
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        await self.replay_spool(db)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write what is left, spooling to disk whatever cannot be written"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.flush()
+        if self._buffered:
+            self._spool()
+
+    def _spool(self):
+        with open(self.spool_path, "a", encoding="utf-8") as spool:
+            for collection, entries in self._buffer.items():
+                for entry in entries:
+                    entry = {k: v for k, v in entry.items() if k != "_id"}
+                    spool.write(json.dumps({"collection": collection, "entry": entry}, default=str) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+        logger.warning(f"Spooled {self._buffered} unwritten audit entries to {self.spool_path}")
+        self._buffer.clear()
+        self._buffered = 0
+
+    async def replay_spool(self, db) -> int:
+        if not self.spool_path.exists():
+            return 0
+        by_collection: Dict[str, List[dict]] = defaultdict(list)
+        with open(self.spool_path, encoding="utf-8") as spool:
+            for line in spool:
+                if line.strip():
+                    record = json.loads(line)
+                    by_collection[record["collection"]].append(record["entry"])
+        self._db = db
+        for collection, entries in by_collection.items():
+            self._requeue(collection, entries)
+        count = self._buffered
+        await self.flush()
+        # A crash before this point replays the file again; the unique id index drops the repeats
+        self.spool_path.unlink()
+        if self._buffered:
+            self._spool()
+        logger.info(f"Replayed {count - self._buffered} of {count} spooled audit entries")
+        return count - self._buffered
+
+audit_writer = AuditWriter()
@@ -0,0 +1,217 @@
+"""
+Month-bucketed cache for the session calendar
+
+The calendar shows one month or one week at a time. Each month's events are
+loaded with a single projected query and kept in memory as a "YYYY-MM"
+bucket, versioned in cache_versions like the reference cache. Session writes
+call invalidate() with every month the session covered before and after the
+change (session_months), and other workers notice the bump within
+VERSION_CHECK_SECONDS. A week window is served from the one or two buckets
+it touches, so navigating back and forth is a cache hit.
+
+Buckets hold compact events with ids only. Company and program names come
+from the reference cache when a window is served, so renames show up without
+touching the buckets. Buckets are always loaded from the primary: a lagging
+secondary could re-cache a month right after it was invalidated.
+"""
+import calendar
+import os
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from .reference_cache import CACHE_VERSIONS_COLLECTION, reference_cache
+
+VERSION_CHECK_SECONDS = float(os.environ.get('CALENDAR_CACHE_VERSION_CHECK_SECONDS', '2'))
+MAX_CACHED_MONTHS = 48
+
+# Stored per event; company_name, program_name and participant_count are added when served
+EVENT_FIELDS = ("id", "name", "start_date", "end_date", "location", "status",
+                "completion_status", "company_id", "program_id")
+EVENT_PROJECTION = {"_id": 0, "participant_ids": 1, **{name: 1 for name in EVENT_FIELDS}}
+
+
+def _version_key(month: str) -> str:
+    return f"calendar:{month}"
+
+
+def _parse_date(value) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def month_key(day: date) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def month_bounds(month: str) -> Tuple[date, date]:
+    """First and last day of a "YYYY-MM" month"""
+    year, month_number = (int(part) for part in month.split("-"))
+    return date(year, month_number, 1), date(year, month_number, calendar.monthrange(year, month_number)[1])
+
+
+def months_between(start: date, end: date) -> List[str]:
+    """Month keys from start to end inclusive"""
+    months = []
+    year, month_number = start.year, start.month
+    while (year, month_number) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month_number:02d}")
+        year, month_number = (year + 1, 1) if month_number == 12 else (year, month_number + 1)
+    return months
+
+
+def session_months(*sessions: Optional[dict]) -> Set[str]:
+    """Every month the given session documents (None allowed) fall in"""
+    months = set()
+    for session in sessions:
+        if not session:
+            continue
+        start = _parse_date(session.get("start_date"))
+        if start is None:
+            continue
+        end = _parse_date(session.get("end_date")) or start
+        months.update(months_between(start, max(start, end)))
+    return months
+
+
+def calendar_window(month: Optional[str] = None, week: Optional[str] = None,
+                    today: Optional[date] = None) -> Tuple[date, date]:
+    """
+    First and last day of the requested window: month="YYYY-MM", ISO
+    week="YYYY-Www" (Monday to Sunday), or the current month by default
+    """
+    if month and week:
+        raise HTTPException(status_code=400, detail="Pass either month or week, not both")
+    if week:
+        try:
+            year, week_number = week.upper().split("-W")
+            first = date.fromisocalendar(int(year), int(week_number), 1)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="week must look like 2025-W07")
+        return first, first + timedelta(days=6)
+    if month:
+        try:
+            return month_bounds(month)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="month must look like 2025-03")
+    today = today or date.today()
+    return month_bounds(month_key(today))
+
+
+class CalendarCache:
+    """Compact session events per month, keyed by the shared per-month version"""
+
+    def __init__(self, check_interval: float = VERSION_CHECK_SECONDS,
+                 max_months: int = MAX_CACHED_MONTHS, references=reference_cache):
+        self.check_interval = check_interval
+        self.max_months = max_months
+        self.references = references
+        self._buckets: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._checked_at: Dict[str, float] = {}
+        # Bumped per month on every drop so a load that raced an invalidation is not stored
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, month: str):
+        self._buckets.pop(month, None)
+        self._generations[month] = self._generations.get(month, 0) + 1
+
+    async def _sync_versions(self, db, months: List[str]):
+        now = time.monotonic()
+        due = [m for m in months
+               if m not in self._checked_at or now - self._checked_at[m] >= self.check_interval]
+        if not due:
+            return
+        # One round-trip covers every month in the window
+        docs = await db[CACHE_VERSIONS_COLLECTION].find(
+            {"_id": {"$in": [_version_key(m) for m in due]}}
+        ).to_list(None)
+        versions = {doc["_id"]: doc.get("version", 0) for doc in docs}
+        for month in due:
+            version = versions.get(_version_key(month), 0)
+            if self._versions.get(month) != version:
+                self._drop(month)
+                self._versions[month] = version
+            self._checked_at[month] = now
+
+    async def _bucket(self, db, month: str) -> List[dict]:
+        events = self._buckets.get(month)
+        if events is not None:
+            self._buckets.move_to_end(month)
+            self.hits += 1
+            return events
+
+        self.misses += 1
+        generation = self._generations.get(month, 0)
+        first, last = (day.isoformat() for day in month_bounds(month))
+        sessions = await db.sessions.find({
+            "start_date": {"$lte": last},
+            "$or": [
+                {"end_date": {"$gte": first}},
+                # Legacy sessions without an end date last one day
+                {"end_date": {"$in": [None, ""]}, "start_date": {"$gte": first}},
+            ],
+        }, EVENT_PROJECTION).to_list(None)
+        events = []
+        for session in sessions:
+            event = {name: session.get(name) for name in EVENT_FIELDS}
+            event["participant_count"] = len(session.get("participant_ids") or [])
+            events.append(event)
+        if generation == self._generations.get(month, 0):
+            self._buckets[month] = events
+            while len(self._buckets) > self.max_months:
+                self._buckets.popitem(last=False)
+        return events
+
+    async def events(self, db, start: date, end: date) -> List[dict]:
+        """Events overlapping start..end, with company and program names"""
+        months = months_between(start, end)
+        await self._sync_versions(db, months)
+        first, last = start.isoformat(), end.isoformat()
+        seen = set()
+        window = []
+        for month in months:
+            for event in await self._bucket(db, month):
+                # A session spanning months sits in several buckets
+                if event["id"] in seen:
+                    continue
+                event_end = event.get("end_date") or event.get("start_date")
+                if event["start_date"] <= last and event_end >= first:
+                    seen.add(event["id"])
+                    window.append(event)
+
+        companies = await self.references.names(db, "companies")
+        programs = await self.references.names(db, "programs")
+        window.sort(key=lambda e: (e["start_date"], e.get("name") or ""))
+        return [
+            {**event,
+             "company_name": companies.get(event.get("company_id")) or "Unknown",
+             "program_name": programs.get(event.get("program_id")) or "Unknown"}
+            for event in window
+        ]
+
+    async def invalidate(self, db, months: Iterable[str]):
+        """Call after a session in these months is created, updated, toggled or deleted"""
+        for month in sorted(set(months)):
+            doc = await db[CACHE_VERSIONS_COLLECTION].find_one_and_update(
+                {"_id": _version_key(month)},
+                {"$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._drop(month)
+            self._versions[month] = doc["version"]
+            self._checked_at[month] = time.monotonic()
+
+
+calendar_cache = CalendarCache()
@@ -0,0 +1,143 @@
+"""
+Negotiated response compression for JSON
+
+Compresses JSON responses at or above COMPRESSION_MIN_BYTES with brotli or
+gzip, whichever the client prefers in Accept-Encoding (brotli wins a tie and
+is only offered when the brotli package is installed). Everything else
+passes through untouched: small bodies, non-JSON content such as files,
+images and event streams, responses that already carry a Content-Encoding,
+and 204/304 responses.
+
+Every JSON response it considers carries Vary: Accept-Encoding, compressed
+or not, so a shared cache never hands a gzip body to a client that did not
+ask for one (or the identity body to one that did). An existing Vary header
+from the route is extended rather than repeated.
+
+This is a pure ASGI middleware. Only JSON responses are buffered, and
+large bodies are compressed in a worker thread so the event loop keeps
+serving other requests.
+"""
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# Bodies above this are compressed off the event loop
+THREAD_THRESHOLD_BYTES = 256 * 1024
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported encoding for an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = weights.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _is_json(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type == "application/json" or media_type.endswith("+json")
+
+
+def vary_on_accept_encoding(headers) -> list:
+    """ASGI headers with Accept-Encoding merged into Vary"""
+    headers = [(name, value) for name, value in headers]
+    tokens = {
+        token.strip().lower()
+        for name, value in headers if name.lower() == b"vary"
+        for token in value.decode("latin-1").split(",")
+    }
+    if "accept-encoding" in tokens or "*" in tokens:
+        return headers
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary" and value.strip():
+            headers[index] = (name, value + b", Accept-Encoding")
+            return headers
+    return [(name, value) for name, value in headers if name.lower() != b"vary"] + [(b"vary", b"Accept-Encoding")]
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        headers = dict((k.lower(), v) for k, v in scope.get("headers", []))
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+        start = None
+        chunks = []
+        passthrough = False
+
+        async def buffered_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (message["status"] in (204, 304) or b"content-encoding" in response_headers
+                        or not _is_json(content_type)):
+                    passthrough = True
+                    await send(message)
+                elif encoding is None:
+                    # Nothing to compress, but caches still need to know the body depends on the header
+                    passthrough = True
+                    await send({**message, "headers": vary_on_accept_encoding(message.get("headers", []))})
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            response_headers = vary_on_accept_encoding(
+                (k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"
+            )
+            if len(body) >= self.minimum_size:
+                if len(body) > THREAD_THRESHOLD_BYTES:
+                    body = await asyncio.to_thread(compress, body, encoding)
+                else:
+                    body = compress(body, encoding)
+                response_headers.append((b"content-encoding", encoding.encode()))
+            response_headers.append((b"content-length", str(len(body)).encode()))
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered_send)
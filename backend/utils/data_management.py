@@ -0,0 +1,176 @@
+"""
+Joined listings for the admin data management screens
+
+Each listing is one aggregation over the record collection:
+
+    $match   session filter (indexed session_id) plus the keyset cursor
+    $sort    _id, then $limit one past the page size
+    $lookup  participant/trainer (users), session, test
+    $project drop the joined arrays, keep only the looked-up fields
+
+Records of archived sessions live in the archive_ tier, so the same pipeline
+runs on both collections and the two pages are merged on _id. Archiving keeps
+_id, and a row caught in both tiers mid-archive is listed once.
+
+Company and program names come from the reference cache rather than a lookup
+per row. Filters on company, program or dates resolve session ids with one
+sessions query first, so a page costs the same number of queries at any size.
+Pages are keyed on _id: pass the returned next cursor as `after`.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from .archive import archive_name
+from .reference_cache import reference_cache
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+
+# Joined collection, local field, and {output field: (joined field, default)}.
+# A default of None marks a field used here but not returned.
+USER_JOIN = ("users", "participant_id", {
+    "participant_name": ("full_name", "Unknown"),
+    "participant_ic": ("id_number", "Unknown"),
+})
+TRAINER_JOIN = ("users", "trainer_id", {
+    "trainer_name": ("full_name", "Unknown"),
+})
+SESSION_JOIN = ("sessions", "session_id", {
+    "session_name": ("name", "Unknown"),
+    "_session_company_id": ("company_id", None),
+    "_session_program_id": ("program_id", None),
+})
+TEST_JOIN = ("tests", "test_id", {
+    "test_title": ("title", "Unknown"),
+    "test_type": ("test_type", "Unknown"),
+})
+
+# Record collection -> (joins, datetime fields stored as ISO strings)
+LISTINGS: Dict[str, Tuple[list, List[str]]] = {
+    "test_results": ([USER_JOIN, SESSION_JOIN, TEST_JOIN], ["submitted_at"]),
+    "course_feedback": ([USER_JOIN, SESSION_JOIN], ["submitted_at"]),
+    "attendance": ([USER_JOIN, SESSION_JOIN], ["clock_in", "clock_out"]),
+    "vehicle_checklists": ([USER_JOIN, TRAINER_JOIN, SESSION_JOIN], ["created_at"]),
+}
+
+
+def parse_cursor(after: Optional[str]) -> Optional[ObjectId]:
+    """ObjectId for an `after` cursor; raises ValueError if it is malformed"""
+    if not after:
+        return None
+    try:
+        return ObjectId(after)
+    except (InvalidId, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+async def session_filter(
+    db,
+    session_id: Optional[str] = None,
+    company_id: Optional[str] = None,
+    program_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> dict:
+    """$match clause on session_id for the listing filters"""
+    if not (company_id or program_id or start_date or end_date):
+        return {"session_id": session_id} if session_id else {}
+
+    session_query = {}
+    if session_id:
+        session_query["id"] = session_id
+    if company_id:
+        session_query["company_id"] = company_id
+    if program_id:
+        session_query["program_id"] = program_id
+    if start_date:
+        session_query["start_date"] = {"$gte": start_date}
+    if end_date:
+        session_query["end_date"] = {"$lte": end_date}
+    sessions = await db.sessions.find(session_query, {"_id": 0, "id": 1}).to_list(None)
+    return {"session_id": {"$in": [s["id"] for s in sessions]}}
+
+
+def build_pipeline(collection: str, match: dict, after: Optional[ObjectId], limit: int) -> list:
+    joins, _ = LISTINGS[collection]
+    if after is not None:
+        match = {**match, "_id": {"$gt": after}}
+
+    pipeline = [{"$match": match}, {"$sort": {"_id": 1}}, {"$limit": limit + 1}]
+    computed, dropped = {}, {}
+    for index, (joined, local_field, fields) in enumerate(joins):
+        alias = f"_join{index}"
+        pipeline.append({"$lookup": {
+            "from": joined, "localField": local_field, "foreignField": "id", "as": alias
+        }})
+        computed[f"{alias}_found"] = {"$gt": [{"$size": f"${alias}"}, 0]}
+        for output, (source, _) in fields.items():
+            computed[f"{alias}_{output}"] = {"$arrayElemAt": [f"${alias}.{source}", 0]}
+        dropped[alias] = 0
+    pipeline.append({"$addFields": computed})
+    pipeline.append({"$project": dropped})
+    return pipeline
+
+
+def _finish_row(row: dict, joins: list, datetime_fields: List[str],
+                company_names: Dict[str, str], program_names: Dict[str, str]) -> dict:
+    row.pop("_id", None)
+    joined = {}
+    for index, (_, _, fields) in enumerate(joins):
+        alias = f"_join{index}"
+        found = row.pop(f"{alias}_found", False)
+        for output, (_, default) in fields.items():
+            value = row.pop(f"{alias}_{output}", None)
+            if not found:
+                continue
+            if default is None:
+                joined[output] = value
+            else:
+                row[output] = default if value is None else value
+
+    company_id = joined.get("_session_company_id")
+    program_id = joined.get("_session_program_id")
+    if company_id:
+        row["company_name"] = company_names.get(company_id) or "Unknown"
+    if program_id:
+        row["program_name"] = program_names.get(program_id) or "Unknown"
+
+    for field in datetime_fields:
+        if isinstance(row.get(field), str):
+            try:
+                row[field] = datetime.fromisoformat(row[field])
+            except ValueError:
+                pass
+    return row
+
+
+async def list_records(
+    db,
+    collection: str,
+    match: dict,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Tuple[list, Optional[str]]:
+    """One page of joined records and the cursor for the next page (None on the last page)"""
+    joins, datetime_fields = LISTINGS[collection]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    pipeline = build_pipeline(collection, match, parse_cursor(after), limit)
+    rows = {}
+    for tier in (collection, archive_name(collection)):
+        for row in await db[tier].aggregate(pipeline).to_list(None):
+            rows.setdefault(row["_id"], row)
+    rows = [rows[key] for key in sorted(rows)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1]["_id"])
+
+    company_names = await reference_cache.names(db, "companies")
+    program_names = await reference_cache.names(db, "programs")
+    return [
+        _finish_row(row, joins, datetime_fields, company_names, program_names) for row in rows
+    ], next_cursor
@@ -1,18 +1,124 @@
 """
 Database connection and configuration
+
+One Motor client per process, shared by server.py and every helper that
+imports utils.db, so the whole worker draws from a single connection pool.
+The pool and driver behaviour are tuned from the environment:
+
+    MONGO_MAX_POOL_SIZE                 connections per server (default 100)
+    MONGO_MIN_POOL_SIZE                 connections kept open while idle (default 0)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS         how long a request may wait for a free connection (default 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS   how long to wait for a usable server (default 5000;
+                                        the driver's 30s turns an outage into hung requests)
+    MONGO_CONNECT_TIMEOUT_MS            TCP connect timeout (default 10000)
+    MONGO_COMPRESSORS                   wire compression, e.g. "zstd,snappy,zlib" (default none)
+    MONGO_RETRY_WRITES                  retry a write once after a failover (default true)
+    MONGO_WRITE_CONCERN                 w for writes, e.g. "majority" or "1" (default: the server's)
+
+Report and aggregation endpoints read through reporting_database(db), which
+uses MONGO_REPORT_READ_PREFERENCE (secondaryPreferred by default): on a
+replica set those reads go to a secondary no more than
+MONGO_REPORT_MAX_STALENESS_SECONDS behind, on a standalone server they stay
+on the primary. Set it to "primary" to keep every read on the primary.
 """
 import os
 import logging
 from pathlib import Path
+from typing import Mapping, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import read_preferences
 from dotenv import load_dotenv
 
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
+READ_PREFERENCES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+# The server rejects a max staleness below 90 seconds
+MIN_MAX_STALENESS_SECONDS = 90
+
+_TRUE = {"1", "true", "yes", "on"}
+
+
+def _int_setting(env: Mapping[str, str], name: str, default: int) -> int:
+    value = env.get(name, str(default))
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+def client_options(env: Optional[Mapping[str, str]] = None) -> dict:
+    """AsyncIOMotorClient keyword arguments from the environment"""
+    env = os.environ if env is None else env
+    options = {
+        "maxPoolSize": _int_setting(env, "MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _int_setting(env, "MONGO_MIN_POOL_SIZE", 0),
+        "waitQueueTimeoutMS": _int_setting(env, "MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _int_setting(env, "MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": _int_setting(env, "MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "retryWrites": env.get("MONGO_RETRY_WRITES", "true").strip().lower() in _TRUE,
+        "appname": env.get("MONGO_APP_NAME", "mddrc-backend"),
+    }
+    compressors = env.get("MONGO_COMPRESSORS", "").strip()
+    if compressors:
+        options["compressors"] = compressors
+    write_concern = env.get("MONGO_WRITE_CONCERN", "").strip()
+    if write_concern:
+        options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+    return options
+
+
+def report_read_preference(env: Optional[Mapping[str, str]] = None):
+    """Read preference for report and aggregation reads"""
+    env = os.environ if env is None else env
+    mode = env.get("MONGO_REPORT_READ_PREFERENCE", "secondaryPreferred").strip()
+    if mode not in READ_PREFERENCES:
+        raise ValueError(
+            f"MONGO_REPORT_READ_PREFERENCE must be one of {', '.join(READ_PREFERENCES)}, got {mode!r}"
+        )
+    if mode == "primary":
+        return read_preferences.Primary()
+    max_staleness = max(_int_setting(env, "MONGO_REPORT_MAX_STALENESS_SECONDS", 120), MIN_MAX_STALENESS_SECONDS)
+    return READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+def create_client(url: Optional[str] = None, event_listeners=None,
+                  env: Optional[Mapping[str, str]] = None) -> AsyncIOMotorClient:
+    """A Motor client with the configured pool; does not connect until first use"""
+    env = os.environ if env is None else env
+    return AsyncIOMotorClient(
+        url or env['MONGO_URL'],
+        event_listeners=list(event_listeners or []),
+        **client_options(env),
+    )
+
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """The process-wide client, with command and pool monitoring attached"""
+    global _client
+    if _client is None:
+        from utils.instrumentation import mongo_command_listener, mongo_pool_listener
+        _client = create_client(event_listeners=[mongo_command_listener, mongo_pool_listener])
+    return _client
+
+
+def reporting_database(database):
+    """The same database, read with the report read preference"""
+    return database.client.get_database(database.name, read_preference=report_read_preference())
+
+
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = get_client()
 db_name = os.environ.get('DB_NAME')
 
 if not db_name:
@@ -0,0 +1,580 @@
+"""
+Excel templates for bulk uploads and program configuration
+
+Each builder returns the finished workbook as bytes. The download endpoints
+serve them through utils.artifact_cache, so a workbook is only rebuilt when
+this file or the builder's inputs change.
+"""
+from io import BytesIO
+
+
+def _auto_width(sheets, max_width: int):
+    """Fit each column to its longest value, capped at max_width"""
+    for sheet in sheets:
+        for column in sheet.columns:
+            longest = max((len(str(cell.value)) for cell in column), default=0)
+            sheet.column_dimensions[column[0].column_letter].width = min(longest + 2, max_width)
+
+
+def _to_bytes(wb) -> bytes:
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def build_assessment_template() -> bytes:
+    """Excel template for Pre/Post Assessment bulk upload"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Pre-Post Assessment"
+    
+    # Headers
+    headers = [
+        "participant_ic",          # Required - IC number to identify participant
+        "participant_name",        # Optional - for reference
+        "test_type",              # Required - "pre" or "post"
+        "correct_answers",        # Required - number of correct answers
+        "total_questions",        # Required - total number of questions
+        "score_percentage",       # Auto-calculated - for reference only
+        "passed",                 # Auto-calculated - for reference only
+        "session_name",           # Optional - for reference
+        "notes"                   # Optional - any additional notes
+    ]
+    ws.append(headers)
+    
+    # Style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.fill = openpyxl.styles.PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
+    
+    # Sample data rows
+    sample_data = [
+        ["871128385485", "Ahmad Bin Ali", "pre", 36, 40, "=D2/E2*100", "=IF(F2>=70,\"PASS\",\"FAIL\")", "KONE Training Session", "Morning batch"],
+        ["880215143265", "Siti Binti Hassan", "pre", 28, 40, "=D3/E3*100", "=IF(F3>=70,\"PASS\",\"FAIL\")", "KONE Training Session", ""],
+        ["871128385485", "Ahmad Bin Ali", "post", 38, 40, "=D4/E4*100", "=IF(F4>=70,\"PASS\",\"FAIL\")", "KONE Training Session", "Improved from pre-test"],
+        ["880215143265", "Siti Binti Hassan", "post", 35, 40, "=D5/E5*100", "=IF(F5>=70,\"PASS\",\"FAIL\")", "KONE Training Session", ""],
+    ]
+    
+    for row in sample_data:
+        ws.append(row)
+    
+    # Instructions sheet
+    ws_inst = wb.create_sheet("Instructions")
+    instructions = [
+        ["PRE/POST ASSESSMENT BULK UPLOAD TEMPLATE"],
+        [""],
+        ["REQUIRED COLUMNS:"],
+        ["participant_ic", "IC Number of participant (must exist in system)"],
+        ["test_type", "Either 'pre' or 'post'"],
+        ["correct_answers", "Number of correct answers (e.g., 36)"],
+        ["total_questions", "Total questions in test (e.g., 40)"],
+        [""],
+        ["OPTIONAL COLUMNS:"],
+        ["participant_name", "Name for reference only"],
+        ["score_percentage", "Auto-calculated: (correct/total)*100"],
+        ["passed", "Auto-calculated: PASS if >=70%, FAIL otherwise"],
+        ["session_name", "Session reference"],
+        ["notes", "Any additional notes"],
+        [""],
+        ["NOTES:"],
+        ["- Same participant can have both PRE and POST test entries"],
+        ["- System will calculate percentage and pass/fail automatically"],
+        ["- Passing mark is 70%"],
+        ["- Delete sample rows before uploading your data"],
+    ]
+    for row in instructions:
+        ws_inst.append(row)
+    
+    _auto_width([ws, ws_inst], 50)
+    
+    return _to_bytes(wb)
+
+
+def build_feedback_template() -> bytes:
+    """Excel template for Feedback bulk upload"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Feedback"
+    
+    # Headers - Generic feedback questions
+    headers = [
+        "participant_ic",           # Required
+        "participant_name",         # Optional - for reference
+        "session_name",            # Optional - for reference
+        "q1_course_content",       # Rating 1-5: Course content quality
+        "q2_trainer_knowledge",    # Rating 1-5: Trainer's knowledge
+        "q3_trainer_delivery",     # Rating 1-5: Trainer's delivery style
+        "q4_training_materials",   # Rating 1-5: Training materials quality
+        "q5_practical_sessions",   # Rating 1-5: Practical session effectiveness
+        "q6_facilities",           # Rating 1-5: Training facilities
+        "q7_time_management",      # Rating 1-5: Time management
+        "q8_overall_satisfaction", # Rating 1-5: Overall satisfaction
+        "q9_recommend_others",     # Yes/No: Would recommend to others
+        "q10_comments",            # Text: Additional comments/suggestions
+    ]
+    ws.append(headers)
+    
+    # Style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.fill = openpyxl.styles.PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
+    
+    # Sample data
+    sample_data = [
+        ["871128385485", "Ahmad Bin Ali", "KONE Training", 5, 5, 4, 5, 5, 4, 5, 5, "Yes", "Excellent training program!"],
+        ["880215143265", "Siti Binti Hassan", "KONE Training", 4, 5, 5, 4, 4, 4, 4, 4, "Yes", "More practical sessions would be better."],
+    ]
+    
+    for row in sample_data:
+        ws.append(row)
+    
+    # Instructions sheet
+    ws_inst = wb.create_sheet("Instructions")
+    instructions = [
+        ["FEEDBACK BULK UPLOAD TEMPLATE"],
+        [""],
+        ["REQUIRED COLUMNS:"],
+        ["participant_ic", "IC Number of participant (must exist in system)"],
+        [""],
+        ["RATING COLUMNS (1-5 scale):"],
+        ["q1_course_content", "Rate course content quality (1=Poor, 5=Excellent)"],
+        ["q2_trainer_knowledge", "Rate trainer's subject knowledge"],
+        ["q3_trainer_delivery", "Rate trainer's delivery and presentation"],
+        ["q4_training_materials", "Rate quality of training materials"],
+        ["q5_practical_sessions", "Rate practical/hands-on sessions"],
+        ["q6_facilities", "Rate training facilities"],
+        ["q7_time_management", "Rate time management during training"],
+        ["q8_overall_satisfaction", "Rate overall satisfaction"],
+        [""],
+        ["OTHER COLUMNS:"],
+        ["q9_recommend_others", "Would recommend to others? (Yes/No)"],
+        ["q10_comments", "Additional comments or suggestions (text)"],
+        [""],
+        ["RATING SCALE:"],
+        ["1 = Poor"],
+        ["2 = Fair"],
+        ["3 = Good"],
+        ["4 = Very Good"],
+        ["5 = Excellent"],
+        [""],
+        ["NOTES:"],
+        ["- Delete sample rows before uploading your data"],
+        ["- All rating columns should be numbers 1-5"],
+    ]
+    for row in instructions:
+        ws_inst.append(row)
+    
+    _auto_width([ws, ws_inst], 50)
+    
+    return _to_bytes(wb)
+
+
+def build_checklist_template() -> bytes:
+    """Excel template for Vehicle Checklist bulk upload"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Vehicle Checklist"
+    
+    # Headers - Standard vehicle checklist items
+    headers = [
+        "participant_ic",          # Required
+        "participant_name",        # Optional
+        "session_name",           # Optional
+        "vehicle_model",          # Vehicle details
+        "registration_number",
+        "roadtax_expiry",         # YYYY-MM-DD format
+        # Checklist items with status (good/satisfactory/needs_repair)
+        "tyres_condition",
+        "tyres_comments",
+        "brakes_condition",
+        "brakes_comments",
+        "lights_condition",
+        "lights_comments",
+        "horn_condition",
+        "horn_comments",
+        "mirrors_condition",
+        "mirrors_comments",
+        "steering_condition",
+        "steering_comments",
+        "windscreen_condition",
+        "windscreen_comments",
+        "wipers_condition",
+        "wipers_comments",
+        "seatbelt_condition",
+        "seatbelt_comments",
+        "engine_condition",
+        "engine_comments",
+        "overall_remarks",
+    ]
+    ws.append(headers)
+    
+    # Style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.fill = openpyxl.styles.PatternFill(start_color="ED7D31", end_color="ED7D31", fill_type="solid")
+        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
+    
+    # Sample data
+    sample_data = [
+        ["871128385485", "Ahmad Bin Ali", "KONE Training", "Honda City", "WMY1234", "2026-06-30",
+         "good", "", "good", "", "good", "", "good", "", "good", "", 
+         "good", "", "satisfactory", "Minor scratch", "good", "", "good", "", "good", "", "Vehicle in good condition"],
+        ["880215143265", "Siti Binti Hassan", "KONE Training", "Toyota Vios", "BKA5678", "2026-08-15",
+         "good", "", "needs_repair", "Brake pads worn", "good", "", "good", "", "good", "",
+         "good", "", "good", "", "good", "", "good", "", "satisfactory", "Minor noise", "Needs brake service"],
+    ]
+    
+    for row in sample_data:
+        ws.append(row)
+    
+    # Instructions sheet
+    ws_inst = wb.create_sheet("Instructions")
+    instructions = [
+        ["VEHICLE CHECKLIST BULK UPLOAD TEMPLATE"],
+        [""],
+        ["REQUIRED COLUMNS:"],
+        ["participant_ic", "IC Number of participant (must exist in system)"],
+        [""],
+        ["VEHICLE DETAILS:"],
+        ["vehicle_model", "Vehicle make and model (e.g., Honda City)"],
+        ["registration_number", "Vehicle registration number"],
+        ["roadtax_expiry", "Road tax expiry date (YYYY-MM-DD format)"],
+        [""],
+        ["CHECKLIST ITEM STATUS VALUES:"],
+        ["good", "Item is in good working condition"],
+        ["satisfactory", "Item is acceptable but may need attention"],
+        ["needs_repair", "Item requires repair/replacement"],
+        [""],
+        ["CHECKLIST ITEMS:"],
+        ["tyres_condition/comments", "Tyre condition and any comments"],
+        ["brakes_condition/comments", "Brake system condition"],
+        ["lights_condition/comments", "All lights (head, tail, signal)"],
+        ["horn_condition/comments", "Horn functionality"],
+        ["mirrors_condition/comments", "Side and rear mirrors"],
+        ["steering_condition/comments", "Steering system"],
+        ["windscreen_condition/comments", "Windscreen condition"],
+        ["wipers_condition/comments", "Windscreen wipers"],
+        ["seatbelt_condition/comments", "Seatbelt functionality"],
+        ["engine_condition/comments", "Engine performance"],
+        [""],
+        ["NOTES:"],
+        ["- Delete sample rows before uploading your data"],
+        ["- Comments are required for 'needs_repair' status"],
+        ["- Date format must be YYYY-MM-DD"],
+    ]
+    for row in instructions:
+        ws_inst.append(row)
+    
+    _auto_width([ws, ws_inst], 50)
+    
+    return _to_bytes(wb)
+
+
+def build_test_questions_template() -> bytes:
+    """Excel template for Pre/Post Test Questions (Program Configuration)"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Test Questions"
+    
+    # Headers for test questions
+    headers = [
+        "program_name",           # For reference
+        "test_type",              # "pre" or "post" (same questions usually)
+        "question_number",        # 1, 2, 3...
+        "question_text",          # The actual question
+        "option_1",               # First answer option
+        "option_2",               # Second answer option
+        "option_3",               # Third answer option
+        "option_4",               # Fourth answer option
+        "correct_answer",         # 1, 2, 3, or 4 (which option is correct)
+    ]
+    ws.append(headers)
+    
+    # Style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.fill = openpyxl.styles.PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
+    
+    # Sample data - Defensive Driving questions
+    sample_data = [
+        ["Defensive Driving", "pre", 1, "What is the safest following distance in normal conditions?", "1 second", "2 seconds", "3 seconds", "4 seconds", 3],
+        ["Defensive Driving", "pre", 2, "When should you use your hazard lights?", "When parking illegally", "When your vehicle breaks down", "When driving slowly", "When it's raining", 2],
+        ["Defensive Driving", "pre", 3, "What does a yellow traffic light mean?", "Speed up", "Stop if safe to do so", "Continue at same speed", "Honk your horn", 2],
+        ["Defensive Driving", "pre", 4, "What is the first thing to check before changing lanes?", "Speedometer", "Mirrors and blind spots", "Radio", "Air conditioning", 2],
+        ["Defensive Driving", "pre", 5, "In wet conditions, you should:", "Drive faster to clear water", "Maintain normal speed", "Reduce speed and increase following distance", "Use high beam lights", 3],
+    ]
+    
+    for row in sample_data:
+        ws.append(row)
+    
+    # Instructions sheet
+    ws_inst = wb.create_sheet("Instructions")
+    instructions = [
+        ["PRE/POST TEST QUESTIONS TEMPLATE (PROGRAM CONFIGURATION)"],
+        [""],
+        ["PURPOSE:"],
+        ["This template is for creating/restoring TEST QUESTIONS for a program."],
+        ["Use this to quickly re-upload your test questions after redeployment."],
+        [""],
+        ["COLUMNS:"],
+        ["program_name", "Name of the program (for your reference)"],
+        ["test_type", "'pre' or 'post' - typically same questions for both"],
+        ["question_number", "Question sequence number (1, 2, 3...)"],
+        ["question_text", "The full question text"],
+        ["option_1 to option_4", "Four answer options"],
+        ["correct_answer", "Number 1-4 indicating which option is correct"],
+        [""],
+        ["HOW TO USE:"],
+        ["1. Fill in your questions following the sample format"],
+        ["2. Save this file locally as your master copy"],
+        ["3. After redeployment, go to Programs tab → Edit Program → Tests"],
+        ["4. Add questions manually using this file as reference"],
+        ["   (or use bulk upload if available)"],
+        [""],
+        ["TIPS:"],
+        ["- Keep questions clear and concise"],
+        ["- Ensure only ONE correct answer per question"],
+        ["- Use consistent formatting for all options"],
+        ["- Recommended: 20-40 questions per program"],
+        ["- Delete sample rows and add your own questions"],
+    ]
+    for row in instructions:
+        ws_inst.append(row)
+    
+    _auto_width([ws, ws_inst], 60)
+    
+    return _to_bytes(wb)
+
+
+def build_feedback_questions_template() -> bytes:
+    """Excel template for Feedback Questions (Program Configuration)"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Feedback Questions"
+    
+    # Headers
+    headers = [
+        "program_name",           # For reference
+        "question_number",        # 1, 2, 3...
+        "question_text",          # The feedback question
+        "question_type",          # "rating" (1-5 scale) or "text" (free text)
+        "required",               # "yes" or "no"
+    ]
+    ws.append(headers)
+    
+    # Style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.fill = openpyxl.styles.PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
+    
+    # Sample data - Standard feedback questions
+    sample_data = [
+        ["Defensive Driving", 1, "How would you rate the overall quality of the training program?", "rating", "yes"],
+        ["Defensive Driving", 2, "How knowledgeable was the trainer on the subject matter?", "rating", "yes"],
+        ["Defensive Driving", 3, "How effective was the trainer's delivery and presentation style?", "rating", "yes"],
+        ["Defensive Driving", 4, "How useful were the training materials provided?", "rating", "yes"],
+        ["Defensive Driving", 5, "How effective were the practical/hands-on sessions?", "rating", "yes"],
+        ["Defensive Driving", 6, "How would you rate the training facilities and environment?", "rating", "yes"],
+        ["Defensive Driving", 7, "How well was the training time managed?", "rating", "yes"],
+        ["Defensive Driving", 8, "How likely are you to recommend this training to others?", "rating", "yes"],
+        ["Defensive Driving", 9, "What did you find most valuable about this training?", "text", "no"],
+        ["Defensive Driving", 10, "What suggestions do you have for improving this training?", "text", "no"],
+    ]
+    
+    for row in sample_data:
+        ws.append(row)
+    
+    # Instructions sheet
+    ws_inst = wb.create_sheet("Instructions")
+    instructions = [
+        ["FEEDBACK QUESTIONS TEMPLATE (PROGRAM CONFIGURATION)"],
+        [""],
+        ["PURPOSE:"],
+        ["This template is for creating/restoring FEEDBACK QUESTIONS for a program."],
+        ["Use this to quickly re-create your feedback form after redeployment."],
+        [""],
+        ["COLUMNS:"],
+        ["program_name", "Name of the program (for your reference)"],
+        ["question_number", "Question sequence (1, 2, 3...)"],
+        ["question_text", "The feedback question text"],
+        ["question_type", "'rating' = 1-5 scale, 'text' = free text answer"],
+        ["required", "'yes' = must answer, 'no' = optional"],
+        [""],
+        ["QUESTION TYPES:"],
+        ["rating", "Participant selects 1-5 (1=Poor, 5=Excellent)"],
+        ["text", "Participant types free-form answer"],
+        [""],
+        ["HOW TO USE:"],
+        ["1. Customize questions for your program"],
+        ["2. Save this file locally as your master copy"],
+        ["3. After redeployment, go to Feedback tab → Create Template"],
+        ["4. Add questions using this file as reference"],
+        [""],
+        ["RECOMMENDED STRUCTURE:"],
+        ["- 6-8 rating questions covering key aspects"],
+        ["- 1-2 text questions for open feedback"],
+        ["- Keep questions clear and specific"],
+        ["- Delete sample rows and add your own questions"],
+    ]
+    for row in instructions:
+        ws_inst.append(row)
+    
+    _auto_width([ws, ws_inst], 60)
+    
+    return _to_bytes(wb)
+
+
+def build_checklist_items_template() -> bytes:
+    """Excel template for Checklist Items (Program Configuration)"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Checklist Items"
+    
+    # Headers
+    headers = [
+        "program_name",           # For reference
+        "item_number",            # 1, 2, 3...
+        "checklist_item",         # The item to check
+        "category",               # Optional: group items by category
+    ]
+    ws.append(headers)
+    
+    # Style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = openpyxl.styles.Font(bold=True)
+        cell.fill = openpyxl.styles.PatternFill(start_color="ED7D31", end_color="ED7D31", fill_type="solid")
+        cell.font = openpyxl.styles.Font(bold=True, color="FFFFFF")
+    
+    # Sample data - Vehicle checklist items
+    sample_data = [
+        ["Defensive Driving", 1, "Tyres - Check tread depth and pressure", "Exterior"],
+        ["Defensive Driving", 2, "Tyres - Check for damage or bulges", "Exterior"],
+        ["Defensive Driving", 3, "Brakes - Test brake pedal feel", "Safety"],
+        ["Defensive Driving", 4, "Brakes - Check handbrake operation", "Safety"],
+        ["Defensive Driving", 5, "Lights - Headlights (low and high beam)", "Lights"],
+        ["Defensive Driving", 6, "Lights - Tail lights and brake lights", "Lights"],
+        ["Defensive Driving", 7, "Lights - Turn signals (front and rear)", "Lights"],
+        ["Defensive Driving", 8, "Lights - Hazard lights", "Lights"],
+        ["Defensive Driving", 9, "Horn - Test horn functionality", "Safety"],
+        ["Defensive Driving", 10, "Mirrors - Side mirrors condition and adjustment", "Visibility"],
+        ["Defensive Driving", 11, "Mirrors - Rear view mirror condition", "Visibility"],
+        ["Defensive Driving", 12, "Windscreen - Check for cracks or chips", "Visibility"],
+        ["Defensive Driving", 13, "Wipers - Front wiper operation", "Visibility"],
+        ["Defensive Driving", 14, "Wipers - Rear wiper operation (if equipped)", "Visibility"],
+        ["Defensive Driving", 15, "Seatbelts - Driver seatbelt condition", "Safety"],
+        ["Defensive Driving", 16, "Seatbelts - Passenger seatbelts", "Safety"],
+        ["Defensive Driving", 17, "Steering - Check for play or stiffness", "Controls"],
+        ["Defensive Driving", 18, "Engine - Check for unusual sounds", "Engine"],
+        ["Defensive Driving", 19, "Engine - Oil level", "Engine"],
+        ["Defensive Driving", 20, "Coolant - Check coolant level", "Engine"],
+    ]
+    
+    for row in sample_data:
+        ws.append(row)
+    
+    # Instructions sheet
+    ws_inst = wb.create_sheet("Instructions")
+    instructions = [
+        ["CHECKLIST ITEMS TEMPLATE (PROGRAM CONFIGURATION)"],
+        [""],
+        ["PURPOSE:"],
+        ["This template is for creating/restoring CHECKLIST ITEMS for a program."],
+        ["Use this to quickly re-create your vehicle inspection checklist after redeployment."],
+        [""],
+        ["COLUMNS:"],
+        ["program_name", "Name of the program (for your reference)"],
+        ["item_number", "Item sequence (1, 2, 3...)"],
+        ["checklist_item", "The item to be inspected"],
+        ["category", "Optional grouping (Exterior, Safety, Lights, etc.)"],
+        [""],
+        ["HOW TO USE:"],
+        ["1. List all inspection items for your program"],
+        ["2. Save this file locally as your master copy"],
+        ["3. After redeployment, go to Checklist Templates tab → Create"],
+        ["4. Add items using this file as reference"],
+        [""],
+        ["RECOMMENDED CATEGORIES:"],
+        ["Exterior", "Body, tyres, paint"],
+        ["Safety", "Brakes, seatbelts, horn"],
+        ["Lights", "All vehicle lights"],
+        ["Visibility", "Mirrors, windscreen, wipers"],
+        ["Controls", "Steering, pedals, gear"],
+        ["Engine", "Oil, coolant, sounds"],
+        [""],
+        ["TIPS:"],
+        ["- Be specific about what to check"],
+        ["- Group related items together"],
+        ["- 15-25 items is typical for vehicle inspection"],
+        ["- Delete sample rows and add your own items"],
+    ]
+    for row in instructions:
+        ws_inst.append(row)
+    
+    _auto_width([ws, ws_inst], 60)
+    
+    return _to_bytes(wb)
+
+
+def build_statutory_template(rate_type: str) -> bytes:
+    """Excel template for statutory rates"""
+    import openpyxl
+    
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = f"{rate_type.upper()} Rates"
+    
+    # Headers
+    headers = ["Min Wages (RM)", "Max Wages (RM)", "Employee Amount (RM)", "Employer Amount (RM)", "Total (RM)"]
+    for col, header in enumerate(headers, 1):
+        ws.cell(row=1, column=col, value=header)
+    
+    # Sample data based on type
+    if rate_type == "epf":
+        sample_data = [
+            [0, 20, 0, 0, 0],
+            [20, 40, 4, 5, 9],
+            [40, 60, 6, 8, 14],
+        ]
+    elif rate_type == "socso":
+        sample_data = [
+            [0, 30, 0.10, 0.40, 0.50],
+            [30, 50, 0.20, 0.70, 0.90],
+            [50, 70, 0.30, 1.00, 1.30],
+        ]
+    else:  # eis
+        sample_data = [
+            [0, 30, 0.05, 0.05, 0.10],
+            [30, 50, 0.10, 0.10, 0.20],
+        ]
+    
+    for row_idx, row_data in enumerate(sample_data, 2):
+        for col_idx, value in enumerate(row_data, 1):
+            ws.cell(row=row_idx, column=col_idx, value=value)
+    
+    # Set column widths
+    for col in ws.columns:
+        ws.column_dimensions[col[0].column_letter].width = 20
+    
+    return _to_bytes(wb)
@@ -0,0 +1,59 @@
+"""
+Fast JSON responses for large payloads
+
+For a list endpoint FastAPI validates the returned documents against
+response_model, dumps them back to Python objects, runs jsonable_encoder
+over the result and finally encodes it with the stdlib json module. With a
+few thousand documents that is most of the request. Two opt-in shortcuts:
+
+- FastJSONResponse encodes plain dicts and lists with orjson (datetimes,
+  sets, Decimals and Pydantic models included).
+- validated_response(List[Session], docs) validates DB documents against the
+  model once, in pydantic-core, and serializes them straight to JSON bytes.
+  The output matches what response_model produces. ISO timestamp strings
+  are parsed by the model, so endpoints need not convert them first.
+
+Returning a Response bypasses FastAPI's own response_model pass; keep
+response_model on the route for the OpenAPI schema.
+"""
+import functools
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; already-encoded bytes pass through"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def validated_json(response_type, content: Any) -> bytes:
+    """Validate content against response_type once and encode it"""
+    adapter = _adapter(response_type)
+    return adapter.dump_json(adapter.validate_python(content))
+
+
+def validated_response(response_type, content: Any, status_code: int = 200) -> FastJSONResponse:
+    return FastJSONResponse(validated_json(response_type, content), status_code=status_code)
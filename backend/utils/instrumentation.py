@@ -0,0 +1,447 @@
+"""
+Request and MongoDB instrumentation
+
+Per-route latency histograms, per-request MongoDB command counts (via PyMongo
+command monitoring) with N+1 detection, connection pool checkout waits and
+occupancy (via pool monitoring), a slow-request log and a Prometheus text
+exposition of everything.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+logger = logging.getLogger("instrumentation")
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+N_PLUS_ONE_QUERY_THRESHOLD = int(os.environ.get('N_PLUS_ONE_QUERY_THRESHOLD', '50'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Driver-internal commands that say nothing about application queries
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildinfo", "buildInfo",
+    "saslStart", "saslContinue", "authenticate", "getnonce", "endSessions",
+}
+
+
+class RequestStats:
+    """MongoDB activity of a single HTTP request"""
+
+    __slots__ = ("commands", "docs_returned", "db_time", "lock")
+
+    def __init__(self):
+        self.commands: Counter = Counter()  # (command, collection) -> count
+        self.docs_returned = 0
+        self.db_time = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def command_count(self) -> int:
+        return sum(self.commands.values())
+
+    def breakdown(self, top: int = 8) -> str:
+        return ", ".join(
+            f"{command} {collection} x{count}"
+            for (command, collection), count in self.commands.most_common(top)
+        )
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield bound, running
+
+
+class MetricsRegistry:
+    """Process-wide metrics, safe to update from driver threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gauges: Dict[str, tuple] = {}
+        self.reset()
+
+    def reset(self):
+        """Clear recorded values (registered gauges are kept)"""
+        with self.lock:
+            self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+            self.request_queries: Dict[Tuple[str, str], Histogram] = {}
+            self.requests_total: Counter = Counter()  # (method, route, status)
+            self.n_plus_one_total: Counter = Counter()  # (method, route)
+            self.slow_requests_total: Counter = Counter()  # (method, route)
+            self.mongo_commands_total: Counter = Counter()  # (command, collection)
+            self.mongo_command_seconds: Dict[str, float] = defaultdict(float)
+            self.mongo_command_failures: Counter = Counter()
+            self.mongo_docs_returned: Counter = Counter()  # collection
+            self.pool_checkout_wait: Dict[str, Histogram] = {}  # server
+            self.pool_checkout_failures: Counter = Counter()  # (server, reason)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self.lock:
+            if key not in self.request_latency:
+                self.request_latency[key] = Histogram(LATENCY_BUCKETS)
+                self.request_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self.request_latency[key].observe(seconds)
+            self.request_queries[key].observe(stats.command_count)
+            self.requests_total[(method, route, str(status))] += 1
+
+    def observe_command(self, command: str, collection: str, seconds: float, docs: int, failed: bool = False):
+        with self.lock:
+            self.mongo_commands_total[(command, collection)] += 1
+            self.mongo_command_seconds[command] += seconds
+            if docs:
+                self.mongo_docs_returned[collection] += docs
+            if failed:
+                self.mongo_command_failures[command] += 1
+
+    def observe_pool_checkout(self, server: str, seconds: float, failure: Optional[str] = None):
+        with self.lock:
+            if server not in self.pool_checkout_wait:
+                self.pool_checkout_wait[server] = Histogram(POOL_WAIT_BUCKETS)
+            self.pool_checkout_wait[server].observe(seconds)
+            if failure:
+                self.pool_checkout_failures[(server, failure)] += 1
+
+    def register_gauge(self, name: str, help_text: str, callback):
+        """Expose a value computed at scrape time (callback returns {labels_tuple_or_None: value})"""
+        self.gauges[name] = (help_text, callback)
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def esc(value: str) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        with self.lock:
+            lines.append("# HELP http_request_duration_seconds Request latency by route template")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), hist in sorted(self.request_latency.items()):
+                labels = f'method="{esc(method)}",route="{esc(route)}"'
+                for bound, count in hist.cumulative():
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {hist.total:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {hist.count}")
+
+            lines.append("# HELP http_request_db_commands MongoDB commands issued per request")
+            lines.append("# TYPE http_request_db_commands histogram")
+            for (method, route), hist in sorted(self.request_queries.items()):
+                labels = f'method="{esc(method)}",route="{esc(route)}"'
+                for bound, count in hist.cumulative():
+                    lines.append(f'http_request_db_commands_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_db_commands_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"http_request_db_commands_sum{{{labels}}} {int(hist.total)}")
+                lines.append(f"http_request_db_commands_count{{{labels}}} {hist.count}")
+
+            lines.append("# HELP http_requests_total Requests by route template and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.requests_total.items()):
+                lines.append(f'http_requests_total{{method="{esc(method)}",route="{esc(route)}",status="{status}"}} {count}')
+
+            lines.append(f"# HELP http_requests_n_plus_one_total Requests issuing more than {N_PLUS_ONE_QUERY_THRESHOLD} MongoDB commands")
+            lines.append("# TYPE http_requests_n_plus_one_total counter")
+            for (method, route), count in sorted(self.n_plus_one_total.items()):
+                lines.append(f'http_requests_n_plus_one_total{{method="{esc(method)}",route="{esc(route)}"}} {count}')
+
+            lines.append(f"# HELP http_requests_slow_total Requests slower than {SLOW_REQUEST_MS}ms")
+            lines.append("# TYPE http_requests_slow_total counter")
+            for (method, route), count in sorted(self.slow_requests_total.items()):
+                lines.append(f'http_requests_slow_total{{method="{esc(method)}",route="{esc(route)}"}} {count}')
+
+            lines.append("# HELP mongodb_commands_total MongoDB commands by command and collection")
+            lines.append("# TYPE mongodb_commands_total counter")
+            for (command, collection), count in sorted(self.mongo_commands_total.items()):
+                lines.append(f'mongodb_commands_total{{command="{esc(command)}",collection="{esc(collection)}"}} {count}')
+
+            lines.append("# HELP mongodb_command_duration_seconds_total Time spent in MongoDB commands")
+            lines.append("# TYPE mongodb_command_duration_seconds_total counter")
+            for command, seconds in sorted(self.mongo_command_seconds.items()):
+                lines.append(f'mongodb_command_duration_seconds_total{{command="{esc(command)}"}} {seconds:.6f}')
+
+            lines.append("# HELP mongodb_command_failures_total Failed MongoDB commands")
+            lines.append("# TYPE mongodb_command_failures_total counter")
+            for command, count in sorted(self.mongo_command_failures.items()):
+                lines.append(f'mongodb_command_failures_total{{command="{esc(command)}"}} {count}')
+
+            lines.append("# HELP mongodb_documents_returned_total Documents returned by cursors")
+            lines.append("# TYPE mongodb_documents_returned_total counter")
+            for collection, count in sorted(self.mongo_docs_returned.items()):
+                lines.append(f'mongodb_documents_returned_total{{collection="{esc(collection)}"}} {count}')
+
+            lines.append("# HELP mongodb_pool_checkout_wait_seconds Time spent waiting for a pooled connection")
+            lines.append("# TYPE mongodb_pool_checkout_wait_seconds histogram")
+            for server, hist in sorted(self.pool_checkout_wait.items()):
+                labels = f'server="{esc(server)}"'
+                for bound, count in hist.cumulative():
+                    lines.append(f'mongodb_pool_checkout_wait_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'mongodb_pool_checkout_wait_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"mongodb_pool_checkout_wait_seconds_sum{{{labels}}} {hist.total:.6f}")
+                lines.append(f"mongodb_pool_checkout_wait_seconds_count{{{labels}}} {hist.count}")
+
+            lines.append("# HELP mongodb_pool_checkout_failures_total Connection checkouts that failed (timeout, pool closed, connection error)")
+            lines.append("# TYPE mongodb_pool_checkout_failures_total counter")
+            for (server, reason), count in sorted(self.pool_checkout_failures.items()):
+                lines.append(f'mongodb_pool_checkout_failures_total{{server="{esc(server)}",reason="{esc(reason)}"}} {count}')
+
+            gauges = list(self.gauges.items())
+
+        for name, (help_text, callback) in gauges:
+            try:
+                values = callback()
+            except Exception as e:
+                logger.warning(f"Metrics gauge {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values.items():
+                label_str = ",".join(f'{k}="{esc(v)}"' for k, v in (labels or ()))
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def _command_collection(event) -> str:
+    command = event.command
+    if event.command_name == "getMore":
+        return str(command.get("collection", ""))
+    value = command.get(event.command_name)
+    return value if isinstance(value, str) else ""
+
+
+def _reply_doc_count(reply) -> int:
+    cursor = reply.get("cursor") if isinstance(reply, dict) else None
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        if isinstance(batch, list):
+            return len(batch)
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Counts commands per request and globally.
+
+    Motor runs PyMongo calls in executor threads with a copy of the calling
+    context, so the request's RequestStats is visible here.
+    """
+
+    def __init__(self):
+        # request_id -> (command, collection); succeeded events carry no command body
+        self._inflight: Dict[Tuple[int, object], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = _command_collection(event)
+        with self._lock:
+            self._inflight[(event.request_id, event.connection_id)] = (event.command_name, collection)
+        stats = _current_request.get()
+        if stats is not None:
+            with stats.lock:
+                stats.commands[(event.command_name, collection)] += 1
+
+    def _finish(self, event, failed: bool, reply=None):
+        with self._lock:
+            info = self._inflight.pop((event.request_id, event.connection_id), None)
+        if info is None:
+            return
+        command, collection = info
+        seconds = event.duration_micros / 1_000_000
+        docs = _reply_doc_count(reply) if reply is not None else 0
+        metrics.observe_command(command, collection, seconds, docs, failed=failed)
+        stats = _current_request.get()
+        if stats is not None:
+            with stats.lock:
+                stats.db_time += seconds
+                stats.docs_returned += docs
+
+    def succeeded(self, event):
+        self._finish(event, failed=False, reply=event.reply)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+def _server(address) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """
+    Connection checkout waits per server, plus open, in-use and waiting
+    connection counts.
+
+    Checkout events carry no duration, but a checkout starts and ends on the
+    thread running the operation, so the two are paired by (server, thread).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiting: Dict[Tuple[str, int], float] = {}
+        self.open: Counter = Counter()
+        self.in_use: Counter = Counter()
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._waiting[(_server(event.address), threading.get_ident())] = time.perf_counter()
+
+    def _checkout_done(self, event, failure: Optional[str] = None):
+        server = _server(event.address)
+        with self._lock:
+            started = self._waiting.pop((server, threading.get_ident()), None)
+            if failure is None:
+                self.in_use[server] += 1
+        if started is not None:
+            metrics.observe_pool_checkout(server, time.perf_counter() - started, failure)
+
+    def connection_checked_out(self, event):
+        self._checkout_done(event)
+
+    def connection_check_out_failed(self, event):
+        self._checkout_done(event, failure=str(event.reason))
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use[_server(event.address)] -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open[_server(event.address)] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open[_server(event.address)] -= 1
+
+    def pool_closed(self, event):
+        server = _server(event.address)
+        with self._lock:
+            self.open.pop(server, None)
+            self.in_use.pop(server, None)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    @staticmethod
+    def _by_server(counts: Counter) -> dict:
+        return {(("server", server),): count for server, count in sorted(counts.items())}
+
+    def open_connections(self) -> dict:
+        with self._lock:
+            return self._by_server(self.open)
+
+    def connections_in_use(self) -> dict:
+        with self._lock:
+            return self._by_server(self.in_use)
+
+    def waiting(self) -> dict:
+        with self._lock:
+            return self._by_server(Counter(server for server, _ in self._waiting))
+
+
+mongo_pool_listener = MongoPoolListener()
+metrics.register_gauge("mongodb_pool_connections_open", "Open pooled connections",
+                       mongo_pool_listener.open_connections)
+metrics.register_gauge("mongodb_pool_connections_in_use", "Pooled connections checked out",
+                       mongo_pool_listener.connections_in_use)
+metrics.register_gauge("mongodb_pool_checkouts_waiting", "Operations waiting for a pooled connection",
+                       mongo_pool_listener.waiting)
+
+
+class InstrumentationMiddleware(BaseHTTPMiddleware):
+    """Times each request, attaches MongoDB stats and logs slow / chatty requests"""
+
+    async def dispatch(self, request: Request, call_next):
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = request.method
+            metrics.observe_request(method, route_path, status, elapsed, stats)
+            self._log(method, route_path, status, elapsed, stats)
+
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.command_count} queries", '
+            f"app;dur={elapsed * 1000:.1f}"
+        )
+        return response
+
+    @staticmethod
+    def _log(method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        elapsed_ms = elapsed * 1000
+        chatty = stats.command_count > N_PLUS_ONE_QUERY_THRESHOLD
+        slow = elapsed_ms > SLOW_REQUEST_MS
+        if not (chatty or slow):
+            return
+        with metrics.lock:
+            if chatty:
+                metrics.n_plus_one_total[(method, route)] += 1
+            if slow:
+                metrics.slow_requests_total[(method, route)] += 1
+        reasons = [label for flag, label in ((slow, "slow"), (chatty, "possible N+1")) if flag]
+        logger.warning(
+            f"{' / '.join(reasons)} request {method} {route} -> {status} in {elapsed_ms:.0f}ms; "
+            f"{stats.command_count} db commands ({stats.db_time * 1000:.0f}ms, "
+            f"{stats.docs_returned} docs): {stats.breakdown()}"
+        )
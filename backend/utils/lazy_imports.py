@@ -0,0 +1,62 @@
+"""
+Heavy optional stacks, imported on first use
+
+The LLM client (emergentintegrations, which pulls in litellm, openai and the
+Google SDKs), python-docx, pandas and openpyxl add seconds to a cold start,
+and most workers never generate an AI report or read a spreadsheet. The
+facades here stand in for those modules and import the real one the first
+time an attribute is read, so server.py can use them like normal imports:
+
+    from utils.lazy_imports import docx
+    doc = docx.Document(template_path)
+
+HEAVY_MODULES lists what must stay out of sys.modules after `import server`;
+benchmarks/startup.py checks it.
+"""
+import importlib
+import io
+import sys
+
+from fastapi import HTTPException
+
+HEAVY_MODULES = ("emergentintegrations", "litellm", "openai", "docx", "pandas", "openpyxl")
+
+
+class LazyModule:
+    """Module proxy that imports on first attribute access"""
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._name in sys.modules
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{'' if self.loaded else ' (not loaded)'}>"
+
+
+llm_chat = LazyModule("emergentintegrations.llm.chat")
+docx = LazyModule("docx")
+docx_shared = LazyModule("docx.shared")
+pandas = LazyModule("pandas")
+openpyxl = LazyModule("openpyxl")
+
+
+def read_excel(contents: bytes):
+    """DataFrame from an uploaded .xlsx or .xls file"""
+    try:
+        return pandas.read_excel(io.BytesIO(contents), engine='openpyxl')
+    except Exception:
+        try:
+            return pandas.read_excel(io.BytesIO(contents), engine='xlrd')
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to read Excel file: {str(e)}")
@@ -0,0 +1,244 @@
+"""
+Notification outbox: batched fan-out, maintained unread counters and long-poll waiters
+
+Counters only ever move by $inc, each paired with a version bump. A user's
+counter is seeded from their stored unread notifications before the first
+$inc touches it, and a recount writes only if the version is unchanged since
+it started counting, so it never loses a concurrent increment.
+"""
+import asyncio
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .time_helpers import get_malaysia_time
+
+# Per-user unread counters live in their own small collection so dashboards can
+# read a single document instead of counting notifications
+COUNTERS_COLLECTION = "notification_counters"
+
+MAX_PAGE_SIZE = 100
+RECOUNT_ATTEMPTS = 5
+DUPLICATE_KEY = 11000
+# next_cursor is "<created_at>|<id>"
+CURSOR_SEPARATOR = "|"
+MAX_POLL_TIMEOUT = 30
+
+# user_id -> events of long-poll requests waiting in this process
+_waiters: Dict[str, Set[asyncio.Event]] = defaultdict(set)
+
+
+def _wake(user_ids: Iterable[str]):
+    for user_id in user_ids:
+        for event in _waiters.get(user_id, ()):
+            event.set()
+
+
+async def notify_users(
+    db,
+    user_ids: Iterable[str],
+    notification_type: str,
+    message: str,
+    **fields
+) -> int:
+    """
+    Fan one event out to many users with a single insert_many.
+
+    Duplicate and empty user ids are dropped. Returns the number of
+    notifications written.
+    """
+    recipients = list(dict.fromkeys(uid for uid in user_ids if uid))
+    if not recipients:
+        return 0
+
+    await _seed_counters(db, recipients)
+    created_at = get_malaysia_time().isoformat()
+    docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "type": notification_type,
+            "message": message,
+            "read": False,
+            "created_at": created_at,
+            **fields
+        }
+        for user_id in recipients
+    ]
+    await db.notifications.insert_many(docs, ordered=False)
+    await db[COUNTERS_COLLECTION].bulk_write(
+        [
+            UpdateOne({"user_id": user_id}, {"$inc": {"unread": 1, "version": 1}}, upsert=True)
+            for user_id in recipients
+        ],
+        ordered=False
+    )
+    _wake(recipients)
+    return len(docs)
+
+
+async def _seed_counters(db, user_ids: List[str]):
+    """
+    Create missing counters from the unread notifications already stored
+    (rows from before counters existed), so the first $inc starts from the
+    right value
+    """
+    counters = db[COUNTERS_COLLECTION]
+    existing = await counters.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1}).to_list(None)
+    have = {counter["user_id"] for counter in existing}
+    missing = [user_id for user_id in user_ids if user_id not in have]
+    if not missing:
+        return
+    rows = await db.notifications.aggregate([
+        {"$match": {"user_id": {"$in": missing}, "read": False}},
+        {"$group": {"_id": "$user_id", "unread": {"$sum": 1}}},
+    ]).to_list(None)
+    unread = {row["_id"]: row["unread"] for row in rows}
+    try:
+        await counters.insert_many(
+            [{"user_id": user_id, "unread": unread.get(user_id, 0), "version": 0} for user_id in missing],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        # Seeded concurrently by another writer, from the same rows
+        if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def get_unread_count(db, user_id: str) -> int:
+    counter = await db[COUNTERS_COLLECTION].find_one({"user_id": user_id}, {"_id": 0, "unread": 1})
+    if counter is None:
+        # Users with notifications from before counters existed
+        return await recount_unread(db, user_id)
+    return counter.get("unread", 0)
+
+
+async def recount_unread(db, user_id: str) -> int:
+    """
+    Rebuild a user's counter from the notifications collection.
+
+    The count is stored only if the counter's version has not moved since
+    before counting; otherwise an increment landed meanwhile and the count
+    is retried.
+    """
+    counters = db[COUNTERS_COLLECTION]
+    for _ in range(RECOUNT_ATTEMPTS):
+        counter = await counters.find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+        unread = await db.notifications.count_documents({"user_id": user_id, "read": False})
+        if counter is None:
+            try:
+                await counters.insert_one({"user_id": user_id, "unread": unread, "version": 0})
+                return unread
+            except DuplicateKeyError:
+                continue
+        result = await counters.update_one(
+            {"user_id": user_id, "version": counter.get("version")},
+            {"$set": {"unread": unread}, "$inc": {"version": 1}}
+        )
+        if result.matched_count:
+            return unread
+    # Still contended: the counter is being maintained by the writers themselves
+    counter = await counters.find_one({"user_id": user_id}, {"_id": 0, "unread": 1})
+    return counter.get("unread", 0) if counter else 0
+
+
+def _cursor(notification: dict) -> str:
+    return f"{notification['created_at']}{CURSOR_SEPARATOR}{notification['id']}"
+
+
+async def list_notifications(
+    db,
+    user_id: str,
+    limit: int = 20,
+    before: Optional[str] = None,
+    unread_only: bool = False
+) -> dict:
+    """
+    One page of a user's feed, newest first.
+
+    Pagination is keyset-based on (created_at, id), since every recipient of
+    one fan-out shares a created_at: pass the returned next_cursor as
+    `before` to get the following page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = {"user_id": user_id}
+    if unread_only:
+        query["read"] = False
+    if before:
+        created_at, _, last_id = before.partition(CURSOR_SEPARATOR)
+        if last_id:
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "id": {"$lt": last_id}},
+            ]
+        else:
+            query["created_at"] = {"$lt": created_at}
+
+    items = await db.notifications.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "unread_count": await get_unread_count(db, user_id),
+        "next_cursor": _cursor(items[-1]) if has_more and items else None
+    }
+
+
+async def mark_read(db, user_id: str, notification_ids: Optional[List[str]] = None) -> int:
+    """Mark some (or all) of a user's notifications read and adjust the counter"""
+    query = {"user_id": user_id, "read": False}
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        query["id"] = {"$in": notification_ids}
+
+    result = await db.notifications.update_many(
+        query,
+        {"$set": {"read": True, "read_at": get_malaysia_time().isoformat()}}
+    )
+    marked = result.modified_count
+    if marked:
+        # Exactly the rows this call flipped, so concurrent notifications still count
+        updated = await db[COUNTERS_COLLECTION].update_one(
+            {"user_id": user_id, "unread": {"$gte": marked}},
+            {"$inc": {"unread": -marked, "version": 1}}
+        )
+        if not updated.matched_count:
+            # Missing or drifted counter: rebuild instead of going negative
+            await recount_unread(db, user_id)
+        _wake([user_id])
+    return marked
+
+
+async def wait_for_change(db, user_id: str, known_unread: Optional[int], timeout: float) -> dict:
+    """
+    Long-poll: return as soon as the unread count differs from known_unread.
+
+    Writes made by this process wake the waiter immediately; changes made by
+    other workers are picked up when the timeout expires.
+    """
+    timeout = max(0.0, min(timeout, MAX_POLL_TIMEOUT))
+    unread = await get_unread_count(db, user_id)
+    if known_unread is None or unread != known_unread or timeout == 0:
+        return {"unread_count": unread, "changed": known_unread is None or unread != known_unread}
+
+    event = asyncio.Event()
+    _waiters[user_id].add(event)
+    try:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        _waiters[user_id].discard(event)
+        if not _waiters[user_id]:
+            _waiters.pop(user_id, None)
+
+    unread = await get_unread_count(db, user_id)
+    return {"unread_count": unread, "changed": unread != known_unread}
@@ -0,0 +1,171 @@
+"""
+Typed accounting periods for finance and HR records
+
+Dates in these collections were written over time as date-only strings,
+ISO strings with and without offsets, and datetimes. Each record now also
+carries:
+
+    period_date   BSON date the record is booked on
+    period_year   Malaysia-time year of period_date
+    period_month  Malaysia-time month of period_date
+
+so year and month filters are index range scans instead of Python-side parsing.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from .time_helpers import MALAYSIA_TZ
+
+# Record-dated collections: first present field wins
+PERIOD_SOURCE_FIELDS = {
+    "invoices": ["invoice_date", "created_at"],
+    "payments": ["payment_date", "created_at"],
+    "credit_notes": ["cn_date", "created_at"],
+}
+
+# Session-linked payables are booked in the month the session starts
+SESSION_PERIOD_COLLECTIONS = [
+    "trainer_fees",
+    "coordinator_fees",
+    "marketing_commissions",
+    "session_expenses",
+]
+
+# Payroll documents already carry integer year/month
+MONTH_PERIOD_COLLECTIONS = ["payslips", "pay_advice"]
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def to_malaysia_datetime(value) -> Optional[datetime]:
+    """Parse any stored date representation into an aware Malaysia-time datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.astimezone(MALAYSIA_TZ) if value.tzinfo else value.replace(tzinfo=MALAYSIA_TZ)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=MALAYSIA_TZ)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return parsed.astimezone(MALAYSIA_TZ) if parsed.tzinfo else parsed.replace(tzinfo=MALAYSIA_TZ)
+    return None
+
+
+def period_fields(value) -> dict:
+    """period_date / period_year / period_month for a date value, or {} if it does not parse"""
+    moment = to_malaysia_datetime(value)
+    if moment is None:
+        return {}
+    return {
+        "period_date": moment,
+        "period_year": moment.year,
+        "period_month": moment.month,
+    }
+
+
+def month_period_fields(year: int, month: int) -> dict:
+    return period_fields(datetime(int(year), int(month), 1, tzinfo=MALAYSIA_TZ))
+
+
+def document_period_fields(collection: str, doc: dict) -> dict:
+    for field in PERIOD_SOURCE_FIELDS[collection]:
+        fields = period_fields(doc.get(field))
+        if fields:
+            return fields
+    return {}
+
+
+def with_period(collection: str, doc: dict) -> dict:
+    """Stamp period fields onto a record before inserting it"""
+    doc.update(document_period_fields(collection, doc))
+    return doc
+
+
+def period_filter(year: Optional[int] = None, month: Optional[int] = None) -> dict:
+    query = {}
+    if year:
+        query["period_year"] = year
+    if month:
+        query["period_month"] = month
+    return query
+
+
+async def stamp_session_periods(db, session_id: str, start_date=None):
+    """
+    Re-stamp every payable row of a session from the session start date.
+
+    Call after writing fees/commissions/expenses for a session, or after the
+    session's start date changes.
+    """
+    if not session_id:
+        return
+    if start_date is None:
+        session = await db.sessions.find_one({"id": session_id}, {"_id": 0, "start_date": 1})
+        start_date = (session or {}).get("start_date")
+    fields = period_fields(start_date)
+    if not fields:
+        return
+    for collection in SESSION_PERIOD_COLLECTIONS:
+        await db[collection].update_many({"session_id": session_id}, {"$set": fields})
+
+
+async def _flush(collection, operations: list) -> int:
+    if not operations:
+        return 0
+    await collection.bulk_write(operations, ordered=False)
+    written = len(operations)
+    operations.clear()
+    return written
+
+
+async def backfill_periods(db) -> dict:
+    """Stamp period fields on every record that predates them"""
+    counts = {}
+    missing = {"period_year": {"$exists": False}}
+
+    for collection_name, source_fields in PERIOD_SOURCE_FIELDS.items():
+        collection = db[collection_name]
+        projection = {"_id": 1, **{field: 1 for field in source_fields}}
+        operations, written = [], 0
+        async for doc in collection.find(missing, projection):
+            fields = document_period_fields(collection_name, doc)
+            if fields:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                written += await _flush(collection, operations)
+        counts[collection_name] = written + await _flush(collection, operations)
+
+    session_starts = {
+        s["id"]: s.get("start_date")
+        async for s in db.sessions.find({}, {"_id": 0, "id": 1, "start_date": 1})
+        if s.get("id")
+    }
+    for collection_name in SESSION_PERIOD_COLLECTIONS:
+        collection = db[collection_name]
+        operations, written = [], 0
+        async for doc in collection.find(missing, {"_id": 1, "session_id": 1, "created_at": 1}):
+            fields = period_fields(session_starts.get(doc.get("session_id"))) or period_fields(doc.get("created_at"))
+            if fields:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                written += await _flush(collection, operations)
+        counts[collection_name] = written + await _flush(collection, operations)
+
+    for collection_name in MONTH_PERIOD_COLLECTIONS:
+        collection = db[collection_name]
+        operations, written = [], 0
+        async for doc in collection.find(missing, {"_id": 1, "year": 1, "month": 1}):
+            if doc.get("year") and doc.get("month"):
+                operations.append(UpdateOne(
+                    {"_id": doc["_id"]}, {"$set": month_period_fields(doc["year"], doc["month"])}
+                ))
+            if len(operations) >= BACKFILL_BATCH_SIZE:
+                written += await _flush(collection, operations)
+        counts[collection_name] = written + await _flush(collection, operations)
+
+    return counts
@@ -0,0 +1,286 @@
+"""
+Petty cash ledger
+
+Transactions are an append-only ledger. The running balance lives in
+petty_cash_settings and is only ever moved with $inc, which also hands out a
+ledger_seq; every posted entry records its signed delta, ledger_seq and the
+balance_after that the $inc produced. Concurrent approvals therefore cannot
+overwrite each other, and a pending transaction can only be claimed (and
+posted) once.
+
+Approved entries are never edited or deleted: removing one posts a reversal.
+Each reconciliation stores an anchor (ledger_seq, balance), so the balance
+can be re-derived as anchor balance + the deltas posted after it.
+"""
+import uuid
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from .time_helpers import get_malaysia_time
+
+SETTINGS = "petty_cash_settings"
+TRANSACTIONS = "petty_cash_transactions"
+RECONCILIATIONS = "petty_cash_reconciliations"
+
+# Balance direction of each transaction type
+SIGNS = {"expense": -1, "topup": 1}
+
+RECONCILIATION_TOLERANCE = 0.01
+
+
+class InsufficientBalance(Exception):
+    def __init__(self, balance: float):
+        super().__init__(f"Insufficient balance. Current: RM {balance:.2f}")
+        self.balance = balance
+
+
+class LedgerNotSetUp(Exception):
+    pass
+
+
+async def configure(db, settings: dict, opening_balance: float) -> dict:
+    """
+    Create or update the settings document. The opening balance only applies
+    on first setup; after that the balance moves through the ledger alone.
+    """
+    return await db[SETTINGS].find_one_and_update(
+        {},
+        {"$set": settings, "$setOnInsert": {
+            "current_balance": opening_balance,
+            "ledger_seq": 0,
+            "created_at": get_malaysia_time().isoformat(),
+            "last_reconciliation": None
+        }},
+        upsert=True,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def transaction_delta(txn: dict) -> float:
+    if txn.get("delta") is not None:
+        return txn["delta"]
+    if txn.get("type") not in SIGNS and txn.get("balance_after") is not None:
+        # Entries from before the ledger (e.g. adjustments) only carry their balances
+        return txn["balance_after"] - txn.get("balance_before", 0)
+    return SIGNS.get(txn.get("type"), 0) * txn.get("amount", 0)
+
+
+async def post(db, delta: float, require_balance: Optional[float] = None) -> dict:
+    """
+    Move the balance by delta in one atomic $inc.
+
+    With require_balance the update only applies while the balance covers it.
+    Returns the ledger fields for the posted entry.
+    """
+    query = {}
+    if require_balance is not None:
+        query["current_balance"] = {"$gte": require_balance}
+    settings = await db[SETTINGS].find_one_and_update(
+        query,
+        {"$inc": {"current_balance": delta, "ledger_seq": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if settings is None:
+        current = await db[SETTINGS].find_one({}, {"_id": 0, "current_balance": 1})
+        if current is None:
+            raise LedgerNotSetUp()
+        raise InsufficientBalance(current.get("current_balance", 0))
+    balance_after = settings["current_balance"]
+    return {
+        "delta": delta,
+        "ledger_seq": settings["ledger_seq"],
+        "balance_before": round(balance_after - delta, 2),
+        "balance_after": round(balance_after, 2),
+    }
+
+
+async def record_posted(db, transaction: dict, require_balance: Optional[float] = None) -> dict:
+    """Post an already-approved transaction and append it to the ledger"""
+    ledger = await post(db, transaction_delta(transaction), require_balance)
+    transaction.update(ledger)
+    try:
+        await db[TRANSACTIONS].insert_one(transaction)
+    except Exception:
+        # Undo the balance move so the ledger and balance stay in step
+        await post(db, -ledger["delta"])
+        raise
+    transaction.pop("_id", None)
+    return transaction
+
+
+async def approve(db, transaction_id: str, approved_by: str) -> Optional[dict]:
+    """
+    Claim a pending transaction and post it. Returns the posted transaction,
+    or None if it was not pending (including when a concurrent call won).
+    """
+    txn = await db[TRANSACTIONS].find_one_and_update(
+        {"id": transaction_id, "status": "pending"},
+        {"$set": {
+            "status": "approved",
+            "approved_by": approved_by,
+            "approved_at": get_malaysia_time().isoformat()
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if txn is None:
+        return None
+    txn.pop("_id", None)
+    ledger = None
+    try:
+        ledger = await post(db, transaction_delta(txn))
+        await db[TRANSACTIONS].update_one({"id": transaction_id}, {"$set": ledger})
+    except Exception:
+        # Undo the claim (and the balance move) so the transaction can be approved again
+        if ledger is not None:
+            await post(db, -ledger["delta"])
+        await db[TRANSACTIONS].update_one(
+            {"id": transaction_id, "status": "approved", "ledger_seq": {"$exists": False}},
+            {"$set": {"status": "pending"}, "$unset": {"approved_by": "", "approved_at": ""}}
+        )
+        raise
+    txn.update(ledger)
+    return txn
+
+
+async def reverse(db, transaction_id: str, user) -> Optional[dict]:
+    """
+    Reverse an approved transaction with a new ledger entry. Returns the
+    reversal, or None if the transaction was not approved.
+    """
+    txn = await db[TRANSACTIONS].find_one_and_update(
+        {"id": transaction_id, "status": "approved"},
+        {"$set": {
+            "status": "reversed",
+            "reversed_by": user.id,
+            "reversed_at": get_malaysia_time().isoformat()
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if txn is None:
+        return None
+    txn.pop("_id", None)
+    now = get_malaysia_time()
+    reversal = {
+        "id": str(uuid.uuid4()),
+        "type": "reversal",
+        "amount": txn.get("amount", 0),
+        "description": f"Reversal of: {txn.get('description', '')}",
+        "category": txn.get("category"),
+        "date": now.isoformat()[:10],
+        "reverses_id": transaction_id,
+        "delta": -transaction_delta(txn),
+        "status": "approved",
+        "created_by": user.id,
+        "created_by_name": user.full_name,
+        "created_at": now.isoformat(),
+        "approved_by": user.id,
+        "approved_at": now.isoformat()
+    }
+    reversal = await record_posted(db, reversal)
+    await db[TRANSACTIONS].update_one({"id": transaction_id}, {"$set": {"reversal_id": reversal["id"]}})
+    return reversal
+
+
+async def reconcile(db, physical_count: float, notes: Optional[str], user) -> dict:
+    """Record a physical count, post any variance and anchor the ledger at the result"""
+    settings = await db[SETTINGS].find_one({}, {"_id": 0})
+    if not settings:
+        raise LedgerNotSetUp()
+
+    now = get_malaysia_time()
+    system_balance = settings.get("current_balance", 0)
+    variance = physical_count - system_balance
+    anchor_seq, anchor_balance = settings.get("ledger_seq", 0), system_balance
+
+    if abs(variance) > RECONCILIATION_TOLERANCE:
+        adjustment = await record_posted(db, {
+            "id": str(uuid.uuid4()),
+            "type": "adjustment",
+            "amount": abs(variance),
+            "delta": variance,
+            "description": "Reconciliation adjustment",
+            "category": "Adjustment",
+            "date": now.isoformat()[:10],
+            "notes": notes,
+            "status": "approved",
+            "created_by": user.id,
+            "created_by_name": user.full_name,
+            "created_at": now.isoformat(),
+            "approved_by": user.id,
+            "approved_at": now.isoformat()
+        })
+        anchor_seq, anchor_balance = adjustment["ledger_seq"], adjustment["balance_after"]
+
+    reconciliation = {
+        "id": str(uuid.uuid4()),
+        "date": now.isoformat()[:10],
+        "system_balance": system_balance,
+        "physical_count": physical_count,
+        "variance": variance,
+        "anchor_seq": anchor_seq,
+        "anchor_balance": anchor_balance,
+        "notes": notes,
+        "reconciled_by": user.id,
+        "reconciled_by_name": user.full_name,
+        "created_at": now.isoformat()
+    }
+    await db[RECONCILIATIONS].insert_one(reconciliation)
+    await db[SETTINGS].update_one({}, {"$set": {"last_reconciliation": reconciliation["date"]}})
+    reconciliation.pop("_id", None)
+    return reconciliation
+
+
+async def ledger_balance(db) -> Optional[dict]:
+    """
+    Balance re-derived from the latest reconciliation anchor and the entries
+    posted after it (None before the first anchored reconciliation).
+    """
+    anchor = await db[RECONCILIATIONS].find_one(
+        {"anchor_seq": {"$exists": True}}, {"_id": 0}, sort=[("anchor_seq", -1)]
+    )
+    if not anchor:
+        return None
+    totals = await db[TRANSACTIONS].aggregate([
+        {"$match": {"ledger_seq": {"$gt": anchor["anchor_seq"]}}},
+        {"$group": {"_id": None, "delta": {"$sum": "$delta"}, "entries": {"$sum": 1}}},
+    ]).to_list(1)
+    delta = totals[0]["delta"] if totals else 0
+    return {
+        "anchor_seq": anchor["anchor_seq"],
+        "anchor_date": anchor.get("date"),
+        "entries_since_anchor": totals[0]["entries"] if totals else 0,
+        "balance": round(anchor["anchor_balance"] + delta, 2),
+    }
+
+
+async def expense_summary(db, year: int) -> dict:
+    """Approved expenses for a year by category and by month, grouped in the database"""
+    groups = await db[TRANSACTIONS].aggregate([
+        {"$match": {
+            "date": {"$gte": f"{year}-01-01", "$lte": f"{year}-12-31"},
+            "type": "expense",
+            "status": "approved",
+        }},
+        {"$group": {
+            "_id": {
+                "category": {"$ifNull": ["$category", "Miscellaneous"]},
+                "month": {"$substr": ["$date", 5, 2]},
+            },
+            "count": {"$sum": 1},
+            "total": {"$sum": "$amount"},
+        }},
+    ]).to_list(None)
+
+    by_category, by_month = {}, {}
+    for group in groups:
+        category = by_category.setdefault(group["_id"]["category"], {"count": 0, "total": 0})
+        category["count"] += group["count"]
+        category["total"] += group["total"]
+        try:
+            month = int(group["_id"]["month"])
+        except (TypeError, ValueError):
+            continue
+        by_month[month] = by_month.get(month, 0) + group["total"]
+    return {"by_category": by_category, "by_month": by_month}
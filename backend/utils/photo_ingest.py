@@ -0,0 +1,204 @@
+"""
+Checklist photo ingest: streamed, content-addressed storage with resized variants
+
+HEIC photos from iPhones decode through pillow-heif when it is installed.
+An image Pillow cannot decode is still stored as uploaded, just without
+variants; its variant URLs are served from the original.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+try:
+    from pillow_heif import register_heif_opener
+except ImportError:  # HEIC originals are stored without variants
+    register_heif_opener = None
+else:
+    register_heif_opener()
+
+MAX_PHOTO_SIZE = 15 * 1024 * 1024  # 15MB max per upload
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+ALLOWED_PHOTO_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'heic'}
+
+# Variant name -> longest edge in pixels
+PHOTO_VARIANTS = {
+    'display': 1600,
+    'thumb': 320,
+}
+VARIANT_JPEG_QUALITY = 82
+
+PHOTO_URL_PREFIX = "/api/static/checklist-photos/"
+HASHED_PHOTO_PATTERN = re.compile(r'^([0-9a-f]{64})\.[a-z0-9]+$')
+VARIANT_PHOTO_PATTERN = re.compile(r'^([0-9a-f]{64})\.(?:' + '|'.join(PHOTO_VARIANTS) + r')\.jpg$')
+
+# Image decoding and resizing happen off the event loop
+_photo_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="photo-ingest")
+
+
+def _write_chunk(handle, chunk: bytes):
+    handle.write(chunk)
+
+
+def variant_filename(content_hash: str, variant: str) -> str:
+    return f"{content_hash}.{variant}.jpg"
+
+
+def _generate_variants(original_path: str, photos_dir: str, content_hash: str):
+    """Create downscaled JPEG variants (runs in the photo worker pool)"""
+    from PIL import Image, ImageOps
+
+    pending = {
+        variant: max_edge for variant, max_edge in PHOTO_VARIANTS.items()
+        if not (Path(photos_dir) / variant_filename(content_hash, variant)).exists()
+    }
+    if not pending:
+        return
+
+    with Image.open(original_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        for variant, max_edge in pending.items():
+            target = Path(photos_dir) / variant_filename(content_hash, variant)
+            resized = img.copy()
+            resized.thumbnail((max_edge, max_edge))
+            tmp_target = target.with_suffix(".tmp")
+            resized.save(tmp_target, "JPEG", quality=VARIANT_JPEG_QUALITY, optimize=True)
+            os.replace(tmp_target, target)
+
+
+async def ingest_photo(file: UploadFile, photos_dir: Path) -> dict:
+    """
+    Stream an uploaded photo to disk and store it under its content hash.
+
+    Duplicate uploads reuse the existing file. Display and thumbnail variants
+    are generated in a worker pool before returning; when the image cannot
+    be decoded the variant URLs are the original's.
+    """
+    ext = Path(file.filename or "").suffix.lower().lstrip('.')
+    if ext not in ALLOWED_PHOTO_EXTENSIONS:
+        ext = 'jpg'
+
+    photos_dir = Path(photos_dir)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_name = tempfile.mkstemp(dir=photos_dir, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_PHOTO_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Photo too large. Maximum size: {MAX_PHOTO_SIZE // (1024*1024)}MB"
+                    )
+                digest.update(chunk)
+                await asyncio.to_thread(_write_chunk, handle, chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+
+        content_hash = digest.hexdigest()
+        filename = f"{content_hash}.{ext}"
+        final_path = photos_dir / filename
+        duplicate = final_path.exists()
+        if duplicate:
+            os.remove(tmp_name)
+        else:
+            os.replace(tmp_name, final_path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+    photo_url = f"{PHOTO_URL_PREFIX}{filename}"
+    display_url = f"{PHOTO_URL_PREFIX}{variant_filename(content_hash, 'display')}"
+    thumb_url = f"{PHOTO_URL_PREFIX}{variant_filename(content_hash, 'thumb')}"
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            _photo_executor, _generate_variants, str(final_path), str(photos_dir), content_hash
+        )
+    except Exception as e:
+        logging.warning(f"Could not generate variants for photo {filename}: {str(e)}")
+        display_url = thumb_url = photo_url
+
+    return {
+        "photo_url": photo_url,
+        "display_url": display_url,
+        "thumb_url": thumb_url,
+        "content_hash": content_hash,
+        "size": size,
+        "duplicate": duplicate,
+    }
+
+
+def photo_variant_filename(photo_url: Optional[str], variant: str) -> Optional[str]:
+    """Variant filename for a content-addressed photo URL, None for legacy photos"""
+    if not photo_url or not photo_url.startswith(PHOTO_URL_PREFIX):
+        return None
+    match = HASHED_PHOTO_PATTERN.match(photo_url[len(PHOTO_URL_PREFIX):])
+    if not match:
+        return None
+    return variant_filename(match.group(1), variant)
+
+
+def photo_variant_url(photo_url: Optional[str], variant: str) -> Optional[str]:
+    """URL of a smaller variant, falling back to the original photo URL"""
+    filename = photo_variant_filename(photo_url, variant)
+    if not filename:
+        return photo_url
+    return f"{PHOTO_URL_PREFIX}{filename}"
+
+
+def photo_variant_path(photo_url: Optional[str], variant: str, photos_dir: Path) -> Optional[Path]:
+    """Local path of the best available file for a photo URL, or None"""
+    if not photo_url or not photo_url.startswith(PHOTO_URL_PREFIX):
+        return None
+    candidates = []
+    filename = photo_variant_filename(photo_url, variant)
+    if filename:
+        candidates.append(filename)
+    candidates.append(Path(photo_url[len(PHOTO_URL_PREFIX):]).name)
+    for name in candidates:
+        path = Path(photos_dir) / name
+        if path.is_file():
+            return path
+    return None
+
+
+def stored_photo_path(path: Path) -> Path:
+    """
+    File to serve for a photo path. A variant that was never generated (the
+    original could not be decoded) is served from the original.
+    """
+    path = Path(path)
+    match = VARIANT_PHOTO_PATTERN.match(path.name)
+    if match and not path.exists():
+        for ext in sorted(ALLOWED_PHOTO_EXTENSIONS):
+            original = path.parent / f"{match.group(1)}.{ext}"
+            if original.is_file():
+                return original
+    return path
+
+
+def add_photo_variant_urls(checklist: dict) -> dict:
+    """Attach display/thumbnail URLs to every checklist item that has a photo"""
+    for item in checklist.get('checklist_items') or []:
+        if isinstance(item, dict) and item.get('photo_url'):
+            item['photo_display_url'] = photo_variant_url(item['photo_url'], 'display')
+            item['photo_thumb_url'] = photo_variant_url(item['photo_url'], 'thumb')
+    return checklist
@@ -0,0 +1,243 @@
+"""
+Official receipts: per-month receipt numbers and pre-rendered receipt PDFs
+
+Receipt numbers are assigned once, when the payment is recorded, from an
+atomic per-month counter. Rendered PDFs are cached on disk keyed by payment
+id and the settings/invoice revision they were rendered from.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+from xml.sax.saxutils import escape
+
+from pymongo import ReturnDocument
+
+from .time_helpers import get_malaysia_time, MALAYSIA_TZ
+
+RECEIPT_COUNTERS_COLLECTION = "receipt_counters"
+RECEIPT_PREFIX = "RCP"
+
+
+def receipt_period(when: datetime) -> str:
+    return f"{when.year}/{when.month:02d}"
+
+
+def receipt_number_prefix(year: int, month: int) -> str:
+    return f"{RECEIPT_PREFIX}/{year}/{month:02d}/"
+
+
+async def next_receipt_number(db, when: Optional[datetime] = None) -> str:
+    """Take the next number from the month's counter: RCP/YYYY/MM/0001"""
+    when = when or get_malaysia_time()
+    period = receipt_period(when)
+    counter = await db[RECEIPT_COUNTERS_COLLECTION].find_one_and_update(
+        {"period": period},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return f"{receipt_number_prefix(when.year, when.month)}{counter['seq']:04d}"
+
+
+def _payment_time(payment: dict) -> datetime:
+    created_at = payment.get("created_at")
+    if isinstance(created_at, datetime):
+        return created_at
+    if isinstance(created_at, str):
+        try:
+            parsed = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            return parsed.astimezone(MALAYSIA_TZ) if parsed.tzinfo else parsed.replace(tzinfo=MALAYSIA_TZ)
+        except ValueError:
+            pass
+    return get_malaysia_time()
+
+
+async def ensure_receipt_number(db, payment: dict) -> str:
+    """
+    Return the payment's receipt number, assigning one if it has none.
+
+    Payments recorded before receipt numbers were stored get a number from
+    the month they were recorded in. The conditional update keeps two
+    concurrent viewers from assigning different numbers.
+    """
+    if payment.get("receipt_number"):
+        return payment["receipt_number"]
+
+    receipt_number = await next_receipt_number(db, _payment_time(payment))
+    result = await db.payments.update_one(
+        {"id": payment["id"], "receipt_number": {"$exists": False}},
+        {"$set": {"receipt_number": receipt_number}}
+    )
+    if not result.modified_count:
+        stored = await db.payments.find_one({"id": payment["id"]}, {"_id": 0, "receipt_number": 1})
+        receipt_number = (stored or {}).get("receipt_number") or receipt_number
+    payment["receipt_number"] = receipt_number
+    return receipt_number
+
+
+def receipt_cache_key(payment: dict, invoice: dict, settings: dict) -> str:
+    """Changes whenever the settings or the invoice details printed on the receipt change"""
+    revision = f"{settings.get('version', 0)}:{invoice.get('updated_at', '')}:{payment.get('receipt_number', '')}"
+    return hashlib.sha256(revision.encode()).hexdigest()[:16]
+
+
+def _format_amount(amount) -> str:
+    return f"RM {float(amount or 0):,.2f}"
+
+
+def _format_date(value) -> str:
+    if not value:
+        return "-"
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).strftime("%d/%m/%Y")
+    except ValueError:
+        return str(value)
+
+
+def render_receipt_pdf(payment: dict, invoice: dict, settings: dict, logo_path: Optional[Path] = None) -> bytes:
+    """Lay out the official receipt the same way the printable HTML version does"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=20 * mm, rightMargin=20 * mm,
+        topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"Receipt {payment.get('receipt_number', '')}"
+    )
+    styles = getSampleStyleSheet()
+    primary = colors.HexColor(settings.get("primary_color") or "#1a365d")
+    centered = ParagraphStyle("centered", parent=styles["Normal"], alignment=1, fontSize=9, textColor=colors.grey)
+    company_style = ParagraphStyle("company", parent=styles["Title"], fontSize=18, textColor=primary)
+    title_style = ParagraphStyle("title", parent=styles["Heading2"], alignment=1, backColor=colors.HexColor("#f0f0f0"))
+    label_style = ParagraphStyle("label", parent=styles["Normal"], fontSize=8, textColor=colors.grey)
+    amount_style = ParagraphStyle("amount", parent=styles["Title"], fontSize=24, textColor=colors.HexColor("#2e7d32"))
+
+    story = []
+    if logo_path and Path(logo_path).is_file():
+        story.append(Image(str(logo_path), width=30 * mm, height=20 * mm, kind="proportional"))
+    story.append(Paragraph(escape(settings.get("company_name") or "MDDRC SDN BHD"), company_style))
+    address = " ".join(filter(None, [
+        f"({settings['company_reg_no']})" if settings.get("company_reg_no") else "",
+        settings.get("address_line1"), settings.get("address_line2"),
+        settings.get("city"), settings.get("postcode"), settings.get("state"),
+    ]))
+    contact = " | ".join(filter(None, [
+        f"Tel: {settings['phone']}" if settings.get("phone") else "",
+        f"Email: {settings['email']}" if settings.get("email") else "",
+    ]))
+    for line in (address, contact):
+        if line:
+            story.append(Paragraph(escape(line), centered))
+    story.append(Spacer(1, 8 * mm))
+    story.append(Paragraph("OFFICIAL RECEIPT", title_style))
+    story.append(Spacer(1, 6 * mm))
+
+    def cell(label, value):
+        return [Paragraph(label, label_style), Paragraph(escape(str(value or "-")), styles["Normal"])]
+
+    method = (payment.get("payment_method") or "-").replace("_", " ").upper()
+    details = Table([
+        [cell("Receipt No:", payment.get("receipt_number")), cell("Invoice No:", invoice.get("invoice_number"))],
+        [cell("Date:", _format_date(payment.get("payment_date"))), cell("Payment Method:", method)],
+    ], colWidths=[85 * mm, 85 * mm])
+    details.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    story.append(details)
+    story.append(Spacer(1, 6 * mm))
+
+    story.append(Paragraph("RECEIVED FROM:", label_style))
+    story.append(Paragraph(f"<b>{escape(invoice.get('bill_to_name') or invoice.get('company_name') or '-')}</b>", styles["Normal"]))
+    if invoice.get("programme_name"):
+        story.append(Paragraph(escape(invoice["programme_name"]), styles["Normal"]))
+    story.append(Spacer(1, 8 * mm))
+
+    story.append(Paragraph("Amount Received", centered))
+    story.append(Paragraph(_format_amount(payment.get("amount")), amount_style))
+    if payment.get("reference_number"):
+        story.append(Paragraph(f"Ref: {escape(payment['reference_number'])}", centered))
+    if payment.get("notes"):
+        story.append(Spacer(1, 4 * mm))
+        story.append(Paragraph("Notes:", label_style))
+        story.append(Paragraph(escape(payment["notes"]), styles["Normal"]))
+
+    story.append(Spacer(1, 12 * mm))
+    story.append(Paragraph("This is a computer-generated receipt. No signature required.", centered))
+    story.append(Paragraph(escape(settings.get("invoice_footer_note") or "Thank you for your business!"), centered))
+    for field in settings.get("invoice_custom_fields") or []:
+        if str(field.get("position", "")).lower() == "footer":
+            story.append(Paragraph(f"<b>{escape(str(field.get('label', '')))}:</b> {escape(str(field.get('value', '')))}", centered))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def receipt_filename(payment: dict) -> str:
+    return (payment.get("receipt_number") or payment["id"]).replace("/", "-") + ".pdf"
+
+
+def _write_cached_pdf(cache_dir: Path, payment_id: str, key: str, content: bytes) -> Path:
+    path = cache_dir / f"{payment_id}.{key}.pdf"
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+    # Drop renders from older settings/invoice revisions
+    for stale in cache_dir.glob(f"{payment_id}.*.pdf"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+
+async def get_receipt_pdf(
+    payment: dict,
+    invoice: dict,
+    settings: dict,
+    cache_dir: Path,
+    logo_path: Optional[Path] = None
+) -> Path:
+    """Path of the rendered receipt, rendering it off the event loop on a cache miss"""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = receipt_cache_key(payment, invoice, settings)
+    path = cache_dir / f"{payment['id']}.{key}.pdf"
+    if path.is_file():
+        return path
+    content = await asyncio.to_thread(render_receipt_pdf, payment, invoice, settings, logo_path)
+    return await asyncio.to_thread(_write_cached_pdf, cache_dir, payment["id"], key, content)
+
+
+def _zip_files(entries: Iterable[tuple]) -> bytes:
+    buffer = io.BytesIO()
+    # PDFs are already compressed
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            archive.write(path, arcname)
+    return buffer.getvalue()
+
+
+async def build_receipts_zip(
+    payments: list,
+    invoices: dict,
+    settings: dict,
+    cache_dir: Path,
+    logo_path: Optional[Path] = None
+) -> bytes:
+    """ZIP of receipt PDFs for the given payments, reusing cached renders"""
+    entries = []
+    for payment in payments:
+        invoice = invoices.get(payment.get("invoice_id"))
+        if not invoice:
+            continue
+        path = await get_receipt_pdf(payment, invoice, settings, cache_dir, logo_path)
+        entries.append((receipt_filename(payment), path))
+    return await asyncio.to_thread(_zip_files, entries)
@@ -0,0 +1,263 @@
+"""
+Maintained receivables balances and accounts-receivable aging
+
+Every invoice carries paid_amount, credited_amount and outstanding. Payments
+and credit notes adjust them with a single atomic $inc instead of re-reading
+and re-summing the invoice's payments on every write.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from .time_helpers import get_malaysia_time
+
+# Only issued invoices are receivable; paid ones have been settled
+OPEN_INVOICE_STATUSES = ["issued"]
+
+# Credit notes reduce the amount owed once approved
+CREDITED_CN_STATUSES = ["approved", "issued"]
+
+# Anything below half a sen is treated as settled
+SETTLED_EPSILON = 0.005
+
+AGING_BUCKETS = ["current", "days_31_60", "days_61_90", "days_over_90"]
+
+
+def credit_note_credit(credit_note: Optional[dict]) -> float:
+    """Amount a credit note takes off its invoice in its current state"""
+    if not credit_note or not credit_note.get("invoice_id"):
+        return 0.0
+    if credit_note.get("status") not in CREDITED_CN_STATUSES:
+        return 0.0
+    return float(credit_note.get("amount") or 0)
+
+
+def collected_amount(invoice: dict) -> float:
+    """
+    Money actually received against an invoice.
+
+    Credit notes can settle an invoice, so "paid" does not mean the total was
+    collected; the maintained paid_amount does. Paid invoices that predate it
+    were settled by payments alone.
+    """
+    if "paid_amount" in invoice:
+        return float(invoice.get("paid_amount") or 0)
+    if invoice.get("status") == "paid":
+        return float(invoice.get("total_amount") or 0)
+    return 0.0
+
+
+async def _sync_invoice_status(db, invoice_id: str, reopen: bool):
+    """Flip issued <-> paid based on the maintained outstanding balance"""
+    now = get_malaysia_time().isoformat()
+    result = await db.invoices.update_one(
+        {"id": invoice_id, "status": "issued", "total_amount": {"$gt": 0},
+         "outstanding": {"$lte": SETTLED_EPSILON}},
+        {"$set": {"status": "paid", "updated_at": now}}
+    )
+    if result.modified_count:
+        await db.sessions.update_one({"invoice_id": invoice_id}, {"$set": {"invoice_status": "paid"}})
+        return
+    if reopen:
+        result = await db.invoices.update_one(
+            {"id": invoice_id, "status": "paid", "outstanding": {"$gt": SETTLED_EPSILON}},
+            {"$set": {"status": "issued", "updated_at": now}}
+        )
+        if result.modified_count:
+            await db.sessions.update_one({"invoice_id": invoice_id}, {"$set": {"invoice_status": "issued"}})
+
+
+async def adjust_invoice_balance(
+    db,
+    invoice_id: str,
+    paid_delta: float = 0.0,
+    credited_delta: float = 0.0
+) -> Optional[dict]:
+    """
+    Apply a payment or credit note delta to an invoice.
+
+    Positive deltas reduce the outstanding balance; negative ones (deleted
+    payments, voided credit notes) restore it. Invoices that predate the
+    maintained balance are rebuilt from their payments and credit notes.
+    """
+    if not invoice_id:
+        return None
+    paid_delta = round(paid_delta, 2)
+    credited_delta = round(credited_delta, 2)
+
+    invoice = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "outstanding": {"$exists": True}},
+        {"$inc": {
+            "paid_amount": paid_delta,
+            "credited_amount": credited_delta,
+            "outstanding": -(paid_delta + credited_delta)
+        }},
+        projection={"_id": 0, "id": 1, "outstanding": 1, "status": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if invoice is None:
+        # The source rows already include this change
+        await recompute_invoice_balances(db, [invoice_id])
+
+    await _sync_invoice_status(db, invoice_id, reopen=paid_delta < 0 or credited_delta < 0)
+    return await db.invoices.find_one(
+        {"id": invoice_id},
+        {"_id": 0, "id": 1, "status": 1, "total_amount": 1, "paid_amount": 1,
+         "credited_amount": 1, "outstanding": 1}
+    )
+
+
+async def apply_credit_note_change(db, before: Optional[dict], after: Optional[dict]):
+    """Adjust invoice balances for a credit note created, edited or voided"""
+    before_invoice = (before or {}).get("invoice_id")
+    after_invoice = (after or {}).get("invoice_id")
+    if before_invoice == after_invoice:
+        delta = credit_note_credit(after) - credit_note_credit(before)
+        if abs(delta) >= SETTLED_EPSILON:
+            await adjust_invoice_balance(db, after_invoice, credited_delta=delta)
+        return
+    if credit_note_credit(before):
+        await adjust_invoice_balance(db, before_invoice, credited_delta=-credit_note_credit(before))
+    if credit_note_credit(after):
+        await adjust_invoice_balance(db, after_invoice, credited_delta=credit_note_credit(after))
+
+
+async def recompute_invoice_balances(db, invoice_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Rebuild paid/credited/outstanding from the payments and credit notes.
+
+    Used after an invoice total changes and by the backfill migration. Pass
+    None to rebuild every invoice. Returns the number of invoices written.
+    """
+    invoice_filter = {}
+    if invoice_ids is not None:
+        invoice_ids = [i for i in invoice_ids if i]
+        if not invoice_ids:
+            return 0
+        invoice_filter["id"] = {"$in": invoice_ids}
+
+    payment_match = {"invoice_id": invoice_filter["id"]} if invoice_ids is not None else {}
+    cn_match = {"status": {"$in": CREDITED_CN_STATUSES}}
+    if invoice_ids is not None:
+        cn_match["invoice_id"] = invoice_filter["id"]
+
+    paid = {
+        row["_id"]: row["total"]
+        for row in await db.payments.aggregate([
+            {"$match": payment_match},
+            {"$group": {"_id": "$invoice_id", "total": {"$sum": "$amount"}}}
+        ]).to_list(None)
+    }
+    credited = {
+        row["_id"]: row["total"]
+        for row in await db.credit_notes.aggregate([
+            {"$match": cn_match},
+            {"$group": {"_id": "$invoice_id", "total": {"$sum": "$amount"}}}
+        ]).to_list(None)
+    }
+
+    operations = []
+    async for invoice in db.invoices.find(invoice_filter, {"_id": 0, "id": 1, "total_amount": 1}):
+        paid_amount = round(paid.get(invoice["id"]) or 0, 2)
+        credited_amount = round(credited.get(invoice["id"]) or 0, 2)
+        operations.append(UpdateOne(
+            {"id": invoice["id"]},
+            {"$set": {
+                "paid_amount": paid_amount,
+                "credited_amount": credited_amount,
+                "outstanding": round((invoice.get("total_amount") or 0) - paid_amount - credited_amount, 2)
+            }}
+        ))
+
+    if operations:
+        await db.invoices.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def refresh_invoice_balance(db, invoice_id: str):
+    """Recompute one invoice's outstanding balance after its total changed"""
+    await recompute_invoice_balances(db, [invoice_id])
+    await _sync_invoice_status(db, invoice_id, reopen=False)
+
+
+def _aging_pipeline(as_of: datetime, company_id: Optional[str] = None) -> list:
+    as_of_date = as_of.date()
+    cutoffs = {days: (as_of_date - timedelta(days=days)).isoformat() for days in (30, 60, 90)}
+    invoice_date = {"$ifNull": ["$invoice_date", {"$ifNull": ["$issued_at", "$created_at"]}]}
+
+    match = {"status": {"$in": OPEN_INVOICE_STATUSES}, "outstanding": {"$gt": SETTLED_EPSILON}}
+    if company_id:
+        match["company_id"] = company_id
+
+    def bucket_sum(bucket):
+        return {"$sum": {"$cond": [{"$eq": ["$bucket", bucket]}, "$outstanding", 0]}}
+
+    return [
+        {"$match": match},
+        {"$project": {
+            "_id": 0,
+            "outstanding": 1,
+            "company_id": 1,
+            "company_name": 1,
+            "invoice_date": invoice_date,
+            "billing_party": {"$cond": [
+                {"$gt": [{"$ifNull": ["$bill_to_name", ""]}, ""]},
+                "$bill_to_name",
+                "$company_name"
+            ]},
+            "bucket": {"$switch": {
+                "branches": [
+                    {"case": {"$gte": [invoice_date, cutoffs[30]]}, "then": "current"},
+                    {"case": {"$gte": [invoice_date, cutoffs[60]]}, "then": "days_31_60"},
+                    {"case": {"$gte": [invoice_date, cutoffs[90]]}, "then": "days_61_90"},
+                ],
+                "default": "days_over_90"
+            }}
+        }},
+        {"$group": {
+            "_id": {"billing_party": "$billing_party", "company_id": "$company_id"},
+            "company_name": {"$first": "$company_name"},
+            **{bucket: bucket_sum(bucket) for bucket in AGING_BUCKETS},
+            "total": {"$sum": "$outstanding"},
+            "invoice_count": {"$sum": 1},
+            "oldest_invoice_date": {"$min": "$invoice_date"}
+        }},
+        {"$sort": {"total": -1}}
+    ]
+
+
+async def receivables_aging(db, as_of: Optional[datetime] = None, company_id: Optional[str] = None) -> dict:
+    """
+    Outstanding receivables per billing party and company, split into
+    current (0-30 days), 31-60, 61-90 and over-90 day buckets by invoice date.
+    """
+    as_of = as_of or get_malaysia_time()
+    rows = await db.invoices.aggregate(_aging_pipeline(as_of, company_id)).to_list(None)
+
+    totals = {bucket: 0.0 for bucket in AGING_BUCKETS + ["total"]}
+    totals["invoice_count"] = 0
+    parties = []
+    for row in rows:
+        party = {
+            "billing_party": row["_id"].get("billing_party") or "Unknown",
+            "company_id": row["_id"].get("company_id"),
+            "company_name": row.get("company_name"),
+            "invoice_count": row["invoice_count"],
+            "oldest_invoice_date": row.get("oldest_invoice_date"),
+        }
+        for key in AGING_BUCKETS + ["total"]:
+            party[key] = round(row.get(key) or 0, 2)
+            totals[key] += party[key]
+        totals["invoice_count"] += row["invoice_count"]
+        parties.append(party)
+
+    for key in AGING_BUCKETS + ["total"]:
+        totals[key] = round(totals[key], 2)
+
+    return {
+        "as_of": as_of.date().isoformat(),
+        "buckets": AGING_BUCKETS,
+        "parties": parties,
+        "totals": totals
+    }
@@ -0,0 +1,111 @@
+"""
+Process-wide cache of small reference collections
+
+Programs, companies, billing parties and the company settings singleton are
+a few hundred documents at most but are looked up for almost every listed
+row, invoice and receipt. Each collection is loaded whole, kept in memory as
+an id -> document map and reloaded when its version in cache_versions
+changes. Writers call invalidate(); other workers notice the bump within
+VERSION_CHECK_SECONDS.
+
+The maps from get() are shared: read them, don't modify them. lookup() and
+all() hand out copies.
+"""
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+
+CACHE_VERSIONS_COLLECTION = "cache_versions"
+VERSION_CHECK_SECONDS = float(os.environ.get('REFERENCE_CACHE_VERSION_CHECK_SECONDS', '2'))
+
+REFERENCE_COLLECTIONS = ("programs", "companies", "billing_parties", "company_settings")
+COMPANY_SETTINGS_ID = "company_settings"
+
+
+def _version_key(collection: str) -> str:
+    return f"reference:{collection}"
+
+
+class ReferenceCache:
+    """Whole-collection id -> document maps keyed by the shared per-collection version"""
+
+    def __init__(self, collections: Iterable[str] = REFERENCE_COLLECTIONS,
+                 check_interval: float = VERSION_CHECK_SECONDS):
+        self.collections = tuple(collections)
+        self.check_interval = check_interval
+        self._docs: Dict[str, Dict[str, dict]] = {}
+        self._versions: Dict[str, int] = {}
+        self._checked_at: Optional[float] = None
+        # Bumped per collection on every drop so a load that raced an invalidation is not stored
+        self._generations: Dict[str, int] = {name: 0 for name in self.collections}
+
+    def _drop(self, collection: str):
+        self._docs.pop(collection, None)
+        self._generations[collection] += 1
+
+    async def _sync_versions(self, db):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        # One round-trip covers every collection's version
+        keys = {_version_key(name): name for name in self.collections}
+        docs = await db[CACHE_VERSIONS_COLLECTION].find({"_id": {"$in": list(keys)}}).to_list(None)
+        versions = {keys[doc["_id"]]: doc.get("version", 0) for doc in docs}
+        for name in self.collections:
+            version = versions.get(name, 0)
+            if self._versions.get(name) != version:
+                self._drop(name)
+                self._versions[name] = version
+        self._checked_at = now
+
+    async def get(self, db, collection: str) -> Dict[str, dict]:
+        """id -> document for the whole collection"""
+        if collection not in self._generations:
+            raise KeyError(f"{collection} is not a cached reference collection")
+        await self._sync_versions(db)
+        docs = self._docs.get(collection)
+        if docs is not None:
+            return docs
+
+        generation = self._generations[collection]
+        loaded = await db[collection].find({}, {"_id": 0}).to_list(None)
+        docs = {doc["id"]: doc for doc in loaded if "id" in doc}
+        if generation == self._generations[collection]:
+            self._docs[collection] = docs
+        return docs
+
+    async def names(self, db, collection: str) -> Dict[str, str]:
+        return {doc_id: doc.get("name") for doc_id, doc in (await self.get(db, collection)).items()}
+
+    async def lookup(self, db, collection: str, doc_id: Optional[str]) -> Optional[dict]:
+        """A copy of one document, or None"""
+        if doc_id is None:
+            return None
+        doc = (await self.get(db, collection)).get(doc_id)
+        if doc is None:
+            # Possibly created on another worker since the last version check
+            doc = await db[collection].find_one({"id": doc_id}, {"_id": 0})
+        return dict(doc) if doc else None
+
+    async def all(self, db, collection: str) -> List[dict]:
+        """Copies of every document in the collection"""
+        return [dict(doc) for doc in (await self.get(db, collection)).values()]
+
+    async def company_settings(self, db) -> Optional[dict]:
+        return await self.lookup(db, "company_settings", COMPANY_SETTINGS_ID)
+
+    async def invalidate(self, db, collection: str):
+        """Call after any create, update or delete on a cached collection"""
+        doc = await db[CACHE_VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": _version_key(collection)},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._drop(collection)
+        self._versions[collection] = doc["version"]
+
+
+reference_cache = ReferenceCache()
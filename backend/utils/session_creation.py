@@ -0,0 +1,171 @@
+"""
+Batched session creation
+
+Creating a session used to resolve each participant and supervisor on its
+own (lookup, update, re-read and a bcrypt hash per new user) and then write
+the session, invoice, commission and access rows one at a time. Here every
+person is resolved with one users query, each distinct password is hashed
+once off the event loop, and the writes go out as a handful of bulk
+operations inside a transaction when the deployment supports one (replica
+set or mongos). Without transactions, a failed write removes whatever the
+batch had already inserted.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTICIPANT_PASSWORD = "mddrc1"
+
+# Match priority: the most specific identifier wins when a person matches several users
+MATCH_FIELDS = ("id_number", "email", "full_name")
+
+_transaction_support: Dict[int, bool] = {}
+
+
+def placeholder_email(id_number: Optional[str]) -> str:
+    """Stand-in for the unique email index when a person has none"""
+    if id_number:
+        return f"{id_number.replace('-', '').replace(' ', '')}@temp.mddrc.local"
+    return f"user_{uuid.uuid4().hex[:8]}@temp.mddrc.local"
+
+
+def _person_update(person: dict, company_id: str) -> dict:
+    update = {
+        "id_number": person.get("id_number"),
+        "phone_number": person.get("phone_number"),
+        "company_id": company_id,
+    }
+    # An empty email would collide on the unique index, so only a real one replaces the stored one
+    email = person.get("email")
+    if email and email.strip():
+        update["email"] = email
+    return {k: v for k, v in update.items() if v is not None}
+
+
+async def resolve_people(db, people: List[Tuple[str, dict]], company_id: str,
+                         make_user: Callable[[dict, str, str, str], dict],
+                         hash_password: Callable[[str], str]):
+    """
+    Find or create every (role, person) pair with a single users query.
+
+    A person matches an existing user on id_number, email or full name (in
+    that order of preference); people later in the list also match users
+    created for earlier ones. make_user(person, role, company_id, email)
+    builds a new user document without its password.
+
+    Returns (bulk write operations for users, [(user, is_existing)] in input order).
+    """
+    values = {field: set() for field in MATCH_FIELDS}
+    for _, person in people:
+        for field in MATCH_FIELDS:
+            if person.get(field):
+                values[field].add(person[field])
+    clauses = [{field: {"$in": sorted(found)}} for field, found in values.items() if found]
+    existing = await db.users.find({"$or": clauses}, {"_id": 0, "password": 0}).to_list(None) if clauses else []
+
+    index = {field: {} for field in MATCH_FIELDS}
+
+    def remember(user: dict):
+        for field in MATCH_FIELDS:
+            if user.get(field):
+                index[field].setdefault(user[field], user)
+
+    for user in existing:
+        remember(user)
+
+    operations, resolved, passwords = [], [], {}
+    for role, person in people:
+        user = next((index[field][person[field]] for field in MATCH_FIELDS
+                     if person.get(field) and person[field] in index[field]), None)
+        if user is not None:
+            update = _person_update(person, company_id)
+            user.update(update)
+            operations.append(UpdateOne({"id": user["id"]}, {"$set": update}))
+            resolved.append((user, True))
+            continue
+
+        email = person.get("email")
+        if not email or not email.strip():
+            email = placeholder_email(person.get("id_number"))
+        user = make_user(person, role, company_id, email)
+        password = person.get("password") or (DEFAULT_PARTICIPANT_PASSWORD if role == "participant" else None)
+        passwords.setdefault(password, []).append(user)
+        remember(user)
+        # Inserted before any later update that matches it (the bulk write is ordered)
+        operations.append(InsertOne(user))
+        resolved.append((user, False))
+
+    # bcrypt is deliberately slow: hash each distinct password once, off the event loop
+    hashes = await asyncio.gather(*(asyncio.to_thread(hash_password, p) for p in passwords))
+    for users, hashed in zip(passwords.values(), hashes):
+        for user in users:
+            user["password"] = hashed
+    return operations, resolved
+
+
+async def transactions_supported(db) -> bool:
+    """Whether the server can run multi-document transactions (checked once per client)"""
+    key = id(db.client)
+    if key not in _transaction_support:
+        try:
+            hello = await db.command("hello")
+            _transaction_support[key] = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+        except Exception:
+            _transaction_support[key] = False
+    return _transaction_support[key]
+
+
+async def write_session(db, user_operations: list, new_users: List[dict], session_doc: dict,
+                        invoice: Optional[dict] = None, commission: Optional[dict] = None,
+                        access_docs: List[dict] = ()):
+    """Write a new session and everything created with it, all or nothing"""
+    access_docs = list(access_docs)
+
+    async def write(session=None):
+        if user_operations:
+            await db.users.bulk_write(user_operations, ordered=True, session=session)
+        await db.sessions.insert_one(session_doc, session=session)
+        if invoice:
+            await db.invoices.insert_one(invoice, session=session)
+        if commission:
+            await db.marketing_commissions.insert_one(commission, session=session)
+        if access_docs:
+            await db.participant_access.insert_many(access_docs, ordered=False, session=session)
+
+    if await transactions_supported(db):
+        async with await db.client.start_session() as session:
+            await session.with_transaction(write)
+    else:
+        try:
+            await write()
+        except Exception:
+            await _undo(db, new_users, session_doc, invoice, commission)
+            raise
+
+    for doc in (session_doc, invoice, commission, *access_docs, *new_users):
+        if doc:
+            doc.pop("_id", None)
+
+
+async def _undo(db, new_users: List[dict], session_doc: dict, invoice: Optional[dict], commission: Optional[dict]):
+    """Best-effort removal of a partly written batch (updates to existing users are kept)"""
+    session_id = session_doc["id"]
+    deletes = [("participant_access", {"session_id": session_id})]
+    if commission:
+        deletes.append(("marketing_commissions", {"id": commission["id"]}))
+    if invoice:
+        deletes.append(("invoices", {"id": invoice["id"]}))
+    deletes.append(("sessions", {"id": session_id}))
+    if new_users:
+        deletes.append(("users", {"id": {"$in": [user["id"] for user in new_users]}}))
+    # One failing delete must not stop the others
+    for collection, query in deletes:
+        try:
+            await getattr(db, collection).delete_many(query)
+        except Exception as e:
+            logger.error(f"Could not clean up partly created session {session_id}: {e}")
@@ -0,0 +1,221 @@
+"""
+Per-session event bus for live coordinator/trainer dashboards
+
+Write endpoints publish compact events (clock-ins, test submissions,
+feedback, checklists) for a session; GET /sessions/{id}/events streams them
+to subscribers as Server-Sent Events, so dashboards apply deltas instead of
+re-polling every multi-query endpoint.
+
+The bus is in-process. With several workers, set SESSION_EVENTS_CHANGE_STREAMS
+to feed it from MongoDB change streams instead (needs a replica set); the
+direct publishes are then skipped so each event arrives once.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set
+
+from .time_helpers import get_malaysia_time
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PER_SESSION = 200
+MAX_TRACKED_SESSIONS = 500
+SUBSCRIBER_QUEUE_SIZE = 256
+HEARTBEAT_SECONDS = 15.0
+
+# Collections watched by the change stream feed and the event each one maps to
+CHANGE_STREAM_EVENTS = {
+    "attendance": "attendance.updated",
+    "test_results": "test.submitted",
+    "course_feedback": "feedback.submitted",
+    "vehicle_checklists": "checklist.updated",
+    "vehicle_details": "vehicle_details.updated",
+    "participant_access": "access.updated",
+}
+
+# Fields copied from a changed document into the event payload
+CHANGE_STREAM_FIELDS = [
+    "participant_id", "date", "clock_in", "clock_out", "test_type", "score", "passed",
+    "verification_status", "pre_test_completed", "post_test_completed",
+    "feedback_submitted", "checklist_completed",
+]
+
+
+class Subscription:
+    """One SSE client's queue; overflow drops the backlog and asks the client to resync"""
+
+    __slots__ = ("session_id", "queue", "overflowed")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, event: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client gets one resync instead of an unbounded backlog
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"id": None, "type": "resync", "data": {}})
+
+
+class SessionEventBus:
+
+    def __init__(self):
+        self._seq = 0
+        self._history: "OrderedDict[str, Deque[dict]]" = OrderedDict()
+        # Newest event id that has fallen out of a session's history (or out with the whole session)
+        self._dropped_through: Dict[str, int] = {}
+        self._evicted_through = 0
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.change_streams_active = False
+
+    def publish(self, session_id: Optional[str], event_type: str, **data):
+        """Publish from a write endpoint (no-op while the change stream feed is running)"""
+        if self.change_streams_active:
+            return
+        self.dispatch(session_id, event_type, data)
+
+    def dispatch(self, session_id: Optional[str], event_type: str, data: dict):
+        if not session_id:
+            return
+        self._seq += 1
+        event = {
+            "id": self._seq,
+            "type": event_type,
+            "session_id": session_id,
+            "at": get_malaysia_time().isoformat(),
+            "data": data,
+        }
+        history = self._history.get(session_id)
+        if history is None:
+            history = self._history[session_id] = deque(maxlen=HISTORY_PER_SESSION)
+            self._evict()
+        else:
+            self._history.move_to_end(session_id)
+        if len(history) == history.maxlen:
+            self._dropped_through[session_id] = history[0]["id"]
+        history.append(event)
+        for subscription in self._subscribers.get(session_id, ()):
+            subscription.offer(event)
+
+    def _evict(self):
+        while len(self._history) > MAX_TRACKED_SESSIONS:
+            stale = next((sid for sid in self._history if sid not in self._subscribers), None)
+            if stale is None:
+                return
+            self._evicted_through = self._seq
+            del self._history[stale]
+            self._dropped_through.pop(stale, None)
+
+    def replay(self, session_id: str, last_event_id: int) -> Optional[list]:
+        """Events after last_event_id, or None when they have been dropped from history"""
+        history = self._history.get(session_id)
+        if history is None:
+            return None if last_event_id < self._evicted_through else []
+        if last_event_id < self._dropped_through.get(session_id, 0):
+            return None
+        return [event for event in history if event["id"] > last_event_id]
+
+    def subscribe(self, session_id: str) -> Subscription:
+        subscription = Subscription(session_id)
+        self._subscribers.setdefault(session_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.session_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.session_id]
+
+    def subscriber_count(self, session_id: Optional[str] = None) -> int:
+        if session_id is not None:
+            return len(self._subscribers.get(session_id, ()))
+        return sum(len(subs) for subs in self._subscribers.values())
+
+
+session_events = SessionEventBus()
+
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_session_events(
+    bus: SessionEventBus,
+    session_id: str,
+    last_event_id: Optional[int] = None,
+    is_disconnected=None,
+    heartbeat: float = HEARTBEAT_SECONDS
+) -> AsyncIterator[str]:
+    """SSE body: missed events (or a resync), then live events with heartbeats"""
+    # Subscribe and take the replay together, so nothing falls between them
+    subscription = bus.subscribe(session_id)
+    missed = bus.replay(session_id, last_event_id) if last_event_id is not None else []
+    replayed_through = missed[-1]["id"] if missed else 0
+    try:
+        yield f"retry: 3000\n: subscribed to {session_id}\n\n"
+        if missed is None:
+            yield format_sse({"id": None, "type": "resync", "data": {}})
+        else:
+            for event in missed:
+                yield format_sse(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if is_disconnected and await is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            if event["type"] == "resync":
+                subscription.overflowed = False
+            elif event["id"] <= replayed_through:
+                continue
+            yield format_sse(event)
+    finally:
+        bus.unsubscribe(subscription)
+
+
+async def run_change_stream_feed(db, bus: SessionEventBus):
+    """
+    Feed the bus from a database-wide change stream. Falls back to direct
+    publishes if the deployment does not support change streams.
+    """
+    pipeline = [{"$match": {
+        "operationType": {"$in": ["insert", "update", "replace"]},
+        "ns.coll": {"$in": list(CHANGE_STREAM_EVENTS)},
+    }}]
+    try:
+        async with db.watch(pipeline, full_document="updateLookup") as stream:
+            bus.change_streams_active = True
+            logger.info("Session events fed from MongoDB change streams")
+            async for change in stream:
+                doc = change.get("fullDocument") or {}
+                event_type = CHANGE_STREAM_EVENTS.get(change["ns"]["coll"])
+                data = {field: doc[field] for field in CHANGE_STREAM_FIELDS if field in doc}
+                bus.dispatch(doc.get("session_id"), event_type, data)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"Change stream feed unavailable, using in-process events: {e}")
+    finally:
+        bus.change_streams_active = False
+
+
+def change_streams_enabled() -> bool:
+    return os.environ.get('SESSION_EVENTS_CHANGE_STREAMS', 'false').lower() == 'true'
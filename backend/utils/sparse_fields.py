@@ -0,0 +1,55 @@
+"""
+Sparse fieldsets for list endpoints
+
+List endpoints accept `fields=name,start_date,end_date` and return only those
+top-level fields (plus `id`). The selection becomes a MongoDB inclusion
+projection, so unrequested arrays such as participant_ids never leave the
+database. Fields an endpoint computes (company_name from company_id, for
+example) are declared as derived fields and project their sources instead.
+Without `fields` the endpoint returns whole documents as before.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# No leading underscore: _id (an ObjectId) and internal fields are never selectable
+FIELD_NAME = re.compile(r'^[A-Za-z][A-Za-z0-9_]*$')
+
+# Returned whatever was asked for, so clients can always key rows
+ALWAYS_INCLUDED = ("id",)
+
+
+def parse_fields(fields: Optional[str], allowed: Optional[Iterable[str]] = None) -> Optional[List[str]]:
+    """Requested field names from a comma-separated parameter (None means whole documents)"""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    allowed = set(allowed) if allowed is not None else None
+    unknown = [name for name in names if not FIELD_NAME.match(name) or (allowed is not None and name not in allowed)]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def field_projection(selected: List[str], needs: Iterable[str] = (),
+                     derived: Optional[Dict[str, Tuple[str, ...]]] = None) -> dict:
+    """
+    Inclusion projection for the selected fields, the stored fields derived
+    ones are computed from, and any fields the endpoint itself reads (needs)
+    """
+    projection = {"_id": 0}
+    for name in (*ALWAYS_INCLUDED, *needs):
+        projection[name] = 1
+    for name in selected:
+        for source in (derived or {}).get(name, (name,)):
+            projection[source] = 1
+    return projection
+
+
+def trim_fields(docs: List[dict], selected: List[str]) -> List[dict]:
+    """Drop everything but the selected fields (and id) after an endpoint has enriched its rows"""
+    keep = (*ALWAYS_INCLUDED, *selected)
+    return [{name: doc[name] for name in keep if name in doc} for doc in docs]
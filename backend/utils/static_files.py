@@ -0,0 +1,194 @@
+"""
+Static file serving with strong ETags, conditional requests and byte ranges
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+# Cache headers
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Files whose stem is a long hex digest (optionally with a variant suffix such
+# as ".thumb") never change content under the same name
+CONTENT_ADDRESSED_PATTERN = re.compile(r'^[0-9a-f]{32,64}(?:[._-][a-z0-9]+)?$')
+
+HASH_CHUNK_SIZE = 1024 * 1024
+MAX_ETAG_CACHE_ENTRIES = 4096
+
+# (path, mtime_ns, size) -> etag, so a file is hashed once per modification
+_etag_cache: Dict[Tuple[str, int, int], str] = {}
+
+
+def is_content_addressed(filename: str) -> bool:
+    """Check if a filename embeds the hash of its own content"""
+    stem = Path(filename).stem.lower()
+    return bool(CONTENT_ADDRESSED_PATTERN.match(stem))
+
+
+def resolve_static_path(base_dir, filename: str) -> Path:
+    """Resolve a filename inside base_dir, rejecting path traversal"""
+    base = Path(base_dir).resolve()
+    file_path = (base / filename).resolve()
+    if base not in file_path.parents:
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+
+def _hash_file(path: str) -> str:
+    """Hash file content (runs in a worker thread)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+async def compute_etag(path: Path, stat_result: Optional[os.stat_result] = None) -> str:
+    """
+    Get a strong ETag for a file.
+
+    Content-addressed names use the name itself; other files are hashed once
+    per (mtime, size) and the result is memoised.
+    """
+    if is_content_addressed(path.name):
+        return f'"{path.stem.lower()}"'
+
+    st = stat_result or path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    etag = _etag_cache.get(key)
+    if etag is None:
+        etag = f'"{await asyncio.to_thread(_hash_file, str(path))}"'
+        if len(_etag_cache) >= MAX_ETAG_CACHE_ENTRIES:
+            _etag_cache.clear()
+        _etag_cache[key] = etag
+    return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison is what If-None-Match uses
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range.
+
+    Returns (start, end) inclusive, None when the header is absent or uses a
+    form we do not serve (multiple ranges), and raises 416 when unsatisfiable.
+    """
+    if not range_header:
+        return None
+    match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', range_header)
+    if not match:
+        return None
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+
+    if not start_str:
+        # Suffix range: last N bytes
+        length = int(end_str)
+        if length == 0:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{file_size}"}
+            )
+        start = max(0, file_size - length)
+        end = file_size - 1
+    else:
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+        end = min(end, file_size - 1)
+
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+
+def _read_range(path: str, start: int, length: int) -> bytes:
+    """Read a byte range from disk (runs in a worker thread)"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+async def serve_static_file(
+    request: Request,
+    file_path: Path,
+    media_type: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    not_found_detail: str = "File not found",
+) -> Response:
+    """
+    Serve a file with ETag, If-None-Match, Range and cache headers.
+
+    Content-addressed files get long-lived immutable caching; everything else
+    must be revalidated, which is cheap thanks to the ETag.
+    """
+    file_path = Path(file_path)
+    try:
+        st = file_path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail=not_found_detail)
+
+    etag = await compute_etag(file_path, st)
+    media_type = media_type or mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_content_addressed(file_path.name) else REVALIDATE_CACHE_CONTROL
+
+    response_headers = dict(headers or {})
+    response_headers.update({
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    })
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={
+            "ETag": etag,
+            "Cache-Control": cache_control,
+        })
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        byte_range = parse_range_header(request.headers.get("range"), st.st_size)
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        body = await asyncio.to_thread(_read_range, str(file_path), start, length)
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        return Response(
+            content=body,
+            status_code=206,
+            media_type=media_type,
+            headers=response_headers,
+        )
+
+    return FileResponse(
+        file_path,
+        media_type=media_type,
+        headers=response_headers,
+        stat_result=st,
+    )
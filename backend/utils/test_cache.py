@@ -0,0 +1,221 @@
+"""
+Compiled test cache for delivery and grading
+
+Tests change rarely but are read on every participant request, typically by
+a whole class at once. Each test is compiled once into:
+
+    participant_questions  question/options/original_index, no answers
+    answer_key             correct option per question, in original order
+    pass_percentage        from the test's program
+
+Compiled tests are kept in memory and dropped whenever the shared version in
+cache_versions changes. Writers call invalidate(); other workers notice the
+bump within VERSION_CHECK_SECONDS.
+
+Post-tests are shuffled per participant. The permutation is generated on
+first delivery and stored in test_permutations, so a reload shows the same
+order and grading maps answers back with the server's copy.
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+from operator import eq
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+CACHE_VERSIONS_COLLECTION = "cache_versions"
+PERMUTATIONS_COLLECTION = "test_permutations"
+TESTS_VERSION_KEY = "tests"
+VERSION_CHECK_SECONDS = float(os.environ.get('TEST_CACHE_VERSION_CHECK_SECONDS', '2'))
+DEFAULT_PASS_PERCENTAGE = 70.0
+
+SHUFFLED_TEST_TYPES = {"post"}
+
+
+class CompiledTest:
+    """Read-only, participant-safe view of a test plus its answer key"""
+
+    __slots__ = ("test_id", "program_id", "test_type", "meta", "questions",
+                 "participant_questions", "answer_key", "pass_percentage")
+
+    def __init__(self, test_doc: dict, pass_percentage: float):
+        questions = test_doc.get("questions") or []
+        meta = {k: v for k, v in test_doc.items() if k != "questions"}
+        if isinstance(meta.get("created_at"), str):
+            meta["created_at"] = datetime.fromisoformat(meta["created_at"])
+
+        self.test_id = test_doc["id"]
+        self.program_id = test_doc.get("program_id")
+        self.test_type = test_doc.get("test_type")
+        self.meta = meta
+        self.questions = questions
+        self.participant_questions = [
+            {
+                "question": q.get("question", q.get("question_text")),
+                "options": q.get("options", []),
+                "original_index": index,
+            }
+            for index, q in enumerate(questions)
+        ]
+        self.answer_key = [int(q.get("correct_answer", -1)) for q in questions]
+        self.pass_percentage = pass_percentage
+
+    @property
+    def shuffled(self) -> bool:
+        return self.test_type in SHUFFLED_TEST_TYPES
+
+    def document(self, questions: list) -> dict:
+        """The test document as the API returns it, with the given question list"""
+        return {**self.meta, "questions": questions}
+
+    def participant_payload(self, order: Optional[List[int]] = None) -> list:
+        if not order:
+            return self.participant_questions
+        return [self.participant_questions[i] for i in order]
+
+    def grade(self, answers: List[int], order: Optional[List[int]] = None) -> dict:
+        """
+        Score answers given in display order.
+
+        `order[i]` is the original index of the question shown at position i;
+        without it the answers are taken to be in original order.
+        """
+        count = len(self.answer_key)
+        answers = answers[:count]
+        if order:
+            key = [self.answer_key[i] if 0 <= i < count else None for i in order[:len(answers)]]
+            key += self.answer_key[len(key):len(answers)]
+        else:
+            key = self.answer_key
+        correct = sum(map(eq, map(int, answers), key))
+        score = (correct / count) * 100 if count else 0
+        return {
+            "correct_answers": correct,
+            "total_questions": count,
+            "score": score,
+            "passed": score >= self.pass_percentage,
+        }
+
+
+class CompiledTestCache:
+    """Process-local cache of compiled tests keyed by the shared tests version"""
+
+    def __init__(self, check_interval: float = VERSION_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._tests: Dict[str, CompiledTest] = {}
+        self._programs: Dict[str, List[str]] = {}
+        self._version = None
+        self._checked_at = 0.0
+        # Bumped on every clear so a compile that raced an invalidation is not stored
+        self._generation = 0
+
+    def clear(self):
+        self._tests.clear()
+        self._programs.clear()
+        self._generation += 1
+
+    async def _sync_version(self, db):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return
+        doc = await db[CACHE_VERSIONS_COLLECTION].find_one({"_id": TESTS_VERSION_KEY})
+        version = (doc or {}).get("version", 0)
+        if version != self._version:
+            self.clear()
+            self._version = version
+        self._checked_at = now
+
+    async def invalidate(self, db):
+        """Call after any write to tests, or to a program's pass percentage"""
+        doc = await db[CACHE_VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": TESTS_VERSION_KEY},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.clear()
+        self._version = doc["version"]
+        self._checked_at = time.monotonic()
+
+    async def _pass_percentages(self, db, program_ids) -> dict:
+        programs = await db.programs.find(
+            {"id": {"$in": list(program_ids)}}, {"_id": 0, "id": 1, "pass_percentage": 1}
+        ).to_list(None)
+        return {p["id"]: p.get("pass_percentage", DEFAULT_PASS_PERCENTAGE) for p in programs}
+
+    async def get(self, db, test_id: str) -> Optional[CompiledTest]:
+        await self._sync_version(db)
+        compiled = self._tests.get(test_id)
+        if compiled:
+            return compiled
+
+        generation = self._generation
+        test_doc = await db.tests.find_one({"id": test_id}, {"_id": 0})
+        if not test_doc:
+            return None
+        pass_percentages = await self._pass_percentages(db, [test_doc.get("program_id")])
+        compiled = CompiledTest(
+            test_doc, pass_percentages.get(test_doc.get("program_id"), DEFAULT_PASS_PERCENTAGE)
+        )
+        if generation == self._generation:
+            self._tests[test_id] = compiled
+        return compiled
+
+    async def for_program(self, db, program_id: str) -> List[CompiledTest]:
+        await self._sync_version(db)
+        test_ids = self._programs.get(program_id)
+        if test_ids is not None and all(test_id in self._tests for test_id in test_ids):
+            return [self._tests[test_id] for test_id in test_ids]
+
+        generation = self._generation
+        test_docs, pass_percentages = await asyncio.gather(
+            db.tests.find({"program_id": program_id}, {"_id": 0}).to_list(10),
+            self._pass_percentages(db, [program_id])
+        )
+        pass_percentage = pass_percentages.get(program_id, DEFAULT_PASS_PERCENTAGE)
+        compiled = [CompiledTest(doc, pass_percentage) for doc in test_docs]
+        if generation == self._generation:
+            for test in compiled:
+                self._tests[test.test_id] = test
+            self._programs[program_id] = [test.test_id for test in compiled]
+        return compiled
+
+
+test_cache = CompiledTestCache()
+
+
+async def participant_order(db, test: CompiledTest, participant_id: str) -> Optional[List[int]]:
+    """The participant's stored question order for a shuffled test, created on first use"""
+    if not test.shuffled or not test.answer_key:
+        return None
+    order = list(range(len(test.answer_key)))
+    random.shuffle(order)
+    key = {"test_id": test.test_id, "participant_id": participant_id}
+    # $setOnInsert keeps the first order if two requests race
+    try:
+        doc = await db[PERMUTATIONS_COLLECTION].find_one_and_update(
+            key,
+            {"$setOnInsert": {"order": order, "question_count": len(order)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        doc = await db[PERMUTATIONS_COLLECTION].find_one(key)
+    if doc.get("question_count") != len(test.answer_key):
+        # Questions were added or removed since the order was drawn
+        await db[PERMUTATIONS_COLLECTION].update_one(
+            {"_id": doc["_id"]}, {"$set": {"order": order, "question_count": len(order)}}
+        )
+        return order
+    return doc["order"]
+
+
+async def stored_order(db, test_id: str, participant_id: str) -> Optional[List[int]]:
+    doc = await db[PERMUTATIONS_COLLECTION].find_one(
+        {"test_id": test_id, "participant_id": participant_id}, {"_id": 0, "order": 1}
+    )
+    return doc["order"] if doc else None
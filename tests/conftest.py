@@ -0,0 +1,27 @@
+"""
+Shared test scaffolding
+Puts backend/ on the import path and provides run() and an in-memory database
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def db(request):
+    """
+    Empty mongomock database named after the test module. Modules that need
+    seed data override it with a db(db) fixture of their own.
+    """
+    # Imported here so the live-server tests do not need mongomock
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()[request.module.__name__.rsplit(".", 1)[-1]]
@@ -0,0 +1,166 @@
+"""
+Archive Tiering Tests
+Tests for moving completed sessions' records to archive collections and reading across tiers
+"""
+import asyncio
+import io
+import os
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from utils.archive import (
+    TieredDatabase,
+    archive_due_sessions,
+    cascade_delete,
+    gather_bounded,
+    records_archived,
+    session_records_archived,
+)
+from utils.time_helpers import MALAYSIA_TZ
+
+from .conftest import run
+
+NOW = datetime(2026, 10, 19, 9, 0, tzinfo=MALAYSIA_TZ)
+
+
+@pytest.fixture
+def db(db):
+    run(db.sessions.insert_many([
+        {"id": "old", "completion_status": "completed", "completed_date": "2025-11-01T10:00:00+08:00"},
+        {"id": "recent", "completion_status": "completed", "completed_date": "2026-10-01T10:00:00+08:00"},
+        {"id": "live", "completion_status": "ongoing"},
+    ]))
+    for session_id in ("old", "recent", "live"):
+        run(db.test_results.insert_many([
+            {"id": f"{session_id}-pre", "session_id": session_id, "participant_id": "p1", "test_type": "pre", "score": 60},
+            {"id": f"{session_id}-post", "session_id": session_id, "participant_id": "p1", "test_type": "post", "score": 90},
+        ]))
+        run(db.attendance.insert_one({"id": f"{session_id}-att", "session_id": session_id, "participant_id": "p1"}))
+        run(db.participant_access.insert_one(
+            {"session_id": session_id, "participant_id": "p1", "certificate_url": f"/certs/{session_id}.pdf"}
+        ))
+    return db
+
+
+@pytest.fixture
+def server(db, tmp_path, monkeypatch):
+    """server.py wired to the mock database, skipped where its dependencies are missing"""
+    for name, value in (("MONGO_URL", "mongodb://localhost:27017"), ("DB_NAME", "archive_test"),
+                        ("SECRET_KEY", "archive-test-secret-" + "x" * 32)):
+        monkeypatch.setenv(name, os.environ.get(name, value))
+    try:
+        import server
+    except ImportError as e:
+        pytest.skip(f"server.py dependencies are not installed: {e}")
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "tiered_db", TieredDatabase(db))
+    monkeypatch.setattr(server, "CERTIFICATE_PDF_DIR", tmp_path)
+    return server
+
+
+class TestArchival:
+
+    def test_only_sessions_past_retention_are_moved(self, db):
+        summary = run(archive_due_sessions(db, retention_days=180, now=NOW))
+        assert summary["sessions_archived"] == 1
+        assert summary["records_moved"] == 4
+
+        assert run(db.test_results.count_documents({"session_id": "old"})) == 0
+        assert run(db.archive_test_results.count_documents({"session_id": "old"})) == 2
+        assert run(db.test_results.count_documents({"session_id": "recent"})) == 2
+        assert run(db.sessions.find_one({"id": "old"}))["records_tier"] == "archive"
+
+        # Already archived sessions are not picked up again
+        assert run(archive_due_sessions(db, retention_days=180, now=NOW))["sessions_archived"] == 0
+
+    def test_reads_are_unchanged_after_archival(self, db):
+        tiered = TieredDatabase(db)
+
+        def snapshot():
+            return (
+                run(tiered.test_results.find({"session_id": "old"}, {"_id": 0}).sort("test_type", -1).to_list(100)),
+                run(tiered.attendance.find_one({"session_id": "old", "participant_id": "p1"}, {"_id": 0})),
+                run(tiered.participant_access.find({"certificate_url": {"$exists": True}}, {"_id": 0})
+                    .sort("session_id", 1).to_list(None)),
+                run(tiered.test_results.count_documents({"participant_id": "p1"})),
+            )
+
+        before = snapshot()
+        run(archive_due_sessions(db, retention_days=0, now=NOW))
+        assert run(db.test_results.count_documents({})) == 2
+        assert snapshot() == before
+        assert [r["test_type"] for r in before[0]] == ["pre", "post"]
+
+    def test_interrupted_move_is_not_double_counted(self, db):
+        doc = run(db.test_results.find_one({"id": "old-pre"}))
+        run(db.archive_test_results.insert_one(dict(doc)))
+        results = run(TieredDatabase(db).test_results.find({"session_id": "old"}, {"_id": 0}).to_list(100))
+        assert sorted(r["id"] for r in results) == ["old-post", "old-pre"]
+
+        run(archive_due_sessions(db, retention_days=180, now=NOW))
+        assert run(db.archive_test_results.count_documents({"session_id": "old"})) == 2
+
+
+class TestCascadeDelete:
+
+    def test_deletes_hot_and_archive_tiers(self, db):
+        run(archive_due_sessions(db, retention_days=180, now=NOW))
+        deleted = run(cascade_delete(db, ["test_results", "attendance", "participant_access"], {"session_id": "old"}))
+        assert deleted == 4
+        assert run(db.archive_test_results.count_documents({})) == 0
+        assert run(db.test_results.count_documents({})) == 4
+
+    def test_parallelism_is_bounded(self):
+        in_flight, peak = 0, 0
+
+        async def task():
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return 1
+
+        assert run(gather_bounded([task] * 20, concurrency=3)) == [1] * 20
+        assert peak == 3
+
+
+class TestArchivedWrites:
+
+    def test_records_tier_marks_a_session_archived(self, db):
+        assert not records_archived(None)
+        assert not records_archived({"id": "old"})
+        run(archive_due_sessions(db, retention_days=180, now=NOW))
+        assert run(session_records_archived(db, "old"))
+        assert not run(session_records_archived(db, "recent"))
+        assert not run(session_records_archived(db, None))
+
+    def test_locate_finds_the_tier_holding_a_record(self, db):
+        run(archive_due_sessions(db, retention_days=180, now=NOW))
+        tiered = TieredDatabase(db)
+        collection, doc = run(tiered.test_results.locate({"id": "old-pre"}, {"_id": 0}))
+        assert collection.name == "archive_test_results" and doc["score"] == 60
+        collection, doc = run(tiered.test_results.locate({"id": "recent-pre"}))
+        assert collection.name == "test_results"
+        assert run(tiered.test_results.locate({"id": "missing"})) == (None, None)
+
+    def test_certificate_upload_to_archived_session_is_refused(self, db, server, tmp_path):
+        run(archive_due_sessions(db, retention_days=180, now=NOW))
+        admin = server.User(full_name="Admin", id_number="A1", role="admin")
+        upload = UploadFile(file=io.BytesIO(b"%PDF-1.4"), filename="cert.pdf")
+
+        with pytest.raises(HTTPException) as error:
+            run(server.upload_participant_certificate("old", "p1", file=upload, current_user=admin))
+        assert error.value.status_code == 409
+        # No file saved and no hot row shadowing the archived one
+        assert list(tmp_path.iterdir()) == []
+        assert run(db.participant_access.count_documents({"session_id": "old"})) == 0
+        access = run(TieredDatabase(db).participant_access.find_one({"session_id": "old", "participant_id": "p1"}))
+        assert access["certificate_url"] == "/certs/old.pdf"
+
+        # Sessions still in the hot tier take uploads as before
+        upload = UploadFile(file=io.BytesIO(b"%PDF-1.4"), filename="cert.pdf")
+        result = run(server.upload_participant_certificate("recent", "p1", file=upload, current_user=admin))
+        assert result["certificate_url"].startswith("/api/static/certificates_pdf/recent_p1_")
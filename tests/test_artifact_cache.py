@@ -0,0 +1,109 @@
+"""
+Artifact Cache Tests
+Tests for content-addressed generated downloads: keys, LRU eviction and ETag/304
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.artifact_cache import ARTIFACT_CACHE_CONTROL, ArtifactStore
+from utils.excel_templates import build_statutory_template
+
+from .conftest import run
+
+
+class CountingGenerator:
+
+    def __init__(self, size=100):
+        self.calls = []
+        self.size = size
+
+    def __call__(self, **inputs):
+        self.calls.append(inputs)
+        time.sleep(0.01)
+        return repr(sorted(inputs.items())).encode().ljust(self.size, b".")
+
+
+class TestArtifactStore:
+
+    def test_built_once_per_input(self, tmp_path):
+        store, generate = ArtifactStore(tmp_path), CountingGenerator()
+        key_a, data_a = run(store.get_or_build("report", generate, {"year": 2025}))
+        key_b, data_b = run(store.get_or_build("report", generate, {"year": 2025}))
+        key_c, _ = run(store.get_or_build("report", generate, {"year": 2026}))
+        assert key_a == key_b != key_c and data_a == data_b
+        assert generate.calls == [{"year": 2025}, {"year": 2026}]
+        assert (store.hits, store.misses) == (1, 2)
+
+    def test_version_changes_the_key(self, tmp_path):
+        store, generate = ArtifactStore(tmp_path), CountingGenerator()
+        assert store.key_for("report", generate, version="1") != store.key_for("report", generate, version="2")
+        assert store.key_for("report", generate) != store.key_for("other", generate)
+
+    def test_concurrent_requests_build_once(self, tmp_path):
+        store, generate = ArtifactStore(tmp_path), CountingGenerator()
+
+        async def burst():
+            return await asyncio.gather(*(store.get_or_build("report", generate, {"n": 1}) for _ in range(10)))
+
+        results = run(burst())
+        assert len(generate.calls) == 1
+        assert len({data for _, data in results}) == 1
+
+    def test_least_recently_used_evicted_first(self, tmp_path):
+        store, generate = ArtifactStore(tmp_path, max_bytes=250), CountingGenerator(size=100)
+        key_a, _ = run(store.get_or_build("report", generate, {"n": "a"}))
+        key_b, _ = run(store.get_or_build("report", generate, {"n": "b"}))
+        run(store.get_or_build("report", generate, {"n": "a"}))  # a is now the most recent
+        run(store.get_or_build("report", generate, {"n": "c"}))
+        assert (tmp_path / f"{key_a}.bin").exists()
+        assert not (tmp_path / f"{key_b}.bin").exists()
+        assert sum(p.stat().st_size for p in tmp_path.glob("*.bin")) <= 250
+
+    def test_survives_restart(self, tmp_path):
+        generate = CountingGenerator()
+        run(ArtifactStore(tmp_path).get_or_build("report", generate, {"n": 1}))
+        run(ArtifactStore(tmp_path).get_or_build("report", generate, {"n": 1}))
+        assert len(generate.calls) == 1
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+    store = ArtifactStore(tmp_path)
+
+    @app.get("/templates/{rate_type}")
+    async def template(rate_type: str, request: Request):
+        return await store.respond(request, "statutory-rates-template", build_statutory_template,
+                                   inputs={"rate_type": rate_type}, filename=f"{rate_type}.xlsx")
+
+    test_client = TestClient(app)
+    test_client.store = store
+    return test_client
+
+
+class TestConditionalDownloads:
+
+    def test_repeat_download_returns_304(self, client):
+        first = client.get("/templates/epf")
+        assert first.status_code == 200
+        assert first.content.startswith(b"PK")
+        assert first.headers["cache-control"] == ARTIFACT_CACHE_CONTROL
+        assert first.headers["content-disposition"] == "attachment; filename=epf.xlsx"
+
+        second = client.get("/templates/epf", headers={"If-None-Match": first.headers["etag"]})
+        assert second.status_code == 304 and second.content == b""
+        # The 304 never looked at the store
+        assert (client.store.hits, client.store.misses) == (0, 1)
+
+        third = client.get("/templates/epf")
+        assert third.content == first.content and client.store.hits == 1
+
+    def test_inputs_get_their_own_etag(self, client):
+        epf = client.get("/templates/epf")
+        socso = client.get("/templates/socso", headers={"If-None-Match": epf.headers["etag"]})
+        assert socso.status_code == 200
+        assert socso.headers["etag"] != epf.headers["etag"]
@@ -0,0 +1,96 @@
+"""
+Attendance Roster Tests
+Tests for the single-aggregation roster and idempotent bulk attendance writes
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from utils.attendance_roster import apply_roster, local_clock, plan_roster, roster
+
+from .conftest import run
+
+
+@pytest.fixture
+def db(db):
+    run(db.sessions.insert_one({
+        "id": "s1", "name": "Defensive Driving", "start_date": "2026-03-16", "end_date": "2026-03-17",
+        "participant_ids": ["p1", "p2", "p3"], "supervisor_ids": ["sup"],
+    }))
+    run(db.users.insert_many([
+        {"id": "p1", "full_name": "Chong Wei", "email": "p1@example.com", "password": "hash"},
+        {"id": "p2", "full_name": "Aminah", "email": "p2@example.com", "password": "hash"},
+        {"id": "p3", "full_name": "Bala", "password": "hash"},
+    ]))
+    run(db.attendance.insert_many([
+        {"id": "a1", "session_id": "s1", "participant_id": "p1", "date": "2026-03-16", "clock_in": "08:05:00"},
+        # Another session's record for the same participant
+        {"id": "a2", "session_id": "s2", "participant_id": "p1", "date": "2026-03-16", "clock_in": "09:00:00"},
+    ]))
+    run(db.archive_participant_attendance.insert_one(
+        {"session_id": "s1", "participant_id": "p3", "status": "absent", "marked_at": "2026-03-16T10:00:00+08:00"}
+    ))
+    return db
+
+
+class TestRoster:
+
+    def test_one_row_per_enrolled_participant(self, db):
+        result = run(roster(db, "s1"))
+        rows = result["participants"]
+        assert [row["participant_id"] for row in rows] == ["p2", "p3", "p1"]
+        p1 = rows[2]
+        assert (p1["attendance_id"], p1["clock_in"], p1["status"]) == ("a1", "08:05:00", None)
+        # Archived tier rows are joined too
+        assert rows[1]["status"] == "absent"
+        assert "password" not in rows[0]
+        assert result["session"]["supervisor_ids"] == ["sup"]
+
+    def test_missing_session(self, db):
+        assert run(roster(db, "nope")) is None
+
+
+class TestApplyRoster:
+
+    ENTRIES = [
+        {"participant_id": "p1", "status": "present", "clock_out": "2026-03-16T09:30:00Z"},
+        {"participant_id": "p2", "status": "present", "clock_in": "2026-03-16T00:10:00Z"},
+        {"participant_id": "p3", "status": "absent"},
+    ]
+
+    def test_writes_changes_and_retries_are_free(self, db):
+        changes = run(apply_roster(db, "s1", run(roster(db, "s1")), self.ENTRIES, "coord"))
+        assert changes == [
+            {"participant_id": "p1", "status": "present", "clock_out": "17:30:00"},
+            {"participant_id": "p2", "status": "present", "date": "2026-03-16", "clock_in": "08:10:00"},
+        ]
+        rows = {row["participant_id"]: row for row in run(roster(db, "s1"))["participants"]}
+        assert rows["p1"]["attendance_id"] == "a1" and rows["p1"]["clock_out"] == "17:30:00"
+        assert rows["p2"]["clock_in"] == "08:10:00" and rows["p2"]["attendance_id"]
+        assert rows["p2"]["marked_by"] == "coord"
+
+        # The retry finds nothing to change
+        marks, clocks, changes = plan_roster("s1", run(roster(db, "s1")), self.ENTRIES, "coord")
+        assert (marks, clocks, changes) == ([], [], [])
+        assert run(db.attendance.count_documents({"session_id": "s1"})) == 2
+        assert run(db.participant_attendance.count_documents({"session_id": "s1"})) == 2
+
+    def test_rejects_before_writing(self, db):
+        current = run(roster(db, "s1"))
+        bad_batches = [
+            [{"participant_id": "p1", "status": "present"}, {"participant_id": "stranger", "status": "present"}],
+            [{"participant_id": "p1", "status": "late"}],
+            [{"participant_id": "p1"}, {"participant_id": "p1"}],
+            [{"participant_id": "p2", "clock_out": "2026-03-16T09:30:00Z"}],
+        ]
+        for entries in bad_batches:
+            with pytest.raises(HTTPException) as error:
+                run(apply_roster(db, "s1", current, entries, "coord"))
+            assert error.value.status_code == 400
+        assert run(db.participant_attendance.count_documents({})) == 0
+
+    def test_clock_times_are_malaysian(self):
+        assert local_clock("2026-03-15T23:30:00Z") == ("2026-03-16", "07:30:00")
+        assert local_clock("2026-03-16T07:30:00") == ("2026-03-16", "07:30:00")
+        with pytest.raises(HTTPException):
+            local_clock("half past seven")
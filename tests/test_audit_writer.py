@@ -0,0 +1,121 @@
+"""
+Audit Writer Tests
+Tests for buffered audit writes, the shutdown spool and field-level diffs
+"""
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from utils.audit_writer import AuditWriter, field_diff, split_diff
+
+from .conftest import run
+
+
+def entry(n):
+    return {"id": f"log-{n}", "entity_type": "invoice", "entity_id": "inv-1", "action": "updated"}
+
+
+class UnavailableDatabase:
+    """Every insert fails, like a primary that has gone away"""
+
+    def __getitem__(self, name):
+        return self
+
+    async def insert_many(self, *args, **kwargs):
+        raise ConnectionError("no primary")
+
+
+class TestFieldDiff:
+
+    def test_partial_update_against_full_document(self):
+        before = {"id": "inv-1", "status": "approved", "total_amount": 800.0, "updated_at": "t1",
+                  "billing": {"name": "Acme", "address": "KL"}}
+        after = {"status": "issued", "updated_at": "t2", "billing": {"name": "Acme", "address": "PJ"}}
+        changes = field_diff(before, after)
+        assert changes == {
+            "status": {"from": "approved", "to": "issued"},
+            "billing.address": {"from": "KL", "to": "PJ"},
+        }
+        assert split_diff(changes) == ({"status": "approved", "billing.address": "KL"},
+                                       {"status": "issued", "billing.address": "PJ"})
+
+    def test_create_and_delete(self):
+        assert field_diff(None, {"id": "p1", "amount": 10}) == {
+            "id": {"from": None, "to": "p1"}, "amount": {"from": None, "to": 10}
+        }
+        assert field_diff({"id": "p1", "amount": 10}, None)["amount"] == {"from": 10, "to": None}
+
+
+class TestBufferedWrites:
+
+    def test_entries_are_batched_until_flush(self):
+        async def scenario():
+            db = AsyncMongoMockClient()["audit_test"]
+            writer = AuditWriter(batch_size=100, flush_interval=60)
+            await writer.start(db)
+            for n in range(5):
+                await writer.write(db, "finance_audit_log", entry(n))
+            assert await db.finance_audit_log.count_documents({}) == 0
+            assert writer.buffered == 5
+
+            assert await writer.flush() == 5
+            assert await db.finance_audit_log.count_documents({}) == 5
+            await writer.stop()
+        run(scenario())
+
+    def test_full_batch_wakes_the_flusher(self):
+        async def scenario():
+            db = AsyncMongoMockClient()["audit_test"]
+            writer = AuditWriter(batch_size=3, flush_interval=60)
+            await writer.start(db)
+            for n in range(3):
+                await writer.write(db, "audit_trail", entry(n))
+            for _ in range(5):
+                await asyncio.sleep(0)
+            assert await db.audit_trail.count_documents({}) == 3
+            await writer.stop()
+        run(scenario())
+
+    def test_writes_inline_when_not_started(self):
+        async def scenario():
+            db = AsyncMongoMockClient()["audit_test"]
+            await AuditWriter().write(db, "audit_logs", entry(1))
+            assert await db.audit_logs.count_documents({}) == 1
+        run(scenario())
+
+
+class TestShutdownSpool:
+
+    def test_unwritten_entries_survive_a_restart(self, tmp_path):
+        spool = tmp_path / "audit_spool.jsonl"
+
+        async def scenario():
+            writer = AuditWriter(flush_interval=60, spool_path=spool)
+            await writer.start(UnavailableDatabase())
+            for n in range(4):
+                await writer.write(UnavailableDatabase(), "finance_audit_log", entry(n))
+            await writer.stop()
+            assert spool.exists()
+
+            db = AsyncMongoMockClient()["audit_test"]
+            restarted = AuditWriter(flush_interval=60, spool_path=spool)
+            await restarted.start(db)
+            assert await db.finance_audit_log.count_documents({}) == 4
+            assert not spool.exists()
+            await restarted.stop()
+        run(scenario())
+
+    def test_retried_batch_skips_entries_already_written(self):
+        async def scenario():
+            db = AsyncMongoMockClient()["audit_test"]
+            await db.finance_audit_log.create_index("id", unique=True)
+            writer = AuditWriter(flush_interval=60)
+            await writer.start(db)
+            await db.finance_audit_log.insert_one(dict(entry(0)))
+            await writer.write(db, "finance_audit_log", entry(0))
+            await writer.write(db, "finance_audit_log", entry(1))
+            await writer.flush()
+            assert writer.buffered == 0
+            assert await db.finance_audit_log.count_documents({}) == 2
+            await writer.stop()
+        run(scenario())
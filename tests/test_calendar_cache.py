@@ -0,0 +1,111 @@
+"""
+Calendar Cache Tests
+Tests for calendar windows, month buckets and their invalidation
+"""
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from utils.calendar_cache import (
+    CalendarCache,
+    calendar_window,
+    months_between,
+    session_months,
+)
+from utils.reference_cache import ReferenceCache
+
+from .conftest import run
+
+
+def session(session_id, start, end, **extra):
+    return {"id": session_id, "name": f"Session {session_id}", "start_date": start, "end_date": end,
+            "location": "Shah Alam", "status": "active", "completion_status": "ongoing",
+            "company_id": "co", "program_id": "prog", "participant_ids": ["p1", "p2"],
+            "trainer_assignments": [{"trainer_id": "t1"}], **extra}
+
+
+@pytest.fixture
+def db(db):
+    run(db.companies.insert_one({"id": "co", "name": "Acme Logistics"}))
+    run(db.programs.insert_one({"id": "prog", "name": "Defensive Driving"}))
+    run(db.sessions.insert_many([
+        session("feb", "2026-02-10", "2026-02-11"),
+        session("span", "2026-02-27", "2026-03-02"),
+        session("mar", "2026-03-16", "2026-03-17"),
+        session("legacy", "2026-03-20", None),
+        session("apr", "2026-04-01", "2026-04-02"),
+    ]))
+    return db
+
+
+@pytest.fixture
+def cache():
+    return CalendarCache(check_interval=60, references=ReferenceCache(check_interval=60))
+
+
+class TestWindows:
+
+    def test_month_week_and_default(self):
+        assert calendar_window(month="2026-02") == (date(2026, 2, 1), date(2026, 2, 28))
+        assert calendar_window(week="2026-W09") == (date(2026, 2, 23), date(2026, 3, 1))
+        assert calendar_window(today=date(2026, 3, 5)) == (date(2026, 3, 1), date(2026, 3, 31))
+
+    def test_bad_windows_are_rejected(self):
+        for kwargs in ({"month": "2026-13"}, {"week": "next"}, {"month": "2026-02", "week": "2026-W09"}):
+            with pytest.raises(HTTPException) as error:
+                calendar_window(**kwargs)
+            assert error.value.status_code == 400
+
+    def test_session_months(self):
+        assert months_between(date(2025, 12, 30), date(2026, 2, 1)) == ["2025-12", "2026-01", "2026-02"]
+        assert session_months(
+            {"start_date": "2026-02-27", "end_date": "2026-03-02"},
+            {"start_date": "2026-05-01"},
+            None,
+        ) == {"2026-02", "2026-03", "2026-05"}
+
+
+class TestCalendarEvents:
+
+    def test_month_events_are_compact_and_named(self, db, cache):
+        events = run(cache.events(db, *calendar_window(month="2026-03")))
+        assert [e["id"] for e in events] == ["span", "mar", "legacy"]
+        event = events[1]
+        assert event["company_name"] == "Acme Logistics"
+        assert event["program_name"] == "Defensive Driving"
+        assert event["participant_count"] == 2
+        assert "participant_ids" not in event and "trainer_assignments" not in event
+
+    def test_week_spanning_two_months(self, db, cache):
+        events = run(cache.events(db, *calendar_window(week="2026-W09")))
+        # Listed once although it sits in the February and March buckets
+        assert [e["id"] for e in events] == ["span"]
+        assert cache.misses == 2
+
+    def test_navigation_is_a_cache_hit(self, db, cache):
+        run(cache.events(db, *calendar_window(month="2026-03")))
+        run(cache.events(db, *calendar_window(month="2026-03")))
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_invalidation_reloads_only_touched_months(self, db, cache):
+        run(cache.events(db, *calendar_window(month="2026-03")))
+        run(cache.events(db, *calendar_window(month="2026-04")))
+        before = {"start_date": "2026-03-16", "end_date": "2026-03-17"}
+        run(db.sessions.update_one({"id": "mar"}, {"$set": {"start_date": "2026-04-20", "end_date": "2026-04-21"}}))
+        after = {"start_date": "2026-04-20", "end_date": "2026-04-21"}
+        run(cache.invalidate(db, session_months(before, after)))
+
+        march = run(cache.events(db, *calendar_window(month="2026-03")))
+        april = run(cache.events(db, *calendar_window(month="2026-04")))
+        assert "mar" not in [e["id"] for e in march]
+        assert [e["id"] for e in april] == ["apr", "mar"]
+        assert cache.misses == 4
+
+    def test_other_workers_see_the_version_bump(self, db, cache):
+        other = CalendarCache(check_interval=0, references=ReferenceCache(check_interval=60))
+        run(other.events(db, *calendar_window(month="2026-02")))
+        run(db.sessions.delete_one({"id": "feb"}))
+        run(cache.invalidate(db, {"2026-02"}))
+        events = run(other.events(db, *calendar_window(month="2026-02")))
+        assert [e["id"] for e in events] == ["span"]
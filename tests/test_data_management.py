@@ -0,0 +1,192 @@
+"""
+Data Management Listing Tests
+Tests for the joined, keyset-paginated admin listings and the reference cache
+"""
+from datetime import datetime
+
+import pytest
+
+from utils import data_management
+from utils.data_management import list_records, session_filter
+from utils.reference_cache import ReferenceCache
+
+from .conftest import run
+
+
+class CountingDatabase:
+    """Counts every query issued through the database, whatever the collection"""
+
+    QUERY_METHODS = {"find", "find_one", "aggregate", "count_documents", "distinct", "find_one_and_update"}
+
+    def __init__(self, db):
+        self._db = db
+        self.queries = []
+
+    def __getitem__(self, name):
+        return CountingCollection(self, self._db[name])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class CountingCollection:
+
+    def __init__(self, owner, collection):
+        self._owner = owner
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in CountingDatabase.QUERY_METHODS:
+            def counted(*args, **kwargs):
+                self._owner.queries.append((self._collection.name, name))
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+@pytest.fixture(autouse=True)
+def fresh_reference_cache(monkeypatch):
+    cache = ReferenceCache(check_interval=60)
+    monkeypatch.setattr(data_management, "reference_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def db(db):
+    run(db.companies.insert_one({"id": "c1", "name": "Acme Logistics"}))
+    run(db.programs.insert_one({"id": "prog", "name": "Defensive Driving"}))
+    run(db.sessions.insert_many([
+        {"id": "s1", "name": "Batch 1", "company_id": "c1", "program_id": "prog", "start_date": "2026-03-01"},
+        {"id": "s2", "name": "Batch 2", "company_id": "c2", "program_id": "prog", "start_date": "2026-04-01"},
+    ]))
+    run(db.tests.insert_one({"id": "t1", "title": "Pre Test", "test_type": "pre"}))
+    run(db.users.insert_many([
+        {"id": f"p{n}", "full_name": f"Participant {n}", "id_number": f"90010{n:03d}", "password": "hash"}
+        for n in range(30)
+    ]))
+    run(db.test_results.insert_many([
+        {"id": f"r{n}", "session_id": "s1" if n % 2 == 0 else "s2", "participant_id": f"p{n}",
+         "test_id": "t1", "score": 80.0, "submitted_at": "2026-03-01T10:00:00+08:00"}
+        for n in range(30)
+    ]))
+    return db
+
+
+class TestListings:
+
+    def test_rows_are_enriched_like_the_per_row_lookups(self, db):
+        rows, _ = run(list_records(db, "test_results", {"session_id": "s1"}, limit=2))
+        row = rows[0]
+        assert row["participant_name"] == "Participant 0"
+        assert row["participant_ic"] == "90010000"
+        assert row["session_name"] == "Batch 1"
+        assert row["company_name"] == "Acme Logistics"
+        assert row["program_name"] == "Defensive Driving"
+        assert (row["test_title"], row["test_type"]) == ("Pre Test", "pre")
+        assert isinstance(row["submitted_at"], datetime)
+        assert "_id" not in row and "password" not in row
+        assert not any(key.startswith("_join") for key in row)
+
+        # Unknown company on the session, missing participant
+        run(db.test_results.insert_one({"id": "orphan", "session_id": "s2", "participant_id": "gone", "test_id": "t1"}))
+        rows, _ = run(list_records(db, "test_results", {"session_id": "s2"}))
+        orphan = next(r for r in rows if r["id"] == "orphan")
+        assert orphan["company_name"] == "Unknown"
+        assert "participant_name" not in orphan
+
+    def test_keyset_pages_cover_every_row_once(self, db):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = run(list_records(db, "test_results", {}, after=cursor, limit=7))
+            seen.extend(r["id"] for r in rows)
+            if cursor is None:
+                break
+        assert sorted(seen) == sorted(f"r{n}" for n in range(30))
+        assert len(seen) == 30
+
+    def test_company_filter_resolves_sessions_once(self, db):
+        match = run(session_filter(db, company_id="c1"))
+        assert match == {"session_id": {"$in": ["s1"]}}
+        rows, _ = run(list_records(db, "test_results", match))
+        assert {r["session_name"] for r in rows} == {"Batch 1"}
+
+    def test_archived_rows_are_listed_and_paged(self, db):
+        archived = run(db.test_results.find({"session_id": "s1"}).to_list(None))
+        run(db.archive_test_results.insert_many(archived))
+        run(db.test_results.delete_many({"session_id": "s1", "id": {"$ne": "r0"}}))
+        # r0 sits in both tiers, as it would mid-archive
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = run(list_records(db, "test_results", {}, after=cursor, limit=4))
+            seen.extend(r["id"] for r in rows)
+            if cursor is None:
+                break
+        assert sorted(seen) == sorted(f"r{n}" for n in range(30))
+        rows, _ = run(list_records(db, "test_results", {"session_id": "s1"}))
+        assert len(rows) == 15 and rows[0]["session_name"] == "Batch 1"
+
+    def test_bad_cursor_is_rejected(self, db):
+        with pytest.raises(ValueError):
+            run(list_records(db, "test_results", {}, after="not-a-cursor"))
+
+
+class TestQueryCount:
+
+    @pytest.mark.parametrize("page_size", [1, 10, 30])
+    def test_query_count_is_constant_in_page_size(self, db, page_size):
+        counting = CountingDatabase(db)
+        match = run(session_filter(counting, company_id="c1", program_id="prog"))
+        rows, _ = run(list_records(counting, "test_results", match, limit=page_size))
+        assert len(rows) == min(page_size, 15)
+        # sessions filter, one aggregation per tier, the cache version check and both reference loads
+        assert len(counting.queries) == 6
+
+        counting.queries.clear()
+        run(list_records(counting, "test_results", match, limit=page_size))
+        assert counting.queries == [("test_results", "aggregate"), ("archive_test_results", "aggregate")]
+
+
+class TestReferenceCache:
+
+    def test_cached_until_a_version_bump(self, db):
+        cached, polling, writer = ReferenceCache(check_interval=60), ReferenceCache(check_interval=0), ReferenceCache()
+        assert run(cached.names(db, "companies")) == {"c1": "Acme Logistics"}
+        assert run(polling.names(db, "companies")) == {"c1": "Acme Logistics"}
+        run(db.companies.update_one({"id": "c1"}, {"$set": {"name": "Acme Freight"}}))
+        assert run(cached.names(db, "companies"))["c1"] == "Acme Logistics"
+
+        run(writer.invalidate(db, "companies"))
+        # Other workers pick the bump up on their next version check
+        assert run(polling.names(db, "companies"))["c1"] == "Acme Freight"
+        run(cached.invalidate(db, "companies"))
+        assert run(cached.names(db, "companies"))["c1"] == "Acme Freight"
+
+    def test_lookups_hand_out_copies(self, db):
+        cache = ReferenceCache(check_interval=60)
+        company = run(cache.lookup(db, "companies", "c1"))
+        company["name"] = "Mutated"
+        assert run(cache.lookup(db, "companies", "c1"))["name"] == "Acme Logistics"
+        assert run(cache.lookup(db, "companies", None)) is None
+
+    def test_warm_lookups_skip_the_database(self, db):
+        run(db.company_settings.insert_one({"id": "company_settings", "company_name": "MDDRC"}))
+        run(db.billing_parties.insert_one({"id": "bp1", "name": "Insurer", "is_active": True}))
+        cache = ReferenceCache(check_interval=60)
+        for collection in ("company_settings", "billing_parties", "programs"):
+            run(cache.get(db, collection))
+
+        counting = CountingDatabase(db)
+        for _ in range(20):
+            assert run(cache.company_settings(counting))["company_name"] == "MDDRC"
+            assert run(cache.lookup(counting, "programs", "prog"))["name"] == "Defensive Driving"
+            assert [p["name"] for p in run(cache.all(counting, "billing_parties"))] == ["Insurer"]
+        assert counting.queries == []
+
+    def test_document_created_on_another_worker_is_found(self, db):
+        cache = ReferenceCache(check_interval=60)
+        run(cache.get(db, "companies"))
+        run(db.companies.insert_one({"id": "c9", "name": "New Co"}))
+        assert run(cache.lookup(db, "companies", "c9"))["name"] == "New Co"
+        assert run(cache.lookup(db, "companies", "missing")) is None
@@ -0,0 +1,85 @@
+"""
+Database Client Tests
+Tests for the shared Motor client configuration and report read routing
+"""
+import os
+
+import pytest
+
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database_client")
+
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from utils import database
+from utils.instrumentation import mongo_command_listener, mongo_pool_listener
+
+
+class TestClientOptions:
+
+    def test_defaults(self):
+        options = database.client_options({})
+        assert options["maxPoolSize"] == 100
+        assert options["waitQueueTimeoutMS"] == 5000
+        assert options["serverSelectionTimeoutMS"] == 5000
+        assert options["retryWrites"] is True
+        assert "compressors" not in options
+        assert "w" not in options
+
+    def test_environment_overrides(self):
+        options = database.client_options({
+            "MONGO_MAX_POOL_SIZE": "20",
+            "MONGO_COMPRESSORS": "zstd,zlib",
+            "MONGO_RETRY_WRITES": "false",
+            "MONGO_WRITE_CONCERN": "1",
+        })
+        assert options["maxPoolSize"] == 20
+        assert options["compressors"] == "zstd,zlib"
+        assert options["retryWrites"] is False
+        assert options["w"] == 1
+        assert database.client_options({"MONGO_WRITE_CONCERN": "majority"})["w"] == "majority"
+
+    def test_bad_integer_is_reported(self):
+        with pytest.raises(ValueError, match="MONGO_MAX_POOL_SIZE"):
+            database.client_options({"MONGO_MAX_POOL_SIZE": "lots"})
+
+    def test_client_applies_options(self):
+        client = database.create_client("mongodb://localhost:27017", env={"MONGO_MAX_POOL_SIZE": "7"})
+        try:
+            assert client.options.pool_options.max_pool_size == 7
+            assert client.options.pool_options.wait_queue_timeout == 5.0
+        finally:
+            client.close()
+
+
+class TestSharedClient:
+
+    def test_one_client_with_monitoring(self):
+        client = database.get_client()
+        assert database.get_client() is client
+        assert database.db.client is client
+        listeners = client.options.event_listeners
+        assert mongo_command_listener in listeners
+        assert mongo_pool_listener in listeners
+
+
+class TestReportReads:
+
+    def test_secondary_preferred_by_default(self):
+        preference = database.report_read_preference({})
+        assert isinstance(preference, SecondaryPreferred)
+        assert preference.max_staleness == 120
+
+    def test_staleness_floor_and_primary_opt_out(self):
+        assert database.report_read_preference({"MONGO_REPORT_MAX_STALENESS_SECONDS": "10"}).max_staleness == 90
+        assert isinstance(database.report_read_preference({"MONGO_REPORT_READ_PREFERENCE": "primary"}), Primary)
+        with pytest.raises(ValueError):
+            database.report_read_preference({"MONGO_REPORT_READ_PREFERENCE": "secondaries"})
+
+    def test_reporting_database_shares_the_client(self):
+        report_db = database.reporting_database(database.db)
+        assert report_db.name == database.db.name
+        assert report_db.client is database.db.client
+        assert isinstance(report_db.read_preference, SecondaryPreferred)
+        assert isinstance(database.db.read_preference, Primary)
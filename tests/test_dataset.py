@@ -0,0 +1,72 @@
+"""
+Synthetic Dataset Tests
+Tests for deterministic generation, linked records and the petty cash ledger
+"""
+from datetime import date
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from benchmarks.dataset import BulkLoader, DatasetGenerator, Scale
+
+from .conftest import run
+
+
+SCALE = Scale(years=1, sessions_per_week=2, participants=4, companies=3, programs=2,
+              trainers=4, coordinators=2, marketing=2, staff=2)
+
+
+def generate(seed=7, batch_size=100):
+    db = AsyncMongoMockClient()["dataset_test"]
+    generator = DatasetGenerator(SCALE, seed=seed, until=date(2026, 1, 1), password_hash="hash")
+    counts = run(generator.generate(BulkLoader(db, batch_size=batch_size, concurrency=4)))
+    return db, counts
+
+
+def dump(db, collection):
+    return run(db[collection].find({}, {"_id": 0}).sort("id", 1).to_list(None))
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return generate()
+
+
+class TestDeterminism:
+
+    def test_same_seed_same_documents(self, dataset):
+        db, counts = dataset
+        again, again_counts = generate(batch_size=37)
+        assert again_counts == counts
+        for collection in ("sessions", "invoices", "test_results", "pay_advice", "petty_cash_transactions"):
+            assert dump(again, collection) == dump(db, collection)
+
+    def test_other_seed_other_documents(self, dataset):
+        db, _ = dataset
+        other, _ = generate(seed=8)
+        assert dump(other, "sessions") != dump(db, "sessions")
+
+
+class TestLinkedRecords:
+
+    def test_session_rows_reference_each_other(self, dataset):
+        db, counts = dataset
+        sessions = dump(db, "sessions")
+        assert counts["sessions"] == len(sessions) > 0
+        assert counts["test_results"] == 2 * counts["participant_access"] == 2 * SCALE.participants * len(sessions)
+        invoice_ids = {i["id"] for i in dump(db, "invoices")}
+        assert {s["invoice_id"] for s in sessions} == invoice_ids
+        assert {p["invoice_id"] for p in dump(db, "payments")} <= invoice_ids
+        user_ids = {u["id"] for u in dump(db, "users")}
+        assert all(set(s["participant_ids"]) <= user_ids for s in sessions)
+        assert all(f.get("period_year") for f in dump(db, "trainer_fees"))
+
+    def test_petty_cash_balance_matches_ledger(self, dataset):
+        db, _ = dataset
+        transactions = sorted(dump(db, "petty_cash_transactions"), key=lambda t: t["ledger_seq"])
+        settings = run(db.petty_cash_settings.find_one({}))
+        assert [t["ledger_seq"] for t in transactions] == list(range(1, len(transactions) + 1))
+        assert settings["current_balance"] == transactions[-1]["balance_after"] >= 0
+        assert settings["current_balance"] == pytest.approx(
+            settings["float_amount"] + sum(t["delta"] for t in transactions)
+        )
@@ -0,0 +1,95 @@
+"""
+Fast JSON Tests
+Tests that the orjson and validated-once response paths match FastAPI's default output
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from utils.fast_json import FastJSONResponse, validated_response
+
+MYT = timezone(timedelta(hours=8))
+
+
+class Result(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    score: float = 0.0
+    answers: List[int] = []
+    submitted_at: datetime = Field(default_factory=lambda: datetime.now(MYT))
+    program_name: Optional[str] = None
+
+
+def stored_results(n=50):
+    """Documents as they come out of MongoDB: ISO strings, extra fields, missing defaults"""
+    docs = []
+    for i in range(n):
+        doc = {"id": f"r{i}", "score": i * 1.5, "answers": [i % 4, 1],
+               "submitted_at": datetime(2025, 3, 1, 9, i % 60, tzinfo=MYT).isoformat(), "session_id": "s1"}
+        if i % 2:
+            doc["program_name"] = "Defensive Driving"
+        docs.append(doc)
+    return docs
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/default", response_model=List[Result])
+    async def default():
+        docs = stored_results()
+        for doc in docs:
+            doc["submitted_at"] = datetime.fromisoformat(doc["submitted_at"])
+        return docs
+
+    @app.get("/validated", response_model=List[Result])
+    async def validated():
+        return validated_response(List[Result], stored_results())
+
+    ledger = {
+        "year": 2025,
+        "entries": [{"entry_id": i, "date": "2025-03-01", "debit": 10.5, "credit": 0,
+                     "tags": {"session_id": None}} for i in range(20)],
+        "posted_at": datetime(2025, 3, 1, 9, 30, tzinfo=MYT),
+        "codes": {"1100"},
+        "amount": Decimal("12.50"),
+        "result": Result(id="r1", submitted_at=datetime(2025, 3, 1, tzinfo=MYT)),
+    }
+
+    @app.get("/ledger/default")
+    async def ledger_default():
+        return {**ledger, "codes": list(ledger["codes"]), "amount": float(ledger["amount"])}
+
+    @app.get("/ledger/fast")
+    async def ledger_fast():
+        return FastJSONResponse(ledger)
+
+    return TestClient(app)
+
+
+class TestFastJSON:
+
+    def test_validated_response_matches_response_model(self, client):
+        default, validated = client.get("/default"), client.get("/validated")
+        assert validated.status_code == 200
+        assert validated.headers["content-type"] == "application/json"
+        assert validated.json() == default.json()
+        assert "session_id" not in validated.json()[0]
+        assert validated.json()[0]["program_name"] is None
+
+    def test_fast_response_matches_default_encoding(self, client):
+        assert client.get("/ledger/fast").json() == client.get("/ledger/default").json()
+
+    def test_unknown_types_still_fail_loudly(self):
+        with pytest.raises(TypeError):
+            FastJSONResponse({"value": object()})
+
+    def test_invalid_documents_are_rejected(self):
+        with pytest.raises(ValidationError):
+            validated_response(List[Result], [{"score": 1}])
@@ -0,0 +1,130 @@
+"""
+Instrumentation Tests
+Tests for per-route latency, per-request MongoDB command counting, connection
+pool metrics and Prometheus output
+"""
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from utils import instrumentation
+from utils.instrumentation import (
+    InstrumentationMiddleware,
+    MongoPoolListener,
+    metrics,
+    mongo_command_listener,
+)
+
+_request_ids = itertools.count(1)
+
+
+def simulate_find(collection, docs=1):
+    """Feed the listener the events PyMongo publishes for one find"""
+    request_id = next(_request_ids)
+    started = SimpleNamespace(
+        command_name="find", command={"find": collection},
+        request_id=request_id, connection_id=("localhost", 27017)
+    )
+    mongo_command_listener.started(started)
+    mongo_command_listener.succeeded(SimpleNamespace(
+        command_name="find", request_id=request_id, connection_id=("localhost", 27017),
+        duration_micros=1500, reply={"cursor": {"firstBatch": [{}] * docs}}
+    ))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(instrumentation, "N_PLUS_ONE_QUERY_THRESHOLD", 10)
+    metrics.reset()
+    app = FastAPI()
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.get("/api/sessions/{session_id}")
+    async def get_session(session_id: str):
+        simulate_find("sessions")
+        return {"id": session_id}
+
+    @app.get("/api/chatty")
+    async def chatty():
+        for _ in range(25):
+            simulate_find("users", docs=1)
+        return {"ok": True}
+
+    @app.get("/metrics")
+    async def prometheus():
+        return Response(content=metrics.render_prometheus(), media_type="text/plain")
+
+    return TestClient(app)
+
+
+class TestRouteMetrics:
+
+    def test_latency_is_labelled_by_route_template(self, client):
+        client.get("/api/sessions/abc")
+        client.get("/api/sessions/def")
+        body = client.get("/metrics").text
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/sessions/{session_id}"} 2' in body
+        assert "abc" not in body
+
+    def test_query_breakdown_per_request(self, client):
+        response = client.get("/api/sessions/abc")
+        assert 'desc="1 queries"' in response.headers["server-timing"]
+        body = client.get("/metrics").text
+        assert 'mongodb_commands_total{command="find",collection="sessions"} 1' in body
+        assert 'mongodb_documents_returned_total{collection="sessions"} 1' in body
+
+    def test_n_plus_one_is_flagged(self, client, caplog):
+        with caplog.at_level("WARNING", logger="instrumentation"):
+            client.get("/api/chatty")
+        body = client.get("/metrics").text
+        assert 'http_requests_n_plus_one_total{method="GET",route="/api/chatty"} 1' in body
+        assert any("find users x25" in record.message for record in caplog.records)
+
+    def test_commands_outside_requests_are_not_attributed(self, client):
+        simulate_find("programs")
+        body = client.get("/metrics").text
+        assert 'mongodb_commands_total{command="find",collection="programs"} 1' in body
+        assert 'http_requests_total{method="GET",route="/metrics",status="200"}' not in body
+
+
+class TestPoolMetrics:
+    ADDRESS = ("db1", 27017)
+
+    def event(self, **extra):
+        return SimpleNamespace(address=self.ADDRESS, **extra)
+
+    def test_checkout_wait_and_occupancy(self):
+        metrics.reset()
+        listener = MongoPoolListener()
+        listener.connection_created(self.event(connection_id=1))
+        listener.connection_check_out_started(self.event())
+        assert listener.waiting() == {(("server", "db1:27017"),): 1}
+        listener.connection_checked_out(self.event(connection_id=1))
+        assert listener.waiting() == {}
+        assert listener.connections_in_use() == {(("server", "db1:27017"),): 1}
+        assert listener.open_connections() == {(("server", "db1:27017"),): 1}
+
+        listener.connection_checked_in(self.event(connection_id=1))
+        assert listener.connections_in_use() == {(("server", "db1:27017"),): 0}
+        body = metrics.render_prometheus()
+        assert 'mongodb_pool_checkout_wait_seconds_count{server="db1:27017"} 1' in body
+
+    def test_failed_checkout_is_counted(self):
+        metrics.reset()
+        listener = MongoPoolListener()
+        listener.connection_check_out_started(self.event())
+        listener.connection_check_out_failed(self.event(reason="timeout"))
+        assert listener.connections_in_use() == {}
+        body = metrics.render_prometheus()
+        assert 'mongodb_pool_checkout_failures_total{server="db1:27017",reason="timeout"} 1' in body
+        assert 'mongodb_pool_checkout_wait_seconds_count{server="db1:27017"} 1' in body
+
+    def test_pool_gauges_are_registered(self):
+        body = metrics.render_prometheus()
+        for name in ("mongodb_pool_connections_open", "mongodb_pool_connections_in_use",
+                     "mongodb_pool_checkouts_waiting"):
+            assert f"# TYPE {name} gauge" in body
@@ -0,0 +1,159 @@
+"""
+Notification Tests
+Tests for batched fan-out, unread counter maintenance, feed pagination and long-poll wake-ups
+"""
+import asyncio
+import time
+
+import pytest
+
+from utils import notifications
+from utils.notifications import (
+    COUNTERS_COLLECTION,
+    get_unread_count,
+    list_notifications,
+    mark_read,
+    notify_users,
+    recount_unread,
+    wait_for_change,
+)
+
+from .conftest import run
+
+
+@pytest.fixture
+def db(db):
+    run(db[COUNTERS_COLLECTION].create_index("user_id", unique=True))
+    run(db.notifications.create_index("id", unique=True))
+    return db
+
+
+class TestFanOut:
+
+    def test_one_insert_many_for_all_recipients(self, db, monkeypatch):
+        calls = []
+        insert_many = type(db.notifications).insert_many
+
+        async def counting_insert_many(self, docs, *args, **kwargs):
+            if self.name == "notifications":
+                calls.append(len(docs))
+            return await insert_many(self, docs, *args, **kwargs)
+
+        monkeypatch.setattr(type(db.notifications), "insert_many", counting_insert_many)
+        written = run(notify_users(db, ["a", "b", "a", None, "c"], "session", "New session"))
+        assert written == 3
+        assert calls == [3]
+        docs = run(db.notifications.find({}, {"_id": 0}).to_list(None))
+        assert sorted(d["user_id"] for d in docs) == ["a", "b", "c"]
+        assert len({d["created_at"] for d in docs}) == 1
+
+    def test_no_recipients(self, db):
+        assert run(notify_users(db, [None, ""], "session", "Nobody")) == 0
+        assert run(db.notifications.count_documents({})) == 0
+
+
+class TestCounters:
+
+    def test_legacy_unread_rows_are_counted_before_the_first_increment(self, db):
+        run(db.notifications.insert_many([
+            {"id": "old1", "user_id": "a", "read": False, "created_at": "2026-01-01T09:00:00+08:00"},
+            {"id": "old2", "user_id": "a", "read": False, "created_at": "2026-01-02T09:00:00+08:00"},
+            {"id": "old3", "user_id": "a", "read": True, "created_at": "2026-01-03T09:00:00+08:00"},
+        ]))
+        run(notify_users(db, ["a", "b"], "session", "New session"))
+        assert run(get_unread_count(db, "a")) == 3
+        assert run(get_unread_count(db, "b")) == 1
+
+    def test_missing_counter_is_rebuilt_on_read(self, db):
+        run(db.notifications.insert_one({"id": "old", "user_id": "a", "read": False, "created_at": "2026-01-01"}))
+        assert run(get_unread_count(db, "a")) == 1
+        assert run(db[COUNTERS_COLLECTION].count_documents({"user_id": "a"})) == 1
+
+    def test_mark_read_by_ids_and_all(self, db):
+        run(notify_users(db, ["a"], "one", "First"))
+        run(notify_users(db, ["a"], "two", "Second"))
+        run(notify_users(db, ["a"], "three", "Third"))
+        ids = [d["id"] for d in run(db.notifications.find({"user_id": "a"}).to_list(None))]
+
+        assert run(mark_read(db, "a", ids[:1])) == 1
+        # Marking the same row again changes nothing
+        assert run(mark_read(db, "a", ids[:1])) == 0
+        assert run(get_unread_count(db, "a")) == 2
+        assert run(mark_read(db, "a")) == 2
+        assert run(get_unread_count(db, "a")) == 0
+
+    def test_drifted_counter_is_rebuilt_not_driven_negative(self, db):
+        run(notify_users(db, ["a"], "one", "First"))
+        run(notify_users(db, ["a"], "two", "Second"))
+        run(db[COUNTERS_COLLECTION].update_one({"user_id": "a"}, {"$set": {"unread": 0}}))
+        assert run(mark_read(db, "a")) == 2
+        assert run(db[COUNTERS_COLLECTION].find_one({"user_id": "a"}))["unread"] == 0
+
+    def test_recount_does_not_overwrite_a_concurrent_increment(self, db, monkeypatch):
+        run(notify_users(db, ["a"], "one", "First"))
+        count_documents = type(db.notifications).count_documents
+        raced = []
+
+        async def racing_count(self, *args, **kwargs):
+            count = await count_documents(self, *args, **kwargs)
+            if not raced:
+                # A fan-out lands between the count and the write
+                raced.append(True)
+                await notify_users(db, ["a"], "two", "Second")
+            return count
+
+        monkeypatch.setattr(type(db.notifications), "count_documents", racing_count)
+        assert run(recount_unread(db, "a")) == 2
+        assert run(get_unread_count(db, "a")) == 2
+
+
+class TestFeed:
+
+    def test_pagination_across_equal_timestamps(self, db):
+        run(db.notifications.insert_many([
+            {"id": f"n{i}", "user_id": "a", "read": False, "message": str(i),
+             "created_at": "2026-03-01T09:00:00+08:00" if i < 5 else "2026-03-02T09:00:00+08:00"}
+            for i in range(8)
+        ]))
+        seen, before = [], None
+        while True:
+            page = run(list_notifications(db, "a", limit=3, before=before))
+            seen.extend(item["id"] for item in page["items"])
+            before = page["next_cursor"]
+            if before is None:
+                break
+        assert seen == ["n7", "n6", "n5", "n4", "n3", "n2", "n1", "n0"]
+
+    def test_timestamp_only_cursor_still_works(self, db):
+        run(notify_users(db, ["a"], "one", "First"))
+        page = run(list_notifications(db, "a", before="2000-01-01"))
+        assert page["items"] == []
+
+
+class TestPoll:
+
+    def poll_while(self, db, known, action, timeout=5):
+        async def scenario():
+            waiter = asyncio.create_task(wait_for_change(db, "a", known, timeout))
+            await asyncio.sleep(0.05)
+            started = time.perf_counter()
+            await action()
+            result = await waiter
+            return result, time.perf_counter() - started
+        return run(scenario())
+
+    def test_wakes_on_notify(self, db):
+        result, waited = self.poll_while(db, 0, lambda: notify_users(db, ["a"], "one", "First"))
+        assert result == {"unread_count": 1, "changed": True}
+        assert waited < 1
+
+    def test_wakes_on_mark_read(self, db):
+        run(notify_users(db, ["a"], "one", "First"))
+        result, waited = self.poll_while(db, 1, lambda: mark_read(db, "a"))
+        assert result == {"unread_count": 0, "changed": True}
+        assert waited < 1
+        assert not notifications._waiters
+
+    def test_returns_at_once_when_already_different(self, db):
+        run(notify_users(db, ["a"], "one", "First"))
+        assert run(wait_for_change(db, "a", 0, 5)) == {"unread_count": 1, "changed": True}
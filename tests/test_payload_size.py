@@ -0,0 +1,158 @@
+"""
+Payload Size Tests
+Tests for ?fields= projections and negotiated response compression on a seeded dataset
+"""
+import gzip
+from datetime import date
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from benchmarks.dataset import BulkLoader, DatasetGenerator, Scale
+from utils import compression
+from utils.compression import CompressionMiddleware, choose_encoding, vary_on_accept_encoding
+from utils.fast_json import FastJSONResponse
+from utils.sparse_fields import field_projection, parse_fields, trim_fields
+
+from .conftest import run
+
+SESSION_DERIVED_FIELDS = {"participant_count": ("participant_ids",)}
+SESSION_FIELDS = {"id", "name", "start_date", "end_date", "company_id", "participant_ids", "supervisor_ids",
+                  "trainer_assignments", "location", "participant_count"}
+
+
+@pytest.fixture(scope="module")
+def db():
+    database = AsyncMongoMockClient()["payload_test"]
+    scale = Scale(years=1, sessions_per_week=3, participants=20, companies=5, programs=2,
+                  trainers=4, coordinators=2, marketing=2, staff=2)
+    generator = DatasetGenerator(scale, seed=3, until=date(2026, 1, 1), password_hash="hash")
+    run(generator.generate(BulkLoader(database, batch_size=500)))
+    return database
+
+
+@pytest.fixture(scope="module")
+def client(db):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/sessions")
+    async def sessions(fields: Optional[str] = None):
+        selected = parse_fields(fields, SESSION_FIELDS)
+        projection = {"_id": 0} if selected is None else field_projection(selected, derived=SESSION_DERIVED_FIELDS)
+        docs = await db.sessions.find({}, projection).to_list(None)
+        for doc in docs:
+            doc["participant_count"] = len(doc.get("participant_ids", []))
+        return FastJSONResponse(docs if selected is None else trim_fields(docs, selected))
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    @app.get("/varied")
+    async def varied():
+        return JSONResponse({"status": "ok"}, headers={"Vary": "Origin"})
+
+    @app.get("/text")
+    async def text():
+        return PlainTextResponse("x" * 10000)
+
+    return TestClient(app)
+
+
+def identity(client, url):
+    return client.get(url, headers={"Accept-Encoding": "identity"})
+
+
+class TestSparseFields:
+
+    def test_projection_shrinks_the_payload(self, client):
+        full = identity(client, "/sessions")
+        sparse = identity(client, "/sessions?fields=name,start_date,end_date")
+        assert len(sparse.json()) == len(full.json()) > 100
+        assert set(sparse.json()[0]) == {"id", "name", "start_date", "end_date"}
+        assert len(sparse.content) < len(full.content) / 4
+
+    def test_derived_field_projects_its_source(self, client):
+        rows = identity(client, "/sessions?fields=name,participant_count").json()
+        assert set(rows[0]) == {"id", "name", "participant_count"}
+        assert all(row["participant_count"] > 0 for row in rows)
+
+    def test_projection_only_asks_for_what_is_needed(self):
+        assert field_projection(["name", "participant_count"], derived=SESSION_DERIVED_FIELDS) == {
+            "_id": 0, "id": 1, "name": 1, "participant_ids": 1
+        }
+        assert field_projection(["name"], needs=("location",)) == {"_id": 0, "id": 1, "location": 1, "name": 1}
+
+    def test_unknown_or_unsafe_fields_are_rejected(self, client):
+        assert identity(client, "/sessions?fields=name,password").status_code == 400
+        with pytest.raises(HTTPException):
+            parse_fields("name,$where")
+        with pytest.raises(HTTPException):
+            parse_fields(" , ")
+        # Open-ended endpoints (no allow-list) must not project ObjectIds back in
+        for unsafe in ("_id", "name,_internal"):
+            with pytest.raises(HTTPException) as error:
+                parse_fields(unsafe)
+            assert error.value.status_code == 400
+        assert parse_fields("name, name ,start_date") == ["name", "start_date"]
+        assert parse_fields(None) is None
+
+
+class TestCompression:
+
+    def test_large_json_is_gzipped(self, client):
+        plain = identity(client, "/sessions")
+        response = client.get("/sessions", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        # TestClient decodes transparently; the wire size is in Content-Length
+        assert int(response.headers["content-length"]) < len(plain.content) / 3
+        assert response.json() == plain.json()
+
+    def test_sparse_and_compressed_together(self, client):
+        full = identity(client, "/sessions")
+        response = client.get("/sessions?fields=name,start_date,end_date", headers={"Accept-Encoding": "gzip"})
+        assert int(response.headers["content-length"]) < len(full.content) / 20
+
+    def test_small_and_non_json_responses_pass_through(self, client):
+        small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers and small.json() == {"status": "ok"}
+        text = client.get("/text", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in text.headers
+        assert "content-encoding" not in identity(client, "/sessions").headers
+
+    def test_every_json_response_varies_on_accept_encoding(self, client):
+        for url in ("/sessions", "/small"):
+            for accept in ("gzip", "identity", ""):
+                response = client.get(url, headers={"Accept-Encoding": accept})
+                assert response.headers.get_list("vary") == ["Accept-Encoding"], (url, accept)
+        for accept in ("gzip", ""):
+            varied = client.get("/varied", headers={"Accept-Encoding": accept})
+            assert varied.headers.get_list("vary") == ["Origin, Accept-Encoding"]
+        assert "vary" not in client.get("/text", headers={"Accept-Encoding": "gzip"}).headers
+
+    def test_vary_is_merged_not_repeated(self):
+        assert vary_on_accept_encoding([]) == [(b"vary", b"Accept-Encoding")]
+        assert vary_on_accept_encoding([(b"Vary", b"origin, accept-encoding")]) == [(b"Vary", b"origin, accept-encoding")]
+        assert vary_on_accept_encoding([(b"vary", b"*")]) == [(b"vary", b"*")]
+        assert vary_on_accept_encoding([(b"vary", b"Origin"), (b"vary", b"Cookie")]) == [
+            (b"vary", b"Origin, Accept-Encoding"), (b"vary", b"Cookie")
+        ]
+
+    def test_encoding_negotiation(self, monkeypatch):
+        assert choose_encoding(None) is None
+        assert choose_encoding("gzip;q=0, identity") is None
+        assert choose_encoding("deflate, *;q=0.5") == ("br" if compression.brotli else "gzip")
+        monkeypatch.setattr(compression, "brotli", None)
+        assert choose_encoding("br, gzip;q=0.8") == "gzip"
+        assert gzip.decompress(compression.compress(b"{}" * 1000, "gzip")) == b"{}" * 1000
+
+    @pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+    def test_brotli_preferred_when_available(self, client):
+        response = client.get("/sessions", headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
@@ -0,0 +1,64 @@
+"""
+Period Normalization Tests
+Tests for typed period fields on finance and HR records
+"""
+from datetime import datetime, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from utils.periods import (
+    backfill_periods,
+    period_fields,
+    stamp_session_periods,
+    with_period,
+)
+
+from .conftest import run
+
+
+class TestPeriodFields:
+
+    @pytest.mark.parametrize("value, expected", [
+        ("2026-03-15", (2026, 3)),
+        ("2026-03-15T10:00:00+08:00", (2026, 3)),
+        # 20:00 UTC on the last day of the month is already the 1st in Malaysia
+        ("2026-03-31T20:00:00Z", (2026, 4)),
+        (datetime(2026, 12, 31, 17, 0, tzinfo=timezone.utc), (2027, 1)),
+        (datetime(2026, 6, 1, 9, 0), (2026, 6)),
+    ])
+    def test_malaysia_period(self, value, expected):
+        fields = period_fields(value)
+        assert (fields["period_year"], fields["period_month"]) == expected
+
+    def test_unparseable_dates_are_left_alone(self):
+        assert period_fields("TBC") == {}
+        assert period_fields(None) == {}
+
+    def test_record_date_takes_precedence(self):
+        invoice = with_period("invoices", {"invoice_date": "2025-12-30", "created_at": "2026-01-05T09:00:00+08:00"})
+        assert (invoice["period_year"], invoice["period_month"]) == (2025, 12)
+
+
+class TestBackfill:
+
+    def test_backfill_and_session_restamp(self):
+        db = AsyncMongoMockClient()["periods_test"]
+        run(db.sessions.insert_one({"id": "s1", "start_date": "2026-02-10"}))
+        run(db.invoices.insert_one({"id": "i1", "created_at": "2026-01-31T23:30:00+08:00"}))
+        run(db.payments.insert_one({"id": "p1", "payment_date": "2026-02-01"}))
+        run(db.trainer_fees.insert_one({"id": "t1", "session_id": "s1", "created_at": "2025-12-01T00:00:00+08:00"}))
+        run(db.payslips.insert_one({"id": "ps1", "year": 2026, "month": 3}))
+
+        counts = run(backfill_periods(db))
+        assert counts["invoices"] == counts["payments"] == counts["trainer_fees"] == counts["payslips"] == 1
+        assert run(db.invoices.find_one({"id": "i1"}))["period_month"] == 1
+        assert run(db.trainer_fees.find_one({"id": "t1"}))["period_month"] == 2
+        assert run(db.payslips.find_one({"id": "ps1"}))["period_month"] == 3
+
+        # A second run has nothing left to do
+        assert run(backfill_periods(db))["invoices"] == 0
+
+        run(stamp_session_periods(db, "s1", "2026-04-01"))
+        fee = run(db.trainer_fees.find_one({"id": "t1"}))
+        assert (fee["period_year"], fee["period_month"]) == (2026, 4)
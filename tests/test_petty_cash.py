@@ -0,0 +1,166 @@
+"""
+Petty Cash Ledger Tests
+Tests for atomic balance updates, reversals, reconciliation anchors and summaries
+"""
+import asyncio
+
+import pytest
+
+from utils import petty_cash
+
+from .conftest import run
+
+
+class Custodian:
+    id = "u1"
+    full_name = "Finance Officer"
+
+
+class YieldingDatabase:
+    """Yields to the event loop before every write so parallel requests interleave"""
+
+    YIELDING = {"find_one", "find_one_and_update", "insert_one", "update_one"}
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return YieldingCollection(self._db[name])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class YieldingCollection:
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in YieldingDatabase.YIELDING:
+            return attr
+
+        async def yielding(*args, **kwargs):
+            await asyncio.sleep(0)
+            return await attr(*args, **kwargs)
+        return yielding
+
+
+def pending_expense(n, amount=12.5, date="2026-03-05", category="Transport"):
+    return {"id": f"txn-{n}", "type": "expense", "amount": amount, "description": f"Expense {n}",
+            "category": category, "date": date, "status": "pending"}
+
+
+@pytest.fixture
+def db(db):
+    run(petty_cash.configure(db, {"float_amount": 5000.0, "approval_threshold": 100.0}, 5000.0))
+    return db
+
+
+class TestLedger:
+
+    def test_parallel_approvals_lose_no_updates(self, db):
+        run(db.petty_cash_transactions.insert_many([pending_expense(n) for n in range(200)]))
+        interleaved = YieldingDatabase(db)
+
+        async def approve_all():
+            # Every transaction is approved twice at once; only one approval may post
+            return await asyncio.gather(*(
+                petty_cash.approve(interleaved, f"txn-{n % 200}", "u1") for n in range(400)
+            ))
+
+        results = run(approve_all())
+        posted = [r for r in results if r]
+        assert len(posted) == 200
+
+        settings = run(db.petty_cash_settings.find_one({}))
+        assert settings["current_balance"] == pytest.approx(5000.0 - 200 * 12.5)
+        assert settings["ledger_seq"] == 200
+        assert sorted(r["ledger_seq"] for r in posted) == list(range(1, 201))
+        # Each entry's balance_after is what the balance was right after it posted
+        by_seq = sorted(posted, key=lambda r: r["ledger_seq"])
+        assert [r["balance_after"] for r in by_seq] == [5000.0 - 12.5 * (i + 1) for i in range(200)]
+
+    def test_overdraw_is_rejected_atomically(self, db):
+        async def spend_all():
+            return await asyncio.gather(*(
+                petty_cash.record_posted(YieldingDatabase(db), {"id": f"e{n}", "type": "expense", "amount": 1000.0},
+                                         require_balance=1000.0)
+                for n in range(8)
+            ), return_exceptions=True)
+
+        results = run(spend_all())
+        assert sum(isinstance(r, petty_cash.InsufficientBalance) for r in results) == 3
+        assert run(db.petty_cash_settings.find_one({}))["current_balance"] == 0
+        assert run(db.petty_cash_transactions.count_documents({})) == 5
+
+    def test_failed_post_releases_the_claim(self, db):
+        run(db.petty_cash_transactions.insert_one(pending_expense(1, amount=40.0)))
+        run(db.petty_cash_settings.delete_many({}))
+        with pytest.raises(petty_cash.LedgerNotSetUp):
+            run(petty_cash.approve(db, "txn-1", "u1"))
+        txn = run(db.petty_cash_transactions.find_one({"id": "txn-1"}))
+        assert txn["status"] == "pending"
+        assert "approved_by" not in txn and "delta" not in txn
+
+        # Once the ledger is set up the same transaction posts normally
+        run(petty_cash.configure(db, {}, 100.0))
+        posted = run(petty_cash.approve(db, "txn-1", "u1"))
+        assert posted["balance_after"] == 60.0
+
+    def test_failed_ledger_write_undoes_the_balance_move(self, db, monkeypatch):
+        run(db.petty_cash_transactions.insert_one(pending_expense(1, amount=40.0)))
+        update_one = type(db.petty_cash_transactions).update_one
+
+        async def failing_ledger_write(self, filter, update, *args, **kwargs):
+            if "ledger_seq" in update.get("$set", {}):
+                raise RuntimeError("write failed")
+            return await update_one(self, filter, update, *args, **kwargs)
+
+        monkeypatch.setattr(type(db.petty_cash_transactions), "update_one", failing_ledger_write)
+        with pytest.raises(RuntimeError):
+            run(petty_cash.approve(db, "txn-1", "u1"))
+        assert run(db.petty_cash_settings.find_one({}))["current_balance"] == 5000.0
+        assert run(db.petty_cash_transactions.find_one({"id": "txn-1"}))["status"] == "pending"
+
+    def test_reversal_appends_instead_of_deleting(self, db):
+        run(db.petty_cash_transactions.insert_one(pending_expense(1, amount=40.0)))
+        run(petty_cash.approve(db, "txn-1", "u1"))
+        reversal = run(petty_cash.reverse(db, "txn-1", Custodian()))
+        assert reversal["delta"] == 40.0
+        assert reversal["balance_after"] == 5000.0
+        assert run(db.petty_cash_transactions.find_one({"id": "txn-1"}))["status"] == "reversed"
+        assert run(petty_cash.reverse(db, "txn-1", Custodian())) is None
+
+
+class TestReconciliation:
+
+    def test_anchor_rederives_the_balance(self, db):
+        run(db.petty_cash_transactions.insert_many([pending_expense(n, amount=10.0) for n in range(3)]))
+        for n in range(3):
+            run(petty_cash.approve(db, f"txn-{n}", "u1"))
+        recon = run(petty_cash.reconcile(db, 4965.0, "Short by RM5", Custodian()))
+        assert recon["variance"] == pytest.approx(-5.0)
+        assert recon["anchor_balance"] == 4965.0
+
+        run(db.petty_cash_transactions.insert_one(pending_expense(9, amount=15.0)))
+        run(petty_cash.approve(db, "txn-9", "u1"))
+        derived = run(petty_cash.ledger_balance(db))
+        assert derived["entries_since_anchor"] == 1
+        assert derived["balance"] == run(db.petty_cash_settings.find_one({}))["current_balance"] == 4950.0
+
+
+class TestSummary:
+
+    def test_grouped_by_category_and_month(self, db):
+        run(db.petty_cash_transactions.insert_many([
+            {**pending_expense(1, 10.0, "2026-01-10", "Transport"), "status": "approved"},
+            {**pending_expense(2, 20.0, "2026-01-20", "Meals"), "status": "approved"},
+            {**pending_expense(3, 30.0, "2026-02-02", "Transport"), "status": "approved"},
+            pending_expense(4, 99.0, "2026-02-03", "Transport"),
+            {**pending_expense(5, 50.0, "2025-12-31", "Transport"), "status": "approved"},
+        ]))
+        summary = run(petty_cash.expense_summary(db, 2026))
+        assert summary["by_category"] == {"Transport": {"count": 2, "total": 40.0}, "Meals": {"count": 1, "total": 20.0}}
+        assert summary["by_month"] == {1: 30.0, 2: 30.0}
@@ -0,0 +1,104 @@
+"""
+Checklist Photo Ingest Tests
+Tests for content-hash storage, dedupe and resized variants
+"""
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from utils import photo_ingest
+from utils.photo_ingest import (
+    add_photo_variant_urls,
+    ingest_photo,
+    photo_variant_path,
+    stored_photo_path,
+)
+
+
+def make_upload(width=3000, height=2000, filename="phone.jpg", format="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format)
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename=filename)
+
+
+class TestPhotoIngest:
+
+    def test_stores_under_content_hash_with_variants(self, tmp_path):
+        photo = asyncio.run(ingest_photo(make_upload(), tmp_path))
+        name = f"{photo['content_hash']}.jpg"
+        assert photo["photo_url"].endswith(name)
+        assert (tmp_path / name).exists()
+
+        with Image.open(tmp_path / f"{photo['content_hash']}.display.jpg") as display:
+            assert max(display.size) == photo_ingest.PHOTO_VARIANTS["display"]
+        with Image.open(tmp_path / f"{photo['content_hash']}.thumb.jpg") as thumb:
+            assert max(thumb.size) == photo_ingest.PHOTO_VARIANTS["thumb"]
+
+    def test_duplicate_upload_is_skipped(self, tmp_path):
+        first = asyncio.run(ingest_photo(make_upload(), tmp_path))
+        second = asyncio.run(ingest_photo(make_upload(), tmp_path))
+        assert not first["duplicate"]
+        assert second["duplicate"]
+        assert second["photo_url"] == first["photo_url"]
+        assert len(list(tmp_path.iterdir())) == 3
+
+    def test_size_cap(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(photo_ingest, "MAX_PHOTO_SIZE", 1024)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(ingest_photo(make_upload(), tmp_path))
+        assert exc.value.status_code == 413
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.skipif(photo_ingest.register_heif_opener is None, reason="pillow-heif is not installed")
+    def test_iphone_heic_gets_variants(self, tmp_path):
+        photo = asyncio.run(ingest_photo(make_upload(filename="IMG_0001.HEIC", format="HEIF"), tmp_path))
+        assert photo["photo_url"].endswith(f"{photo['content_hash']}.heic")
+        with Image.open(tmp_path / f"{photo['content_hash']}.thumb.jpg") as thumb:
+            assert max(thumb.size) == photo_ingest.PHOTO_VARIANTS["thumb"]
+
+    def test_undecodable_heic_is_stored_without_variants(self, tmp_path, monkeypatch):
+        # As it is where pillow-heif is missing
+        def cannot_decode(*args):
+            raise OSError("cannot identify image file")
+
+        monkeypatch.setattr(photo_ingest, "_generate_variants", cannot_decode)
+        upload = UploadFile(file=io.BytesIO(b"\x00\x00\x00\x18ftypheic" + b"\x00" * 64), filename="IMG_0002.HEIC")
+        photo = asyncio.run(ingest_photo(upload, tmp_path))
+        original = tmp_path / f"{photo['content_hash']}.heic"
+        assert original.exists()
+        assert photo["display_url"] == photo["thumb_url"] == photo["photo_url"]
+        # Variant URLs handed out by checklist listings resolve to the original
+        assert stored_photo_path(tmp_path / f"{photo['content_hash']}.thumb.jpg") == original
+
+    def test_unreadable_image_is_kept_as_uploaded(self, tmp_path):
+        upload = UploadFile(file=io.BytesIO(b"not an image"), filename="fake.jpg")
+        photo = asyncio.run(ingest_photo(upload, tmp_path))
+        assert [p.name for p in tmp_path.iterdir()] == [f"{photo['content_hash']}.jpg"]
+        assert photo["thumb_url"] == photo["photo_url"]
+
+
+class TestVariantLookup:
+
+    def test_checklist_items_get_variant_urls(self, tmp_path):
+        photo = asyncio.run(ingest_photo(make_upload(), tmp_path))
+        checklist = {"checklist_items": [
+            {"item": "Brakes", "photo_url": photo["photo_url"]},
+            {"item": "Legacy", "photo_url": "/api/static/checklist-photos/old-uuid.jpg"},
+            {"item": "No photo"},
+        ]}
+        add_photo_variant_urls(checklist)
+        items = checklist["checklist_items"]
+        assert items[0]["photo_thumb_url"] == photo["thumb_url"]
+        assert items[0]["photo_display_url"] == photo["display_url"]
+        # Legacy photos have no variants and fall back to the original
+        assert items[1]["photo_thumb_url"] == items[1]["photo_url"]
+        assert "photo_thumb_url" not in items[2]
+
+    def test_report_embedding_uses_display_variant(self, tmp_path):
+        photo = asyncio.run(ingest_photo(make_upload(), tmp_path))
+        path = photo_variant_path(photo["photo_url"], "display", tmp_path)
+        assert path.name == f"{photo['content_hash']}.display.jpg"
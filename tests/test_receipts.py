@@ -0,0 +1,79 @@
+"""
+Receipt Tests
+Tests for persisted per-month receipt numbers and cached receipt PDFs
+"""
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from utils import receipts
+from utils.receipts import (
+    build_receipts_zip,
+    ensure_receipt_number,
+    get_receipt_pdf,
+    next_receipt_number,
+)
+from utils.time_helpers import MALAYSIA_TZ
+
+from .conftest import run
+
+pytest.importorskip("reportlab")
+
+PAYMENT = {"id": "pay-1", "invoice_id": "inv-1", "amount": 1500.0, "payment_date": "2026-10-05",
+           "payment_method": "bank_transfer", "receipt_number": "RCP/2026/10/0001"}
+INVOICE = {"id": "inv-1", "invoice_number": "INV/MDDRC/2026/10/0001", "company_name": "Acme & Sons",
+           "updated_at": "2026-10-01T10:00:00+08:00"}
+
+
+class TestReceiptNumbers:
+
+    def test_sequence_resets_each_month(self, db):
+        october = datetime(2026, 10, 3, tzinfo=MALAYSIA_TZ)
+        november = datetime(2026, 11, 1, tzinfo=MALAYSIA_TZ)
+        assert run(next_receipt_number(db, october)) == "RCP/2026/10/0001"
+        assert run(next_receipt_number(db, october)) == "RCP/2026/10/0002"
+        assert run(next_receipt_number(db, november)) == "RCP/2026/11/0001"
+
+    def test_concurrent_payments_get_distinct_numbers(self, db):
+        async def record_many():
+            return await asyncio.gather(*(next_receipt_number(db) for _ in range(50)))
+        numbers = run(record_many())
+        assert len(set(numbers)) == 50
+
+    def test_number_is_stable_once_assigned(self, db):
+        payment = {"id": "legacy", "created_at": "2025-03-14T09:00:00+08:00"}
+        run(db.payments.insert_one(dict(payment)))
+        first = run(ensure_receipt_number(db, dict(payment)))
+        run(next_receipt_number(db, datetime(2025, 3, 20, tzinfo=MALAYSIA_TZ)))
+        again = run(ensure_receipt_number(db, run(db.payments.find_one({"id": "legacy"}, {"_id": 0}))))
+        assert first == again == "RCP/2025/03/0001"
+
+
+class TestReceiptPdfCache:
+
+    def test_rendered_once_per_settings_version(self, tmp_path, monkeypatch):
+        calls = []
+        render = receipts.render_receipt_pdf
+        monkeypatch.setattr(receipts, "render_receipt_pdf", lambda *a: calls.append(1) or render(*a))
+
+        settings = {"company_name": "MDDRC SDN BHD", "version": 1}
+        first = run(get_receipt_pdf(PAYMENT, INVOICE, settings, tmp_path))
+        second = run(get_receipt_pdf(PAYMENT, INVOICE, settings, tmp_path))
+        assert first == second
+        assert first.read_bytes().startswith(b"%PDF")
+        assert len(calls) == 1
+
+        updated = run(get_receipt_pdf(PAYMENT, INVOICE, {**settings, "version": 2}, tmp_path))
+        assert updated != first
+        assert len(calls) == 2
+        assert list(tmp_path.glob("pay-1.*.pdf")) == [updated]
+
+    def test_month_zip(self, tmp_path):
+        second = {**PAYMENT, "id": "pay-2", "receipt_number": "RCP/2026/10/0002"}
+        orphan = {**PAYMENT, "id": "pay-3", "invoice_id": "missing", "receipt_number": "RCP/2026/10/0003"}
+        content = run(build_receipts_zip([PAYMENT, second, orphan], {"inv-1": INVOICE}, {}, tmp_path))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            assert archive.namelist() == ["RCP-2026-10-0001.pdf", "RCP-2026-10-0002.pdf"]
@@ -0,0 +1,114 @@
+"""
+Receivables Tests
+Tests for maintained invoice balances and the accounts-receivable aging report
+"""
+from datetime import datetime
+
+import pytest
+
+from utils.receivables import (
+    adjust_invoice_balance,
+    apply_credit_note_change,
+    collected_amount,
+    receivables_aging,
+    recompute_invoice_balances,
+)
+
+from .conftest import run
+
+
+@pytest.fixture
+def db(db):
+    run(db.invoices.insert_many([
+        {"id": "inv-1", "total_amount": 1000.0, "status": "issued", "company_id": "c1",
+         "company_name": "Acme", "invoice_date": "2026-10-10"},
+        {"id": "inv-2", "total_amount": 500.0, "status": "issued", "company_id": "c1",
+         "company_name": "Acme", "bill_to_name": "HRD Corp", "invoice_date": "2026-08-25"},
+        {"id": "inv-3", "total_amount": 300.0, "status": "issued", "company_id": "c2",
+         "company_name": "Beta", "created_at": "2026-05-01T09:00:00+08:00"},
+        {"id": "inv-4", "total_amount": 200.0, "status": "auto_draft", "company_id": "c2",
+         "company_name": "Beta", "invoice_date": "2026-10-01"},
+    ]))
+    run(db.sessions.insert_one({"id": "s1", "invoice_id": "inv-1", "invoice_status": "issued"}))
+    run(recompute_invoice_balances(db))
+    return db
+
+
+class TestMaintainedBalances:
+
+    def test_partial_then_full_payment(self, db):
+        invoice = run(adjust_invoice_balance(db, "inv-1", paid_delta=400))
+        assert invoice["outstanding"] == 600
+        assert invoice["status"] == "issued"
+
+        invoice = run(adjust_invoice_balance(db, "inv-1", paid_delta=600))
+        assert invoice["outstanding"] == 0
+        assert invoice["status"] == "paid"
+        session = run(db.sessions.find_one({"id": "s1"}))
+        assert session["invoice_status"] == "paid"
+
+    def test_deleted_payment_reopens_invoice(self, db):
+        run(adjust_invoice_balance(db, "inv-1", paid_delta=1000))
+        invoice = run(adjust_invoice_balance(db, "inv-1", paid_delta=-250))
+        assert invoice["outstanding"] == 250
+        assert invoice["status"] == "issued"
+
+    def test_credit_note_settles_remaining_balance(self, db):
+        run(adjust_invoice_balance(db, "inv-2", paid_delta=480))
+        draft = {"id": "cn-1", "invoice_id": "inv-2", "amount": 20.0, "status": "draft"}
+        run(apply_credit_note_change(db, None, draft))
+        assert run(db.invoices.find_one({"id": "inv-2"}))["outstanding"] == 20
+
+        approved = {**draft, "status": "approved"}
+        run(apply_credit_note_change(db, draft, approved))
+        invoice = run(db.invoices.find_one({"id": "inv-2"}))
+        assert invoice["outstanding"] == 0
+        assert invoice["status"] == "paid"
+
+        run(apply_credit_note_change(db, approved, {**approved, "status": "voided"}))
+        invoice = run(db.invoices.find_one({"id": "inv-2"}))
+        assert invoice["outstanding"] == 20
+        assert invoice["status"] == "issued"
+
+    def test_credit_settled_invoice_is_not_counted_as_collected(self, db):
+        run(adjust_invoice_balance(db, "inv-2", paid_delta=300))
+        run(apply_credit_note_change(db, None, {"id": "cn-1", "invoice_id": "inv-2", "amount": 200.0, "status": "approved"}))
+        run(apply_credit_note_change(db, None, {"id": "cn-2", "invoice_id": "inv-3", "amount": 300.0, "status": "approved"}))
+        partly_credited = run(db.invoices.find_one({"id": "inv-2"}))
+        fully_credited = run(db.invoices.find_one({"id": "inv-3"}))
+        assert partly_credited["status"] == fully_credited["status"] == "paid"
+        assert collected_amount(partly_credited) == 300
+        assert collected_amount(fully_credited) == 0
+        # Paid before balances were maintained: settled by payments
+        assert collected_amount({"status": "paid", "total_amount": 150.0}) == 150
+        assert collected_amount({"status": "issued", "total_amount": 150.0}) == 0
+
+    def test_invoice_without_balance_is_rebuilt(self, db):
+        run(db.invoices.insert_one({"id": "legacy", "total_amount": 100.0, "status": "issued"}))
+        run(db.payments.insert_many([
+            {"id": "p1", "invoice_id": "legacy", "amount": 30.0},
+            {"id": "p2", "invoice_id": "legacy", "amount": 20.0},
+        ]))
+        invoice = run(adjust_invoice_balance(db, "legacy", paid_delta=20.0))
+        assert invoice["paid_amount"] == 50
+        assert invoice["outstanding"] == 50
+
+
+class TestAgingReport:
+
+    def test_buckets_per_billing_party(self, db):
+        run(adjust_invoice_balance(db, "inv-1", paid_delta=250))
+        report = run(receivables_aging(db, as_of=datetime(2026, 10, 19)))
+        parties = {(p["billing_party"], p["company_id"]): p for p in report["parties"]}
+
+        assert parties[("Acme", "c1")]["current"] == 750
+        assert parties[("HRD Corp", "c1")]["days_31_60"] == 500
+        assert parties[("Beta", "c2")]["days_over_90"] == 300
+        # Drafts are not receivable yet
+        assert report["totals"]["total"] == 1550
+        assert report["totals"]["invoice_count"] == 3
+
+    def test_settled_invoices_drop_out(self, db):
+        run(adjust_invoice_balance(db, "inv-3", paid_delta=300))
+        report = run(receivables_aging(db, as_of=datetime(2026, 10, 19), company_id="c2"))
+        assert report["parties"] == []
@@ -0,0 +1,122 @@
+"""
+Session Creation Tests
+Tests for batched participant resolution, password hashing and all-or-nothing writes
+"""
+
+import pytest
+
+from utils.session_creation import resolve_people, write_session
+
+from .conftest import run
+
+
+def make_user(person, role, company_id, email):
+    return {"id": f"new-{person['id_number']}", "full_name": person["full_name"], "id_number": person["id_number"],
+            "email": email, "role": role, "company_id": company_id, "phone_number": person.get("phone_number")}
+
+
+class CountingHasher:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, password):
+        self.calls.append(password)
+        return f"hashed:{password}"
+
+
+def participant(n, **extra):
+    return ("participant", {"full_name": f"DRIVER {n}", "id_number": f"9001010{n:05d}", "email": "",
+                            "password": "mddrc1", "phone_number": "", **extra})
+
+
+@pytest.fixture
+def db(db):
+    run(db.users.insert_one({"id": "u-existing", "full_name": "OLD NAME", "id_number": "900101000001",
+                                   "email": "driver1@acme.com", "role": "participant", "password": "old-hash"}))
+    return db
+
+
+class TestResolvePeople:
+
+    def test_matches_existing_and_creates_the_rest(self, db):
+        hasher = CountingHasher()
+        people = [participant(n) for n in range(1, 41)] + \
+                 [("pic_supervisor", {"full_name": "SUPERVISOR", "id_number": "800101000001",
+                                      "email": "sup@acme.com", "password": "Secret#1"})]
+        operations, resolved = run(resolve_people(db, people, "c1", make_user, hasher))
+
+        assert resolved[0][0]["id"] == "u-existing" and resolved[0][1] is True
+        assert resolved[0][0]["company_id"] == "c1"
+        assert sum(1 for _, existing in resolved if not existing) == 40
+        # One hash per distinct password, however many users share it
+        assert sorted(hasher.calls) == ["Secret#1", "mddrc1"]
+        created = resolved[1][0]
+        assert created["email"] == "900101000002@temp.mddrc.local"
+        assert created["password"] == "hashed:mddrc1"
+
+        run(db.users.bulk_write(operations, ordered=True))
+        assert run(db.users.count_documents({})) == 41
+        existing = run(db.users.find_one({"id": "u-existing"}))
+        assert existing["company_id"] == "c1" and existing["password"] == "old-hash"
+
+    def test_repeated_person_in_one_request_is_created_once(self, db):
+        people = [participant(7), participant(7, phone_number="0123456789")]
+        operations, resolved = run(resolve_people(db, people, "c1", make_user, CountingHasher()))
+        assert [existing for _, existing in resolved] == [False, True]
+        assert resolved[0][0] is resolved[1][0]
+        run(db.users.bulk_write(operations, ordered=True))
+        stored = run(db.users.find({"id_number": "900101000007"}).to_list(None))
+        assert len(stored) == 1 and stored[0]["phone_number"] == "0123456789"
+
+
+class FailingCommissions:
+    """Database whose marketing_commissions inserts fail"""
+
+    def __init__(self, db):
+        self._db = db
+        self.client = db.client
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    @property
+    def marketing_commissions(self):
+        class Broken:
+            async def insert_one(self, *args, **kwargs):
+                raise ConnectionError("primary stepped down")
+        return Broken()
+
+
+class TestWriteSession:
+
+    def batch(self, db):
+        operations, resolved = run(resolve_people(db, [participant(n) for n in range(1, 4)], "c1",
+                                                  make_user, CountingHasher()))
+        new_users = [u for u, existing in resolved if not existing]
+        session = {"id": "s1", "participant_ids": [u["id"] for u, _ in resolved]}
+        invoice = {"id": "inv1", "session_id": "s1"}
+        commission = {"id": "mc1", "session_id": "s1"}
+        access = [{"id": f"a{n}", "session_id": "s1", "participant_id": u["id"]} for n, (u, _) in enumerate(resolved)]
+        return operations, new_users, session, invoice, commission, access
+
+    def test_everything_is_written(self, db):
+        operations, new_users, session, invoice, commission, access = self.batch(db)
+        run(write_session(db, operations, new_users, session, invoice=invoice, commission=commission,
+                          access_docs=access))
+        assert run(db.users.count_documents({})) == 3
+        assert run(db.participant_access.count_documents({"session_id": "s1"})) == 3
+        assert run(db.invoices.count_documents({})) == run(db.marketing_commissions.count_documents({})) == 1
+        assert "_id" not in session and "_id" not in new_users[0]
+
+    def test_failure_leaves_nothing_behind(self, db):
+        operations, new_users, session, invoice, commission, access = self.batch(db)
+        with pytest.raises(ConnectionError):
+            run(write_session(FailingCommissions(db), operations, new_users, session, invoice=invoice,
+                              commission=commission, access_docs=access))
+        assert run(db.sessions.count_documents({})) == 0
+        assert run(db.invoices.count_documents({})) == 0
+        assert run(db.users.count_documents({})) == 1
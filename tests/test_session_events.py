@@ -0,0 +1,88 @@
+"""
+Session Event Tests
+Tests for the per-session event bus and its Server-Sent Events stream
+"""
+import json
+
+from utils import session_events as events_module
+from utils.session_events import SessionEventBus, stream_session_events
+
+from .conftest import run
+
+
+def parse(chunk: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if not line.startswith(":"))
+    return {"event": fields.get("event"), "id": fields.get("id"), "data": json.loads(fields["data"]) if "data" in fields else None}
+
+
+class TestEventBus:
+
+    def test_only_the_sessions_subscribers_receive_events(self):
+        async def scenario():
+            bus = SessionEventBus()
+            mine, other = bus.subscribe("s1"), bus.subscribe("s2")
+            bus.publish("s1", "attendance.clock_in", participant_id="p1", time="08:01:00")
+            event = mine.queue.get_nowait()
+            assert event["type"] == "attendance.clock_in"
+            assert event["data"] == {"participant_id": "p1", "time": "08:01:00"}
+            assert other.queue.empty()
+            bus.unsubscribe(mine)
+            assert bus.subscriber_count("s1") == 0
+        run(scenario())
+
+    def test_change_stream_feed_suppresses_direct_publishes(self):
+        bus = SessionEventBus()
+        bus.change_streams_active = True
+        bus.publish("s1", "test.submitted", participant_id="p1")
+        assert bus.replay("s1", 0) == []
+        bus.dispatch("s1", "test.submitted", {"participant_id": "p1"})
+        assert len(bus.replay("s1", 0)) == 1
+
+    def test_replay_after_reconnect(self, monkeypatch):
+        monkeypatch.setattr(events_module, "HISTORY_PER_SESSION", 3)
+        bus = SessionEventBus()
+        for n in range(2):
+            bus.publish("s1", "feedback.submitted", participant_id=f"p{n}")
+        assert [e["data"]["participant_id"] for e in bus.replay("s1", 1)] == ["p1"]
+        for n in range(2, 5):
+            bus.publish("s1", "feedback.submitted", participant_id=f"p{n}")
+        # Event 2 has fallen out of the 3-event history
+        assert bus.replay("s1", 1) is None
+        assert len(bus.replay("s1", 2)) == 3
+
+    def test_slow_subscriber_gets_a_resync(self, monkeypatch):
+        monkeypatch.setattr(events_module, "SUBSCRIBER_QUEUE_SIZE", 2)
+
+        async def scenario():
+            bus = SessionEventBus()
+            subscription = bus.subscribe("s1")
+            for n in range(5):
+                bus.publish("s1", "attendance.clock_in", participant_id=f"p{n}")
+            assert subscription.queue.qsize() == 1
+            assert subscription.queue.get_nowait()["type"] == "resync"
+        run(scenario())
+
+
+class TestEventStream:
+
+    def test_stream_replays_then_pushes_live_events(self):
+        async def scenario():
+            bus = SessionEventBus()
+            bus.publish("s1", "attendance.clock_in", participant_id="p1")
+            bus.publish("s1", "attendance.clock_in", participant_id="p2")
+
+            stream = stream_session_events(bus, "s1", last_event_id=1, heartbeat=0.01)
+            assert (await stream.__anext__()).startswith("retry:")
+            replayed = parse(await stream.__anext__())
+            assert replayed["event"] == "attendance.clock_in"
+            assert replayed["id"] == "2"
+
+            assert (await stream.__anext__()) == ": ping\n\n"
+            bus.publish("s1", "test.submitted", participant_id="p1", score=85.0, passed=True)
+            live = parse(await stream.__anext__())
+            assert live["event"] == "test.submitted"
+            assert live["data"]["data"]["score"] == 85.0
+
+            await stream.aclose()
+            assert bus.subscriber_count() == 0
+        run(scenario())
@@ -0,0 +1,76 @@
+"""
+Startup Time Tests
+Tests that heavy stacks load lazily and that a cold start stays within budget
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import startup
+
+from .conftest import BACKEND_DIR
+
+
+def in_fresh_interpreter(code):
+    completed = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    return completed.stdout.strip()
+
+
+def cold_start(check_health):
+    try:
+        return startup.measure(repeat=3, check_health=check_health)
+    except RuntimeError as e:
+        if "ModuleNotFoundError" in str(e) or "ImportError" in str(e):
+            pytest.skip(f"server.py dependencies are not installed: {str(e).splitlines()[-1]}")
+        raise
+
+
+def mongo_available():
+    from pymongo import MongoClient
+    try:
+        MongoClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                    serverSelectionTimeoutMS=500).admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+class TestLazyImports:
+
+    def test_facade_imports_on_first_use(self):
+        output = in_fresh_interpreter(
+            "import sys\n"
+            "from utils.lazy_imports import docx\n"
+            "print('docx' in sys.modules, docx.loaded)\n"
+            "docx.Document\n"
+            "print('docx' in sys.modules, docx.loaded)\n"
+        )
+        assert output.splitlines() == ["False False", "True True"]
+
+    def test_missing_module_fails_on_use_not_on_import(self):
+        output = in_fresh_interpreter(
+            "from utils.lazy_imports import LazyModule\n"
+            "missing = LazyModule('not_an_installed_module')\n"
+            "try:\n"
+            "    missing.anything\n"
+            "except ModuleNotFoundError:\n"
+            "    print('raised on use')\n"
+        )
+        assert output == "raised on use"
+
+
+class TestStartupBudget:
+
+    def test_import_within_budget(self):
+        summary = cold_start(check_health=False)
+        assert summary["heavy_modules"] == []
+        assert summary["budget"]["over"] == []
+
+    @pytest.mark.skipif(not mongo_available(), reason="MongoDB is not reachable")
+    def test_first_health_within_budget(self):
+        summary = cold_start(check_health=True)
+        assert summary["health_status"] == 200
+        assert summary["budget"]["over"] == []
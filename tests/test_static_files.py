@@ -0,0 +1,117 @@
+"""
+Static File Serving Tests
+Tests for ETag revalidation, Range requests and cache headers on static routes
+"""
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.static_files import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    resolve_static_path,
+    serve_static_file,
+)
+
+
+@pytest.fixture
+def static_client(tmp_path):
+    """App exposing a tmp directory through the static file helper"""
+    app = FastAPI()
+
+    @app.get("/static/{filename}")
+    async def get_static(filename: str, request: Request):
+        file_path = resolve_static_path(tmp_path, filename)
+        return await serve_static_file(request, file_path)
+
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(range(256)) * 4)
+    content = b"photo-bytes" * 100
+    digest = hashlib.sha256(content).hexdigest()
+    (tmp_path / f"{digest}.jpg").write_bytes(content)
+
+    client = TestClient(app)
+    client.content_addressed_name = f"{digest}.jpg"
+    return client
+
+
+class TestConditionalRequests:
+    """ETag / If-None-Match behaviour"""
+
+    def test_repeat_fetch_returns_304(self, static_client):
+        """Second fetch with the returned ETag is answered with 304 and no body"""
+        first = static_client.get("/static/logo.png")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and not etag.startswith('W/')
+        assert first.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+        second = static_client.get("/static/logo.png", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+        third = static_client.get("/static/logo.png", headers={"If-None-Match": etag})
+        assert third.status_code == 304
+
+    def test_changed_file_gets_new_etag(self, static_client, tmp_path):
+        """Rewriting the file invalidates the previous ETag"""
+        etag = static_client.get("/static/logo.png").headers["etag"]
+        (tmp_path / "logo.png").write_bytes(b"\x89PNG new logo content")
+        os.utime(tmp_path / "logo.png", ns=(1, 1))
+
+        response = static_client.get("/static/logo.png", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_content_addressed_file_is_immutable(self, static_client):
+        """Hash-named files are cached long term"""
+        name = static_client.content_addressed_name
+        response = static_client.get(f"/static/{name}")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+        repeat = static_client.get(f"/static/{name}", headers={"If-None-Match": response.headers["etag"]})
+        assert repeat.status_code == 304
+
+
+class TestRangeRequests:
+    """Range / If-Range behaviour"""
+
+    def test_partial_content(self, static_client):
+        full = static_client.get("/static/logo.png").content
+        response = static_client.get("/static/logo.png", headers={"Range": "bytes=4-13"})
+        assert response.status_code == 206
+        assert response.content == full[4:14]
+        assert response.headers["content-range"] == f"bytes 4-13/{len(full)}"
+
+    def test_suffix_range(self, static_client):
+        full = static_client.get("/static/logo.png").content
+        response = static_client.get("/static/logo.png", headers={"Range": "bytes=-16"})
+        assert response.status_code == 206
+        assert response.content == full[-16:]
+
+    def test_unsatisfiable_range(self, static_client):
+        response = static_client.get("/static/logo.png", headers={"Range": "bytes=999999-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"].startswith("bytes */")
+
+    def test_stale_if_range_serves_full_file(self, static_client):
+        full = static_client.get("/static/logo.png").content
+        response = static_client.get(
+            "/static/logo.png",
+            headers={"Range": "bytes=0-3", "If-Range": '"stale"'}
+        )
+        assert response.status_code == 200
+        assert response.content == full
+
+
+class TestPathSafety:
+
+    def test_missing_file_is_404(self, static_client):
+        assert static_client.get("/static/missing.png").status_code == 404
+
+    def test_traversal_is_rejected(self, static_client):
+        assert static_client.get("/static/..%2F..%2Fetc%2Fpasswd").status_code == 404
@@ -0,0 +1,85 @@
+"""
+Test Cache Tests
+Tests for compiled test delivery, stored shuffle orders and grading
+"""
+
+import pytest
+
+from utils.test_cache import (
+    CompiledTestCache,
+    participant_order,
+    stored_order,
+)
+
+from .conftest import run
+
+QUESTIONS = [
+    {"question": "Same question", "options": ["a", "b", "c", "d"], "correct_answer": 0},
+    {"question": "Same question", "options": ["a", "b", "c", "d"], "correct_answer": 0},
+    {"question_text": "Uploaded", "options": ["a", "b", "c", "d"], "correct_answer": 2},
+    {"question": "Last", "options": ["a", "b", "c", "d"], "correct_answer": 3},
+]
+
+
+@pytest.fixture
+def db(db):
+    run(db.programs.insert_one({"id": "prog", "name": "Defensive Driving", "pass_percentage": 75.0}))
+    run(db.tests.insert_many([
+        {"id": "pre", "program_id": "prog", "test_type": "pre", "questions": QUESTIONS,
+         "created_at": "2026-01-01T09:00:00+08:00"},
+        {"id": "post", "program_id": "prog", "test_type": "post", "questions": QUESTIONS,
+         "created_at": "2026-01-01T09:00:00+08:00"},
+    ]))
+    return db
+
+
+class TestCompiledTests:
+
+    def test_participant_payload_hides_answers(self, db):
+        test = run(CompiledTestCache().get(db, "pre"))
+        payload = test.participant_payload()
+        assert all("correct_answer" not in q for q in payload)
+        # Duplicate questions keep their own positions
+        assert [q["original_index"] for q in payload] == [0, 1, 2, 3]
+        assert payload[2]["question"] == "Uploaded"
+        assert test.answer_key == [0, 0, 2, 3]
+        assert test.pass_percentage == 75.0
+
+    def test_cached_until_invalidated(self, db):
+        cache = CompiledTestCache(check_interval=60)
+        assert len(run(cache.for_program(db, "prog"))) == 2
+        run(db.programs.update_one({"id": "prog"}, {"$set": {"pass_percentage": 50.0}}))
+        assert run(cache.get(db, "pre")).pass_percentage == 75.0
+
+        run(cache.invalidate(db))
+        assert run(cache.get(db, "pre")).pass_percentage == 50.0
+
+    def test_other_workers_see_the_version_bump(self, db):
+        reader, writer = CompiledTestCache(check_interval=0), CompiledTestCache()
+        assert run(reader.get(db, "pre")).pass_percentage == 75.0
+        run(db.programs.update_one({"id": "prog"}, {"$set": {"pass_percentage": 50.0}}))
+        run(writer.invalidate(db))
+        assert run(reader.get(db, "pre")).pass_percentage == 50.0
+
+
+class TestShuffledGrading:
+
+    def test_order_is_stored_once(self, db):
+        test = run(CompiledTestCache().get(db, "post"))
+        first = run(participant_order(db, test, "p1"))
+        assert sorted(first) == [0, 1, 2, 3]
+        assert run(participant_order(db, test, "p1")) == first
+        assert run(stored_order(db, "post", "p1")) == first
+
+    def test_grading_maps_display_order_back(self, db):
+        test = run(CompiledTestCache().get(db, "post"))
+        order = [3, 2, 1, 0]
+        graded = test.grade([3, 2, 0, 1], order)
+        assert graded["correct_answers"] == 3
+        assert graded["score"] == 75.0
+        assert graded["passed"] is True
+
+    def test_grading_without_order_matches_original_positions(self, db):
+        test = run(CompiledTestCache().get(db, "pre"))
+        assert test.grade([0, 0, 2])["correct_answers"] == 3
+        assert test.grade([0, 0, 2, 3, 1, 1])["total_questions"] == 4